@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Address Index - Keystroke-speed address, street, city and ZIP autocomplete
+Normalized entries are kept sorted in one contiguous byte blob with a uint32
+offset array and a uint16 rank per entry. A prefix is located with two binary
+searches. The top-ranked matches come from per-block rank maxima, so even a
+one-letter prefix over millions of entries only examines a handful of blocks.
+The index file is memory-mapped, so every worker on a host shares one copy.
+
+Input: OpenAddresses-style CSVs (NUMBER, STREET, CITY, REGION, POSTCODE) or
+number,street,city,state,zip[,weight]; ZIP codes and cities come from
+data/zip_centroids.csv and the shelter addresses from the knowledge base.
+
+Build with: python address_index.py build [addresses.csv ...]
+"""
+
+import os
+import re
+import sys
+import csv
+import json
+import mmap
+import time
+import struct
+import argparse
+
+import numpy as np
+
+INDEX_PATH_ENV = 'EMERGENCY_ADDRESS_INDEX'
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'addresses.index')
+
+MAGIC = b'EPADDR1\0'
+HEADER = struct.Struct('<8sIQ')
+
+# Entries per block for the top-k search
+BLOCK = 64
+
+# Suggestions returned per keystroke
+TOP = 10
+
+# Ranks: ZIP codes and cities outrank streets, which outrank single addresses
+RANK_ZIP = 60000
+RANK_CITY = 50000
+RANK_STREET = 20000
+RANK_ADDRESS = 1000
+MAX_RANK = 65535
+
+# Completed words are abbreviated the USPS way, in the index and in what is typed
+ABBREVIATIONS = {
+    'street': 'st', 'avenue': 'ave', 'road': 'rd', 'drive': 'dr', 'boulevard': 'blvd', 'lane': 'ln',
+    'court': 'ct', 'place': 'pl', 'parkway': 'pkwy', 'highway': 'hwy', 'expressway': 'expy',
+    'circle': 'cir', 'terrace': 'ter', 'north': 'n', 'south': 's', 'east': 'e', 'west': 'w'
+}
+STATES = {
+    'al', 'ak', 'az', 'ar', 'ca', 'co', 'ct', 'de', 'dc', 'fl', 'ga', 'hi', 'id', 'il', 'in', 'ia', 'ks', 'ky',
+    'la', 'me', 'md', 'ma', 'mi', 'mn', 'ms', 'mo', 'mt', 'ne', 'nv', 'nh', 'nj', 'nm', 'ny', 'nc', 'nd', 'oh',
+    'ok', 'or', 'pa', 'ri', 'sc', 'sd', 'tn', 'tx', 'ut', 'vt', 'va', 'wa', 'wv', 'wi', 'wy', 'pr'
+}
+# Tokens that read better upper-cased in a suggestion (directions and state codes)
+UPPER_TOKENS = STATES | {'n', 's', 'e', 'w', 'ne', 'nw', 'se', 'sw'}
+
+NON_WORD_RE = re.compile(r'[^a-z0-9]+')
+
+
+def index_path():
+    return os.environ.get(INDEX_PATH_ENV, DEFAULT_INDEX_PATH)
+
+
+def normalize(text, partial=False):
+    """Lowercase words separated by single spaces, with completed words abbreviated
+
+    With partial=True (what the user is typing) the last word is left as typed
+    unless it is followed by a space, so 'main str' still matches 'main st'.
+    """
+    lowered = text.lower()
+    words = NON_WORD_RE.sub(' ', lowered).split()
+    if not words:
+        return ''
+    last = len(words) if not partial or lowered[-1:].isspace() or lowered[-1:] == ',' else len(words) - 1
+    words = [ABBREVIATIONS.get(word, word) if i < last else word for i, word in enumerate(words)]
+    return " ".join(words)
+
+
+def display(key):
+    """A readable suggestion from a normalized entry"""
+    return " ".join(word.upper() if word in UPPER_TOKENS and i else word.capitalize() if not word[:1].isdigit()
+                    else word for i, word in enumerate(key.split()))
+
+
+def address_entries(number, street, city, state, zip_code, weight=None):
+    """Index entries for one address and its street: [(key, rank), ...]"""
+    street_key = normalize(f"{street} {city} {state}")
+    full = normalize(f"{number} {street} {city} {state} {zip_code}")
+    rank = RANK_ADDRESS if weight is None else max(1, min(RANK_STREET - 1, int(weight)))
+    return [(full, rank), (street_key, RANK_STREET)] if full else []
+
+
+def read_addresses(path):
+    """Index entries from an address CSV (OpenAddresses or number,street,city,state,zip[,weight])"""
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = csv.DictReader(f)
+        fields = {name.strip().lower(): name for name in rows.fieldnames}
+
+        def column(*names):
+            return next((fields[name] for name in names if name in fields), None)
+
+        number, street = column('number', 'house_number'), column('street')
+        city, state = column('city'), column('region', 'state')
+        zip_code, weight = column('postcode', 'zip'), column('weight')
+        if not (street and city):
+            raise ValueError(f"{path}: needs at least street and city columns")
+        for row in rows:
+            yield from address_entries(row.get(number, '') if number else '', row[street], row[city],
+                                       row.get(state, '') if state else '', row.get(zip_code, '') if zip_code else '',
+                                       row[weight] if weight and row[weight] else None)
+
+
+def local_entries(shelter_data=None, centroids=None):
+    """ZIP, city and shelter address entries from the app's own data"""
+    from zip_shelters import centroids_path
+
+    entries = []
+    path = centroids or centroids_path()
+    if os.path.exists(path):
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                city, state = row.get('city', ''), row.get('state', '')
+                entries.append((normalize(f"{row['zip']} {city} {state}"), RANK_ZIP))
+                if city:
+                    entries.append((normalize(f"{city} {state}"), RANK_CITY))
+    entries.extend((key, RANK_ADDRESS) for key in shelter_keys(shelter_data))
+    return entries
+
+
+def shelter_keys(shelter_data):
+    """Sorted entry keys of the shelter addresses in the knowledge base"""
+    keys = set()
+    for region, shelters in (shelter_data or {}).items():
+        city, _, state = region.partition(',')
+        for shelter in shelters:
+            street = shelter['address'].split(',')[0]
+            keys.add(normalize(f"{street} {city} {state}"))
+    keys.discard('')
+    return sorted(keys)
+
+
+def write_index(path, entries, shelters=()):
+    """Sort, de-duplicate (keeping the highest rank; streets add up) and write an index file
+
+    The shelter keys are stored after the blob so a later knowledge change can
+    swap them out without re-reading the address CSVs.
+    """
+    ranks = {}
+    for key, rank in entries:
+        if not key:
+            continue
+        if rank == RANK_STREET and key in ranks:
+            # Each address on a street makes the street a slightly better suggestion
+            ranks[key] = min(MAX_RANK, ranks[key] + 1)
+        else:
+            ranks[key] = max(rank, ranks.get(key, 0))
+    keys = sorted(key.encode('utf-8') for key in ranks)
+    blob = b''.join(keys)
+    offsets = np.zeros(len(keys) + 1, dtype=np.uint32)
+    np.cumsum([len(key) for key in keys], out=offsets[1:])
+    rank_array = np.array([ranks[key.decode('utf-8')] for key in keys], dtype=np.uint16)
+    padded = np.zeros(-(-len(keys) // BLOCK) * BLOCK, dtype=np.uint16)
+    padded[:len(keys)] = rank_array
+    block_max = padded.reshape(-1, BLOCK).max(axis=1) if len(keys) else padded
+
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(keys), len(blob)))
+        for array in (offsets, rank_array, block_max):
+            f.write(array.tobytes())
+        f.write(blob)
+        f.write(json.dumps({'shelters': list(shelters)}).encode('utf-8'))
+    os.replace(tmp, path)
+    return len(keys)
+
+
+class AddressIndex:
+    """Memory-mapped sorted prefix index with ranked top-k suggestions"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, blob_len = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an address index")
+        self.count = count
+        position = HEADER.size
+        self.offsets = np.frombuffer(self._map, dtype=np.uint32, count=count + 1, offset=position)
+        position += self.offsets.nbytes
+        self.ranks = np.frombuffer(self._map, dtype=np.uint16, count=count, offset=position)
+        position += self.ranks.nbytes
+        self.block_max = np.frombuffer(self._map, dtype=np.uint16, count=-(-count // BLOCK), offset=position)
+        self._blob = position + self.block_max.nbytes
+        # Indexes written before the shelter keys were recorded have no trailer
+        trailer = self._map[self._blob + blob_len:]
+        self.shelters = json.loads(trailer)['shelters'] if trailer else None
+
+    def __len__(self):
+        return self.count
+
+    def _entry(self, i):
+        start, end = self.offsets[i:i + 2].tolist()
+        return self._map[self._blob + start:self._blob + end]
+
+    def _lower(self, prefix):
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._entry(mid) < prefix:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _upper(self, prefix, lo):
+        hi, size = self.count, len(prefix)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._entry(mid)[:size] <= prefix:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def prefix_range(self, prefix):
+        """[lo, hi) of the entries starting with a normalized prefix"""
+        prefix = prefix.encode('utf-8')
+        lo = self._lower(prefix)
+        return lo, self._upper(prefix, lo)
+
+    def _top(self, lo, hi, k):
+        if hi - lo <= BLOCK * 4:
+            candidates = np.arange(lo, hi)
+        else:
+            first, last = -(-lo // BLOCK), hi // BLOCK
+            # Each of the k best entries sits in one of the k blocks with the highest maxima
+            blocks = first + np.argpartition(-self.block_max[first:last].astype(np.int32),
+                                             min(k, last - first) - 1)[:k]
+            candidates = np.concatenate([np.arange(lo, first * BLOCK), np.arange(last * BLOCK, hi)] +
+                                        [np.arange(b * BLOCK, (b + 1) * BLOCK) for b in blocks.tolist()])
+        order = np.lexsort((candidates, -self.ranks[candidates].astype(np.int32)))[:k]
+        return candidates[order].tolist()
+
+    def suggest(self, text, k=TOP):
+        """Up to k (suggestion, normalized key) pairs for what has been typed, best first"""
+        prefix = normalize(text, partial=True)
+        if not prefix:
+            return []
+        # A half-typed word ('str', 'aven') also matches its abbreviation as a completed word
+        head, _, last = prefix.rpartition(' ')
+        prefixes = [prefix] + [f"{head} {short} ".lstrip() for word, short in ABBREVIATIONS.items()
+                               if len(last) > len(short) and word.startswith(last)]
+        found = set()
+        for candidate in prefixes:
+            lo, hi = self.prefix_range(candidate)
+            found.update(self._top(lo, hi, k) if lo < hi else ())
+        best = sorted(found, key=lambda i: (-int(self.ranks[i]), i))[:k]
+        return [(display(key), key) for key in (self._entry(i).decode('utf-8') for i in best)]
+
+    def contains(self, text):
+        """True when the text is exactly an indexed entry (or a known ZIP code)"""
+        key = normalize(text)
+        lo, hi = self.prefix_range(key)
+        return lo < hi and (self._entry(lo).decode('utf-8') == key or (key.isdigit() and len(key) == 5))
+
+    def entries(self):
+        """Every (key, rank) in the index"""
+        for i, rank in enumerate(self.ranks.tolist()):
+            yield self._entry(i).decode('utf-8'), rank
+
+    def nbytes(self):
+        return len(self._map)
+
+    def close(self):
+        self.offsets = self.ranks = self.block_max = None
+        self._map.close()
+
+
+def build_index(path=None, sources=(), shelter_data=None):
+    """Write an index of the local ZIP, city and shelter data plus any address CSVs; returns entry count"""
+    entries = local_entries(shelter_data)
+    for source in sources:
+        entries.extend(read_addresses(source))
+    return write_index(path or index_path(), entries, shelter_keys(shelter_data))
+
+
+def refresh_index(index, shelter_data, path=None):
+    """Rewrite an index with its shelter entries replaced by the current ones; returns entry count"""
+    old = set(index.shelters or ())
+    shelters = shelter_keys(shelter_data)
+    entries = [(key, rank) for key, rank in index.entries() if key not in old]
+    entries.extend((key, RANK_ADDRESS) for key in shelters)
+    return write_index(path or index.path, entries, shelters)
+
+
+def load_index(shelter_data=None, path=None):
+    """The index file, built from the local data if missing or refreshed if its shelters are out of date"""
+    path = path or index_path()
+    try:
+        if not os.path.exists(path):
+            build_index(path, shelter_data=shelter_data)
+        else:
+            index = AddressIndex(path)
+            if index.shelters == shelter_keys(shelter_data):
+                return index
+            refresh_index(index, shelter_data, path)
+            index.close()
+    except (OSError, ValueError) as e:
+        print(f"Could not build address index {path}: {e}", file=sys.stderr)
+        if not os.path.exists(path):
+            return None
+    try:
+        return AddressIndex(path)
+    except (OSError, ValueError) as e:
+        print(f"Address autocomplete off: {e}", file=sys.stderr)
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the address autocomplete index")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help="Index the local data plus any address CSVs")
+    build.add_argument('sources', nargs='*', help="Address CSV files")
+    suggest = sub.add_parser('suggest', help="Print suggestions for typed text")
+    suggest.add_argument('text')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        import snapshot
+        start = time.perf_counter()
+        count = build_index(sources=args.sources, shelter_data=snapshot.load_knowledge()['shelters'])
+        print(f"{count:,} entries -> {index_path()} ({os.path.getsize(index_path()) / 1e6:.1f} MB) "
+              f"in {time.perf_counter() - start:.1f}s")
+    else:
+        index = load_index()
+        start = time.perf_counter()
+        suggestions = index.suggest(args.text)
+        elapsed = (time.perf_counter() - start) * 1e6
+        for label, _ in suggestions:
+            print(label)
+        print(f"({len(suggestions)} suggestions in {elapsed:.0f} us)")
+
+
+if __name__ == "__main__":
+    main()
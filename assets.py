@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Static Assets - Vendored web font and images, served content-hashed from the app
+The Inter web font and the go-bag photo used to come from Google Fonts and
+Unsplash on every page load, which is slow or impossible on the links the app
+runs on. `fetch` downloads them once into assets/ (commit that directory);
+`build` writes them into static/, which Streamlit serves at app/static/, under
+names carrying a hash of their content, and the photo at several widths as
+AVIF, WebP and JPEG so phones download a small modern file. A name never
+changes content, so those files can be cached forever: serve the app through
+create_app() to send immutable cache headers for them. Workers build static/
+on first start when it is missing or older than assets/.
+
+Build with: python assets.py fetch && python assets.py build
+"""
+
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+import functools
+import urllib.parse
+import urllib.request
+from io import BytesIO
+from html import escape
+
+try:
+    from PIL import Image, features
+
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIR = os.path.join(APP_DIR, 'assets')
+STATIC_DIR = os.path.join(APP_DIR, 'static')
+VENDOR_PATH = os.path.join(SOURCE_DIR, 'vendor.json')
+MANIFEST_PATH = os.path.join(STATIC_DIR, 'assets.json')
+APP_SCRIPT = os.path.join(APP_DIR, 'emergency_agent.py')
+
+# URL prefix Streamlit serves static/ under (relative, so a baseUrlPath still works)
+STATIC_URL = 'app/static/'
+
+FONT_CSS_URL = 'https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap'
+# Asset name -> knowledge key holding the image URL
+IMAGES = {'go-bag': 'go_bag_image'}
+
+# Image widths generated (never wider than the source) and per-format quality
+WIDTHS = (320, 480, 640, 800)
+FORMATS = (('avif', 'AVIF', {'quality': 55}), ('webp', 'WEBP', {'quality': 78, 'method': 6}),
+           ('jpg', 'JPEG', {'quality': 80, 'optimize': True, 'progressive': True}))
+# Bump when the generated files change for the same sources
+BUILD_VERSION = 1
+
+HASH_LENGTH = 10
+HASHED_RE = re.compile(r'/app/static/[^/]+\.[0-9a-f]{%d}\.[a-z0-9]+$' % HASH_LENGTH)
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Google Fonts only serves WOFF2 to browsers it recognizes
+BROWSER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36'
+CSS_URL_RE = re.compile(r"url\((['\"]?)([^)'\"]+)\1\)")
+
+
+def _download(url):
+    request = urllib.request.Request(url, headers={'User-Agent': BROWSER_AGENT})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return response.read(), response.headers.get_content_type()
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def fetch(knowledge, source_dir=SOURCE_DIR):
+    """Download the web font and the images named in IMAGES into source_dir; returns the vendor record"""
+    css, _ = _download(FONT_CSS_URL)
+    css = css.decode('utf-8')
+    fonts = {}
+    for url in dict.fromkeys(match.group(2) for match in CSS_URL_RE.finditer(css)):
+        data, _ = _download(url)
+        extension = os.path.splitext(urllib.parse.urlparse(url).path)[1]
+        name = f"inter-{hashlib.sha256(url.encode()).hexdigest()[:8]}{extension}"
+        _write(os.path.join(source_dir, 'fonts', name), data)
+        fonts[url] = name
+    css = CSS_URL_RE.sub(lambda match: f"url({fonts[match.group(2)]})", css)
+    _write(os.path.join(source_dir, 'fonts', 'inter.css'), css.encode('utf-8'))
+
+    images = {}
+    for name, key in IMAGES.items():
+        url = knowledge[key]
+        data, content_type = _download(url)
+        extension = {'image/png': '.png', 'image/webp': '.webp', 'image/avif': '.avif'}.get(content_type, '.jpg')
+        _write(os.path.join(source_dir, 'images', name + extension), data)
+        images[name] = {'url': url, 'file': f"images/{name}{extension}"}
+    record = {'font_css': 'fonts/inter.css', 'font_source': FONT_CSS_URL, 'images': images}
+    _write(os.path.join(source_dir, 'vendor.json'), (json.dumps(record, indent=2) + '\n').encode('utf-8'))
+    return record
+
+
+def sources_sha(source_dir=SOURCE_DIR):
+    """Hash of every vendored file and the build settings; the manifest is stale when it differs"""
+    digest = hashlib.sha256(repr((BUILD_VERSION, WIDTHS, FORMATS, PIL_AVAILABLE)).encode())
+    for root, _, files in sorted(os.walk(source_dir)):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, source_dir).encode())
+            with open(path, 'rb') as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def _publish(static_dir, stem, extension, data):
+    """Write data as stem.<content hash>.extension (once) and return that name"""
+    name = f"{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}.{extension}"
+    path = os.path.join(static_dir, name)
+    if not os.path.exists(path):
+        _write(path, data)
+    return name
+
+
+def _image_variants(path, static_dir, stem):
+    """{extension: [[width, name], ...]} plus the source (width, height)"""
+    with open(path, 'rb') as f:
+        original = f.read()
+    if not PIL_AVAILABLE:
+        extension = os.path.splitext(path)[1].lstrip('.')
+        return {extension: [[0, _publish(static_dir, stem, extension, original)]]}, (0, 0)
+    variants = {}
+    with Image.open(path) as image:
+        image = image.convert('RGB')
+        size = image.size
+        widths = sorted({min(width, size[0]) for width in WIDTHS})
+        for width in widths:
+            scaled = image if width == size[0] else \
+                image.resize((width, round(size[1] * width / size[0])), Image.Resampling.LANCZOS)
+            for extension, format_name, options in FORMATS:
+                if format_name == 'AVIF' and not features.check('avif'):
+                    continue
+                buffer = BytesIO()
+                scaled.save(buffer, format_name, **options)
+                variants.setdefault(extension, []).append(
+                    [width, _publish(static_dir, f"{stem}-{width}", extension, buffer.getvalue())])
+    return variants, size
+
+
+def build(source_dir=SOURCE_DIR, static_dir=STATIC_DIR, prune=False):
+    """Write the hashed files and the manifest into static_dir; returns the manifest (None without sources)"""
+    vendor_path = os.path.join(source_dir, 'vendor.json')
+    if not os.path.exists(vendor_path):
+        return None
+    with open(vendor_path, encoding='utf-8') as f:
+        vendor = json.load(f)
+    os.makedirs(static_dir, exist_ok=True)
+
+    css_path = os.path.join(source_dir, vendor['font_css'])
+    with open(css_path, encoding='utf-8') as f:
+        css = f.read()
+
+    def publish_font(match):
+        path = os.path.normpath(os.path.join(os.path.dirname(css_path), match.group(2)))
+        stem, extension = os.path.splitext(os.path.basename(path))
+        with open(path, 'rb') as font:
+            return f"url({STATIC_URL}{_publish(static_dir, stem, extension.lstrip('.'), font.read())})"
+
+    manifest = {'sha': sources_sha(source_dir), 'font_css': CSS_URL_RE.sub(publish_font, css), 'images': {}}
+    for name, image in vendor.get('images', {}).items():
+        variants, (width, height) = _image_variants(os.path.join(source_dir, image['file']), static_dir, name)
+        manifest['images'][name] = {'url': image['url'], 'width': width, 'height': height, 'variants': variants}
+
+    if prune:
+        keep = set(Assets(manifest).files())
+        for name in os.listdir(static_dir):
+            if HASHED_RE.search('/app/static/' + name) and name not in keep:
+                os.remove(os.path.join(static_dir, name))
+    _write(os.path.join(static_dir, 'assets.json'), (json.dumps(manifest, indent=1) + '\n').encode('utf-8'))
+    return manifest
+
+
+class Assets:
+    """The built manifest: vendored font CSS and responsive image markup"""
+
+    def __init__(self, manifest):
+        self.manifest = manifest
+
+    def font_css(self):
+        """@font-face rules pointing at the hashed font files"""
+        return self.manifest['font_css']
+
+    def picture(self, name, url, alt, style='', sizes="(max-width: 600px) 100vw, 600px"):
+        """<picture> with AVIF/WebP/JPEG srcsets for a vendored image, or None when url is not the vendored one"""
+        image = self.manifest['images'].get(name)
+        if image is None or image['url'] != url:
+            return None
+        variants = image['variants']
+        if not image['width']:
+            # Built without Pillow: the original, content-hashed
+            (_, file), = next(iter(variants.values()))
+            return f'<img src="{STATIC_URL}{file}" alt="{escape(alt)}" style="{style}" loading="lazy">'
+
+        def srcset(extension):
+            return ", ".join(f"{STATIC_URL}{file} {width}w" for width, file in variants[extension])
+
+        sources = "".join(f'<source type="image/{extension}" srcset="{srcset(extension)}" sizes="{sizes}">'
+                          for extension in variants if extension != 'jpg')
+        return (f'<picture>{sources}<img src="{STATIC_URL}{variants["jpg"][-1][1]}" srcset="{srcset("jpg")}" '
+                f'sizes="{sizes}" width="{image["width"]}" height="{image["height"]}" alt="{escape(alt)}" '
+                f'style="{style} height: auto;" loading="lazy" decoding="async"></picture>')
+
+    def files(self):
+        return sorted(set(re.findall(r'[^/()"\s]+\.[0-9a-f]{%d}\.[a-z0-9]+' % HASH_LENGTH,
+                                     json.dumps(self.manifest))))
+
+
+@functools.lru_cache(maxsize=1)
+def get_assets():
+    """The built assets, building static/ first when it is stale (None when nothing is vendored)"""
+    if not os.path.exists(VENDOR_PATH):
+        return None
+    manifest = None
+    try:
+        with open(MANIFEST_PATH, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        pass
+    try:
+        if manifest is None or manifest.get('sha') != sources_sha():
+            manifest = build()
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Could not build static assets: {type(e).__name__}: {e}", file=sys.stderr)
+        return None
+    return Assets(manifest)
+
+
+class ImmutableAssets:
+    """ASGI middleware: content-hashed files under app/static/ are cached for a year without revalidation"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not HASHED_RE.search(scope['path']):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_cached(message):
+            if message['type'] == 'http.response.start' and message['status'] == 200:
+                headers = [(key, value) for key, value in message.get('headers', [])
+                           if key.lower() != b'cache-control']
+                message = dict(message, headers=headers + [(b'cache-control', IMMUTABLE.encode())])
+            await send(message)
+
+        await self.app(scope, receive, send_cached)
+
+
+def create_app():
+    """The Streamlit app as an ASGI app with immutable caching of hashed assets (uvicorn --factory)"""
+    import streamlit as st
+    from starlette.middleware import Middleware
+
+    if not hasattr(st, 'App'):
+        raise RuntimeError(f"Streamlit {st.__version__} has no ASGI entry point (st.App); upgrade Streamlit, "
+                           f"or run the app with: streamlit run {APP_SCRIPT}")
+    return st.App(APP_SCRIPT, middleware=[Middleware(ImmutableAssets)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vendor and build the app's static assets")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('fetch', help="Download the web font and images into assets/")
+    build_parser = sub.add_parser('build', help="Write content-hashed files and the manifest into static/")
+    build_parser.add_argument('--prune', action='store_true', help="Delete hashed files the manifest no longer uses")
+    args = parser.parse_args()
+
+    if args.command == 'fetch':
+        import snapshot
+        record = fetch(snapshot.load_knowledge())
+        print(f"Vendored the font and {len(record['images'])} image(s) into {SOURCE_DIR}")
+        return
+    manifest = build(prune=args.prune)
+    if manifest is None:
+        sys.exit(f"Nothing vendored yet ({VENDOR_PATH} is missing); run: python assets.py fetch")
+    files = Assets(manifest).files()
+    total = sum(os.path.getsize(os.path.join(STATIC_DIR, name)) for name in files)
+    print(f"{len(files)} files ({total / 1024:.0f} KB) in {STATIC_DIR}")
+    for name, image in manifest['images'].items():
+        for extension, variants in image['variants'].items():
+            sizes = ", ".join(f"{width}px {os.path.getsize(os.path.join(STATIC_DIR, file)) / 1024:.0f} KB"
+                              for width, file in variants)
+            print(f"  {name} {extension}: {sizes}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark: address autocomplete latency per keystroke over millions of addresses
+Generates a synthetic address file (house numbers on a few thousand streets
+across many cities and ZIP codes), builds the index, then types a sample of
+addresses one character at a time and reports per-keystroke latency
+percentiles, the index size and the memory added to the process.
+
+Run with: python benchmarks/bench_address_index.py [addresses]
+"""
+
+import os
+import sys
+import csv
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from address_index import AddressIndex, read_addresses, write_index, TOP  # noqa: E402
+
+STREET_WORDS = ['Main', 'Oak', 'Pine', 'Maple', 'Cedar', 'Elm', 'Washington', 'Lake', 'Hill', 'Sunset',
+                'Park', 'Ridge', 'Mathilda', 'Fremont', 'Remington', 'Homestead', 'Wolfe', 'Mary', 'Bernardo',
+                'Hollenbeck', 'Evelyn', 'Java', 'Tasman', 'Lawrence', 'Stevens Creek', 'El Camino']
+STREET_TYPES = ['Street', 'Avenue', 'Road', 'Drive', 'Court', 'Lane', 'Way', 'Boulevard']
+CITIES = [('Sunnyvale', 'CA', 940), ('Santa Clara', 'CA', 950), ('San Jose', 'CA', 951), ('Fresno', 'CA', 937),
+          ('Portland', 'OR', 972), ('Seattle', 'WA', 981), ('Phoenix', 'AZ', 850), ('Denver', 'CO', 802),
+          ('Austin', 'TX', 787), ('Houston', 'TX', 770), ('Miami', 'FL', 331), ('Atlanta', 'GA', 303)]
+
+
+def write_addresses(path, count, seed=9):
+    rng = random.Random(seed)
+    streets = [f"{a}{' ' + b if rng.random() < 0.3 else ''} {t}"
+               for a in STREET_WORDS for b in STREET_WORDS[:8] for t in STREET_TYPES]
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['number', 'street', 'city', 'state', 'zip'])
+        for _ in range(count):
+            city, state, zip3 = rng.choice(CITIES)
+            writer.writerow([rng.randint(1, 9999), rng.choice(streets), city, state,
+                             f"{zip3}{rng.randint(0, 99):02d}"])
+    return rng
+
+
+def rss_mb():
+    """Current resident set size (Linux); 0 elsewhere"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except OSError:
+        return 0.0
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    with tempfile.TemporaryDirectory() as tmp:
+        source, path = os.path.join(tmp, 'addresses.csv'), os.path.join(tmp, 'addresses.index')
+        rng = write_addresses(source, count)
+        start = time.perf_counter()
+        entries = write_index(path, read_addresses(source))
+        build_s = time.perf_counter() - start
+
+        before = rss_mb()
+        index = AddressIndex(path)
+        with open(source, newline='') as f:
+            sample = [row for i, row in enumerate(csv.reader(f)) if i and rng.random() < 200 / count]
+
+        latencies = []
+        returned = 0
+        for number, street, city, state, zip_code in sample:
+            typed = f"{number} {street}, {city}, {state} {zip_code}"
+            for end in range(1, len(typed) + 1):
+                t0 = time.perf_counter()
+                returned += len(index.suggest(typed[:end]))
+                latencies.append(time.perf_counter() - t0)
+        # One-character prefixes match the most entries
+        for ch in "123456789abcdefghijklmnopqrstuvwxyz":
+            t0 = time.perf_counter()
+            index.suggest(ch)
+            latencies.append(time.perf_counter() - t0)
+        latencies.sort()
+
+        def pct(share):
+            return latencies[min(len(latencies) - 1, int(share * len(latencies)))] * 1e6
+
+        print(f"{count:,} addresses -> {entries:,} entries (with streets), built in {build_s:.1f}s")
+        print(f"  index file   {os.path.getsize(path) / 1e6:.1f} MB memory-mapped "
+              f"({os.path.getsize(path) / entries:.1f} B/entry); resident set grew {rss_mb() - before:.1f} MB "
+              f"(shared page cache)")
+        print(f"  {len(latencies):,} keystrokes: p50 {pct(0.5):.0f} us, p95 {pct(0.95):.0f} us, "
+              f"p99 {pct(0.99):.0f} us, max {latencies[-1] * 1e6:.0f} us (top {TOP}, "
+              f"{returned / len(latencies):.1f} suggestions on average)")
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark: worker cold start with and without the startup snapshot
+Each case starts a fresh Python process that loads what a Streamlit worker
+needs before its first answer (knowledge, search index, spelling dictionary)
+and answers one query. The corpus is the real guidance plus generated
+passages, standing in for the larger datasets to come.
+
+Run with: python benchmarks/bench_cold_start.py [n_passages]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from search_index import corpus_passages, DEFAULT_CORPUS_DIR  # noqa: E402
+
+RUNS = 3
+
+# Runs in the child process; prints phase timings as JSON
+WORKER = r"""
+import sys, time, json
+t0 = time.perf_counter()
+sys.path.insert(0, %(root)r)
+import snapshot, fuzzy_match
+from knowledge_base import INTENT_KEYWORDS
+t1 = time.perf_counter()
+knowledge = snapshot.load_knowledge()
+index = snapshot.search_index_for(knowledge)
+speller = snapshot.speller(fuzzy_match.routing_vocabulary(INTENT_KEYWORDS, knowledge['disaster_guides']), knowledge)
+t2 = time.perf_counter()
+text, _ = speller.correct_text("is tap watr safe after an earthqake")
+hits = index.search(text, k=3)
+t3 = time.perf_counter()
+print(json.dumps({'import': t1 - t0, 'load': t2 - t1, 'first_answer': t3 - t2, 'total': t3 - t0,
+                  'snapshot': snapshot.open_snapshot() is not None, 'hit': hits[0]['title']}))
+"""
+
+
+def write_corpus(directory, n, seed=11):
+    """Real guidance plus generated passages with a Zipf-like vocabulary"""
+    rng = random.Random(seed)
+    real = corpus_passages(DEFAULT_CORPUS_DIR)
+    words = sorted({w for p in real for w in p[3].lower().split()})
+    words += [f"term{i}" for i in range(30_000)]
+    weights = [1.0 / (rank + 1) for rank in range(len(words))]
+    with open(os.path.join(directory, 'guidance.jsonl'), 'w', encoding='utf-8') as f:
+        for title, source, url, text in real:
+            f.write(json.dumps({'title': title, 'source': source, 'url': url, 'text': text}) + "\n")
+        for i in range(n - len(real)):
+            text = " ".join(rng.choices(words, weights, k=rng.randint(30, 70)))
+            f.write(json.dumps({'title': f"Passage {i}", 'source': 'synthetic', 'text': text}) + "\n")
+
+
+def run_worker(env):
+    samples = []
+    for _ in range(RUNS):
+        out = subprocess.run([sys.executable, '-c', WORKER % {'root': ROOT}], env=env,
+                             capture_output=True, text=True, check=True)
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return min(samples, key=lambda s: s['total'])
+
+
+def report(label, s):
+    print(f"{label:<44} total {s['total']:6.2f}s | import {s['import']:.2f}s | load {s['load']:6.2f}s | "
+          f"first answer {s['first_answer'] * 1000:6.1f} ms | snapshot={s['snapshot']}")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = os.path.join(tmp, 'corpus')
+        os.makedirs(corpus)
+        write_corpus(corpus, n)
+        env = dict(os.environ, EMERGENCY_CORPUS=corpus,
+                   EMERGENCY_SEARCH_INDEX=os.path.join(tmp, 'search.index'),
+                   EMERGENCY_SNAPSHOT=os.path.join(tmp, 'snapshot.pack'),
+                   EMERGENCY_DATAPACK=os.path.join(tmp, 'knowledge.pack'))
+        print(f"Corpus: {n:,} passages")
+
+        # No persisted index: every start builds it (only the first start in practice)
+        samples = []
+        for _ in range(RUNS):
+            if os.path.exists(env['EMERGENCY_SEARCH_INDEX']):
+                os.remove(env['EMERGENCY_SEARCH_INDEX'])
+            samples.append(run_worker(env))
+        report("Build everything at startup", min(samples, key=lambda s: s['total']))
+
+        report("Persisted index (fingerprint check) + speller", run_worker(env))
+
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(ROOT, 'snapshot.py'), 'build', env['EMERGENCY_SNAPSHOT']],
+                       env=env, check=True, capture_output=True)
+        print(f"Snapshot build: {time.perf_counter() - start:.1f}s, "
+              f"{os.path.getsize(env['EMERGENCY_SNAPSHOT']) / 1024 / 1024:.1f} MiB")
+        report("Mapped snapshot", run_worker(env))
+
+
+if __name__ == "__main__":
+    main()
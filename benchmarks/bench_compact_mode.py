@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark: answer payload per intent, full vs low-bandwidth mode
+Drives the real app headlessly (streamlit.testing) to get each intent's
+answer, then compares raw and gzipped bytes of the full HTML against the
+compact rendering, and counts the images and maps the compact mode skips.
+
+Run with: python benchmarks/bench_compact_mode.py
+"""
+
+import os
+import re
+import sys
+import gzip
+import time
+import logging
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+from compact_mode import compact_html  # noqa: E402
+
+# (label, session values, query)
+CASES = [
+    ("fema", {}, "How do I apply for FEMA assistance?"),
+    ("shelter (ask address)", {}, "Find emergency shelters near me"),
+    ("shelter (results)", {'user_address': "94086"}, "Find shelters near 94086"),
+    ("kit (ask household)", {}, "Help me build an emergency kit"),
+    ("kit (checklist)", {'household_info': {'adults': 2, 'children': 1, 'pets': 1}}, "Create kit for my family"),
+    ("plan", {}, "Help me create an emergency plan"),
+    ("alert", {}, "What are the current emergency alerts?"),
+    ("disaster", {}, "Tell me about earthquake preparedness"),
+    ("guidance search", {}, "is tap water safe after a quake"),
+    ("help card", {}, "hello there")
+]
+
+
+def answer(values, query):
+    at = AppTest.from_file(os.path.join(ROOT, 'emergency_agent.py'), default_timeout=30).run()
+    for key, value in values.items():
+        at.session_state[key] = value
+    at.session_state.messages = [{"role": "user", "content": query}]
+    at.session_state.is_thinking = True
+    at.run()
+    message = at.session_state.messages[-1]
+    return message['content'], message.get('show_map')
+
+
+def main():
+    logging.getLogger('streamlit').setLevel(logging.ERROR)
+    print(f"{'intent':<24}{'full B':>8}{'gz':>7}{'compact B':>11}{'gz':>7}{'saved':>8}  skipped")
+    totals = [0, 0, 0, 0]
+    for label, values, query in CASES:
+        full, show_map = answer(values, query)
+        start = time.perf_counter()
+        compact = compact_html.__wrapped__(full)
+        compact_ms = (time.perf_counter() - start) * 1000
+        sizes = [len(full.encode('utf-8')), len(gzip.compress(full.encode('utf-8'))),
+                 len(compact.encode('utf-8')), len(gzip.compress(compact.encode('utf-8')))]
+        totals = [t + s for t, s in zip(totals, sizes)]
+        skipped = []
+        images = len(re.findall(r'<img\b', full))
+        if images:
+            skipped.append(f"{images} image(s)")
+        if show_map:
+            skipped.append("map")
+        print(f"{label:<24}{sizes[0]:>8,}{sizes[1]:>7,}{sizes[2]:>11,}{sizes[3]:>7,}"
+              f"{1 - sizes[2] / sizes[0]:>8.0%}  {', '.join(skipped) or '-'} ({compact_ms:.2f} ms)")
+    print(f"{'total':<24}{totals[0]:>8,}{totals[1]:>7,}{totals[2]:>11,}{totals[3]:>7,}"
+          f"{1 - totals[2] / totals[0]:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
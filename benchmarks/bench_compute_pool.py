@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark: CPU-bound work on session threads vs the compute pool
+Concurrent sessions (threads, as Streamlit runs them) each render folium
+shelter maps and run nearest-shelter queries. Runs the same load inline (all
+sessions sharing one GIL) and through pools of 1..N worker processes, and
+reports aggregate throughput, plus the payload sizes crossing the process
+boundary.
+
+Run with: python benchmarks/bench_compute_pool.py [sessions] [tasks_per_session]
+"""
+
+import os
+import sys
+import zlib
+import time
+import pickle
+import threading
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datapack import load_knowledge  # noqa: E402
+from compute_pool import ComputePool, SharedArray, TASKS  # noqa: E402
+
+# Points per nearest-shelter query (a ZIP code's worth of addresses)
+QUERY_POINTS = 50_000
+# Shelters the queries search (the bundled ones repeated with jitter)
+QUERY_SHELTERS = 600
+
+
+def workload(seed=3):
+    shelters = [s for region in load_knowledge()['shelters'].values() for s in region]
+    rng = np.random.default_rng(seed)
+    points = rng.uniform([37.2, -122.2], [37.5, -121.8], size=(QUERY_POINTS, 2))
+    shelter_points = rng.uniform([37.2, -122.2], [37.5, -121.8], size=(QUERY_SHELTERS, 2))
+    return shelters, points, shelter_points
+
+
+def run_sessions(pool, sessions, per_session, shelters, shared_points, shelter_points):
+    """Aggregate tasks/s for sessions each alternating map renders and spatial queries"""
+    def session():
+        for i in range(per_session):
+            if i % 2:
+                pool.run('nearest_shelters', shared_points, shelter_points, 3)
+            else:
+                pool.run('shelter_map_html', shelters, None, None, None)
+
+    threads = [threading.Thread(target=session) for _ in range(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sessions * per_session / (time.perf_counter() - start)
+
+
+def main():
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    per_session = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    cores = os.cpu_count() or 1
+    shelters, points, shelter_points = workload()
+
+    html = TASKS['shelter_map_html'](shelters)
+    with SharedArray.copy_of(points) as shared:
+        print("Payloads crossing the process boundary:")
+        print(f"  map HTML           {len(zlib.decompress(html)):>9,} B raw -> {len(html):>7,} B compressed")
+        print(f"  {QUERY_POINTS:,} query points {len(pickle.dumps(points, protocol=5)):>9,} B pickled -> "
+              f"{len(pickle.dumps(shared, protocol=5)):>7,} B as a SharedArray handle")
+        idx, miles = TASKS['nearest_shelters'](points, shelter_points, 3)
+        print(f"  nearest-3 result   {len(pickle.dumps((idx, miles), protocol=5)):>9,} B (int32 + float32)\n")
+
+        print(f"{sessions} concurrent sessions x {per_session} tasks, {cores} CPU core(s)")
+        print(f"{'mode':<20}{'tasks/s':>9}{'speedup':>9}")
+        baseline = None
+        for workers in [0] + sorted({1, 2, 4, cores} & set(range(1, cores + 1))):
+            pool = ComputePool(workers=workers)
+            # Start and warm the workers before timing
+            run_sessions(pool, min(workers, sessions) or 1, 2, shelters, shared, shelter_points)
+            rate = run_sessions(pool, sessions, per_session, shelters, shared, shelter_points)
+            pool.close()
+            baseline = baseline or rate
+            label = "inline (one GIL)" if workers == 0 else f"pool, {workers} worker(s)"
+            print(f"{label:<20}{rate:>9.1f}{rate / baseline:>8.2f}x")
+    if cores == 1:
+        print("\nOnly one core here: the pool cannot add throughput on this machine, only isolation.")
+
+
+if __name__ == "__main__":
+    main()
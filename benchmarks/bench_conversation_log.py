@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark: conversation log write latency and range queries
+Compares the per-turn cost on the request path of the queued writer against a
+synchronous insert + commit, then times session and time-range queries.
+
+Run with: python benchmarks/bench_conversation_log.py
+"""
+
+import os
+import sys
+import time
+import random
+import sqlite3
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conversation_log import ConversationLog, SCHEMA  # noqa: E402
+
+TURNS = 20_000
+BULK_TURNS = 1_000_000
+CONTENT = "<div class=\"info-card\"><h3>FEMA Individual Assistance</h3></div>" * 20
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def report(label, samples):
+    print(f"{label}: p50 {percentile(samples, 50) * 1e6:.1f}us, "
+          f"p99 {percentile(samples, 99) * 1e6:.1f}us, mean {statistics.mean(samples) * 1e6:.1f}us")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        sync_path = os.path.join(tmp, 'sync.db')
+        conn = sqlite3.connect(sync_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        samples = []
+        for i in range(TURNS):
+            start = time.perf_counter()
+            with conn:
+                conn.execute("INSERT INTO turns (session_id, ts, role, content, meta) VALUES (?, ?, ?, ?, ?)",
+                             (f"s{i % 500}", time.time(), "assistant", CONTENT, None))
+            samples.append(time.perf_counter() - start)
+        report("Synchronous insert+commit", samples)
+
+        log = ConversationLog(os.path.join(tmp, 'queued.db'))
+        samples = []
+        for i in range(TURNS):
+            start = time.perf_counter()
+            log.append(f"s{i % 500}", "assistant", CONTENT)
+            samples.append(time.perf_counter() - start)
+        report("Queued append (request path)", samples)
+        log.flush()
+        print(f"  writer stats: {log.stats}")
+        log.close()
+
+        # Range queries over a large history
+        bulk = ConversationLog(os.path.join(tmp, 'bulk.db'))
+        conn = sqlite3.connect(bulk.path)
+        rng = random.Random(1)
+        t0 = 1_760_000_000.0
+        with conn:
+            conn.executemany("INSERT INTO turns (session_id, ts, role, content, meta) VALUES (?, ?, ?, ?, ?)",
+                             ((f"s{rng.randrange(50_000)}", t0 + i * 0.1, "user", "shelter near 94086", None)
+                              for i in range(BULK_TURNS)))
+        conn.close()
+
+        samples = []
+        for _ in range(200):
+            start = time.perf_counter()
+            list(bulk.turns(session_id=f"s{rng.randrange(50_000)}"))
+            samples.append(time.perf_counter() - start)
+        report(f"Session query ({BULK_TURNS:,} turns)", samples)
+
+        samples = []
+        for _ in range(200):
+            lo = t0 + rng.uniform(0, BULK_TURNS * 0.1 - 60)
+            start = time.perf_counter()
+            list(bulk.turns(start=lo, end=lo + 60))
+            samples.append(time.perf_counter() - start)
+        report("One-minute time-range query", samples)
+        bulk.close()
+
+
+if __name__ == "__main__":
+    main()
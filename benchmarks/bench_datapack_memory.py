@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-worker memory with and without the shared data pack
+Eight worker processes each load the app's knowledge (data/knowledge.json)
+either decoded into private Python objects or mapped as tree sections of one
+pack file, and then the same with a large synthetic dataset (shelter
+coordinates and guidance passages) added.
+
+RSS counts shared pages in every process; PSS splits them between the
+processes sharing them, so PSS is the per-worker cost the host actually pays.
+
+Run with: python benchmarks/bench_datapack_memory.py
+"""
+
+import gc
+import os
+import sys
+import time
+import random
+import tempfile
+import tracemalloc
+import multiprocessing
+from collections.abc import Mapping, Sequence
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+import datapack  # noqa: E402
+import knowledge_pack  # noqa: E402, F401  (imported before forking, like the app's modules)
+
+WORKERS = 8
+N_SHELTERS = 500_000
+N_PASSAGES = 200_000
+
+
+def synthetic_sections():
+    """Knowledge sections plus large shelter and passage datasets"""
+    rng = random.Random(3)
+    words = ["water", "shelter", "evacuate", "power", "outage", "generator", "flood",
+             "quake", "fire", "smoke", "medication", "radio", "battery", "family", "plan"]
+    sections = datapack.knowledge_sections()
+    sections['shelter_coords'] = np.array([(rng.uniform(32, 42), rng.uniform(-124, -114))
+                                           for _ in range(N_SHELTERS)], dtype=np.float64)
+    sections['shelter_capacity'] = np.array([rng.randint(50, 2000) for _ in range(N_SHELTERS)],
+                                            dtype=np.int32)
+    sections['passages'] = datapack.StringList(
+        " ".join(rng.choice(words) for _ in range(40)) for _ in range(N_PASSAGES))
+    return sections
+
+
+def memory_kb():
+    """(rss_kb, pss_kb) of the current process"""
+    values = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ('Rss:', 'Pss:'):
+                values[parts[0]] = int(parts[1])
+    return values['Rss:'], values['Pss:']
+
+
+def walk(value):
+    """Touch every value, as rendering every answer would"""
+    if isinstance(value, Mapping):
+        return sum(walk(key) + walk(item) for key, item in value.items())
+    if isinstance(value, Sequence) and not isinstance(value, str):
+        return sum(walk(item) for item in value)
+    return len(value) if isinstance(value, str) else 1
+
+
+def heap_held(load):
+    """Bytes of Python heap load() leaves allocated once every value has been touched"""
+    tracemalloc.start()
+    try:
+        knowledge = load()
+        walk(knowledge)
+        return tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def worker_knowledge_private(ready, go, results):
+    """Each worker decodes the knowledge source into its own objects"""
+    knowledge = datapack.knowledge_sections()
+    touched = walk(knowledge)
+    ready.release()
+    go.wait()
+    results.put(memory_kb() + (touched,))
+
+
+def worker_knowledge_shared(path, ready, go, results):
+    """Each worker maps the knowledge from the same pack"""
+    os.environ[datapack.PACK_PATH_ENV] = path
+    knowledge = datapack.load_knowledge()
+    touched = walk(knowledge)
+    ready.release()
+    go.wait()
+    results.put(memory_kb() + (touched,))
+
+
+def worker_idle(ready, go, results):
+    """Baseline: a worker that loads nothing"""
+    ready.release()
+    go.wait()
+    results.put(memory_kb() + (0,))
+
+
+def worker_private(ready, go, results):
+    """Each worker builds its own copy of the data"""
+    sections = synthetic_sections()
+    coords = sections['shelter_coords'].tolist()
+    capacity = sections['shelter_capacity'].tolist()
+    passages = list(sections['passages'].items)
+    touched = len(coords) + len(capacity) + sum(len(p) for p in passages)
+    ready.release()
+    go.wait()
+    results.put(memory_kb() + (touched,))
+
+
+def worker_shared(path, ready, go, results):
+    """Each worker maps the same pack read-only"""
+    pack = datapack.open_shared(path)
+    coords = pack['shelter_coords']
+    capacity = pack['shelter_capacity']
+    passages = pack['passages']
+    touched = int(coords.shape[0]) + int(capacity.sum() > 0) + sum(len(p) for p in passages)
+    ready.release()
+    go.wait()
+    results.put(memory_kb() + (touched,))
+
+
+def run(target, args):
+    # Keep the collector from dirtying the parent's inherited pages in every worker
+    gc.freeze()
+    ctx = multiprocessing.get_context('fork')
+    ready, go, results = ctx.Semaphore(0), ctx.Event(), ctx.Queue()
+    procs = [ctx.Process(target=target, args=args + (ready, go, results)) for _ in range(WORKERS)]
+    for p in procs:
+        p.start()
+    for _ in procs:
+        ready.acquire()
+    # Every worker holds its data while all of them are measured
+    go.set()
+    samples = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    rss = sum(s[0] for s in samples) / WORKERS / 1024
+    pss = sum(s[1] for s in samples) / WORKERS / 1024
+    return rss, pss
+
+
+def main():
+    base_rss, base_pss = memory_kb()
+    print(f"Parent baseline: RSS {base_rss / 1024:.1f} MiB, PSS {base_pss / 1024:.1f} MiB")
+
+    # The app's own knowledge; PSS over an idle worker is what loading it costs
+    _, idle = run(worker_idle, ())
+    _, private = run(worker_knowledge_private, ())
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'knowledge.pack')
+        datapack.write_pack(path, datapack.mapped(datapack.knowledge_sections()))
+        _, shared = run(worker_knowledge_shared, (path,))
+        private_heap = heap_held(datapack.knowledge_sections)
+        os.environ[datapack.PACK_PATH_ENV] = path
+        mapped_heap = heap_held(datapack.load_knowledge)
+        del os.environ[datapack.PACK_PATH_ENV]
+        datapack.open_shared.cache_clear()
+    print(f"App knowledge ({os.path.getsize(knowledge_pack.source_path()) / 1024:.1f} KiB JSON, {WORKERS} workers):")
+    print(f"  PSS over an idle worker: private {(private - idle) * 1024:.0f} KiB, mapped {(shared - idle) * 1024:.0f} KiB")
+    print(f"  Python heap held:        private {private_heap / 1024:.1f} KiB, mapped {mapped_heap / 1024:.1f} KiB")
+
+    rss, pss = run(worker_private, ())
+    print(f"Private copies ({WORKERS} workers): RSS {rss:.1f} MiB/worker, PSS {pss:.1f} MiB/worker")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.pack')
+        start = time.perf_counter()
+        datapack.write_pack(path, synthetic_sections())
+        print(f"Pack build: {time.perf_counter() - start:.2f}s, "
+              f"{os.path.getsize(path) / 1024 / 1024:.1f} MiB on disk")
+        rss, pss = run(worker_shared, (path,))
+        print(f"Shared pack ({WORKERS} workers):   RSS {rss:.1f} MiB/worker, PSS {pss:.1f} MiB/worker")
+
+
+if __name__ == "__main__":
+    main()
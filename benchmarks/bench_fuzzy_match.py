@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Benchmark: symmetric-delete spelling correction vs brute-force edit distance
+Both methods search the same dictionary for the best word within edit
+distance 2; the app's routing dictionary is measured, then a 50k-word one.
+
+Run with: python benchmarks/bench_fuzzy_match.py
+"""
+
+import os
+import sys
+import time
+import random
+import string
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datapack  # noqa: E402
+from fuzzy_match import SymSpell, build_speller, brute_force_lookup  # noqa: E402
+from search_index import knowledge_passages, corpus_passages, DEFAULT_CORPUS_DIR  # noqa: E402
+
+ROUTING = ('alert', 'apply', 'assistance', 'communication', 'disaster', 'earthquake', 'emergency',
+           'evacuation', 'fema', 'financial', 'fire', 'flood', 'funding', 'go', 'bag', 'kit',
+           'notification', 'pack', 'plan', 'planning', 'prepare', 'shelter', 'warning')
+
+TYPOS = ["earthqake", "shleter", "femma", "evacuaton", "warnnig", "finacial", "prepair",
+         "alrt", "disastr", "flod", "notifcation", "comunication", "asistance", "emergancy"]
+
+
+def time_per_term(fn, terms, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for term in terms:
+            fn(term)
+    return (time.perf_counter() - start) / (repeat * len(terms)) * 1e6
+
+
+def compare(label, speller, terms, repeat):
+    sym = time_per_term(lambda t: speller.lookup(t, 2), terms, repeat)
+    brute = time_per_term(lambda t: brute_force_lookup(t, speller.words, 2), terms, max(1, repeat // 20))
+    agree = sum(1 for t in terms
+                if (speller.lookup(t, 2) or (None,))[0] == (brute_force_lookup(t, speller.words, 2) or (None,))[0])
+    print(f"{label}: {len(speller.words):,} words | SymSpell {sym:.1f}us/term | "
+          f"brute force {brute:.1f}us/term | {brute / sym:.0f}x | agree {agree}/{len(terms)}")
+
+
+def main():
+    texts = [p[3] for p in knowledge_passages(datapack.load_knowledge()) + corpus_passages(DEFAULT_CORPUS_DIR)]
+    start = time.perf_counter()
+    speller = build_speller(ROUTING, texts)
+    print(f"Routing dictionary build: {(time.perf_counter() - start) * 1000:.1f} ms")
+    for typo in TYPOS[:5]:
+        print(f"  {typo} -> {speller.lookup(typo, 2)}")
+    compare("Routing dictionary", speller, TYPOS, 2000)
+
+    rng = random.Random(5)
+    big = SymSpell()
+    for _ in range(50_000):
+        big.add_word("".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 12))), rng.randint(1, 100))
+    for word in ROUTING:
+        big.add_word(word, 1000)
+    compare("50k-word dictionary", big, TYPOS, 200)
+
+
+if __name__ == "__main__":
+    main()
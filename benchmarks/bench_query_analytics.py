@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark: streaming sketches vs exact counting for query analytics
+Feeds a synthetic day of questions (Zipf-skewed intents, ZIP codes, addresses
+and returning users) through QueryAnalytics split across worker "processes",
+merges the exports, and compares throughput, memory and accuracy with exact
+Counters and sets over the same stream.
+
+Run with: python benchmarks/bench_query_analytics.py [queries] [workers]
+"""
+
+import os
+import sys
+import time
+import random
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from query_analytics import QueryAnalytics, normalize_location  # noqa: E402
+from session_budget import approx_size  # noqa: E402
+
+INTENTS = ['shelter', 'alert', 'fema', 'disaster', 'kit', 'plan', 'search']
+STREETS = ['Main St', 'Mathilda Ave', 'El Camino Real', 'Fremont Ave', 'Wolfe Rd', 'Homestead Rd']
+
+
+def stream(queries, seed=11):
+    """(session id, question, intents, address or None) tuples with realistic skew"""
+    rng = random.Random(seed)
+    users = max(1, queries // 5)
+    for _ in range(queries):
+        zip_code = 94000 + min(int(rng.paretovariate(1.1)), 999)
+        intent = INTENTS[min(int(rng.paretovariate(1.3)) - 1, len(INTENTS) - 1)]
+        address = None
+        if intent == 'shelter' and rng.random() < 0.6:
+            # A few places (a school, a community center) are typed far more often than the rest
+            number = min(int(rng.paretovariate(0.8)), 5000)
+            address = f"{number} {STREETS[number % len(STREETS)]}, Sunnyvale, CA {zip_code}"
+        question = f"Find shelters near {zip_code}" if intent == 'shelter' else f"Tell me about {intent}"
+        yield f"s{rng.randrange(users)}", question, [intent], address
+
+
+def main():
+    queries = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    events = list(stream(queries))
+
+    shards = [QueryAnalytics() for _ in range(workers)]
+    start = time.perf_counter()
+    for i, (session_id, question, intents, address) in enumerate(events):
+        shard = shards[i % workers]
+        shard.record_query(session_id, question)
+        shard.record_intents(intents)
+        if address:
+            shard.record_location(address)
+    elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    exports = [shard.to_bytes() for shard in shards]
+    merged = QueryAnalytics()
+    for data in exports:
+        merged.merge(QueryAnalytics.from_bytes(data))
+    merge_ms = (time.perf_counter() - start) * 1000
+    report = merged.report(10)
+
+    exact_intents = Counter(intent for _, _, intents, _ in events for intent in intents)
+    exact_zips = Counter(q.rsplit(' ', 1)[1] for _, q, _, _ in events if q.startswith('Find'))
+    exact_addresses = Counter(normalize_location(a) for _, _, _, a in events if a)
+    exact_users = {session_id for session_id, _, _, _ in events}
+    exact_bytes = sum(approx_size(c) for c in (exact_intents, exact_zips, exact_addresses, exact_users))
+
+    print(f"{queries:,} questions over {workers} workers")
+    print(f"  ingest      {queries / elapsed:>10,.0f} questions/s on one thread "
+          f"({elapsed / queries * 1e6:.1f} us each)")
+    print(f"  export+merge {merge_ms:>9.1f} ms for {workers} exports of "
+          f"{sum(map(len, exports)) / workers / 1024:.0f} KB each")
+    print(f"  memory      {merged.nbytes() / 1024:>10,.0f} KB sketches vs {exact_bytes / 1024:,.0f} KB exact "
+          f"(exact grows with traffic; sketches do not)")
+    print(f"  users       {report['users']:>10,} estimated vs {len(exact_users):,} exact "
+          f"({report['users'] / len(exact_users) - 1:+.1%})")
+    for name, exact in (('zips', exact_zips), ('addresses', exact_addresses)):
+        true_top = [key for key, _ in exact.most_common(10)]
+        found = [key for key, _ in report[name]]
+        worst = max(abs(count - exact[key]) / exact[key] for key, count in report[name])
+        print(f"  top-10 {name:<10} {len(set(true_top) & set(found))}/10 recovered, "
+              f"worst count error {worst:.1%} ({len(exact):,} distinct)")
+    worst = max(abs(count - exact_intents[key]) / exact_intents[key] for key, count in report['intents'])
+    print(f"  intent mix  worst count error {worst:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark: BM25 preparedness search over 100k passages
+Times index build, cold open of the persisted index and top-k query latency.
+
+Run with: python benchmarks/bench_search_index.py
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datapack  # noqa: E402
+from search_index import SearchIndex, build_index, corpus_passages, DEFAULT_CORPUS_DIR  # noqa: E402
+
+N_PASSAGES = 100_000
+QUERIES = [
+    "what do I do if the power is out for a week",
+    "is tap water safe after a quake",
+    "can I bring my dog to a shelter",
+    "how long does food last in the freezer without power",
+    "generator carbon monoxide garage",
+    "wildfire smoke mask asthma",
+    "apply for fema assistance insurance"
+]
+
+
+def synthetic_passages(n, seed=11):
+    """Real guidance passages plus generated ones with a Zipf-like vocabulary"""
+    rng = random.Random(seed)
+    real = corpus_passages(DEFAULT_CORPUS_DIR)
+    words = sorted({w for p in real for w in p[3].lower().split()})
+    words += [f"term{i}" for i in range(30_000)]
+    weights = [1.0 / (rank + 1) for rank in range(len(words))]
+    passages = list(real)
+    while len(passages) < n:
+        text = " ".join(rng.choices(words, weights, k=rng.randint(30, 70)))
+        passages.append((f"Passage {len(passages)}", "synthetic", "", text))
+    return passages
+
+
+def main():
+    passages = synthetic_passages(N_PASSAGES)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'search.index')
+        start = time.perf_counter()
+        build_index(passages, path)
+        print(f"Build ({N_PASSAGES:,} passages): {time.perf_counter() - start:.1f}s, "
+              f"{os.path.getsize(path) / 1024 / 1024:.1f} MiB")
+
+        start = time.perf_counter()
+        index = SearchIndex(datapack.DataPack(path))
+        print(f"Open persisted index: {(time.perf_counter() - start) * 1000:.2f} ms "
+              f"({index.meta['terms']:,} terms)")
+
+        samples = []
+        for _ in range(50):
+            for query in QUERIES:
+                start = time.perf_counter()
+                index.search(query, k=5)
+                samples.append(time.perf_counter() - start)
+        samples.sort()
+        print(f"Top-5 query: p50 {samples[len(samples) // 2] * 1000:.2f} ms, "
+              f"p99 {samples[int(len(samples) * 0.99)] * 1000:.2f} ms")
+        print("Example:", index.search(QUERIES[1], k=1)[0]['title'])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark: capacity-aware shelter assignment
+100k households against 1k shelters, plus incremental re-planning
+
+Run with: python benchmarks/bench_shelter_assignment.py
+"""
+
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shelter_assignment import AssignmentPlan  # noqa: E402
+
+SERVICES = ["food", "water", "medical", "pet-friendly", "mental health"]
+
+
+def make_instance(n_households, n_shelters, seed=7):
+    """Random Bay Area-sized instance with ~10% spare capacity"""
+    rng = random.Random(seed)
+    households = []
+    for i in range(n_households):
+        needs = []
+        if rng.random() < 0.15:
+            needs.append("pet-friendly")
+        if rng.random() < 0.05:
+            needs.append("medical")
+        households.append({
+            'id': f"h{i}",
+            'lat': rng.uniform(37.0, 38.0),
+            'lon': rng.uniform(-122.5, -121.5),
+            'size': rng.choice([1, 1, 2, 2, 3, 4, 5]),
+            'needs': needs
+        })
+    total_people = sum(h['size'] for h in households)
+    per_shelter = int(total_people * 1.1 / n_shelters) + 1
+    shelters = []
+    for j in range(n_shelters):
+        services = ["food", "water"] + [s for s in SERVICES[2:] if rng.random() < 0.4]
+        shelters.append({
+            'id': f"s{j}",
+            'name': f"Shelter {j}",
+            'lat': rng.uniform(37.0, 38.0),
+            'lon': rng.uniform(-122.5, -121.5),
+            'capacity': rng.randint(per_shelter // 2, per_shelter * 3 // 2),
+            'services': services
+        })
+    return households, shelters
+
+
+def main():
+    households, shelters = make_instance(100_000, 1_000)
+
+    start = time.perf_counter()
+    plan = AssignmentPlan(shelters)
+    plan.add_households(households)
+    unplaced = plan.solve()
+    elapsed = time.perf_counter() - start
+    print(f"Full solve (100k x 1k): {elapsed:.2f}s, unplaced={len(unplaced)}")
+    for key, value in plan.summary().items():
+        print(f"  {key}: {value}")
+
+    # Capacity-free nearest-eligible distance is a lower bound on the optimum
+    bound = AssignmentPlan(shelters, candidates=1)
+    bound.capacity[:] = 10 ** 9
+    bound.add_households(households)
+    bound.solve()
+    print(f"  lower bound mean distance: {bound.summary()['mean_distance_miles']:.3f}")
+
+    busiest = int(plan.load.argmax())
+    start = time.perf_counter()
+    plan.update_capacity(shelters[busiest]['id'], int(plan.load[busiest]) // 2)
+    print(f"Halve busiest shelter: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    start = time.perf_counter()
+    plan.close_shelter(shelters[0]['id'])
+    print(f"Close one shelter: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    start = time.perf_counter()
+    plan.update_capacity(shelters[1]['id'], int(plan.capacity[1]) + 500)
+    print(f"Grow one shelter: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark: a synthetic alert burst with and without single-flight coalescing
+Simulates many sessions pressing the main menu buttons within a short window
+(one thread per session, as Streamlit runs them) and drives the app's real
+answer path. Reports process CPU time, computations, tool fallbacks and answer
+latency for each mode.
+
+Run with: python benchmarks/bench_single_flight.py [users] [window_seconds]
+"""
+
+import os
+import sys
+import time
+import random
+import logging
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logging.disable(logging.WARNING)
+
+import emergency_agent as app  # noqa: E402
+from single_flight import SingleFlight, flight_key  # noqa: E402
+
+# The main menu's questions; alerts and shelters dominate right after an alert goes out
+MENU_QUESTIONS = [
+    ("What are the current emergency alerts?", 4),
+    ("Find emergency shelters near me", 3),
+    ("Tell me about earthquake preparedness", 1),
+    ("How do I apply for FEMA assistance?", 1),
+    ("Help me build an emergency kit", 1),
+    ("Help me create an emergency plan", 1)
+]
+CONTEXT = {'user_address': None, 'household_info': None}
+
+
+def burst(users, window, coalesce, seed=7):
+    """Run one burst; returns (cpu seconds, wall seconds, latencies, fallbacks, flight stats)"""
+    rng = random.Random(seed)
+    questions = [q for q, weight in MENU_QUESTIONS for _ in range(weight)]
+    arrivals = sorted((rng.uniform(0, window), rng.choice(questions)) for _ in range(users))
+    flights = SingleFlight()
+    latencies = []
+    fallbacks = []
+    lock = threading.Lock()
+    start = time.perf_counter()
+
+    def session(at, query):
+        time.sleep(max(0.0, start + at - time.perf_counter()))
+        t0 = time.perf_counter()
+        if coalesce:
+            (_, _, tools, _, _), _ = flights.do(flight_key(query, CONTEXT), app.simulate_thinking, query, CONTEXT)
+        else:
+            _, _, tools, _, _ = app.simulate_thinking(query, CONTEXT)
+        with lock:
+            latencies.append(time.perf_counter() - t0)
+            fallbacks.append(sum(1 for tool in tools if tool.get('status')))
+
+    threads = [threading.Thread(target=session, args=arrival) for arrival in arrivals]
+    cpu = time.process_time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.process_time() - cpu, time.perf_counter() - start, sorted(latencies), sum(fallbacks), flights.stats()
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    window = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    # Warm the snapshot, speller and tool caches so both modes start equal
+    for query, _ in MENU_QUESTIONS:
+        app.simulate_thinking(query, CONTEXT)
+
+    print(f"{users} sessions pressing menu buttons within {window:.1f}s "
+          f"({app.TOOL_WORKERS} tool workers, {app.QUERY_DEADLINE:.0f}s query deadline)\n")
+    print(f"{'mode':<16}{'computed':>9}{'CPU s':>8}{'wall s':>8}{'p50 ms':>8}{'p95 ms':>8}{'max ms':>8}{'fallbacks':>11}")
+    results = {}
+    for label, coalesce in (("independent", False), ("single-flight", True)):
+        # Let abandoned (timed-out) tool calls from the previous burst drain first
+        time.sleep(app.QUERY_DEADLINE)
+        cpu, wall, latencies, fallbacks, stats = burst(users, window, coalesce)
+        computed = stats['executions'] if coalesce else users
+        results[label] = cpu
+
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+
+        print(f"{label:<16}{computed:>9}{cpu:>8.2f}{wall:>8.2f}{pct(0.5):>8.0f}{pct(0.95):>8.0f}"
+              f"{latencies[-1] * 1000:>8.0f}{fallbacks:>11}")
+        if coalesce:
+            print(f"\n  coalesced {stats['coalesced']} of {stats['calls']} ({stats['coalesced_ratio']:.0%}), "
+                  f"largest group {stats['largest_group']}, {stats['saved_seconds']:.1f}s of answering saved")
+
+    print(f"  CPU reduction: {results['independent'] / max(results['single-flight'], 1e-9):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
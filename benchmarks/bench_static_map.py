@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark: static SVG shelter map vs the interactive folium map
+Measures server render time and the bytes each path sends, then models
+time-to-visible on slow links. The folium map's HTML is shown in an iframe
+that then loads ten CDN scripts and stylesheets and about a dozen map
+tiles, none of which the SVG needs.
+
+Run with: python benchmarks/bench_static_map.py
+"""
+
+import os
+import re
+import sys
+import gzip
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import folium  # noqa: E402
+
+from datapack import load_knowledge  # noqa: E402
+from static_map import render_shelter_map, _render  # noqa: E402
+
+# Modeled links: (name, Mbps, round-trip ms)
+LINKS = [("3G", 1.6, 300), ("2G / congested", 0.25, 800)]
+# 700x500 view at zoom 11 spans about 4x3 256px tiles
+VIEW_TILES = 12
+# Typical OpenStreetMap raster tile size (bytes); the only number here not measured
+TILE_BYTES = 15_000
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def folium_html(shelters):
+    """Same map as create_shelter_map in emergency_agent.py"""
+    m = folium.Map(location=[sum(s['lat'] for s in shelters) / len(shelters),
+                             sum(s['lon'] for s in shelters) / len(shelters)], zoom_start=11, tiles='OpenStreetMap')
+    for shelter in shelters:
+        folium.Marker(location=[shelter['lat'], shelter['lon']], tooltip=shelter['name'],
+                      popup=folium.Popup(shelter['name'], max_width=300),
+                      icon=folium.Icon(color='green', icon='info-sign', prefix='glyphicon')).add_to(m)
+    return m.get_root().render()
+
+
+def model(label, transfers, render_ms):
+    """Sequential round trips for dependent fetches plus transfer time"""
+    total_bytes = sum(b for _, b in transfers)
+    print(f"{label}: {total_bytes / 1024:,.1f} KiB over {len(transfers)} request group(s), "
+          f"server render {render_ms:.2f} ms")
+    for name, mbps, rtt in LINKS:
+        visible = render_ms + len(transfers) * rtt + total_bytes * 8 / (mbps * 1e6) * 1000
+        print(f"    {name:<16} ~{visible / 1000:.2f} s to visible")
+
+
+def main():
+    shelters = load_knowledge()['shelters']["Sunnyvale, CA"]
+
+    cold_ms, _ = timed(lambda: (_render.cache_clear(), render_shelter_map(shelters))[1], 200)
+    warm_ms, svg = timed(lambda: render_shelter_map(shelters), 2000)
+    svg_gz = len(gzip.compress(svg.encode('utf-8')))
+    print(f"SVG: {len(svg):,} bytes ({svg_gz:,} gzipped) | render cold {cold_ms:.3f} ms, cached {warm_ms * 1000:.1f} us")
+
+    folium_ms, html = timed(lambda: folium_html(shelters), 20)
+    html_gz = len(gzip.compress(html.encode('utf-8')))
+    cdn_assets = re.findall(r'(?:src|href)="(https?://[^"]+)"', html)
+    print(f"Folium: map HTML {len(html):,} bytes ({html_gz:,} gzipped), render {folium_ms:.1f} ms | "
+          f"{len(cdn_assets)} CDN assets (not measured) | "
+          f"{VIEW_TILES} tiles")
+
+    print()
+    model("Static SVG", [("svg", svg_gz)], cold_ms)
+    # Map HTML, then CDN assets and tiles (in parallel, one round trip each group)
+    model("Folium (lower bound, CDN assets excluded)",
+          [("html", html_gz), ("tiles", VIEW_TILES * TILE_BYTES)], folium_ms)
+
+
+if __name__ == "__main__":
+    main()
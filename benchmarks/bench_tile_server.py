@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark: local tile server latency
+Builds a synthetic MBTiles file covering the shelter regions (zoom 8-14),
+serves it on a free port and times one map view's worth of tiles cold
+(SQLite reads), warm (in-memory LRU) and revalidated (304 via If-None-Match).
+
+Run with: python benchmarks/bench_tile_server.py
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+import threading
+import http.client
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datapack import load_knowledge  # noqa: E402
+from tile_server import create_mbtiles, put_tile, make_server, region_bounds, tiles_in_bounds, tile_for  # noqa: E402
+
+MIN_ZOOM, MAX_ZOOM = 8, 14
+TILE_BYTES = 18_000
+MAP_ZOOM = 11
+# A 700x500 map view shows roughly 4x3 tiles, plus a ring folium/Leaflet prefetches
+VIEW_TILES = 6
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def fetch_all(conn, tiles, etags=None):
+    latencies, new_etags = [], {}
+    for z, x, y in tiles:
+        headers = {'If-None-Match': etags[(z, x, y)]} if etags else {}
+        start = time.perf_counter()
+        conn.request('GET', f'/tiles/{z}/{x}/{y}.png', headers=headers)
+        response = conn.getresponse()
+        response.read()
+        latencies.append((time.perf_counter() - start) * 1000)
+        new_etags[(z, x, y)] = response.getheader('ETag')
+    return latencies, new_etags
+
+
+def report(label, latencies):
+    print(f"{label:<28} p50 {percentile(latencies, 0.5):6.3f} ms | p95 {percentile(latencies, 0.95):6.3f} ms | "
+          f"view of {VIEW_TILES * VIEW_TILES} tiles {sum(latencies[:VIEW_TILES * VIEW_TILES]):6.1f} ms")
+
+
+def main():
+    rng = random.Random(3)
+    shelters = load_knowledge()['shelters']
+    bounds = region_bounds(shelters)
+    path = os.path.join(tempfile.mkdtemp(), 'tiles.mbtiles')
+    conn = create_mbtiles(path, 'bench', bounds, MIN_ZOOM, MAX_ZOOM)
+    start = time.perf_counter()
+    count = 0
+    for z, x, y in tiles_in_bounds(bounds, MIN_ZOOM, MAX_ZOOM):
+        put_tile(conn, z, x, y, b'\x89PNG' + rng.randbytes(TILE_BYTES))
+        count += 1
+    conn.commit()
+    conn.close()
+    print(f"Built {count:,} tiles ({os.path.getsize(path) / 1e6:.0f} MB) in {time.perf_counter() - start:.1f}s")
+
+    server = make_server(path, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = http.client.HTTPConnection('127.0.0.1', server.server_address[1])
+
+    # Every tile around each shelter region at the map's zoom level
+    lat, lon = shelters["Sunnyvale, CA"][0]['lat'], shelters["Sunnyvale, CA"][0]['lon']
+    cx, cy = tile_for(lat, lon, MAP_ZOOM)
+    view = [(MAP_ZOOM, x, y) for x in range(cx - VIEW_TILES // 2, cx + VIEW_TILES // 2)
+            for y in range(cy - VIEW_TILES // 2, cy + VIEW_TILES // 2)]
+    sample = view + rng.sample(list(tiles_in_bounds(bounds, MAX_ZOOM, MAX_ZOOM)), 2000)
+
+    cold, etags = fetch_all(client, sample)
+    report("Cold (SQLite read)", cold)
+    for _ in range(3):
+        warm, _ = fetch_all(client, sample)
+    report("Warm (LRU hit)", warm)
+    revalidated, _ = fetch_all(client, sample, etags)
+    report("Revalidated (304)", revalidated)
+
+    threads, per_thread = 8, 500
+    timings = []
+
+    def worker():
+        c = http.client.HTTPConnection('127.0.0.1', server.server_address[1])
+        lat_ms, _ = fetch_all(c, rng.sample(sample, per_thread))
+        timings.extend(lat_ms)
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    print(f"{threads} concurrent clients: {threads * per_thread / elapsed:,.0f} tiles/s, "
+          f"p95 {percentile(timings, 0.95):.2f} ms")
+    print(f"Server stats: {server.RequestHandlerClass.store.stats}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
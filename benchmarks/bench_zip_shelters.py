@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-ZIP nearest-shelter table, full build vs incremental refresh
+Builds the table for a nationwide-sized set of ZIP centroids and shelters,
+then applies typical shelter changes (a few close or fill up, a few open,
+one moves) and compares the incremental refresh against a full rebuild, with
+a check that both give the same table. Also times single-ZIP lookups.
+
+Run with: python benchmarks/bench_zip_shelters.py [zips] [shelters]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from zip_shelters import ZipShelterTable, DEFAULT_K  # noqa: E402
+
+# Continental US bounding box
+BOUNDS = ([25.0, -125.0], [49.0, -67.0])
+
+
+def main():
+    n_zips = int(sys.argv[1]) if len(sys.argv) > 1 else 33_000
+    n_shelters = int(sys.argv[2]) if len(sys.argv) > 2 else 3_000
+    rng = np.random.default_rng(5)
+    zips = np.arange(10_000, 10_000 + n_zips, dtype=np.int32)
+    points = rng.uniform(*BOUNDS, size=(n_zips, 2))
+    keys = [f"shelter {i}|{i} Main St" for i in range(n_shelters)]
+    shelter_points = rng.uniform(*BOUNDS, size=(n_shelters, 2))
+
+    start = time.perf_counter()
+    table = ZipShelterTable.build(zips, points, keys, shelter_points, DEFAULT_K)
+    build_s = time.perf_counter() - start
+    stats = table.stats()
+    print(f"{n_zips:,} ZIPs x top-{DEFAULT_K} of {n_shelters:,} shelters: built in {build_s:.2f}s, "
+          f"{stats['bytes'] / 1024:.0f} KB")
+
+    changes = (("2 close, 1 fills up", 3, 0, False), ("2 open", 0, 2, False), ("1 moves", 0, 0, True),
+               ("10 close, 10 open", 10, 10, False))
+    for label, closed, opened, move in changes:
+        keys = keys[closed:] + [f"new {len(keys) + i}|{i} Oak Ave" for i in range(opened)]
+        shelter_points = np.vstack([shelter_points[closed:], rng.uniform(*BOUNDS, size=(opened, 2))])
+        if move:
+            shelter_points = shelter_points.copy()
+            shelter_points[len(keys) // 2] += 0.3
+        start = time.perf_counter()
+        rows = table.refresh(keys, shelter_points)
+        refresh_s = time.perf_counter() - start
+        start = time.perf_counter()
+        full = ZipShelterTable.build(zips, points, keys, shelter_points, DEFAULT_K)
+        full_s = time.perf_counter() - start
+        same = np.array_equal(table._data[4], full._data[4]) and np.allclose(table._data[5], full._data[5])
+        print(f"  {label:<20} refresh {refresh_s * 1000:7.1f} ms ({rows:,} rows) vs rebuild "
+              f"{full_s * 1000:7.1f} ms  {'identical' if same else 'MISMATCH'}")
+
+    probes = rng.choice(zips, 10_000)
+    start = time.perf_counter()
+    for zip_code in probes.tolist():
+        table.lookup(zip_code)
+    print(f"  lookup {(time.perf_counter() - start) / len(probes) * 1e6:.1f} us per ZIP")
+
+
+if __name__ == "__main__":
+    main()
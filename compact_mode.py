@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Compact Response Mode - Text-first rendering of answers for degraded links
+Rewrites an answer's HTML into minimal semantic markup: headings, paragraphs,
+emphasis and plain links. Images are dropped, decorative cards are unwrapped and
+inline styles are removed; the one visual cue kept (warning boxes) becomes a
+short class styled once by the page stylesheet instead of per answer.
+
+Measure with: python benchmarks/bench_compact_mode.py
+"""
+
+import re
+import functools
+from html import escape
+from html.parser import HTMLParser
+
+# Tags kept as-is (attributes dropped, except href on links)
+KEPT_TAGS = {'h2', 'h3', 'p', 'strong', 'b', 'em', 'small', 'ul', 'ol', 'li', 'a'}
+VOID_TAGS = {'br', 'img', 'hr', 'input', 'meta', 'link'}
+
+# Card classes that become a paragraph (warning ones get the "w" class)
+BOX_CLASSES = ('highlight-box', 'checklist-item')
+WARNING_CLASSES = ('highlight-box-warning', 'info-card-warning')
+# Elements dropped with everything inside them
+DROPPED_CLASSES = ('image-container',)
+
+# Page-level CSS for the compact markup, sent once rather than in every answer
+COMPACT_CSS = """
+    .message-assistant p.w { border-left: 3px solid #f59e0b; padding-left: 0.5rem; }
+    .message-assistant a { color: #3b82f6; }
+"""
+
+
+class _Compactor(HTMLParser):
+    """Streams the answer's HTML into the compact form"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.out = []
+        # Per open div: the closing tag to emit ('' when unwrapped, None when dropped)
+        self.divs = []
+        self.dropping = 0
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = (attrs.get('class') or '').split()
+        if tag == 'div':
+            if self.dropping or any(c in DROPPED_CLASSES for c in classes):
+                self.dropping += 1
+                self.divs.append(None)
+            elif any(c.startswith(BOX_CLASSES) for c in classes):
+                warning = any(c in WARNING_CLASSES for c in classes)
+                self.out.append('<p class="w">' if warning else '<p>')
+                self.divs.append('</p>')
+            else:
+                self.divs.append('')
+            return
+        if self.dropping:
+            return
+        if tag == 'br':
+            # Blank lines inside cards collapse to a single break
+            if not self.out or self.out[-1] not in ('<br>', '<p>', '<p class="w">'):
+                self.out.append('<br>')
+        elif tag == 'a':
+            self.out.append(f'<a href="{escape(attrs.get("href") or "", quote=True)}">')
+        elif tag in KEPT_TAGS:
+            self.out.append(f'<{tag}>')
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag == 'div':
+            closing = self.divs.pop() if self.divs else ''
+            if closing is None:
+                self.dropping -= 1
+            else:
+                while self.out and (self.out[-1] == '<br>' or not self.out[-1].strip()):
+                    self.out.pop()
+                if closing:
+                    self.out.append(closing)
+            return
+        if not self.dropping and tag in KEPT_TAGS:
+            self.out.append(f'</{tag}>')
+
+    def handle_data(self, data):
+        if not self.dropping:
+            text = re.sub(r'\s+', ' ', data)
+            # Whitespace between block tags is trimmed at the end; between inline tags it matters
+            if text.strip() or (self.out and self.out[-1] != ' '):
+                self.out.append(text)
+
+    def handle_entityref(self, name):
+        self.handle_data(f'&{name};')
+
+    def handle_charref(self, name):
+        self.handle_data(f'&#{name};')
+
+
+@functools.lru_cache(maxsize=1024)
+def compact_html(html):
+    """Minimal-markup version of an answer (cached, answers are re-rendered every rerun)"""
+    parser = _Compactor()
+    parser.feed(html)
+    parser.close()
+    text = ''.join(parser.out)
+    text = re.sub(r'\s*(<(?:/?(?:p|h2|h3|ul|ol|li)|p class="w")>)\s*', r'\1', text)
+    text = re.sub(r'\s*<br>\s*', '<br>', text)
+    text = re.sub(r'<(p|p class="w")></p>', '', text)
+    return text.strip()
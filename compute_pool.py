@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Compute Pool - Worker processes for CPU-bound rendering and spatial work
+Every session's script runs on a thread of one Python process, so CPU-heavy
+work (building folium maps, bulk kit totals, nearest-shelter queries) holds the
+GIL against every other session. The pool runs those tasks in separate worker
+processes instead. Arguments and results cross as compact payloads: large
+numpy arrays travel as SharedArray handles (a shared-memory name, shape and
+dtype rather than the data), and rendered HTML comes back zlib-compressed.
+
+Tasks are the module-level functions in TASKS, importable without Streamlit.
+
+Measure with: python benchmarks/bench_compute_pool.py
+"""
+
+import os
+import sys
+import zlib
+import time
+import types
+import threading
+import contextlib
+import concurrent.futures
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+try:
+    import folium
+
+    FOLIUM_AVAILABLE = True
+except ImportError:
+    FOLIUM_AVAILABLE = False
+
+from shelter_assignment import unit_vectors, dot_to_miles
+
+WORKERS_ENV = 'EMERGENCY_COMPUTE_WORKERS'
+
+# Workers per app process unless EMERGENCY_COMPUTE_WORKERS says otherwise; each Streamlit
+# process on a host has its own pool, so this stays small rather than following the cores
+DEFAULT_WORKERS = 2
+
+# Seconds a caller waits for a pooled task before computing in its own thread
+DEFAULT_TIMEOUT = 10.0
+
+# Marker colors by distance, the same bands as the static map
+MARKER_COLORS = ((2.0, 'green'), (4.0, 'blue'), (float('inf'), 'orange'))
+
+
+class SharedArray:
+    """A numpy array in shared memory; pickles as a handle, not as its data
+
+    The creating process owns the segment and must unlink() it once every
+    task using it has finished (or use it as a context manager).
+    """
+
+    def __init__(self, shm, shape, dtype, owner):
+        self.shm = shm
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.owner = owner
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=shm.buf)
+
+    @classmethod
+    def copy_of(cls, array):
+        array = np.ascontiguousarray(array)
+        shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        shared = cls(shm, array.shape, array.dtype, owner=True)
+        shared.array[...] = array
+        return shared
+
+    @classmethod
+    def _attach(cls, name, shape, dtype):
+        # Workers share the parent's resource tracker, so attaching never makes
+        # a worker responsible for unlinking the segment
+        return cls(shared_memory.SharedMemory(name=name), shape, dtype, owner=False)
+
+    def __reduce__(self):
+        return SharedArray._attach, (self.shm.name, self.shape, self.dtype.str)
+
+    def close(self):
+        self.array = None
+        self.shm.close()
+
+    def unlink(self):
+        self.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.unlink()
+        return False
+
+
+def _as_array(value):
+    return value.array if isinstance(value, SharedArray) else np.asarray(value)
+
+
+# Tasks (run in worker processes, or inline when the pool is off)
+
+def build_shelter_map(shelters, center_lat=None, center_lon=None, tiles=None):
+    """Folium map with the user's location and a marker per shelter"""
+    if center_lat and center_lon:
+        map_center = [center_lat, center_lon]
+    else:
+        map_center = [sum(s['lat'] for s in shelters) / len(shelters),
+                      sum(s['lon'] for s in shelters) / len(shelters)]
+
+    # Local tile server when configured; public OpenStreetMap tiles otherwise
+    m = folium.Map(
+        location=map_center,
+        zoom_start=11,
+        tiles=tiles or 'OpenStreetMap',
+        attr='© OpenStreetMap contributors' if tiles else None
+    )
+
+    if center_lat and center_lon:
+        folium.Marker(
+            location=[center_lat, center_lon],
+            popup="Your Location",
+            tooltip="You are here",
+            icon=folium.Icon(color='red', icon='home', prefix='glyphicon')
+        ).add_to(m)
+
+    for shelter in shelters:
+        popup_html = f"""
+        <div style="font-family: Inter, sans-serif; width: 250px; padding: 8px;">
+            <h4 style="color: #1e40af; margin: 0 0 8px 0; font-size: 14px;">{shelter['name']}</h4>
+            <p style="margin: 4px 0; font-size: 13px;"><strong>Address:</strong><br>{shelter['address']}</p>
+            <p style="margin: 4px 0; font-size: 13px;"><strong>Distance:</strong> {shelter['distance']}</p>
+            <p style="margin: 4px 0; font-size: 13px;"><strong>Capacity:</strong> {shelter['capacity']}</p>
+            <p style="margin: 4px 0; font-size: 13px;"><strong>Services:</strong> {shelter['services']}</p>
+            <p style="margin: 4px 0; font-size: 13px;"><strong>Phone:</strong> {shelter['phone']}</p>
+        </div>
+        """
+
+        miles = float(shelter['distance'].split()[0])
+        marker_color = next(color for limit, color in MARKER_COLORS if miles < limit)
+
+        folium.Marker(
+            location=[shelter['lat'], shelter['lon']],
+            popup=folium.Popup(popup_html, max_width=300),
+            tooltip=shelter['name'],
+            icon=folium.Icon(color=marker_color, icon='info-sign', prefix='glyphicon')
+        ).add_to(m)
+
+    return m
+
+
+def shelter_map_html(shelters, center_lat=None, center_lon=None, tiles=None):
+    """The shelter map rendered to a standalone HTML page, zlib-compressed"""
+    html = build_shelter_map(shelters, center_lat, center_lon, tiles).get_root().render()
+    return zlib.compress(html.encode('utf-8'), 1)
+
+
+def kit_totals(per_person_counts, households):
+    """Checklist item totals for many households at once
+
+    per_person_counts: (base, per_adult, per_child, per_pet) item counts;
+    households: (n, 3) adults/children/pets array (or SharedArray).
+    """
+    households = _as_array(households)
+    base, per_adult, per_child, per_pet = per_person_counts
+    return base + households @ np.array([per_adult, per_child, per_pet], dtype=np.int64)
+
+
+def nearest_shelters(points, shelter_points, k=3):
+    """Indices and miles of the k nearest shelters for each (lat, lon) point"""
+    points = _as_array(points)
+    shelter_points = _as_array(shelter_points)
+    k = min(k, len(shelter_points))
+    xyz = unit_vectors(points[:, 0], points[:, 1]).reshape(-1, 3)
+    shelter_xyz = unit_vectors(shelter_points[:, 0], shelter_points[:, 1]).reshape(-1, 3)
+    dots = xyz @ shelter_xyz.T
+    top = np.argpartition(-dots, k - 1, axis=1)[:, :k] if k < dots.shape[1] else \
+        np.tile(np.arange(dots.shape[1]), (len(dots), 1))
+    top_dots = np.take_along_axis(dots, top, axis=1)
+    order = np.argsort(-top_dots, axis=1, kind='stable')
+    return (np.take_along_axis(top, order, axis=1).astype(np.int32),
+            dot_to_miles(np.take_along_axis(top_dots, order, axis=1)).astype(np.float32))
+
+
+TASKS = {
+    'shelter_map_html': shelter_map_html,
+    'kit_totals': kit_totals,
+    'nearest_shelters': nearest_shelters
+}
+
+
+def _run_task(name, args):
+    try:
+        return TASKS[name](*args)
+    finally:
+        # Drop this worker's view of shared inputs; the owner unlinks them
+        for arg in args:
+            if isinstance(arg, SharedArray):
+                arg.close()
+
+
+def _warm_worker():
+    """Worker initializer: pay the imports once, not on the first task"""
+    if FOLIUM_AVAILABLE:
+        folium.Map(location=[0, 0]).get_root().render()
+
+
+@contextlib.contextmanager
+def _script_main_hidden():
+    """Hide the Streamlit script from process start-up while workers are launched
+
+    During a script run sys.modules['__main__'] is the script itself, and new
+    spawn/forkserver workers re-import __main__ from its file, which would run
+    the whole app (and start another pool) in every worker.
+    """
+    main = sys.modules.get('__main__')
+    stub = types.ModuleType('__main__')
+    sys.modules['__main__'] = stub
+    try:
+        yield
+    finally:
+        # A new script run may have installed its own __main__ meanwhile; keep that one
+        if sys.modules.get('__main__') is stub:
+            sys.modules['__main__'] = main
+
+
+def default_workers():
+    """EMERGENCY_COMPUTE_WORKERS, else DEFAULT_WORKERS within the spare cores (0 runs tasks inline)"""
+    value = os.environ.get(WORKERS_ENV)
+    if value is not None:
+        return max(0, int(value))
+    return min(DEFAULT_WORKERS, max(1, (os.cpu_count() or 1) - 1))
+
+
+class ComputePool:
+    """Runs TASKS in worker processes; falls back to the calling thread when off or broken"""
+
+    def __init__(self, workers=None, timeout=DEFAULT_TIMEOUT):
+        self.workers = default_workers() if workers is None else workers
+        self.timeout = timeout
+        self._executor = None
+        self._lock = threading.Lock()
+        self._submit_lock = threading.Lock()
+        self.pooled = 0
+        self.inline = 0
+        self.failures = 0
+        self.busy_seconds = 0.0
+        if self.workers:
+            # forkserver: forking a process full of Streamlit threads is unsafe
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context(method),
+                initializer=_warm_worker)
+
+    def submit(self, name, *args):
+        """Future for TASKS[name](*args) in a worker process"""
+        # Workers start on demand inside submit(), so every submit hides the script
+        with self._submit_lock, _script_main_hidden():
+            return self._executor.submit(_run_task, name, args)
+
+    def run(self, name, *args):
+        """TASKS[name](*args), in a worker when the pool is on"""
+        start = time.perf_counter()
+        if self._executor is not None:
+            try:
+                result = self.submit(name, *args).result(timeout=self.timeout)
+                self._count('pooled', start)
+                return result
+            except (concurrent.futures.TimeoutError, concurrent.futures.process.BrokenProcessPool, OSError) as e:
+                print(f"Compute pool {name} failed ({type(e).__name__}: {e}); running inline", file=sys.stderr)
+                with self._lock:
+                    self.failures += 1
+        result = TASKS[name](*args)
+        self._count('inline', start)
+        return result
+
+    def _count(self, counter, start):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+            self.busy_seconds += time.perf_counter() - start
+
+    def stats(self):
+        with self._lock:
+            return {'workers': self.workers, 'pooled': self.pooled, 'inline': self.inline,
+                    'failures': self.failures, 'busy_seconds': self.busy_seconds}
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
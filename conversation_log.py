@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Conversation Log - Durable, append-only record of every turn for after-action review
+The request path only enqueues; a background writer commits turns to SQLite
+(WAL mode) in batches. Turns are indexed by session and time for range queries.
+
+Query with: python conversation_log.py conversations.db --session <id> --since 2026-10-01
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import sqlite3
+import atexit
+import argparse
+import threading
+import functools
+from datetime import datetime
+
+LOG_PATH_ENV = 'EMERGENCY_CONVERSATION_LOG'
+
+# Writer commits when this many turns are queued or this many seconds have passed
+BATCH_SIZE = 256
+BATCH_INTERVAL = 0.5
+
+# Turns queued beyond this are dropped (and counted) rather than blocking the app
+QUEUE_LIMIT = 100_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    ts REAL NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    meta TEXT
+);
+CREATE INDEX IF NOT EXISTS turns_session_ts ON turns (session_id, ts);
+CREATE INDEX IF NOT EXISTS turns_ts ON turns (ts);
+CREATE TRIGGER IF NOT EXISTS turns_no_update BEFORE UPDATE ON turns
+BEGIN SELECT RAISE(ABORT, 'conversation log is append-only'); END;
+CREATE TRIGGER IF NOT EXISTS turns_no_delete BEFORE DELETE ON turns
+BEGIN SELECT RAISE(ABORT, 'conversation log is append-only'); END;
+"""
+
+
+def _timestamp(value):
+    """Accept datetimes, epoch seconds or ISO strings; return epoch seconds"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, str):
+        return datetime.fromisoformat(value).timestamp()
+    return float(value)
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class ConversationLog:
+    """Append-only turn store fed by a background writer queue"""
+
+    def __init__(self, path, batch_size=BATCH_SIZE, batch_interval=BATCH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        conn = _connect(path)
+        conn.executescript(SCHEMA)
+        conn.close()
+
+        self._queue = queue.Queue(maxsize=QUEUE_LIMIT)
+        self._stats_lock = threading.Lock()
+        self._reader = threading.local()
+        self.stats = {'enqueued': 0, 'written': 0, 'dropped': 0, 'batches': 0,
+                      'errors': 0, 'max_commit_ms': 0.0}
+        self._thread = threading.Thread(target=self._run, name='conversation-log-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # Request path
+
+    def append(self, session_id, role, content, timestamp=None, meta=None):
+        """Queue one turn; never blocks the caller"""
+        row = (session_id, _timestamp(timestamp) or time.time(), role, content,
+               json.dumps(meta, default=str, separators=(',', ':')) if meta else None)
+        try:
+            self._queue.put_nowait(row)
+            counter = 'enqueued'
+        except queue.Full:
+            counter = 'dropped'
+        with self._stats_lock:
+            self.stats[counter] += 1
+
+    # Writer thread
+
+    def _run(self):
+        conn = _connect(self.path)
+        while True:
+            row = self._queue.get()
+            if row is None:
+                break
+            batch = [row]
+            deadline = time.monotonic() + self.batch_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    row = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if row is None:
+                    stop = True
+                    break
+                batch.append(row)
+            self._commit(conn, batch)
+            if stop:
+                break
+        # Drain whatever was queued before shutdown
+        rest = []
+        while True:
+            try:
+                row = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if row is not None:
+                rest.append(row)
+        if rest:
+            self._commit(conn, rest)
+        conn.close()
+
+    def _commit(self, conn, batch):
+        start = time.perf_counter()
+        try:
+            with conn:
+                conn.executemany("INSERT INTO turns (session_id, ts, role, content, meta) "
+                                 "VALUES (?, ?, ?, ?, ?)", batch)
+        except sqlite3.Error as e:
+            # Rows, not batches: flush() compares written + errors against rows enqueued
+            self.stats['errors'] += len(batch)
+            print(f"Conversation log write failed ({len(batch)} turns lost): {e}", file=sys.stderr)
+            return
+        elapsed = (time.perf_counter() - start) * 1000
+        self.stats['written'] += len(batch)
+        self.stats['batches'] += 1
+        self.stats['max_commit_ms'] = max(self.stats['max_commit_ms'], elapsed)
+
+    def flush(self, timeout=10):
+        """Block until everything queued so far is committed (for tools and tests)"""
+        target = self.stats['enqueued']
+        deadline = time.monotonic() + timeout
+        while self.stats['written'] + self.stats['errors'] < target and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=10)
+
+    # Analysis queries
+
+    def _conn(self):
+        conn = getattr(self._reader, 'conn', None)
+        if conn is None:
+            conn = _connect(self.path)
+            conn.row_factory = sqlite3.Row
+            self._reader.conn = conn
+        return conn
+
+    def turns(self, session_id=None, start=None, end=None, role=None, limit=None):
+        """Turns in time order, optionally filtered by session, time range and role"""
+        clauses, params = [], []
+        if session_id is not None:
+            clauses.append("session_id = ?")
+            params.append(session_id)
+        if start is not None:
+            clauses.append("ts >= ?")
+            params.append(_timestamp(start))
+        if end is not None:
+            clauses.append("ts < ?")
+            params.append(_timestamp(end))
+        if role is not None:
+            clauses.append("role = ?")
+            params.append(role)
+        sql = "SELECT session_id, ts, role, content, meta FROM turns"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY ts, id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        for row in self._conn().execute(sql, params):
+            yield {
+                'session_id': row['session_id'],
+                'timestamp': datetime.fromtimestamp(row['ts']),
+                'role': row['role'],
+                'content': row['content'],
+                'meta': json.loads(row['meta']) if row['meta'] else None
+            }
+
+    def sessions(self, start=None, end=None):
+        """Sessions active in a time range with their turn counts and first/last times"""
+        sql = "SELECT session_id, COUNT(*), MIN(ts), MAX(ts) FROM turns WHERE ts >= ? AND ts < ? " \
+              "GROUP BY session_id ORDER BY MIN(ts)"
+        params = (_timestamp(start) or 0.0, _timestamp(end) or float('inf'))
+        return [{'session_id': sid, 'turns': count,
+                 'first': datetime.fromtimestamp(first), 'last': datetime.fromtimestamp(last)}
+                for sid, count, first, last in self._conn().execute(sql, params)]
+
+
+@functools.lru_cache(maxsize=None)
+def get_log(path=None):
+    """Per-process log for the configured path, or None when logging is off"""
+    path = path or os.environ.get(LOG_PATH_ENV)
+    if not path:
+        return None
+    return ConversationLog(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the conversation log")
+    parser.add_argument('path', help="Conversation log database")
+    parser.add_argument('--session', help="Only this session id")
+    parser.add_argument('--since', help="ISO start time (inclusive)")
+    parser.add_argument('--until', help="ISO end time (exclusive)")
+    parser.add_argument('--sessions', action='store_true', help="List sessions instead of turns")
+    args = parser.parse_args()
+
+    log = ConversationLog(args.path)
+    if args.sessions:
+        for row in log.sessions(args.since, args.until):
+            print(json.dumps(row, default=str))
+    else:
+        for turn in log.turns(args.session, args.since, args.until):
+            print(json.dumps(turn, default=str, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
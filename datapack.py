@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+Shared Data Pack - Immutable, memory-mapped knowledge data
+One file per host that every Streamlit worker maps read-only. Array,
+string-table and tree sections (the knowledge sections themselves) are read
+in place from the mapping, so the OS page cache holds a single copy of them
+for all processes. Plain JSON sections are decoded into objects in each
+process that reads them.
+
+Build with: python datapack.py build [data/knowledge.pack]
+"""
+
+import os
+import sys
+import json
+import mmap
+import zlib
+import struct
+import argparse
+import functools
+from collections.abc import Mapping, Sequence
+
+try:
+    import numpy as np
+
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+MAGIC = b'EPDP'
+# 2 added tree sections; packs of format 1 are still read
+FORMAT_VERSION = 2
+# magic, format version, header length
+PREAMBLE = struct.Struct('<4sII')
+# Section payloads start on cache-line boundaries so arrays map cleanly
+ALIGNMENT = 64
+
+# Tree nodes: a tag byte, then a u32 length or count (or the scalar itself)
+NODE_HEAD = struct.Struct('<cI')
+NODE_REF = struct.Struct('<I')
+NODE_PAIR = struct.Struct('<II')
+NODE_INT = struct.Struct('<cq')
+NODE_FLOAT = struct.Struct('<cd')
+
+DEFAULT_PACK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'knowledge.pack')
+PACK_PATH_ENV = 'EMERGENCY_DATAPACK'
+
+
+class StringList:
+    """Marks a list of strings to be stored as an offset-indexed string table"""
+
+    def __init__(self, items):
+        self.items = list(items)
+
+
+class Tree:
+    """Marks a JSON-compatible value to be stored as a tree read in place from the mapping"""
+
+    def __init__(self, value):
+        self.value = value
+
+
+def mapped(sections):
+    """Knowledge sections marked to be stored as trees"""
+    return {name: Tree(value) for name, value in sections.items()}
+
+
+class StringTable:
+    """Read-only sequence of strings decoded lazily from the mapped file"""
+
+    def __init__(self, buffer, count):
+        self._offsets = buffer[:(count + 1) * 8].cast('Q')
+        self._blob = buffer[(count + 1) * 8:]
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("string table index out of range")
+        return bytes(self._blob[self._offsets[index]:self._offsets[index + 1]]).decode('utf-8')
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self[i]
+
+
+def _encode_tree(value):
+    """(root offset, payload) of a tree; children are written before their parent"""
+    out = bytearray()
+    strings = {}
+
+    def node(value):
+        if isinstance(value, str):
+            if value not in strings:
+                encoded = value.encode('utf-8')
+                strings[value] = len(out)
+                out.extend(NODE_HEAD.pack(b's', len(encoded)) + encoded)
+            return strings[value]
+        if isinstance(value, Mapping):
+            refs = [(node(key), node(item)) for key, item in value.items()]
+            offset = len(out)
+            out.extend(NODE_HEAD.pack(b'd', len(refs)) + b''.join(NODE_PAIR.pack(*ref) for ref in refs))
+            return offset
+        if isinstance(value, (list, tuple, MappedList)):
+            refs = [node(item) for item in value]
+            offset = len(out)
+            out.extend(NODE_HEAD.pack(b'l', len(refs)) + b''.join(NODE_REF.pack(ref) for ref in refs))
+            return offset
+        offset = len(out)
+        if value is None or isinstance(value, bool):
+            out.extend({None: b'N', True: b'T', False: b'F'}[value])
+        elif isinstance(value, int):
+            out.extend(NODE_INT.pack(b'i', value))
+        elif isinstance(value, float):
+            out.extend(NODE_FLOAT.pack(b'f', value))
+        else:
+            raise TypeError(f"Cannot store {type(value).__name__} in a tree section")
+        return offset
+
+    root = node(value)
+    return root, bytes(out)
+
+
+def _node(buffer, offset):
+    """The value at offset: scalars decoded, dicts and lists as views over the mapping"""
+    tag = buffer[offset]
+    if tag == 0x73:  # 's'
+        length = NODE_REF.unpack_from(buffer, offset + 1)[0]
+        return str(buffer[offset + 5:offset + 5 + length], 'utf-8')
+    if tag == 0x64:  # 'd'
+        return MappedDict(buffer, offset)
+    if tag == 0x6c:  # 'l'
+        return MappedList(buffer, offset)
+    if tag == 0x69:  # 'i'
+        return NODE_INT.unpack_from(buffer, offset)[1]
+    if tag == 0x66:  # 'f'
+        return NODE_FLOAT.unpack_from(buffer, offset)[1]
+    return {0x4e: None, 0x54: True, 0x46: False}[tag]
+
+
+def plain(value):
+    """A copy of a (possibly mapped) tree value made of ordinary dicts and lists"""
+    if isinstance(value, Mapping):
+        return {key: plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, MappedList)):
+        return [plain(item) for item in value]
+    return value
+
+
+class MappedDict(Mapping):
+    """Read-only dict node of a tree section; keys keep their original order"""
+
+    __slots__ = ('_buffer', '_offset', '_count')
+
+    def __init__(self, buffer, offset):
+        self._buffer = buffer
+        self._offset = offset
+        self._count = NODE_REF.unpack_from(buffer, offset + 1)[0]
+
+    def _pairs(self):
+        for i in range(self._count):
+            yield NODE_PAIR.unpack_from(self._buffer, self._offset + 5 + i * NODE_PAIR.size)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            encoded = key.encode('utf-8')
+            for key_at, value_at in self._pairs():
+                length = NODE_REF.unpack_from(self._buffer, key_at + 1)[0]
+                if length == len(encoded) and self._buffer[key_at + 5:key_at + 5 + length] == encoded:
+                    return _node(self._buffer, value_at)
+        raise KeyError(key)
+
+    def __iter__(self):
+        for key_at, _ in self._pairs():
+            yield _node(self._buffer, key_at)
+
+    def __len__(self):
+        return self._count
+
+    def __repr__(self):
+        return repr(plain(self))
+
+    def __reduce__(self):
+        return dict, (plain(self),)
+
+
+class MappedList(Sequence):
+    """Read-only list node of a tree section"""
+
+    __slots__ = ('_buffer', '_offset', '_count')
+
+    def __init__(self, buffer, offset):
+        self._buffer = buffer
+        self._offset = offset
+        self._count = NODE_REF.unpack_from(buffer, offset + 1)[0]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("list index out of range")
+        return _node(self._buffer, NODE_REF.unpack_from(self._buffer, self._offset + 5 + index * 4)[0])
+
+    def __len__(self):
+        return self._count
+
+    def __eq__(self, other):
+        if not isinstance(other, (list, MappedList)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __repr__(self):
+        return repr(plain(self))
+
+    def __reduce__(self):
+        return list, (plain(self),)
+
+
+def _encode_section(value):
+    """Return (meta, payload bytes) for one section value"""
+    if NUMPY_AVAILABLE and isinstance(value, np.ndarray):
+        array = np.ascontiguousarray(value)
+        return {'kind': 'array', 'dtype': array.dtype.str, 'shape': list(array.shape)}, array.tobytes()
+
+    if isinstance(value, StringList):
+        encoded = [s.encode('utf-8') for s in value.items]
+        offsets = [0]
+        for item in encoded:
+            offsets.append(offsets[-1] + len(item))
+        payload = struct.pack(f'<{len(offsets)}Q', *offsets) + b''.join(encoded)
+        return {'kind': 'strings', 'count': len(encoded)}, payload
+
+    if isinstance(value, Tree):
+        root, payload = _encode_tree(value.value)
+        return {'kind': 'tree', 'root': root}, payload
+
+    return {'kind': 'json'}, json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def write_pack(path, sections, checksum=False):
+    """Write sections ({name: value}) to an immutable pack file, atomically
+
+    Values may be JSON-compatible objects, numpy arrays (mapped zero-copy),
+    StringList instances (mapped as lazily decoded string tables) or Tree
+    instances (mapped as read-only dict and list views).
+    With checksum=True the header records a CRC-32 of all section payloads,
+    which DataPack.verify() checks.
+    """
+    metas, payloads = {}, []
+    crc = 0
+    for name, value in sections.items():
+        meta, payload = _encode_section(value)
+        metas[name] = meta
+        payloads.append((name, payload))
+        crc = zlib.crc32(payload, crc)
+
+    # Offsets depend on the header length, which depends on the offsets;
+    # iterate until the header size is stable
+    header_len = 0
+    while True:
+        offset = PREAMBLE.size + header_len
+        for name, payload in payloads:
+            offset += -offset % ALIGNMENT
+            metas[name]['offset'] = offset
+            metas[name]['length'] = len(payload)
+            offset += len(payload)
+        header_fields = {'sections': metas}
+        if checksum:
+            header_fields['crc32'] = crc
+        header = json.dumps(header_fields, separators=(',', ':')).encode('utf-8')
+        if len(header) == header_len:
+            break
+        header_len = len(header)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, header_len))
+        f.write(header)
+        for name, payload in payloads:
+            f.write(b'\0' * (metas[name]['offset'] - f.tell()))
+            f.write(payload)
+    os.chmod(tmp_path, 0o444)
+    os.replace(tmp_path, path)
+    return path
+
+
+class DataPack:
+    """A read-only, memory-mapped view of a pack file"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        magic, version, header_len = PREAMBLE.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a data pack")
+        if not 1 <= version <= FORMAT_VERSION:
+            raise ValueError(f"{path} has pack format {version}, expected {FORMAT_VERSION}")
+        header = json.loads(bytes(self._view[PREAMBLE.size:PREAMBLE.size + header_len]))
+        self.sections = header['sections']
+        self.crc32 = header.get('crc32')
+        self._decoded = {}
+
+    def __contains__(self, name):
+        return name in self.sections
+
+    def __getitem__(self, name):
+        if name not in self._decoded:
+            self._decoded[name] = self._decode(name)
+        return self._decoded[name]
+
+    def get(self, name, default=None):
+        return self[name] if name in self.sections else default
+
+    def verify(self):
+        """True if the payloads match the recorded checksum (None when none was recorded)"""
+        if self.crc32 is None:
+            return None
+        crc = 0
+        for meta in self.sections.values():
+            crc = zlib.crc32(self._view[meta['offset']:meta['offset'] + meta['length']], crc)
+        return crc == self.crc32
+
+    def prefixed(self, prefix):
+        """View of the sections whose names start with prefix, with the prefix removed"""
+        return PackView(self, prefix)
+
+    def _decode(self, name):
+        meta = self.sections[name]
+        buffer = self._view[meta['offset']:meta['offset'] + meta['length']]
+        if meta['kind'] == 'array':
+            if not NUMPY_AVAILABLE:
+                raise RuntimeError(f"numpy is required to read array section '{name}'")
+            # frombuffer over a read-only mapping gives a zero-copy, read-only array
+            return np.frombuffer(buffer, dtype=np.dtype(meta['dtype'])).reshape(meta['shape'])
+        if meta['kind'] == 'strings':
+            return StringTable(buffer, meta['count'])
+        if meta['kind'] == 'tree':
+            return _node(buffer, meta['root'])
+        return json.loads(bytes(buffer))
+
+    def close(self):
+        self._decoded.clear()
+        self._view.release()
+        self._mmap.close()
+
+
+class PackView:
+    """Sections of a pack under a name prefix, used like a DataPack of their own"""
+
+    def __init__(self, pack, prefix):
+        self.pack = pack
+        self.prefix = prefix
+        self.sections = {name[len(prefix):]: meta for name, meta in pack.sections.items()
+                         if name.startswith(prefix)}
+
+    def __contains__(self, name):
+        return name in self.sections
+
+    def __getitem__(self, name):
+        return self.pack[self.prefix + name]
+
+    def get(self, name, default=None):
+        return self[name] if name in self.sections else default
+
+
+@functools.lru_cache(maxsize=None)
+def open_shared(path):
+    """Open a pack once per process; every caller shares the same mapping"""
+    return DataPack(path)
+
+
+def knowledge_sections():
+    """Pack sections of the validated knowledge source (data/knowledge.json)"""
+    import knowledge_pack
+
+    return knowledge_pack.load_source()
+
+
+def pack_path():
+    """Path of the host's knowledge pack (EMERGENCY_DATAPACK overrides the default)"""
+    return os.environ.get(PACK_PATH_ENV, DEFAULT_PACK_PATH)
+
+
+def load_knowledge():
+    """Return the knowledge sections, mapped from the shared pack when one exists
+
+    The source is only read without a pack, or for sections an older pack lacks.
+    """
+    from knowledge_pack import SECTIONS
+
+    path = pack_path()
+    if os.path.exists(path):
+        try:
+            pack = open_shared(path)
+            sections = {name: pack[name] for name in pack.sections}
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable data pack {path}: {e}", file=sys.stderr)
+        else:
+            missing = [name for name in SECTIONS if name not in sections]
+            if missing:
+                # A pack without 'version' predates versioning; the source's version doesn't describe it
+                source = knowledge_sections()
+                sections.update((name, source[name]) for name in missing)
+            return sections
+    return knowledge_sections()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect the shared data pack")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help="Build the pack from the knowledge source")
+    build.add_argument('path', nargs='?', default=pack_path())
+    info = sub.add_parser('info', help="List the sections of a pack")
+    info.add_argument('path', nargs='?', default=pack_path())
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        write_pack(args.path, mapped(knowledge_sections()))
+        print(f"Wrote {args.path} ({os.path.getsize(args.path)} bytes)")
+    else:
+        pack = DataPack(args.path)
+        for name, meta in pack.sections.items():
+            print(f"{name}: {meta['kind']} {meta['length']} bytes @ {meta['offset']}")
+
+
+if __name__ == "__main__":
+    main()
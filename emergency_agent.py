@@ -8,16 +8,42 @@ Run with: streamlit run emergency_prep_app_enhanced.py
 
 import streamlit as st
 from datetime import datetime
+import os
+import hmac
 import time
+import uuid
+import zlib
+import functools
+from html import escape
+
+import snapshot
+from knowledge_base import INTENT_KEYWORDS, detect_intents
+from session_store import get_store, PERSISTED_KEYS, SESSION_TTL
+from conversation_log import get_log
+from fuzzy_match import routing_vocabulary
+from tool_runtime import ToolRuntime
+from tile_server import tile_url
+from static_map import render_shelter_map, is_low_bandwidth
+from compact_mode import COMPACT_CSS, compact_html
+from profiler import RunProfiler
+from single_flight import SingleFlight, flight_key
+from surge import SurgeController
+from knowledge_pack import KnowledgeWatcher, loaded_version
+from compute_pool import ComputePool, FOLIUM_AVAILABLE
+from session_budget import SessionLedger, budget_bytes, enforce_budget, session_footprint
+from query_analytics import get_analytics, live_report
+from trace_replay import get_recorder
+from zip_shelters import load_table, zip_of, shelter_key
+from address_index import load_index
+from fema_screening import RuleSet
+from assets import get_assets, FONT_CSS_URL
 
-# Try to import folium, but make it optional
 try:
-    import folium
-    from streamlit_folium import st_folium
+    from streamlit_searchbox import st_searchbox
 
-    FOLIUM_AVAILABLE = True
+    SEARCHBOX_AVAILABLE = True
 except ImportError:
-    FOLIUM_AVAILABLE = False
+    SEARCHBOX_AVAILABLE = False
 
 # Page configuration - MUST BE FIRST STREAMLIT COMMAND
 st.set_page_config(
@@ -27,11 +53,48 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Recent runs kept for the developer panel
+PROFILE_HISTORY = 10
+
+
+def next_run_capture():
+    """Profile type to capture for this run, when one was requested from the developer panel"""
+    request = st.session_state.get('profile_request')
+    if not request:
+        return None
+    if request['wait']:
+        # This is the run triggered by the request button itself; capture the one after it
+        request['wait'] = False
+        return None
+    del st.session_state['profile_request']
+    return request['capture']
+
+
+# Phase timings for the developer panel (a no-op unless it is switched on)
+PROFILER = RunProfiler(enabled=st.session_state.get('operator', False) and st.session_state.get('dev_panel', False),
+                       capture=next_run_capture())
+RUN_STARTED = time.perf_counter()
+
+
+@st.cache_resource
+def get_surge_controller():
+    """Overload controller shared by all sessions in this process"""
+    return SurgeController()
+
+
+# Surge mode: decided once per run so the whole page renders one way
+SURGE = get_surge_controller()
+IN_SURGE = SURGE.active()
+
+# Vendored font and images served from app/static/ (None until `python assets.py fetch` has run)
+ASSETS = get_assets()
+FONT_CSS = ASSETS.font_css() if ASSETS is not None else f"@import url('{FONT_CSS_URL}');"
+
 # Enhanced Custom CSS with beautiful, interactive design
-st.markdown("""
+PAGE_CSS = """
     <style>
     /* Import Professional Font */
-    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
+    """ + FONT_CSS + """
 
     /* Global Styles */
     * {
@@ -543,103 +606,88 @@ st.markdown("""
         white-space: nowrap;
         z-index: 1000;
     }
-    </style>
-""", unsafe_allow_html=True)
-
-# Data structures (same as before but will be used differently)
-FEMA_DATA = {
-    "eligibility": [
-        "Disaster must be federally declared",
-        "Property is your primary residence",
-        "Losses not fully covered by insurance",
-        "Valid U.S. citizenship or residency"
-    ],
-    "process": [
-        "Register online at DisasterAssistance.gov or call 1-800-621-FEMA",
-        "Provide damage details and insurance information",
-        "FEMA inspector assesses damage within 10 days",
-        "Decision made and funds distributed"
-    ]
-}
+""" + COMPACT_CSS + """    </style>
+"""
 
-SHELTER_DATA = {
-    "Sunnyvale, CA": [
-        {
-            "name": "Sunnyvale Community Center",
-            "address": "550 E Remington Dr",
-            "distance": "1.2 miles",
-            "capacity": "500 people",
-            "services": "Food, water, medical",
-            "phone": "(408) 730-7350",
-            "lat": 37.3688,
-            "lon": -122.0363
-        },
-        {
-            "name": "Fremont High School Gymnasium",
-            "address": "765 W Fremont Ave",
-            "distance": "2.1 miles",
-            "capacity": "800 people",
-            "services": "Food, water, medical, pet-friendly",
-            "phone": "(408) 522-8200",
-            "lat": 37.3541,
-            "lon": -122.0443
-        },
-        {
-            "name": "Red Cross Emergency Shelter",
-            "address": "2731 N First St, San Jose",
-            "distance": "5.3 miles",
-            "capacity": "1200 people",
-            "services": "Food, water, medical, mental health",
-            "phone": "(408) 577-1000",
-            "lat": 37.3894,
-            "lon": -121.9439
-        }
-    ]
-}
+# Surge mode stylesheet: the few rules answers need, no web fonts or animations
+SURGE_CSS = """
+    <style>
+    .professional-header, .main-menu-box { text-align: center; }
+    .message-container { margin: 0.75rem 0; }
+    .message-user { background: #1e40af; color: #fff; padding: 0.75rem 1rem; border-radius: 8px; margin-left: 20%; }
+    .message-assistant { background: #f8fafc; border: 1px solid #e2e8f0; padding: 1rem; border-radius: 8px; }
+    .highlight-box-warning { border-left: 3px solid #f59e0b; padding-left: 0.5rem; }
+    .contact-card { border: 1px solid #e2e8f0; padding: 0.5rem; margin-bottom: 0.5rem; border-radius: 6px; }
+    .contact-card-emergency { border-color: #dc2626; }
+    .section-header { font-weight: 700; margin: 1rem 0 0.5rem; }
+""" + COMPACT_CSS + """    </style>
+"""
 
-GO_BAG_ESSENTIALS = {
-    "base": [
-        "Water (1 gallon per person per day for 3 days)",
-        "Non-perishable food (3-day supply)",
-        "Battery-powered or hand-crank radio",
-        "Flashlight and extra batteries",
-        "First aid kit",
-        "Medications (7-day supply)",
-        "Copies of important documents",
-        "Cash and credit cards",
-        "Emergency contact list",
-        "Phone charger and backup battery"
-    ],
-    "per_adult": [
-        "Personal medications",
-        "Eyeglasses or contacts",
-        "Hygiene items",
-        "Change of clothes",
-        "Sturdy shoes"
-    ],
-    "per_child": [
-        "Diapers and wipes",
-        "Formula and bottles",
-        "Comfort items",
-        "Snacks",
-        "Extra clothing"
-    ],
-    "per_pet": [
-        "Pet food (3-day supply)",
-        "Water bowls",
-        "Leash and collar with ID",
-        "Pet medications",
-        "Carrier or crate",
-        "Recent photo"
-    ]
-}
+css_started = time.perf_counter()
+st.markdown(SURGE_CSS if IN_SURGE else PAGE_CSS, unsafe_allow_html=True)
+PROFILER.record("CSS injection", time.perf_counter() - css_started)
+
+# Data structures (mapped from the startup snapshot or the shared data pack when one is built)
+KNOWLEDGE = snapshot.load_knowledge()
+FEMA_DATA = KNOWLEDGE['fema']
+# Eligibility rules, compiled; the caseworkers' batch screener uses the same ones
+FEMA_RULES = RuleSet(FEMA_DATA['rules']) if FEMA_DATA.get('rules') else None
+SHELTER_DATA = KNOWLEDGE['shelters']
+GO_BAG_ESSENTIALS = KNOWLEDGE['go_bag']
+GO_BAG_IMAGE = KNOWLEDGE['go_bag_image']
+DISASTER_GUIDES = KNOWLEDGE['disaster_guides']
+DISASTER_GENERAL = KNOWLEDGE['disaster_general']
+
+# External session store (None keeps state in this process only)
+SESSION_STORE = get_store()
+
+# Durable conversation log for after-action review (None when disabled)
+CONVERSATION_LOG = get_log()
+
+# Fixed-memory counts of intents, locations and users for the live dashboard
+ANALYTICS = get_analytics()
+
+# Replayable traces of real conversation flows (None when capture is off)
+TRACE = get_recorder()
+
+# Threads for blocking tool lookups, shared by every session in the process
+TOOL_WORKERS = 8
+
+# Seconds one query may wait for its tools before fallbacks are shown
+QUERY_DEADLINE = 3.0
+
+# Seconds between "you are number N" updates, and the longest a session waits in line
+QUEUE_POLL = 0.5
+QUEUE_MAX_WAIT = 30.0
+
+# A duplicate question waits for its leader longer than the leader can spend in line and
+# answering, so under surge a waiter never takes an admission ticket of its own
+FLIGHT_WAIT = QUEUE_MAX_WAIT + QUEUE_POLL + QUERY_DEADLINE + 5.0
 
-# Go-bag image URL (using a placeholder service)
-GO_BAG_IMAGE = "https://images.unsplash.com/photo-1622260614927-2c7ec90445f0?w=800&q=80"
+# Vocabulary the spelling corrector snaps typos onto
+ROUTING_VOCABULARY = routing_vocabulary(INTENT_KEYWORDS, DISASTER_GUIDES)
+
+# Minimum BM25 score for a guidance passage to be shown instead of the help card
+MIN_SEARCH_SCORE = 1.5
+
+# Widget key of the plain address box, which load_test.py fills in
+ADDRESS_INPUT_KEY = 'address_input'
+
+# Secret that unlocks the developer panel (also read from st.secrets['operator_key'])
+OPERATOR_KEY_ENV = 'EMERGENCY_OPERATOR_KEY'
+
+# Browser cookie carrying the session id for the session store (never the URL, which gets shared)
+SESSION_COOKIE = 'emergency_sid'
 
 
 def initialize_session_state():
     """Initialize session state variables"""
+    if 'session_id' not in st.session_state:
+        if SESSION_STORE is not None:
+            restore_session_state()
+        else:
+            st.session_state.session_id = uuid.uuid4().hex
+
     if 'messages' not in st.session_state:
         st.session_state.messages = []
 
@@ -655,91 +703,137 @@ def initialize_session_state():
     if 'user_address' not in st.session_state:
         st.session_state.user_address = None
 
+    if 'low_bandwidth' not in st.session_state:
+        st.session_state.low_bandwidth = client_is_slow()
 
-def create_shelter_map(shelters, center_lat=None, center_lon=None):
-    """Create an interactive map with shelter markers"""
-    if not FOLIUM_AVAILABLE:
-        return None
+    if 'compacted_turns' not in st.session_state:
+        st.session_state.compacted_turns = 0
 
-    if center_lat and center_lon:
-        map_center = [center_lat, center_lon]
-    else:
-        map_center = [sum(s['lat'] for s in shelters) / len(shelters),
-                      sum(s['lon'] for s in shelters) / len(shelters)]
-
-    m = folium.Map(
-        location=map_center,
-        zoom_start=11,
-        tiles='OpenStreetMap'
-    )
-
-    if center_lat and center_lon:
-        folium.Marker(
-            location=[center_lat, center_lon],
-            popup="Your Location",
-            tooltip="You are here",
-            icon=folium.Icon(color='red', icon='home', prefix='glyphicon')
-        ).add_to(m)
+    if 'evicted_turns' not in st.session_state:
+        st.session_state.evicted_turns = 0
 
-    for idx, shelter in enumerate(shelters, 1):
-        popup_html = f"""
-        <div style="font-family: Inter, sans-serif; width: 250px; padding: 8px;">
-            <h4 style="color: #1e40af; margin: 0 0 8px 0; font-size: 14px;">{shelter['name']}</h4>
-            <p style="margin: 4px 0; font-size: 13px;"><strong>Address:</strong><br>{shelter['address']}</p>
-            <p style="margin: 4px 0; font-size: 13px;"><strong>Distance:</strong> {shelter['distance']}</p>
-            <p style="margin: 4px 0; font-size: 13px;"><strong>Capacity:</strong> {shelter['capacity']}</p>
-            <p style="margin: 4px 0; font-size: 13px;"><strong>Services:</strong> {shelter['services']}</p>
-            <p style="margin: 4px 0; font-size: 13px;"><strong>Phone:</strong> {shelter['phone']}</p>
-        </div>
-        """
+    check_operator()
 
-        distance_val = float(shelter['distance'].split()[0])
-        if distance_val < 2:
-            marker_color = 'green'
-        elif distance_val < 4:
-            marker_color = 'blue'
-        else:
-            marker_color = 'orange'
 
-        folium.Marker(
-            location=[shelter['lat'], shelter['lon']],
-            popup=folium.Popup(popup_html, max_width=300),
-            tooltip=shelter['name'],
-            icon=folium.Icon(color=marker_color, icon='info-sign', prefix='glyphicon')
-        ).add_to(m)
+def operator_key():
+    """The key that unlocks the developer panel: environment first, then Streamlit secrets"""
+    key = os.environ.get(OPERATOR_KEY_ENV)
+    if not key:
+        try:
+            key = st.secrets.get('operator_key')
+        except FileNotFoundError:
+            key = None
+    return key or None
 
-    return m
 
+def check_operator():
+    """Mark this session as an operator's when it was opened with ?operator=<key>"""
+    supplied = st.query_params.get('operator')
+    if supplied is None:
+        return
+    key = operator_key()
+    if key and hmac.compare_digest(supplied.encode(), key.encode()):
+        st.session_state.operator = True
+    # Never leave the key in a URL that might be shared
+    del st.query_params['operator']
 
-def simulate_thinking(query, context=None):
-    """Simulate agent reasoning process"""
-    reasoning = []
-    tools_used = []
 
-    reasoning.append({
-        "step": "Query Analysis",
-        "thought": f"Analyzing: '{query}'"
-    })
-    time.sleep(0.2)
+def is_session_id(value):
+    """True for an id this app issued (a random UUID's hex)"""
+    try:
+        return uuid.UUID(hex=value).hex == value
+    except (TypeError, ValueError):
+        return False
 
-    response = ""
-    show_map = False
-    needs_input = None
 
-    # FEMA queries
-    if any(word in query.lower() for word in ['fema', 'funding', 'financial', 'assistance', 'apply']):
-        reasoning.append({
-            "step": "Tool Selection",
-            "thought": "Accessing FEMA database"
-        })
+def restore_session_state():
+    """Adopt the session id from the browser's cookie and fetch the saved conversation"""
+    # Links from before the cookie carried ?sid=; they no longer open anyone's conversation
+    if 'sid' in st.query_params:
+        del st.query_params['sid']
+    session_id = st.context.cookies.get(SESSION_COOKIE)
+    if not is_session_id(session_id):
+        session_id = uuid.uuid4().hex
+    st.session_state.session_id = session_id
 
-        tools_used.append({
-            "tool": "FEMA Assistance Database",
-            "query": "Eligibility and process"
-        })
-        time.sleep(0.2)
+    saved = SESSION_STORE.load(session_id)
+    if saved:
+        for key in PERSISTED_KEYS:
+            if key in saved:
+                st.session_state[key] = saved[key]
 
-        response = """<div class="info-card">
+
+def remember_session():
+    """Store the session id in a browser cookie until the browser sends it back"""
+    if SESSION_STORE is None or st.context.cookies.get(SESSION_COOKIE) == st.session_state.session_id:
+        return
+    st.html(f"""<script>
+document.cookie = "{SESSION_COOKIE}={st.session_state.session_id}; path=/; max-age={SESSION_TTL}; SameSite=Strict"
+    + (location.protocol === "https:" ? "; Secure" : "");
+</script>""", unsafe_allow_javascript=True)
+
+
+def persist_session_state():
+    """Queue the conversation state for the external session store"""
+    if SESSION_STORE is not None:
+        SESSION_STORE.save(st.session_state.session_id,
+                           {key: st.session_state[key] for key in PERSISTED_KEYS})
+
+
+def address_suggestions(text):
+    """Autocomplete suggestions for a partly typed address or ZIP code"""
+    if ADDRESS_INDEX is None or not text:
+        return []
+    return [label for label, _ in ADDRESS_INDEX.suggest(text)]
+
+
+def choose_address(label):
+    """Fill the plain address box with a suggestion (button callback)
+
+    Only the text-input form has suggestion buttons; the searchbox keeps its own state.
+    """
+    st.session_state[ADDRESS_INPUT_KEY] = label
+
+
+def trace_input(kind, value):
+    """Record a user input for trace replay"""
+    if TRACE is not None:
+        TRACE.input(st.session_state.session_id, kind, value)
+
+
+def trace_answer(query, result, started):
+    """Record an answer, the context it used and its latency for trace replay"""
+    if TRACE is not None:
+        context = {
+            'user_address': st.session_state.user_address,
+            'household_info': st.session_state.household_info
+        }
+        shared = any(step['step'] in ("Shared Answer", "Surge Mode") for step in result[1])
+        TRACE.answer(st.session_state.session_id, query, context, result,
+                     (time.perf_counter() - started) * 1000, loaded_version(KNOWLEDGE).get('version'), shared)
+
+
+def log_turn(role, content, **meta):
+    """Queue a turn for the conversation log (off the request path)"""
+    if CONVERSATION_LOG is not None:
+        CONVERSATION_LOG.append(st.session_state.session_id, role, content, meta=meta or None)
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def create_shelter_map(shelters, center_lat=None, center_lon=None, tiles=None):
+    """Interactive shelter map as an HTML page, built in the compute pool and cached per input"""
+    if not FOLIUM_AVAILABLE:
+        return None
+    html = COMPUTE_POOL.run('shelter_map_html', shelters, center_lat, center_lon, tiles)
+    return zlib.decompress(html).decode('utf-8')
+
+
+def fema_tool(context):
+    """FEMA eligibility and application process, checked against the user's address when known"""
+    time.sleep(0.2)
+    checks = FEMA_RULES.check({'zip': context['user_address']}) if FEMA_RULES and context['user_address'] else {}
+
+    response = """<div class="info-card">
 <h3>💰 FEMA Individual Assistance</h3>
 <p>Financial help for disaster-affected homeowners and renters</p>
 </div>
@@ -747,18 +841,28 @@ def simulate_thinking(query, context=None):
 <div class="highlight-box">
 <strong>✓ Eligibility Requirements</strong><br><br>
 """
-        for item in FEMA_DATA['eligibility']:
+    for item in FEMA_DATA['eligibility']:
+        rule = FEMA_RULES.by_criterion.get(item) if checks else None
+        outcome = checks.get(rule.id) if rule else None
+        if outcome is True:
+            response += f"✅ {item} ({escape(context['user_address'])})<br>"
+        elif outcome is False:
+            response += f"⚠️ {item}: {rule.reason} ({escape(context['user_address'])})<br>"
+        else:
             response += f"• {item}<br>"
+    checked = any(outcome is not None for outcome in checks.values())
+    if checked:
+        response += "<br>Checked against the address you entered; FEMA confirms the rest when you apply.<br>"
 
-        response += """</div>
+    response += """</div>
 
 <div class="info-card info-card-success">
 <h3>📋 How to Apply</h3>
 """
-        for idx, step in enumerate(FEMA_DATA['process'], 1):
-            response += f"<strong>Step {idx}:</strong> {step}<br><br>"
+    for idx, step in enumerate(FEMA_DATA['process'], 1):
+        response += f"<strong>Step {idx}:</strong> {step}<br><br>"
 
-        response += """</div>
+    response += """</div>
 
 <div class="highlight-box-success">
 <strong>💵 Available Assistance (Up to $38,000)</strong><br><br>
@@ -775,10 +879,19 @@ Apply within 60 days • Document all damage • Keep receipts
 
 <strong>📞 Contact:</strong> 1-800-621-FEMA (3362) | <a href="https://www.disasterassistance.gov" target="_blank" style="color: #3b82f6; text-decoration: underline;">DisasterAssistance.gov</a>"""
 
-    # Shelter queries
-    elif any(word in query.lower() for word in ['shelter', 'evacuation']):
-        if not st.session_state.user_address:
-            response = """<div class="info-card">
+    return {
+        "response": response,
+        "reasoning": {"step": "Tool Selection",
+                      "thought": "Accessing FEMA database" + ("; checked eligibility rules against your address"
+                                                             if checked else "")},
+        "tool": {"tool": "FEMA Assistance Database", "query": "Eligibility and process"}
+    }
+
+
+def shelter_tool(context):
+    """Shelters near the user's address, or a prompt for the address"""
+    if not context['user_address']:
+        response = """<div class="info-card">
 <h3>🏠 Find Emergency Shelters</h3>
 <p>Locate safe havens within 50 miles of your location</p>
 </div>
@@ -786,30 +899,30 @@ Apply within 60 days • Document all damage • Keep receipts
 <div class="highlight-box">
 Enter your address or ZIP code below to see all available emergency shelters on an interactive map.
 </div>"""
-            needs_input = "address"
-        else:
-            reasoning.append({
-                "step": "Tool Selection",
-                "thought": "Searching 50-mile radius"
-            })
-
-            tools_used.append({
-                "tool": "Emergency Shelter Database",
-                "query": f"Near {st.session_state.user_address}"
-            })
-            time.sleep(0.2)
-
-            show_map = True
+        return {"response": response, "needs_input": "address"}
+
+    # A ZIP code in the table is answered with one lookup; anything else uses the regional list
+    zip_code = zip_of(context['user_address'])
+    nearest = ZIP_TABLE.lookup(zip_code) if ZIP_TABLE is not None and zip_code else None
+    if nearest:
+        by_key = {shelter_key(shelter): shelter for entries in SHELTER_DATA.values() for shelter in entries}
+        shelters = [dict(by_key[key], distance=f"{miles:.1f} miles") for key, miles in nearest if key in by_key]
+        thought = f"Nearest open shelters to ZIP {zip_code:05d} from the precomputed table"
+    else:
+        time.sleep(0.2)
+        # Plain dicts: the answer is stored with the session and logged
+        shelters = [dict(shelter) for shelter in SHELTER_DATA["Sunnyvale, CA"]]
+        thought = "Searching 50-mile radius"
 
-            response = f"""<div class="info-card info-card-success">
+    response = f"""<div class="info-card info-card-success">
 <h3>🏠 Emergency Shelters Found</h3>
-<p><strong>Your Location:</strong> {st.session_state.user_address}<br>
+<p><strong>Your Location:</strong> {context['user_address']}<br>
 <strong>Search Radius:</strong> 50 miles</p>
 </div>
 
 """
-            for idx, shelter in enumerate(SHELTER_DATA["Sunnyvale, CA"], 1):
-                response += f"""<div class="checklist-item">
+    for idx, shelter in enumerate(shelters, 1):
+        response += f"""<div class="checklist-item">
 <strong>{idx}. {shelter['name']}</strong><br>
 📍 {shelter['address']} • 📏 {shelter['distance']}<br>
 📞 {shelter['phone']} • 👥 {shelter['capacity']}<br>
@@ -818,23 +931,39 @@ Enter your address or ZIP code below to see all available emergency shelters on
 
 """
 
-            response += """<div class="highlight-box-warning">
+    response += """<div class="highlight-box-warning">
 <strong>What to Bring to Shelter</strong><br><br>
 Photo ID • Medications • Bedding • Toiletries • Phone charger • Cash
 </div>
 
 <strong>📱 Resources:</strong> Call 211 for real-time availability • <a href="https://www.redcross.org/get-help/disaster-relief-and-recovery-services/find-an-open-shelter.html" target="_blank" style="color: #3b82f6; text-decoration: underline;">redcross.org/shelter</a>"""
 
-    # Go-bag queries
-    elif any(word in query.lower() for word in ['go bag', 'go-bag', 'emergency kit', 'prepare', 'pack', 'kit']):
-        if not st.session_state.household_info:
-            response = f"""<div class="info-card">
+    return {
+        "response": response,
+        "reasoning": {"step": "Tool Selection", "thought": thought},
+        "tool": {"tool": "Emergency Shelter Database", "query": f"Near {context['user_address']}"},
+        # The map shows the shelters this answer lists
+        "show_map": shelters
+    }
+
+
+def go_bag_image_html():
+    """The go-bag photo: responsive vendored copies when built, the remote URL otherwise"""
+    style = "max-width: 600px; border-radius: 12px;"
+    picture = ASSETS.picture('go-bag', GO_BAG_IMAGE, "Emergency Go-Bag", style) if ASSETS is not None else None
+    return picture or f'<img src="{GO_BAG_IMAGE}" alt="Emergency Go-Bag" style="{style}">'
+
+
+def kit_tool(context):
+    """Personalized go-bag checklist, or a prompt for the household size"""
+    if not context['household_info']:
+        response = f"""<div class="info-card">
 <h3>🎒 Build Your Emergency Kit</h3>
 <p>Personalized checklist for your household</p>
 </div>
 
 <div class="image-container">
-<img src="{GO_BAG_IMAGE}" alt="Emergency Go-Bag" style="max-width: 600px; border-radius: 12px;">
+{go_bag_image_html()}
 <p class="image-caption">A well-stocked emergency go-bag ready for any situation</p>
 </div>
 
@@ -842,72 +971,62 @@ Photo ID • Medications • Bedding • Toiletries • Phone charger • Cash
 <strong>Tell us about your household</strong><br><br>
 Enter the number of adults, children, and pets below to get a customized emergency kit checklist.
 </div>"""
-            needs_input = "household"
-        else:
-            reasoning.append({
-                "step": "Personalization",
-                "thought": "Generating custom checklist"
-            })
+        return {"response": response, "needs_input": "household"}
 
-            tools_used.append({
-                "tool": "Emergency Kit Generator",
-                "query": f"Household: {st.session_state.household_info}"
-            })
-            time.sleep(0.2)
+    time.sleep(0.2)
 
-            info = st.session_state.household_info
-            total_people = info['adults'] + info['children']
+    info = context['household_info']
 
-            response = f"""<div class="info-card info-card-success">
+    response = f"""<div class="info-card info-card-success">
 <h3>🎒 Your Personalized Emergency Kit</h3>
 <p><strong>Household:</strong> {info['adults']} adults • {info['children']} children • {info['pets']} pets<br>
 <strong>Total Items:</strong> {len(GO_BAG_ESSENTIALS['base']) + (info['adults'] * len(GO_BAG_ESSENTIALS['per_adult'])) + (info['children'] * len(GO_BAG_ESSENTIALS['per_child'])) + (info['pets'] * len(GO_BAG_ESSENTIALS['per_pet']))} items</p>
 </div>
 
 <div class="image-container">
-<img src="{GO_BAG_IMAGE}" alt="Emergency Go-Bag" style="max-width: 600px; border-radius: 12px;">
+{go_bag_image_html()}
 <p class="image-caption">Example of a well-organized emergency go-bag</p>
 </div>
 
 <div class="highlight-box">
 <strong>📦 Base Essentials (Everyone)</strong><br><br>
 """
-            for idx, item in enumerate(GO_BAG_ESSENTIALS['base'], 1):
-                response += f"{idx}. {item}<br>"
+    for idx, item in enumerate(GO_BAG_ESSENTIALS['base'], 1):
+        response += f"{idx}. {item}<br>"
 
-            response += "</div>"
+    response += "</div>"
 
-            if info['adults'] > 0:
-                response += f"""
+    if info['adults'] > 0:
+        response += f"""
 
 <div class="highlight-box-success">
 <strong>👤 For {info['adults']} Adult(s)</strong><br><br>
 """
-                for item in GO_BAG_ESSENTIALS['per_adult']:
-                    response += f"• {item}<br>"
-                response += "</div>"
+        for item in GO_BAG_ESSENTIALS['per_adult']:
+            response += f"• {item}<br>"
+        response += "</div>"
 
-            if info['children'] > 0:
-                response += f"""
+    if info['children'] > 0:
+        response += f"""
 
 <div class="highlight-box-success">
 <strong>👶 For {info['children']} Child(ren)</strong><br><br>
 """
-                for item in GO_BAG_ESSENTIALS['per_child']:
-                    response += f"• {item}<br>"
-                response += "</div>"
+        for item in GO_BAG_ESSENTIALS['per_child']:
+            response += f"• {item}<br>"
+        response += "</div>"
 
-            if info['pets'] > 0:
-                response += f"""
+    if info['pets'] > 0:
+        response += f"""
 
 <div class="highlight-box-success">
 <strong>🐾 For {info['pets']} Pet(s)</strong><br><br>
 """
-                for item in GO_BAG_ESSENTIALS['per_pet']:
-                    response += f"• {item}<br>"
-                response += "</div>"
+        for item in GO_BAG_ESSENTIALS['per_pet']:
+            response += f"• {item}<br>"
+        response += "</div>"
 
-            response += """
+    response += """
 
 <div class="highlight-box-warning">
 <strong>💡 Pro Tips</strong><br><br>
@@ -916,20 +1035,18 @@ Store near exit • Check every 6 months • Keep lightweight • Use waterproof
 
 <strong>📄 Download Checklist:</strong> <a href="https://www.ready.gov/kit" target="_blank" style="color: #3b82f6; text-decoration: underline;">Ready.gov/kit</a>"""
 
-    # Emergency Planning
-    elif any(word in query.lower() for word in ['plan', 'planning', 'communication']):
-        reasoning.append({
-            "step": "Tool Selection",
-            "thought": "Loading planning templates"
-        })
+    return {
+        "response": response,
+        "reasoning": {"step": "Personalization", "thought": "Generating custom checklist"},
+        "tool": {"tool": "Emergency Kit Generator", "query": f"Household: {info}"}
+    }
 
-        tools_used.append({
-            "tool": "Emergency Planning Database",
-            "query": "Family plans"
-        })
-        time.sleep(0.2)
 
-        response = """<div class="info-card">
+def plan_tool(context):
+    """Family emergency plan template"""
+    time.sleep(0.2)
+
+    response = """<div class="info-card">
 <h3>📋 Family Emergency Plan</h3>
 <p>Create a comprehensive communication and response strategy</p>
 </div>
@@ -962,20 +1079,18 @@ Insurance • Medical records • IDs • Financial documents • Property deeds
 
 <strong>📚 Resource:</strong> <a href="https://www.ready.gov/plan" target="_blank" style="color: #3b82f6; text-decoration: underline;">Ready.gov/plan</a>"""
 
-    # Alert System
-    elif any(word in query.lower() for word in ['alert', 'warning', 'notification']):
-        reasoning.append({
-            "step": "Tool Selection",
-            "thought": "Checking alert systems"
-        })
+    return {
+        "response": response,
+        "reasoning": {"step": "Tool Selection", "thought": "Loading planning templates"},
+        "tool": {"tool": "Emergency Planning Database", "query": "Family plans"}
+    }
 
-        tools_used.append({
-            "tool": "Emergency Alert System",
-            "query": "Current status"
-        })
-        time.sleep(0.2)
 
-        response = """<div class="info-card info-card-success">
+def alert_tool(context):
+    """Current alert status and sign-up channels"""
+    time.sleep(0.2)
+
+    response = """<div class="info-card info-card-success">
 <h3>⚠️ Emergency Alert Status</h3>
 <p><strong>Location:</strong> Sunnyvale, CA<br>
 <strong>Status:</strong> ✓ No Active Alerts<br>
@@ -998,11 +1113,23 @@ Insurance • Medical records • IDs • Financial documents • Property deeds
 4. Monitor official channels</p>
 </div>"""
 
-    # Disaster-specific
-    elif any(word in query.lower() for word in ['earthquake', 'fire', 'flood', 'disaster']):
-        disaster = next((d for d in ['earthquake', 'fire', 'flood'] if d in query.lower()), 'earthquake')
+    return {
+        "response": response,
+        "reasoning": {"step": "Tool Selection", "thought": "Checking alert systems"},
+        "tool": {"tool": "Emergency Alert System", "query": "Current status"}
+    }
+
+
+def disaster_for(text):
+    """Disaster guide named in the text, earthquake by default"""
+    return next((d for d in DISASTER_GUIDES if d in text), 'earthquake')
 
-        response = f"""<div class="info-card info-card-warning">
+
+def disaster_tool(context):
+    """Safety guide for the disaster named in the query (earthquake by default)"""
+    disaster = disaster_for(context['text'])
+
+    response = f"""<div class="info-card info-card-warning">
 <h3>🚨 {disaster.title()} Preparedness</h3>
 <p>Essential safety information</p>
 </div>
@@ -1010,39 +1137,365 @@ Insurance • Medical records • IDs • Financial documents • Property deeds
 <div class="highlight-box-warning">
 <strong>Immediate Actions</strong><br><br>
 """
-        if disaster == 'earthquake':
-            response += "🛡️ <strong>Drop, Cover, Hold On</strong><br>Get under sturdy furniture • Stay away from windows • If outdoors, move to open area"
-        elif disaster == 'fire':
-            response += "🔥 <strong>Get Out, Stay Out</strong><br>Exit immediately • Crawl under smoke • Feel doors before opening • Never use elevators"
-        elif disaster == 'flood':
-            response += "🌊 <strong>Move to Higher Ground</strong><br>Never drive through water • 6\" knocks you down • 12\" moves cars • Avoid floodwaters"
+    guide = DISASTER_GUIDES[disaster]
+    response += f"{guide['icon']} <strong>{guide['action']}</strong><br>{' • '.join(guide['steps'])}"
 
-        response += """</div>
+    response += """</div>
 
 <div class="highlight-box">
 <strong>Before Disaster</strong><br><br>
-• Secure furniture and appliances<br>
-• Know utility shut-offs<br>
-• Maintain emergency supplies<br>
-• Practice safety drills
+"""
+    response += "<br>\n".join(f"• {item}" for item in DISASTER_GENERAL['before'])
+
+    response += f"""
 </div>
 
 <div class="info-card">
 <h3>After the Disaster</h3>
-<p>Check for injuries • Inspect for damage • Avoid hazard areas • Document losses • Contact FEMA if needed</p>
+<p>{' • '.join(DISASTER_GENERAL['after'])}</p>
 </div>
 
 <strong>📚 Learn More:</strong> <a href="https://www.ready.gov/{disaster}" target="_blank" style="color: #3b82f6; text-decoration: underline;">Ready.gov/{disaster}</a>"""
 
-    else:
+    return {"response": response}
+
+
+def search_tool(context):
+    """BM25 search over the preparedness guidance for queries no intent matched"""
+    hits = snapshot.search_index_for(KNOWLEDGE).search(context['search_text'], k=3, min_score=MIN_SEARCH_SCORE)
+    if not hits:
         response = """<div class="info-card">
 <h3>How Can I Help?</h3>
 <p>Choose a service from the menu above or ask me about emergency preparedness topics.</p>
 </div>"""
+        return {"response": response}
+
+    response = """<div class="info-card">
+<h3>📚 Preparedness Guidance</h3>
+<p>The most relevant guidance we have for your question</p>
+</div>
+
+"""
+    for hit in hits:
+        source = escape(hit['source'])
+        if hit['url']:
+            source = f'<a href="{escape(hit["url"])}" target="_blank" style="color: #3b82f6; text-decoration: underline;">{source}</a>'
+        response += f"""<div class="checklist-item">
+<strong>{escape(hit['title'])}</strong><br>
+{escape(hit['text'])}<br>
+<small>Source: {source}</small>
+</div>
+
+"""
+    response += """<strong>💡 Tip:</strong> Choose a service from the menu above for personalized help."""
+
+    return {
+        "response": response,
+        "reasoning": {"step": "Tool Selection", "thought": "No direct match; searching preparedness guidance"},
+        "tool": {"tool": "Preparedness Knowledge Search", "query": context['query']}
+    }
+
+
+def degraded_answer(title, body):
+    """Short answer shown when a tool misses its deadline and nothing is cached"""
+    return {"response": f"""<div class="highlight-box-warning">
+<strong>⏳ {title} is responding slowly</strong><br><br>
+{body}
+</div>"""}
+
+
+# Tool behind each intent, in the order their answers are shown:
+# (function, label, cache key, degraded fallback)
+INTENT_TOOLS = {
+    'fema': (fema_tool, "FEMA Assistance Database", lambda context: context['user_address'],
+             lambda context: degraded_answer("The FEMA database",
+                                             "Call 1-800-621-FEMA (3362) or apply at DisasterAssistance.gov")),
+    'shelter': (shelter_tool, "Emergency Shelter Database", lambda context: context['user_address'],
+                lambda context: degraded_answer("The shelter database",
+                                                "Call 211 for open shelters near you, or check redcross.org/shelter")),
+    'kit': (kit_tool, "Emergency Kit Generator", lambda context: repr(context['household_info']),
+            lambda context: degraded_answer("The kit generator", "The standard checklist is at Ready.gov/kit")),
+    'plan': (plan_tool, "Emergency Planning Database", None,
+             lambda context: degraded_answer("The planning database", "Plan templates are at Ready.gov/plan")),
+    'alert': (alert_tool, "Emergency Alert System", None,
+              lambda context: degraded_answer("The alert system",
+                                              "Follow official instructions and check alertscc.org or weather.gov")),
+    'disaster': (disaster_tool, "Disaster Guides", lambda context: disaster_for(context['text']),
+                 lambda context: degraded_answer("The disaster guides", "Safety guides are at Ready.gov")),
+    'search': (search_tool, "Preparedness Knowledge Search", lambda context: context['search_text'],
+               lambda context: degraded_answer("Guidance search",
+                                               "Choose a service from the menu above for help"))
+}
+
+
+def run_tool(intent, part, context):
+    """Call the current run's tool function, cache key or fallback (part 0, 2 or 3 of its INTENT_TOOLS entry)"""
+    return context['tools'][intent][part](context)
+
+
+@st.cache_resource
+def get_tool_runtime():
+    """Tool runtime shared by all sessions in this process, with the intent tools registered once
+
+    Every script run has its own globals, so the registered callables look the
+    tool up in the run's context and each query sees its own run's knowledge.
+    """
+    runtime = ToolRuntime(workers=TOOL_WORKERS)
+    for intent, (_, label, cache_key, _) in INTENT_TOOLS.items():
+        runtime.register(intent, functools.partial(run_tool, intent, 0), label=label,
+                         fallback=functools.partial(run_tool, intent, 3),
+                         cache_key=functools.partial(run_tool, intent, 2) if cache_key else None)
+    return runtime
+
+
+TOOL_RUNTIME = get_tool_runtime()
+
+
+@st.cache_resource
+def get_single_flight():
+    """Coalescing layer shared by all sessions in this process"""
+    return SingleFlight(wait_timeout=FLIGHT_WAIT)
+
+
+SINGLE_FLIGHT = get_single_flight()
+
+
+def refresh_zip_table():
+    """Recompute the ZIP rows a shelter change can affect (knowledge swap callback)"""
+    if ZIP_TABLE is not None:
+        ZIP_TABLE.refresh_from(snapshot.load_knowledge()['shelters'],
+                               nearest=functools.partial(COMPUTE_POOL.run, 'nearest_shelters'))
+
+
+def refresh_address_index():
+    """Rewrite the address index's shelter entries and map it afresh on the next run (knowledge swap callback)"""
+    index = load_index(snapshot.load_knowledge()['shelters'])
+    if index is not None:
+        index.close()
+    get_address_index.clear()
+
+
+@st.cache_resource
+def get_knowledge_watcher():
+    """Background hot reload of data/knowledge.json, shared by all sessions in this process
+
+    Each run reads KNOWLEDGE once at its start, so a swap never changes data
+    under a run in flight; answers cached from the old version are dropped.
+    """
+    return KnowledgeWatcher(on_swap=[TOOL_RUNTIME.clear_cache, SURGE.clear_answers, refresh_zip_table,
+                                     refresh_address_index]).start()
+
+
+KNOWLEDGE_WATCHER = get_knowledge_watcher()
+
+
+@st.cache_resource
+def get_compute_pool():
+    """Worker processes for CPU-heavy rendering, shared by all sessions in this process"""
+    return ComputePool()
+
+
+COMPUTE_POOL = get_compute_pool()
+
+
+@st.cache_resource
+def get_zip_table():
+    """Nearest open shelters per ZIP code, loaded (or built) once per process"""
+    return load_table(snapshot.load_knowledge()['shelters'],
+                      nearest=functools.partial(COMPUTE_POOL.run, 'nearest_shelters'))
+
+
+ZIP_TABLE = get_zip_table()
+
+
+@st.cache_resource
+def get_address_index():
+    """Memory-mapped address autocomplete index, shared by all sessions in this process"""
+    return load_index(snapshot.load_knowledge()['shelters'])
+
+
+ADDRESS_INDEX = get_address_index()
+
+
+@st.cache_resource
+def get_session_ledger():
+    """Memory footprint of every live session in this process, for the operator view"""
+    return SessionLedger()
+
+
+SESSION_LEDGER = get_session_ledger()
+
+# Approximate memory each session may hold before its oldest turns are compacted or evicted
+SESSION_BUDGET = budget_bytes()
+
+def simulate_thinking(query, context=None):
+    """Simulate agent reasoning process
+
+    Every intent found in the query gets its tool; they run concurrently on
+    the tool runtime and their answers are merged in intent order. A tool
+    that misses its deadline contributes a cached or degraded answer.
+    context may supply user_address and household_info (read from the
+    session otherwise) since tools run outside the script thread.
+    """
+    reasoning = []
+    tools_used = []
+
+    reasoning.append({
+        "step": "Query Analysis",
+        "thought": f"Analyzing: '{query}'"
+    })
+    time.sleep(0.2)
+
+    text, corrections = snapshot.speller(ROUTING_VOCABULARY, KNOWLEDGE).correct_text(query)
+    if corrections:
+        reasoning.append({
+            "step": "Spelling Correction",
+            "thought": ", ".join(f"'{typed}' → '{fixed}'" for typed, fixed in corrections)
+        })
+
+    context = dict(context or {})
+    for name in ('user_address', 'household_info'):
+        if name not in context:
+            context[name] = st.session_state[name]
+    # Search sees the words as typed plus their corrections, so a wrong correction can't hide a match
+    context.update(query=query, text=text, tools=INTENT_TOOLS,
+                   search_text=" ".join([query.lower()] + [fixed for _, fixed in corrections]))
+
+    intents = detect_intents(text)
+    if len(intents) > 1:
+        reasoning.append({
+            "step": "Intent Detection",
+            "thought": f"{len(intents)} requests found ({', '.join(intents)}); running their tools concurrently"
+        })
+
+    start = time.perf_counter()
+    names = intents or ['search']
+    results = TOOL_RUNTIME.run(names, context, deadline=QUERY_DEADLINE)
+    wall_ms = (time.perf_counter() - start) * 1000
+
+    for name, result in zip(names, results):
+        timing = f"{result['elapsed_ms']:.0f} ms"
+        if result['status'] != 'ok':
+            label = INTENT_TOOLS[name][1]
+            reasoning.append({
+                "step": "Fallback",
+                "thought": f"{label}: {result['status']} after {timing}; showing {result['fallback']} answer"
+            })
+            tools_used.append({"tool": label, "query": f"{result['status']} ({result['fallback']} answer)",
+                               "time_ms": round(result['elapsed_ms'], 1), "status": result['status']})
+            continue
+        if result.get('reasoning'):
+            step = dict(result['reasoning'])
+            step['thought'] = f"{step['thought']} ({timing})"
+            reasoning.append(step)
+        if result.get('tool'):
+            tools_used.append(dict(result['tool'], time_ms=round(result['elapsed_ms'], 1)))
+
+    if len(results) > 1:
+        reasoning.append({
+            "step": "Merge",
+            "thought": f"Combined {len(results)} answers in {wall_ms:.0f} ms "
+                       f"(tools total {sum(r['elapsed_ms'] for r in results):.0f} ms)"
+        })
+
+    response = "\n\n".join(result['response'] for result in results)
+    # The shelters to map (only the shelter tool asks for a map), or False
+    show_map = next((result['show_map'] for result in results if result.get('show_map')), False)
+    # Every follow-up form the tools asked for, in tool order ("kit and shelter" gets both)
+    needs_input = list(dict.fromkeys(result['needs_input'] for result in results if result.get('needs_input')))
+    needs_input = needs_input or None
 
     return response, reasoning, tools_used, show_map, needs_input
 
 
+def routed_intents(query):
+    """Intents of the spelling-corrected question, as simulate_thinking routes it"""
+    text, _ = snapshot.speller(ROUTING_VOCABULARY, KNOWLEDGE).correct_text(query)
+    return detect_intents(text) or ['search']
+
+
+def busy_answer(query, context):
+    """Short answer for a session turned away by a full admission queue"""
+    intents = routed_intents(query)
+    parts = ["""<div class="highlight-box-warning">
+<strong>🚦 Very high demand right now</strong><br><br>
+We're helping a lot of people at once, so here is the short answer. Try again in a minute for the full one.
+In a life-threatening emergency, call 911.
+</div>"""]
+    parts += [INTENT_TOOLS[intent][3](context)['response'] for intent in intents]
+    reasoning = [{"step": "Surge Mode", "thought": "Admission queue full; showing the short answer"}]
+    return "\n\n".join(parts), reasoning, [], False, None
+
+
+def admitted_thinking(key, query, context, notice=None):
+    """simulate_thinking once admitted by the surge controller; remembers full answers for surge mode"""
+    ticket = SURGE.enter()
+    if ticket is None:
+        return busy_answer(query, context)
+    try:
+        while not SURGE.wait(ticket, QUEUE_POLL):
+            if time.monotonic() - ticket.enqueued_at > QUEUE_MAX_WAIT:
+                return busy_answer(query, context)
+            if notice is not None:
+                notice.info(f"🚦 High demand: you are number {SURGE.position(ticket)} in line. "
+                            "Your answer will appear here.")
+        result = simulate_thinking(query, context)
+    finally:
+        SURGE.leave(ticket)
+    if not any(tool.get('status') for tool in result[2]):
+        SURGE.remember(key, result)
+    return result
+
+
+def answer_query(query, notice=None):
+    """simulate_thinking, shared with any session already answering the same question
+
+    The key is the normalized question plus the session context the answer
+    depends on, so only truly identical computations are coalesced. In surge
+    mode a recent saved answer is served without computing at all. The question's
+    intents are counted here, once per question however it ends up answered.
+    """
+    ANALYTICS.record_intents(routed_intents(query))
+    context = {
+        'user_address': st.session_state.user_address,
+        'household_info': st.session_state.household_info
+    }
+    key = flight_key(query, context)
+    saved = SURGE.cached(key) if IN_SURGE else None
+    if saved is not None:
+        computed_at, (response, reasoning, tools, show_map, needs_input) = saved
+        reasoning = reasoning + [{
+            "step": "Surge Mode",
+            "thought": f"High demand: served the saved answer from {datetime.fromtimestamp(computed_at):%H:%M}"
+        }]
+        return response, reasoning, tools, show_map, needs_input
+
+    result, shared = SINGLE_FLIGHT.do(key, admitted_thinking, key, query, context, notice)
+    response, reasoning, tools, show_map, needs_input = result
+    if shared:
+        reasoning = reasoning + [{
+            "step": "Shared Answer",
+            "thought": "The same question was already being answered for another user; reused that result"
+        }]
+    return response, reasoning, tools, show_map, needs_input
+
+
+def client_is_slow():
+    """True when the browser's request headers signal Save-Data or a slow connection"""
+    context = getattr(st, 'context', None)
+    return is_low_bandwidth(context.headers if context is not None else None)
+
+
+def use_static_map():
+    """Static SVG map when chosen in the sidebar, when folium is missing, or on slow connections"""
+    style = st.session_state.get('map_style', 'Auto')
+    if style == 'Lightweight' or not FOLIUM_AVAILABLE or IN_SURGE:
+        return True
+    if style == 'Interactive':
+        return False
+    return client_is_slow()
+
+
 def display_message(msg):
     """Display a chat message"""
     with st.container():
@@ -1050,20 +1503,39 @@ def display_message(msg):
             st.markdown(f'<div class="message-container"><div class="message-user">{msg["content"]}</div></div>',
                         unsafe_allow_html=True)
         else:
-            st.markdown(f'<div class="message-container"><div class="message-assistant">{msg["content"]}</div></div>',
+            lightweight = st.session_state.low_bandwidth or IN_SURGE
+            content = compact_html(msg["content"]) if lightweight else msg["content"]
+            st.markdown(f'<div class="message-container"><div class="message-assistant">{content}</div></div>',
                         unsafe_allow_html=True)
 
-            if msg.get('show_map') and FOLIUM_AVAILABLE:
+            if msg.get('show_map') and st.session_state.low_bandwidth:
+                st.caption("🗺️ Map hidden in low-bandwidth mode; shelter addresses are listed above.")
+            elif msg.get('show_map'):
+                # Messages saved before answers carried their shelters hold True
+                shelters = msg['show_map'] if isinstance(msg['show_map'], list) else SHELTER_DATA["Sunnyvale, CA"]
                 st.markdown("---")
-                shelter_map = create_shelter_map(SHELTER_DATA["Sunnyvale, CA"])
-                if shelter_map:
-                    st_folium(shelter_map, width=700, height=500)
+                if use_static_map():
+                    with PROFILER.phase("  map build (static)"):
+                        shelter_map = render_shelter_map(shelters)
+                        st.session_state.map_bytes = len(shelter_map)
+                        st.markdown(f'<div class="image-container">{shelter_map}</div>',
+                                    unsafe_allow_html=True)
+                else:
+                    with PROFILER.phase("  map build (folium)"):
+                        shelter_map = create_shelter_map(shelters, tiles=tile_url())
+                        if shelter_map:
+                            st.session_state.map_bytes = len(shelter_map)
+                            if hasattr(st, 'iframe'):
+                                st.iframe(shelter_map, height=500)
+                            else:
+                                st.components.v1.html(shelter_map, height=500)
                 st.markdown("---")
 
             if msg.get('tools_used') and st.session_state.reasoning_visible:
                 with st.expander("🔧 Tools Used", expanded=False):
                     for tool in msg['tools_used']:
-                        st.info(f"**{tool['tool']}**\nQuery: {tool['query']}")
+                        timing = f" • {tool['time_ms']:.0f} ms" if 'time_ms' in tool else ""
+                        st.info(f"**{tool['tool']}**{timing}\nQuery: {tool['query']}")
 
             if msg.get('reasoning') and st.session_state.reasoning_visible:
                 with st.expander("🧠 Agent Reasoning", expanded=False):
@@ -1071,6 +1543,110 @@ def display_message(msg):
                         st.success(f"**{step['step']}:** {step['thought']}")
 
 
+def enforce_session_budget():
+    """Compact, then evict, the oldest turns when this session is over its memory budget"""
+    footprint = session_footprint(st.session_state)
+    messages, compacted, evicted = enforce_budget(st.session_state.messages, SESSION_BUDGET,
+                                                  sum(footprint.values()) - footprint['messages'])
+    if compacted or evicted:
+        st.session_state.messages = messages
+        st.session_state.compacted_turns += compacted
+        st.session_state.evicted_turns += evicted
+
+
+def account_session():
+    """Report this session's current footprint to the process-wide ledger"""
+    SESSION_LEDGER.update(st.session_state.session_id, session_footprint(st.session_state),
+                          turns=len(st.session_state.messages), compacted=st.session_state.compacted_turns,
+                          evicted=st.session_state.evicted_turns)
+
+
+def show_session_memory():
+    """Operator view: the heaviest sessions in this process and their footprint by category"""
+    totals = SESSION_LEDGER.totals()
+    st.caption(f"{totals['sessions']} sessions • {totals['bytes'] / 1024:.0f} KB total • "
+               f"budget {SESSION_BUDGET / 1024:.0f} KB each • {totals['compacted']} turns compacted • "
+               f"{totals['evicted']} evicted")
+    rows = "\n".join(
+        f"| {entry['session_id'][:8]}{' (you)' if entry['session_id'] == st.session_state.session_id else ''} "
+        f"| {entry['turns']} | {entry['footprint']['messages'] / 1024:.1f} "
+        f"| {entry['footprint']['maps'] / 1024:.1f} | {entry['footprint']['household'] / 1024:.1f} "
+        f"| {entry['footprint']['profiles'] / 1024:.1f} | **{entry['bytes'] / 1024:.1f}** "
+        f"| {entry['compacted']}/{entry['evicted']} | {datetime.fromtimestamp(entry['seen_at']):%H:%M:%S} |"
+        for entry in SESSION_LEDGER.heaviest())
+    st.markdown("| Session | Turns | Messages KB | Maps KB | Household KB | Profiles KB | Total KB "
+                f"| Compacted/evicted | Seen |\n|---|---:|---:|---:|---:|---:|---:|---:|---|\n{rows}")
+
+
+def show_analytics():
+    """Live dashboard: question rates, distinct users, intent mix and top locations"""
+    report = live_report(ANALYTICS)
+    rates = report['rates']['queries']
+    st.caption(f"{report['queries']} questions in the last hour • ~{report['users']} distinct users • "
+               f"{rates['1 min'] * 60:.1f}/min now, {rates['1 hour'] * 60:.1f}/min over the hour")
+    for title, name in (("Intent mix", 'intents'), ("Top ZIP codes", 'zips'), ("Top addresses", 'addresses')):
+        if report[name]:
+            total = report['intent_total'] if name == 'intents' else None
+            st.markdown(f"**{title}**\n" + "\n".join(
+                f"- {key}: {count}" + (f" ({count / total:.0%})" if total else "") for key, count in report[name]))
+
+
+def request_profile():
+    """Ask for a profile of the next run (button callback)"""
+    st.session_state.profile_request = {'capture': st.session_state.profile_capture, 'wait': True}
+
+
+def record_run(interrupted=False):
+    """Keep this run's timings (and any captured profile) for the developer panel"""
+    if not (PROFILER.enabled or PROFILER.capture):
+        return None
+    summary = PROFILER.finish()
+    if 'interrupted' not in summary:
+        summary['interrupted'] = interrupted
+        runs = st.session_state.setdefault('profile_runs', [])
+        runs.append(summary)
+        del runs[:-PROFILE_HISTORY]
+        if 'profile' in summary:
+            st.session_state.last_profile = summary
+    return summary
+
+
+def show_dev_panel(placeholder, summary):
+    """Phase breakdown of this run, earlier runs and profile capture controls"""
+    with placeholder.container():
+        st.markdown(f"**This run: {summary['total_ms']:.0f} ms**")
+        rows = "\n".join(f"| {name} | {ms:.1f} | {ms / summary['total_ms']:.0%} |"
+                         for name, ms in summary['phases'])
+        st.markdown(f"| Phase | ms | Share |\n|---|---:|---:|\n{rows}")
+
+        for run in reversed(st.session_state.profile_runs[:-1]):
+            slowest = max(run['phases'], key=lambda p: p[1], default=("-", 0))
+            ended = "rerun" if run['interrupted'] else "complete"
+            st.caption(f"{datetime.fromtimestamp(run['finished_at']):%H:%M:%S} • {run['total_ms']:.0f} ms "
+                       f"({ended}) • slowest: {slowest[0].strip()} {slowest[1]:.0f} ms")
+
+        st.radio("Profiler", ["cProfile", "sampling"], key="profile_capture", horizontal=True)
+        pending = st.session_state.get('profile_request')
+        st.button("⏺️ Profile next run", use_container_width=True, on_click=request_profile,
+                  disabled=bool(pending), help="Captures the next rerun, e.g. the next question you ask")
+        if pending:
+            st.caption(f"Waiting to capture the next run with {pending['capture']}…")
+
+        profile = st.session_state.get('last_profile')
+        if profile:
+            cprofile = profile['capture'] == 'cProfile'
+            st.download_button(
+                "⬇️ Download profile",
+                data=profile['profile'],
+                file_name=f"run-{profile['finished_at']:.0f}.{'prof' if cprofile else 'collapsed.txt'}",
+                mime="application/octet-stream" if cprofile else "text/plain",
+                use_container_width=True,
+                help="Open with snakeviz / pstats" if cprofile else "Collapsed stacks for flamegraph.pl or speedscope"
+            )
+            with st.expander(f"{profile['capture']} summary ({profile['total_ms']:.0f} ms run)", expanded=False):
+                st.code(profile['profile_text'], language=None)
+
+
 def handle_user_input(query):
     """Handle user input"""
     if not st.session_state.is_thinking:
@@ -1080,6 +1656,18 @@ def handle_user_input(query):
             "timestamp": datetime.now()
         })
         st.session_state.is_thinking = True
+        persist_session_state()
+        log_turn("user", query)
+        trace_input("question", query)
+        ANALYTICS.record_query(st.session_state.session_id, query)
+
+
+def submit_user_input():
+    """Send the chat box contents and clear it so reruns don't resubmit"""
+    query = st.session_state.user_input_field
+    st.session_state.user_input_field = ""
+    if query:
+        handle_user_input(query)
 
 
 def show_main_menu():
@@ -1128,7 +1716,8 @@ def show_main_menu():
 
 def main():
     """Main application"""
-    initialize_session_state()
+    with PROFILER.phase("session init"):
+        initialize_session_state()
 
     # Beautiful Header
     st.markdown("""
@@ -1138,6 +1727,10 @@ def main():
         </div>
     """, unsafe_allow_html=True)
 
+    if IN_SURGE:
+        st.warning("🚦 **High demand mode.** Pages are lighter and maps are static while many people "
+                   "are using this service. In a life-threatening emergency, call 911.")
+
     # Sidebar
     with st.sidebar:
         st.markdown("### 🚀 QUICK ACCESS")
@@ -1198,37 +1791,109 @@ def main():
             value=False
         )
 
+        st.checkbox(
+            "📶 Low-bandwidth mode",
+            key="low_bandwidth",
+            help="Text-first answers without images or maps; on by default for slow connections"
+        )
+
+        st.selectbox(
+            "🗺️ Map style",
+            ["Auto", "Interactive", "Lightweight"],
+            key="map_style",
+            help="Lightweight draws a small static map; Auto picks it on slow connections"
+        )
+
+        # Only for operators: it shows other sessions' memory and what everyone asks about
+        if st.session_state.get('operator'):
+            st.checkbox(
+                "🛠️ Developer panel",
+                key="dev_panel",
+                help="Timing breakdown of each run, with on-demand cProfile or sampling captures"
+            )
+        dev_panel = st.empty() if st.session_state.get('operator') and st.session_state.get('dev_panel') else None
+        if dev_panel is not None:
+            with st.expander("🧮 Session Memory", expanded=False):
+                show_session_memory()
+            with st.expander("📊 Live Analytics", expanded=False):
+                show_analytics()
+
+        if st.session_state.reasoning_visible:
+            with st.expander("🩺 Tool Health", expanded=False):
+                for name, stats in TOOL_RUNTIME.stats().items():
+                    if stats['calls']:
+                        st.caption(f"**{INTENT_TOOLS[name][1]}** • {stats['calls']} calls • "
+                                   f"p50 {stats['p50_ms']:.0f} ms • p95 {stats['p95_ms']:.0f} ms • "
+                                   f"{stats['timeouts']} timeouts • {stats['errors']} errors • "
+                                   f"{stats['cached_fallbacks'] + stats['degraded_fallbacks']} fallbacks")
+                flights = SINGLE_FLIGHT.stats()
+                st.caption(f"**Coalescing** • {flights['calls']} questions • {flights['executions']} computed • "
+                           f"{flights['coalesced']} shared ({flights['coalesced_ratio']:.0%}) • "
+                           f"largest group {flights['largest_group']} • {flights['saved_seconds']:.1f}s saved")
+                load = SURGE.stats()
+                st.caption(f"**Surge mode {'ON' if load['surge'] else 'off'}** ({load['mode']}) • "
+                           f"{load['answering']} answering • {load['waiting']} waiting • "
+                           f"run p95 {load['latency_p95_ms']:.0f} ms • {load['trips']} trips • "
+                           f"{load['rejected']} turned away • {load['cache_hits']} saved answers served")
+                data = KNOWLEDGE_WATCHER.status()
+                st.caption(f"**Knowledge** v{data['version']} • loaded "
+                           f"{datetime.fromtimestamp(data['loaded_at']):%H:%M:%S} • {data['reloads']} reloads"
+                           + (f" • ⚠️ rejected update: {data['last_error']}" if data['last_error'] else ""))
+                if ZIP_TABLE is not None:
+                    table = ZIP_TABLE.stats()
+                    st.caption(f"**ZIP shelter table** • {table['zips']} ZIPs • "
+                               f"{table['shelters']} open shelters • {table['refreshes']} refreshes • "
+                               f"{table['rows_recomputed']} rows recomputed")
+                pool = COMPUTE_POOL.stats()
+                st.caption(f"**Compute pool** • {pool['workers']} workers • {pool['pooled']} pooled • "
+                           f"{pool['inline']} inline • {pool['failures']} failures")
+
+        remember_session()
+
         if st.button("🔄 Clear conversation", use_container_width=True):
+            log_turn("event", "conversation cleared")
             st.session_state.messages = []
             st.session_state.is_thinking = False
             st.session_state.household_info = None
             st.session_state.user_address = None
+            st.session_state.compacted_turns = 0
+            st.session_state.evicted_turns = 0
+            persist_session_state()
             st.rerun()
 
     # Main menu - always visible
-    show_main_menu()
+    with PROFILER.phase("show_main_menu"):
+        show_main_menu()
 
     # Conversation area
     if len(st.session_state.messages) > 0:
         st.markdown('<div class="section-header">💬 Conversation</div>', unsafe_allow_html=True)
+        if st.session_state.evicted_turns:
+            st.caption(f"🧹 {st.session_state.evicted_turns} earlier messages were cleared to keep this "
+                       f"session light.")
 
-        for message in st.session_state.messages:
-            display_message(message)
+        for i, message in enumerate(st.session_state.messages, 1):
+            with PROFILER.phase(f"display_message #{i} ({message['role']})"):
+                display_message(message)
 
         # Handle input requests
         if len(st.session_state.messages) > 0:
             last_msg = st.session_state.messages[-1]
-            if last_msg['role'] == 'assistant' and last_msg.get('needs_input'):
-                if last_msg['needs_input'] == 'household':
+            needs = last_msg.get('needs_input') if last_msg['role'] == 'assistant' else None
+            # Messages saved before several forms were possible hold a single name
+            needs = [needs] if isinstance(needs, str) else needs or []
+            if needs:
+                if 'household' in needs:
                     st.markdown("---")
                     st.markdown("### 👨‍👩‍👧‍👦 Tell Us About Your Household")
                     col1, col2, col3 = st.columns(3)
                     with col1:
-                        adults = st.number_input("👤 Adults", min_value=0, max_value=20, value=2)
+                        adults = st.number_input("👤 Adults", min_value=0, max_value=20, value=2, key="household_adults")
                     with col2:
-                        children = st.number_input("👶 Children", min_value=0, max_value=20, value=0)
+                        children = st.number_input("👶 Children", min_value=0, max_value=20, value=0,
+                                                   key="household_children")
                     with col3:
-                        pets = st.number_input("🐾 Pets", min_value=0, max_value=20, value=0)
+                        pets = st.number_input("🐾 Pets", min_value=0, max_value=20, value=0, key="household_pets")
 
                     if st.button("✨ Generate My Checklist", use_container_width=True):
                         st.session_state.household_info = {
@@ -1236,21 +1901,40 @@ def main():
                             'children': children,
                             'pets': pets
                         }
+                        trace_input("household", st.session_state.household_info)
                         handle_user_input(f"Create kit for {adults} adults, {children} children, {pets} pets")
                         st.rerun()
 
-                elif last_msg['needs_input'] == 'address':
+                if 'address' in needs:
                     st.markdown("---")
                     st.markdown("### 📍 Enter Your Location")
-                    address = st.text_input("Address or ZIP code", placeholder="e.g., 123 Main St, Sunnyvale, CA 94086")
+                    if SEARCHBOX_AVAILABLE and ADDRESS_INDEX is not None:
+                        # Suggestions on every keystroke, from the local index
+                        address = st_searchbox(address_suggestions, label="Address or ZIP code",
+                                               placeholder="e.g., 123 Main St, Sunnyvale, CA 94086",
+                                               key="address_search", default_use_searchterm=True)
+                    else:
+                        address = st.text_input("Address or ZIP code",
+                                                placeholder="e.g., 123 Main St, Sunnyvale, CA 94086",
+                                                key=ADDRESS_INPUT_KEY)
+                        suggestions = [] if not address or ADDRESS_INDEX is None or \
+                            ADDRESS_INDEX.contains(address) else address_suggestions(address)[:4]
+                        if suggestions:
+                            st.caption("Did you mean:")
+                            for i, (column, label) in enumerate(zip(st.columns(len(suggestions)), suggestions)):
+                                column.button(label, key=f"address_suggestion_{i}", on_click=choose_address,
+                                              args=(label,), use_container_width=True)
                     if st.button("🔍 Find Shelters", use_container_width=True):
                         if address:
                             st.session_state.user_address = address
+                            ANALYTICS.record_location(address)
+                            trace_input("address", address)
                             handle_user_input(f"Find shelters near {address}")
                             st.rerun()
 
         if st.session_state.is_thinking:
-            st.markdown("""
+            thinking = st.empty()
+            thinking.markdown("""
             <div class="thinking-container">
                 <div style="display: flex; align-items: center; gap: 1rem;">
                     <div class="thinking-dots">
@@ -1263,8 +1947,12 @@ def main():
             </div>
             """, unsafe_allow_html=True)
 
+            notice = st.empty()
             query = st.session_state.messages[-1]['content']
-            response, reasoning, tools, show_map, needs_input = simulate_thinking(query)
+            with PROFILER.phase("simulate_thinking"):
+                started = time.perf_counter()
+                response, reasoning, tools, show_map, needs_input = answer_query(query, notice)
+                trace_answer(query, (response, reasoning, tools, show_map, needs_input), started)
 
             st.session_state.messages.append({
                 "role": "assistant",
@@ -1277,21 +1965,30 @@ def main():
             })
 
             st.session_state.is_thinking = False
-            st.rerun()
+            with PROFILER.phase("memory budget"):
+                enforce_session_budget()
+            with PROFILER.phase("persist and log"):
+                persist_session_state()
+                log_turn("assistant", response, reasoning=reasoning, tools_used=tools,
+                         show_map=show_map, needs_input=needs_input)
+            if IN_SURGE and not needs_input:
+                # Surge mode saves the full rerun: the answer replaces the indicator in place
+                notice.empty()
+                with thinking.container():
+                    display_message(st.session_state.messages[-1])
+            else:
+                st.rerun()
 
         # Chat input
         st.markdown("---")
-        user_input = st.text_input(
+        st.text_input(
             "💬 Ask a question...",
             placeholder="E.g., How do I prepare for an earthquake?",
             label_visibility="collapsed",
-            key="user_input_field"
+            key="user_input_field",
+            on_change=submit_user_input
         )
 
-        if user_input and not st.session_state.is_thinking:
-            handle_user_input(user_input)
-            st.rerun()
-
     # Footer
     st.markdown("---")
     st.markdown("""
@@ -1301,6 +1998,17 @@ def main():
     </div>
     """, unsafe_allow_html=True)
 
+    with PROFILER.phase("session accounting"):
+        account_session()
+    summary = record_run()
+    if dev_panel is not None and summary:
+        show_dev_panel(dev_panel, summary)
+
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        SURGE.record_run(time.perf_counter() - RUN_STARTED)
+        # Runs cut short by st.rerun() are kept too; they are usually the slow ones
+        record_run(interrupted=True)
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+FEMA Screening - Batch pre-screening of applicants against the eligibility rules
+The eligibility criteria (declared disaster area, primary residence,
+uninsured loss, residency status) are data in data/knowledge.json under
+fema.rules. They are compiled into vectorized checks that run over an intake
+spreadsheet a block of columns at a time, so a million applicants screen in
+seconds with each one's failed rules and reasons streamed to the output. The
+chat answer checks what it knows about the user against the same rules.
+
+A row passes when every rule holds, fails when any rule is broken and needs
+review when no rule is broken but a value a rule needs is missing.
+
+Run with: python fema_screening.py intake.csv -o screened.csv [--column zip="ZIP Code"]
+"""
+
+import re
+import sys
+import csv
+import time
+import argparse
+from collections import Counter
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+
+from zip_shelters import zip_of
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.compute as pc
+
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# Rows per block read from the intake file
+CHUNK_ROWS = 262_144
+
+TEXT_OPS = ('in', 'not_in')
+FLAG_OPS = ('is_true', 'is_false')
+COMPARE_OPS = {'lt': np.less, 'le': np.less_equal, 'gt': np.greater, 'ge': np.greater_equal,
+               'eq': np.equal, 'ne': np.not_equal}
+OPS = TEXT_OPS + FLAG_OPS + tuple(COMPARE_OPS)
+TYPES = ('text', 'zip')
+
+TRUE_WORDS = frozenset({'y', 'yes', 'true', 't', '1', 'x'})
+FALSE_WORDS = frozenset({'n', 'no', 'false', 'f', '0'})
+NUMBER_JUNK_RE = re.compile(r'[$,\s]')
+RULE_ID_RE = re.compile(r'^[a-z][a-z0-9_]*$')
+
+PASS, FAIL, REVIEW = 'pass', 'fail', 'review'
+
+
+def _is_list(value):
+    # Loaded knowledge may be mapped from a data pack rather than plain lists and dicts
+    return isinstance(value, Sequence) and not isinstance(value, str)
+
+
+def rule_problems(rules, criteria=()):
+    """Every problem in a fema.rules list (empty when it is valid)"""
+    if not _is_list(rules) or not rules:
+        return ["fema.rules must be a non-empty list"]
+    problems = []
+    seen = set()
+    for i, rule in enumerate(rules):
+        where = f"fema.rules[{i}]"
+        if not isinstance(rule, Mapping):
+            problems.append(f"{where} must be a mapping")
+            continue
+        for field in ('id', 'criterion', 'column', 'op', 'reason'):
+            if not isinstance(rule.get(field), str) or not rule[field].strip():
+                problems.append(f"{where}.{field} must be a non-empty string")
+        rule_id, op = rule.get('id'), rule.get('op')
+        if isinstance(rule_id, str):
+            if not RULE_ID_RE.match(rule_id):
+                problems.append(f"{where}.id '{rule_id}' must be lowercase letters, digits and _")
+            elif rule_id in seen:
+                problems.append(f"{where}.id '{rule_id}' is used twice")
+            seen.add(rule_id)
+        if criteria and isinstance(rule.get('criterion'), str) and rule['criterion'] not in criteria:
+            problems.append(f"{where}.criterion must be one of fema.eligibility")
+        if op not in OPS:
+            problems.append(f"{where}.op must be one of {', '.join(OPS)}")
+        elif op in TEXT_OPS:
+            value = rule.get('value')
+            if not _is_list(value) or not value or not all(isinstance(v, str) and v.strip() for v in value):
+                problems.append(f"{where}.value must be a non-empty list of strings")
+            if rule.get('type', 'text') not in TYPES:
+                problems.append(f"{where}.type must be one of {', '.join(TYPES)}")
+        elif op in COMPARE_OPS:
+            value, other = rule.get('value'), rule.get('other')
+            if (other is None) == (value is None):
+                problems.append(f"{where} must compare against either a number 'value' or an 'other' column")
+            elif other is not None and not (isinstance(other, str) and other.strip()):
+                problems.append(f"{where}.other must be a column name")
+            elif value is not None and (not isinstance(value, (int, float)) or isinstance(value, bool)):
+                problems.append(f"{where}.value must be a number")
+    if len(rules) > 32:
+        problems.append("fema.rules may hold at most 32 rules")
+    return problems
+
+
+def normalize_text(value):
+    return ' '.join(value.split()).lower()
+
+
+def normalize_zip(value):
+    zip_code = zip_of(value)
+    return f"{zip_code:05d}" if zip_code is not None else ''
+
+
+def parse_flag(value):
+    """1.0 for yes, 0.0 for no, NaN when the value is neither"""
+    word = normalize_text(value)
+    return 1.0 if word in TRUE_WORDS else 0.0 if word in FALSE_WORDS else np.nan
+
+
+def parse_number(value):
+    try:
+        return float(NUMBER_JUNK_RE.sub('', value))
+    except ValueError:
+        return np.nan
+
+
+class Rule:
+    """One compiled rule: per-label checks, applied to a whole column by index"""
+
+    def __init__(self, spec, bit):
+        self.id = spec['id']
+        self.criterion = spec['criterion']
+        self.column = spec['column']
+        self.op = spec['op']
+        self.reason = spec['reason']
+        self.other = spec.get('other')
+        self.bit = bit
+        self.normalize = normalize_zip if spec.get('type') == 'zip' else normalize_text
+        if self.op in TEXT_OPS:
+            self.values = frozenset(self.normalize(value) for value in spec['value'])
+        else:
+            self.values = spec.get('value')
+
+    @property
+    def columns(self):
+        return (self.column, self.other) if self.other else (self.column,)
+
+    def _values(self, column, parse):
+        """Parsed values of a (codes, labels) column, NaN where missing or unreadable"""
+        codes, labels = column
+        parsed = np.fromiter((parse(label) for label in labels), dtype=np.float64, count=len(labels))
+        # Missing values (-1) pick up the NaN appended at the end
+        return np.append(parsed, np.nan)[codes]
+
+    def evaluate(self, columns):
+        """(broken, unknown) boolean arrays for one block of columns"""
+        if self.op in TEXT_OPS:
+            codes, labels = columns[self.column]
+            normalized = [self.normalize(label) for label in labels]
+            member = np.array([value in self.values for value in normalized] + [False])
+            known = np.array([bool(value) for value in normalized] + [False])
+            holds = member[codes] if self.op == 'in' else ~member[codes]
+            known = known[codes]
+            return ~holds & known, ~known
+        if self.op in FLAG_OPS:
+            flags = self._values(columns[self.column], parse_flag)
+            known = ~np.isnan(flags)
+            return known & (flags != (1.0 if self.op == 'is_true' else 0.0)), ~known
+        left = self._values(columns[self.column], parse_number)
+        right = self._values(columns[self.other], parse_number) if self.other else self.values
+        known = ~np.isnan(left) & ~np.isnan(right)
+        with np.errstate(invalid='ignore'):
+            return known & ~COMPARE_OPS[self.op](left, right), ~known
+
+
+class RuleSet:
+    """The compiled fema.rules list"""
+
+    def __init__(self, rules):
+        self.rules = [Rule(spec, 1 << i) for i, spec in enumerate(rules)]
+        self.columns = list(dict.fromkeys(name for rule in self.rules for name in rule.columns))
+        self.by_criterion = {rule.criterion: rule for rule in self.rules}
+
+    def evaluate(self, columns):
+        """(broken, unknown) uint32 bit masks, one bit per rule, for one block of columns"""
+        rows = len(next(iter(columns.values()))[0])
+        broken = np.zeros(rows, dtype=np.uint32)
+        unknown = np.zeros(rows, dtype=np.uint32)
+        for rule in self.rules:
+            rule_broken, rule_unknown = rule.evaluate(columns)
+            broken[rule_broken] |= rule.bit
+            unknown[rule_unknown & ~rule_broken] |= rule.bit
+        return broken, unknown
+
+    def explain(self, broken, unknown):
+        """(result, failed rule ids, reasons) for one pair of bit masks"""
+        failed = [rule for rule in self.rules if broken & rule.bit]
+        missing = [rule for rule in self.rules if unknown & rule.bit]
+        reasons = [rule.reason for rule in failed]
+        reasons += [f"{rule.criterion}: {', '.join(rule.columns)} missing" for rule in missing]
+        result = FAIL if failed else REVIEW if missing else PASS
+        return result, '|'.join(rule.id for rule in failed + missing), '; '.join(reasons)
+
+    def check(self, record):
+        """{rule id: True (holds), False (broken) or None (unknown)} for one applicant's values"""
+        columns = {name: ([0], [str(record[name])]) if record.get(name) not in (None, '') else ([-1], [])
+                   for name in self.columns}
+        columns = {name: (np.asarray(codes, dtype=np.intp), labels) for name, (codes, labels) in columns.items()}
+        broken, unknown = (int(mask[0]) for mask in self.evaluate(columns))
+        return {rule.id: None if unknown & rule.bit else not broken & rule.bit for rule in self.rules}
+
+
+def _factorize(values):
+    """(codes, labels) for a list of strings; empty strings become -1"""
+    index = {}
+    codes = np.fromiter((index.setdefault(value, len(index)) if value else -1 for value in values),
+                        dtype=np.intp, count=len(values))
+    return codes, list(index)
+
+
+def _arrow_blocks(path, names, id_column, chunk_rows):
+    # Everything is read as text, ids included, so they come back exactly as written
+    options = pacsv.ConvertOptions(column_types={name: pa.string() for name in names + [id_column] if name},
+                                   include_columns=[id_column] + names if id_column else names,
+                                   include_missing_columns=True, strings_can_be_null=True)
+    reader = pacsv.open_csv(path, read_options=pacsv.ReadOptions(block_size=chunk_rows * 64),
+                            convert_options=options)
+    for batch in reader:
+        columns = {}
+        for name in names:
+            encoded = batch.column(name).dictionary_encode()
+            codes = pc.fill_null(encoded.indices, -1).to_numpy(zero_copy_only=False).astype(np.intp)
+            columns[name] = (codes, encoded.dictionary.to_pylist())
+        yield batch.column(id_column).to_pylist() if id_column else None, columns
+
+
+def _csv_blocks(path, names, id_column, chunk_rows):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        while True:
+            rows = [row for _, row in zip(range(chunk_rows), reader)]
+            if not rows:
+                return
+            columns = {name: _factorize([(row.get(name) or '').strip() for row in rows]) for name in names}
+            yield [row.get(id_column) for row in rows] if id_column else None, columns
+
+
+def read_blocks(path, names, id_column=None, chunk_rows=CHUNK_ROWS):
+    """Yield (ids or None, {column: (codes, labels)}) blocks of an intake CSV"""
+    blocks = _arrow_blocks if PYARROW_AVAILABLE else _csv_blocks
+    yield from blocks(path, list(names), id_column, chunk_rows)
+
+
+def screen(path, rules, mapping=None, id_column=None, chunk_rows=CHUNK_ROWS):
+    """Yield (ids, results, failed rule ids, reasons) lists for each block of an intake CSV
+
+    mapping renames rule columns to the file's headers ({'zip': 'ZIP Code'}).
+    Rows are numbered from 1 when there is no id column.
+    """
+    ruleset = rules if isinstance(rules, RuleSet) else RuleSet(rules)
+    mapping = mapping or {}
+    headers = {name: mapping.get(name, name) for name in ruleset.columns}
+    row = 0
+    for ids, columns in read_blocks(path, dict.fromkeys(headers.values()), id_column, chunk_rows):
+        broken, unknown = ruleset.evaluate({name: columns[header] for name, header in headers.items()})
+        # Few distinct outcomes per block: explain each once, then index
+        outcomes, inverse = np.unique(broken.astype(np.uint64) << np.uint64(32) | unknown, return_inverse=True)
+        explained = [ruleset.explain(int(key) >> 32, int(key) & 0xFFFFFFFF) for key in outcomes.tolist()]
+        picks = inverse.ravel().tolist()
+        if ids is None:
+            ids = list(range(row + 1, row + len(picks) + 1))
+        row += len(picks)
+        yield ids, *([explained[i][field] for i in picks] for field in range(3))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-screen an intake CSV against the FEMA eligibility rules")
+    parser.add_argument('intake', help="Applicant CSV")
+    parser.add_argument('-o', '--output', default='screened.csv', help="Output CSV path ('-' for stdout)")
+    parser.add_argument('--id', default='applicant_id', help="Applicant id column (row numbers if absent)")
+    parser.add_argument('--column', action='append', default=[], metavar='RULE_COLUMN=HEADER',
+                        help="Read a rule column from a differently named header")
+    parser.add_argument('--failed-only', action='store_true', help="Write only rows that fail or need review")
+    args = parser.parse_args()
+
+    import snapshot
+    fema = snapshot.load_knowledge()['fema']
+    problems = rule_problems(fema.get('rules'), fema.get('eligibility', ()))
+    if problems:
+        sys.exit("; ".join(problems))
+    ruleset = RuleSet(fema['rules'])
+    mapping = dict(item.split('=', 1) for item in args.column)
+    with open(args.intake, newline='', encoding='utf-8-sig') as f:
+        header = next(csv.reader(f), [])
+    id_column = args.id if args.id in header else None
+    missing = [mapping.get(name, name) for name in ruleset.columns if mapping.get(name, name) not in header]
+    if missing:
+        print(f"Columns not in {args.intake}: {', '.join(missing)} (rules that need them will ask for review)",
+              file=sys.stderr)
+
+    start = time.perf_counter()
+    counts = Counter()
+    flagged = Counter()
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', newline='')
+    try:
+        writer = csv.writer(out)
+        writer.writerow([args.id, 'result', 'failed_rules', 'reasons'])
+        for ids, results, failed, reasons in screen(args.intake, ruleset, mapping, id_column):
+            rows = zip(ids, results, failed, reasons)
+            writer.writerows((row for row in rows if row[1] != PASS) if args.failed_only else rows)
+            counts.update(results)
+            for rule_ids, hits in Counter(failed).items():
+                for rule_id in filter(None, rule_ids.split('|')):
+                    flagged[rule_id] += hits
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    total = sum(counts.values())
+    print(f"{total:,} applicants screened in {time.perf_counter() - start:.1f}s: {counts[PASS]:,} pass, "
+          f"{counts[FAIL]:,} fail, {counts[REVIEW]:,} need review", file=sys.stderr)
+    for rule in ruleset.rules:
+        print(f"  {flagged[rule.id]:>10,} broken or missing  {rule.id} ({rule.criterion})", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+Fuzzy Term Matcher - Typo-tolerant correction of user queries
+Symmetric-delete (SymSpell-style) dictionary over the routing vocabulary and
+disaster names, so "earthqake", "shleter" and "femma" still reach the right
+answer. Only unknown words are corrected, and only onto routing terms: ordinary
+words from the knowledge base and guidance corpus are in the dictionary, and a
+correction must keep the first letter and may not just drop a suffix, so "lack",
+"plano" or "renter" stay as typed.
+
+Benchmark with: python benchmarks/bench_fuzzy_match.py
+"""
+
+import re
+import hashlib
+import threading
+
+import numpy as np
+
+import datapack
+from search_index import STOPWORDS, knowledge_passages, corpus_passages, corpus_dir
+
+# Bumped whenever the serialized dictionary layout changes
+SPELLER_VERSION = 2
+
+# Terms shorter than this are never corrected ("kit" vs "hit" is too ambiguous)
+MIN_CORRECTION_LENGTH = 4
+
+# Only the first PREFIX_LENGTH characters generate deletes (SymSpell's prefix trick)
+PREFIX_LENGTH = 7
+
+WORD_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+# Everyday words within two edits of a routing term that must stay as typed
+COMMON_WORDS = """
+plant plane planet planes plans plank plain please place played player
+fine five fired firm hire wire tire tired fir fires fiery
+food floor flow flows blood floods flooded
+back pick park pact packed packs pace page pock kits kitten kite kin
+bag big beg bug bags bog
+apple apples apply applied
+alter altar alert alerts alerted later
+waring warming wearing earning morning warn warned
+shelf shelves sheltered shelters
+fame femme film
+aid aids maid said
+stock store storm storms
+power tower lower mower
+water later hater
+help need want know tell find near nearest home house family kids child dog cat
+lack jack hack rack sack tack pace pan clan plano plant plate flan
+fair hair pair main rain sick tick mold hold told tree free three renter center
+create crate craft drive print alarm
+""".split()
+
+
+def osa_distance(a, b, max_distance):
+    """Optimal string alignment distance, or max_distance + 1 once it is exceeded"""
+    if a == b:
+        return 0
+    la, lb = len(a), len(b)
+    if abs(la - lb) > max_distance:
+        return max_distance + 1
+    if la == 0 or lb == 0:
+        return max(la, lb)
+
+    prev_prev = None
+    prev = list(range(lb + 1))
+    for i in range(1, la + 1):
+        current = [i] + [0] * lb
+        row_min = i
+        ca = a[i - 1]
+        for j in range(1, lb + 1):
+            cost = 0 if ca == b[j - 1] else 1
+            value = min(prev[j] + 1, current[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, prev_prev[j - 2] + 1)
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return max_distance + 1
+        prev_prev, prev = prev, current
+    return prev[lb] if prev[lb] <= max_distance else max_distance + 1
+
+
+def max_distance_for(term):
+    """Allowed edits grow with word length: 0 below 4 letters, 1 up to 5, then 2"""
+    if len(term) < MIN_CORRECTION_LENGTH:
+        return 0
+    if len(term) <= 5:
+        return 1
+    return 2
+
+
+class SymSpell:
+    """Symmetric-delete spelling corrector
+
+    Every dictionary word is indexed under all of its deletes (up to
+    max_distance characters removed from its prefix). A lookup generates the
+    deletes of the query term and only verifies the words sharing one, so
+    the cost depends on the term length, not on the vocabulary size.
+    """
+
+    def __init__(self, max_distance=2, prefix_length=PREFIX_LENGTH):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.words = {}
+        self.deletes = {}
+        # Words corrections may produce; empty means any dictionary word
+        self.targets = frozenset()
+
+    def _edits(self, word, distance):
+        """All strings reachable from word by deleting up to distance characters"""
+        results = {word}
+        frontier = {word}
+        for _ in range(distance):
+            next_frontier = set()
+            for w in frontier:
+                if len(w) <= 1:
+                    continue
+                for i in range(len(w)):
+                    next_frontier.add(w[:i] + w[i + 1:])
+            next_frontier -= results
+            results |= next_frontier
+            frontier = next_frontier
+        return results
+
+    def add_word(self, word, count=1):
+        """Add a word (or raise its frequency if already known)"""
+        word = word.lower()
+        if word in self.words:
+            self.words[word] += count
+            return
+        self.words[word] = count
+        for delete in self._edits(word[:self.prefix_length], self.max_distance):
+            self.deletes.setdefault(delete, []).append(word)
+
+    def __contains__(self, word):
+        return word in self.words
+
+    def lookup(self, term, max_distance=None):
+        """Best (word, distance) within max_distance, or None
+
+        Ties on distance go to the more frequent word.
+        """
+        term = term.lower()
+        if max_distance is None:
+            max_distance = self.max_distance
+        max_distance = min(max_distance, self.max_distance)
+        if term in self.words:
+            return term, 0
+        if max_distance == 0:
+            return None
+
+        best, best_distance, best_count = None, max_distance + 1, 0
+        seen = set()
+        prefix = term[:self.prefix_length]
+        for delete in self._edits(prefix, max_distance):
+            for word in self.deletes.get(delete, ()):
+                if word in seen:
+                    continue
+                seen.add(word)
+                if abs(len(word) - len(term)) > max_distance:
+                    continue
+                distance = osa_distance(term, word, min(max_distance, best_distance))
+                if distance > max_distance:
+                    continue
+                count = self.words[word]
+                if distance < best_distance or (distance == best_distance and count > best_count):
+                    best, best_distance, best_count = word, distance, count
+        return (best, best_distance) if best is not None else None
+
+    def plausible_typo(self, token, word):
+        """Whether correcting token to word looks like a typo rather than a different word
+
+        Typos rarely change the first letter, and a routing term plus extra
+        letters ("plano", "planer") is usually another word, unless the extra
+        letter just repeats the last one ("kitt").
+        """
+        if self.targets and word not in self.targets:
+            return False
+        if token[0] != word[0]:
+            return False
+        if token.startswith(word):
+            return token[len(word):] == word[-1] * (len(token) - len(word))
+        return True
+
+    def correct_text(self, text):
+        """Return (corrected_text, [(typed, corrected), ...]) for lowercase text
+
+        Words in the dictionary are never changed.
+        """
+        corrections = []
+
+        def replace(match):
+            token = match.group(0)
+            if token in self.words or token.isdigit():
+                return token
+            hit = self.lookup(token, max_distance_for(token))
+            if hit is None or hit[0] == token or not self.plausible_typo(token, hit[0]):
+                return token
+            corrections.append((token, hit[0]))
+            return hit[0]
+
+        return WORD_RE.sub(replace, text.lower()), corrections
+
+
+def term_hash(term):
+    """Stable 64-bit hash used to look terms up in a mapped dictionary"""
+    return int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def speller_sections(speller, routing_terms=()):
+    """Serialize a speller into pack sections: sorted hash tables over mapped arrays
+
+    Delete keys are stored only as hashes; a colliding key can only add a
+    candidate, which the distance check then rejects.
+    """
+    words = sorted(speller.words)
+    word_ids = {word: i for i, word in enumerate(words)}
+    word_hashes = np.fromiter((term_hash(w) for w in words), dtype=np.uint64, count=len(words))
+    word_order = np.argsort(word_hashes, kind='stable')
+
+    keys = sorted(speller.deletes, key=term_hash)
+    delete_hashes = np.fromiter((term_hash(k) for k in keys), dtype=np.uint64, count=len(keys))
+    offsets = np.zeros(len(keys) + 1, dtype=np.uint64)
+    postings = []
+    for i, key in enumerate(keys):
+        ids = [word_ids[w] for w in speller.deletes[key]]
+        postings.extend(ids)
+        offsets[i + 1] = offsets[i] + len(ids)
+
+    return {
+        'meta': {'version': SPELLER_VERSION, 'max_distance': speller.max_distance,
+                 'prefix_length': speller.prefix_length, 'routing_terms': list(routing_terms)},
+        'words': datapack.StringList(words),
+        'counts': np.fromiter((speller.words[w] for w in words), dtype=np.uint32, count=len(words)),
+        'word_hashes': word_hashes[word_order],
+        'word_order': word_order.astype(np.uint32),
+        'delete_hashes': delete_hashes,
+        'delete_offsets': offsets,
+        'delete_words': np.asarray(postings, dtype=np.uint32)
+    }
+
+
+class _MappedWords:
+    """Read-only word -> count mapping over a serialized dictionary"""
+
+    def __init__(self, pack):
+        self.words = pack['words']
+        self.counts = pack['counts']
+        self.hashes = pack['word_hashes']
+        self.order = pack['word_order']
+
+    def _index(self, word):
+        h = np.uint64(term_hash(word))
+        i = int(np.searchsorted(self.hashes, h))
+        while i < len(self.hashes) and self.hashes[i] == h:
+            index = int(self.order[i])
+            if self.words[index] == word:
+                return index
+            i += 1
+        return None
+
+    def __contains__(self, word):
+        return self._index(word) is not None
+
+    def __getitem__(self, word):
+        index = self._index(word)
+        if index is None:
+            raise KeyError(word)
+        return int(self.counts[index])
+
+    def __len__(self):
+        return len(self.words)
+
+    def items(self):
+        return ((word, int(count)) for word, count in zip(self.words, self.counts))
+
+
+class _MappedDeletes:
+    """Read-only delete -> candidate words mapping over a serialized dictionary"""
+
+    def __init__(self, pack):
+        self.words = pack['words']
+        self.hashes = pack['delete_hashes']
+        self.offsets = pack['delete_offsets']
+        self.postings = pack['delete_words']
+
+    def get(self, key, default=()):
+        h = np.uint64(term_hash(key))
+        lo = int(np.searchsorted(self.hashes, h, side='left'))
+        hi = int(np.searchsorted(self.hashes, h, side='right'))
+        if lo == hi:
+            return default
+        ids = self.postings[int(self.offsets[lo]):int(self.offsets[hi])]
+        return [self.words[int(i)] for i in ids]
+
+
+class MappedSymSpell(SymSpell):
+    """SymSpell over a memory-mapped serialized dictionary; nothing is rebuilt at load"""
+
+    def __init__(self, pack):
+        meta = pack['meta']
+        if meta.get('version') != SPELLER_VERSION:
+            raise ValueError(f"Speller version {meta.get('version')}, expected {SPELLER_VERSION}")
+        super().__init__(meta['max_distance'], meta['prefix_length'])
+        self.routing_terms = tuple(meta['routing_terms'])
+        self.targets = routing_words(self.routing_terms)
+        self.words = _MappedWords(pack)
+        self.deletes = _MappedDeletes(pack)
+
+    def add_word(self, word, count=1):
+        raise TypeError("a mapped speller is read-only")
+
+
+def brute_force_lookup(term, words, max_distance):
+    """Reference lookup: OSA distance against every word (for benchmarks)"""
+    best, best_distance, best_count = None, max_distance + 1, 0
+    for word, count in words.items():
+        distance = osa_distance(term, word, max_distance)
+        if distance < best_distance or (distance == best_distance and distance <= max_distance
+                                         and count > best_count):
+            best, best_distance, best_count = word, distance, count
+    return (best, best_distance) if best is not None and best_distance <= max_distance else None
+
+
+# Routing vocabulary frequency: routing terms win ties against ordinary words
+ROUTING_WEIGHT = 1000
+
+_speller_lock = threading.Lock()
+_speller_cache = {}
+
+
+def routing_words(routing_terms):
+    """The single words of the routing terms ("go bag" -> go, bag), the only correction targets"""
+    return frozenset(word for term in routing_terms for word in WORD_RE.findall(term.lower()))
+
+
+def build_speller(routing_terms, texts=()):
+    """Dictionary of routing terms (heavily weighted) plus words seen in texts"""
+    speller = SymSpell()
+    speller.targets = routing_words(routing_terms)
+    for term in routing_terms:
+        for word in WORD_RE.findall(term.lower()):
+            speller.add_word(word, ROUTING_WEIGHT)
+    for word in COMMON_WORDS:
+        speller.add_word(word, 1)
+    for word in STOPWORDS:
+        speller.add_word(word, 1)
+    for text in texts:
+        for word in WORD_RE.findall(text.lower()):
+            speller.add_word(word, 1)
+    return speller
+
+
+def routing_vocabulary(intent_keywords, disaster_guides):
+    """Vocabulary the spelling corrector snaps typos onto"""
+    return tuple(sorted({word for words in intent_keywords.values() for word in words}
+                        | set(disaster_guides) | {'emergency', 'shelters', 'alerts'}))
+
+
+def speller_texts(knowledge):
+    """Titles and texts of every indexed passage, for the everyday-word dictionary"""
+    texts = []
+    for title, _, _, text in knowledge_passages(knowledge) + corpus_passages(corpus_dir()):
+        texts.append(title)
+        texts.append(text)
+    return texts
+
+
+def get_speller(routing_terms, knowledge=None):
+    """Per-process speller for the routing vocabulary, built on first use"""
+    key = tuple(routing_terms)
+    with _speller_lock:
+        if key not in _speller_cache:
+            texts = speller_texts(knowledge) if knowledge is not None else []
+            _speller_cache[key] = build_speller(routing_terms, texts)
+        return _speller_cache[key]
+
+
+def clear_speller_cache():
+    """Forget the per-process spellers (their dictionaries include knowledge text)"""
+    with _speller_lock:
+        _speller_cache.clear()
@@ -0,0 +1,53 @@
+"""
+Emergency Preparedness Knowledge Base
+Routing keywords used by the agent and the patterns that find them in a
+question. The FEMA, shelter and go-bag reference data lives in
+data/knowledge.json, validated and loaded by knowledge_pack.py
+"""
+
+import re
+
+# Routing keywords per intent; a query may match several
+INTENT_KEYWORDS = {
+    'fema': ['fema', 'funding', 'financial', 'assistance', 'apply'],
+    'shelter': ['shelter', 'evacuation'],
+    'kit': ['go bag', 'go-bag', 'emergency kit', 'prepare', 'pack', 'kit'],
+    'plan': ['plan', 'planning', 'communication'],
+    'alert': ['alert', 'warning', 'notification'],
+    'disaster': ['earthquake', 'fire', 'flood', 'disaster']
+}
+
+VOWELS = 'aeiou'
+
+
+def inflected(word):
+    """Regex for a keyword and its inflections: packs, packed, prepared, preparing, planned, applies
+
+    Keywords of four letters or more also match as the end of a compound
+    ("wildfire", "backpack"); shorter ones ("kit") only on their own.
+    """
+    *head, last = word.split(' ')
+    if last.endswith('e'):
+        forms = re.escape(last[:-1]) + r"(?:e|es|ed|ing)"
+    elif last.endswith('y') and len(last) > 2 and last[-2] not in VOWELS:
+        forms = re.escape(last[:-1]) + r"(?:y|ies|ied|ying)"
+    elif len(last) >= 3 and last[-1] not in VOWELS + 'wxy' and last[-2] in VOWELS and last[-3] not in VOWELS \
+            and sum(ch in VOWELS for ch in last) == 1:
+        # One-syllable consonant-vowel-consonant words double the last letter: planned, planning
+        forms = re.escape(last) + r"(?:s|" + re.escape(last[-1]) + r"?(?:ed|ing|ers?))?"
+    else:
+        forms = re.escape(last) + r"(?:s|es|ed|ing)?"
+    compound = r"[a-z]*" if not head and len(last) >= 4 else ""
+    return r"\b" + compound + "".join(re.escape(part) + " " for part in head) + forms + r"\b"
+
+
+# Whole-word matches (plus inflections and compounds), so "preparedness" is not a kit request
+INTENT_PATTERNS = {
+    intent: re.compile("|".join(inflected(word) for word in words))
+    for intent, words in INTENT_KEYWORDS.items()
+}
+
+
+def detect_intents(text):
+    """Every intent whose keywords appear in the (lowercase) text, in INTENT_KEYWORDS order"""
+    return [intent for intent, pattern in INTENT_PATTERNS.items() if pattern.search(text)]
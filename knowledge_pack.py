@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Knowledge Pack - Validated reference data with hot reload
+The FEMA, shelter, go-bag and disaster guide data is edited as JSON (or YAML)
+in data/knowledge.json, validated, and compiled into the binary startup
+snapshot. A watcher thread picks up a changed source, builds and checks the new
+snapshot off the request path, then swaps it in with a single reference
+assignment: script runs already in flight finish on the version they started
+with, later runs see the new one, and caches derived from the old version are
+dropped.
+
+Check or compile with: python knowledge_pack.py validate|compile [data/knowledge.json]
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+
+try:
+    import yaml
+
+    YAML_AVAILABLE = True
+except ImportError:
+    YAML_AVAILABLE = False
+
+import datapack
+import snapshot
+import search_index
+import fuzzy_match
+import fema_screening
+
+SOURCE_PATH_ENV = 'EMERGENCY_KNOWLEDGE'
+DEFAULT_SOURCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'knowledge.json')
+
+# Seconds between checks of the source file
+POLL_INTERVAL = 5.0
+
+SECTIONS = ('fema', 'shelters', 'go_bag', 'go_bag_image', 'disaster_guides', 'disaster_general')
+SHELTER_FIELDS = ('name', 'address', 'distance', 'capacity', 'services', 'phone')
+# Optional shelter 'status' and 'occupancy' (people there now); only open shelters with room are offered
+SHELTER_STATUSES = ('open', 'full', 'closed')
+# Regions and guides the app refers to by name
+REQUIRED_REGIONS = ('Sunnyvale, CA',)
+REQUIRED_GUIDES = ('earthquake',)
+
+PHONE_RE = re.compile(r'^[\d\s()+\-.]{7,}$')
+DISTANCE_RE = re.compile(r'^\d+(\.\d+)? miles?$')
+
+
+class KnowledgePackError(ValueError):
+    """A knowledge source that cannot be read or fails validation"""
+
+    def __init__(self, path, problems):
+        self.problems = problems
+        super().__init__(f"{path}: " + "; ".join(problems[:10]) +
+                         (f" (and {len(problems) - 10} more)" if len(problems) > 10 else ""))
+
+
+def source_path():
+    """Path of the knowledge source (EMERGENCY_KNOWLEDGE overrides the default)"""
+    return os.environ.get(SOURCE_PATH_ENV, DEFAULT_SOURCE_PATH)
+
+
+def _string_list(problems, where, value):
+    if not isinstance(value, list) or not value:
+        problems.append(f"{where} must be a non-empty list")
+    elif not all(isinstance(item, str) and item.strip() for item in value):
+        problems.append(f"{where} must contain only non-empty strings")
+
+
+def validate(doc):
+    """Every problem found in a parsed source document (empty when it is valid)"""
+    if not isinstance(doc, dict):
+        return ["top level must be a mapping"]
+    problems = []
+    if not isinstance(doc.get('version'), str) or not doc['version'].strip():
+        problems.append("version must be a non-empty string")
+    for name in SECTIONS:
+        if name not in doc:
+            problems.append(f"missing section '{name}'")
+    for name in set(doc) - set(SECTIONS) - {'version'}:
+        problems.append(f"unknown section '{name}'")
+
+    fema = doc.get('fema')
+    if isinstance(fema, dict):
+        for key in ('eligibility', 'process'):
+            _string_list(problems, f"fema.{key}", fema.get(key))
+        if 'rules' in fema:
+            eligibility = fema.get('eligibility') if isinstance(fema.get('eligibility'), list) else ()
+            problems += fema_screening.rule_problems(fema['rules'], eligibility)
+    elif fema is not None:
+        problems.append("fema must be a mapping")
+
+    shelters = doc.get('shelters')
+    if isinstance(shelters, dict):
+        for region in REQUIRED_REGIONS:
+            if region not in shelters:
+                problems.append(f"shelters must include '{region}'")
+        for region, entries in shelters.items():
+            if not isinstance(entries, list) or not entries:
+                problems.append(f"shelters['{region}'] must be a non-empty list")
+                continue
+            for i, shelter in enumerate(entries):
+                where = f"shelters['{region}'][{i}]"
+                if not isinstance(shelter, dict):
+                    problems.append(f"{where} must be a mapping")
+                    continue
+                for field in SHELTER_FIELDS:
+                    if not isinstance(shelter.get(field), str) or not shelter[field].strip():
+                        problems.append(f"{where}.{field} must be a non-empty string")
+                if isinstance(shelter.get('phone'), str) and not PHONE_RE.match(shelter['phone']):
+                    problems.append(f"{where}.phone '{shelter['phone']}' is not a phone number")
+                if isinstance(shelter.get('distance'), str) and not DISTANCE_RE.match(shelter['distance']):
+                    problems.append(f"{where}.distance must look like '1.2 miles'")
+                if shelter.get('status', 'open') not in SHELTER_STATUSES:
+                    problems.append(f"{where}.status must be one of {', '.join(SHELTER_STATUSES)}")
+                occupancy = shelter.get('occupancy')
+                if occupancy is not None and (not isinstance(occupancy, int) or isinstance(occupancy, bool)
+                                              or occupancy < 0):
+                    problems.append(f"{where}.occupancy must be a whole number of people")
+                for field, limit in (('lat', 90), ('lon', 180)):
+                    value = shelter.get(field)
+                    if not isinstance(value, (int, float)) or isinstance(value, bool) or abs(value) > limit:
+                        problems.append(f"{where}.{field} must be a number within ±{limit}")
+    elif shelters is not None:
+        problems.append("shelters must be a mapping of region to shelter list")
+
+    go_bag = doc.get('go_bag')
+    if isinstance(go_bag, dict):
+        for key in ('base', 'per_adult', 'per_child', 'per_pet'):
+            _string_list(problems, f"go_bag.{key}", go_bag.get(key))
+    elif go_bag is not None:
+        problems.append("go_bag must be a mapping")
+
+    image = doc.get('go_bag_image')
+    if image is not None and not (isinstance(image, str) and image.startswith(('https://', 'http://', '/'))):
+        problems.append("go_bag_image must be a URL")
+
+    guides = doc.get('disaster_guides')
+    if isinstance(guides, dict):
+        for name in REQUIRED_GUIDES:
+            if name not in guides:
+                problems.append(f"disaster_guides must include '{name}'")
+        for name, guide in guides.items():
+            if not re.fullmatch(r'[a-z]+', name):
+                problems.append(f"disaster_guides key '{name}' must be a single lowercase word")
+            if not isinstance(guide, dict):
+                problems.append(f"disaster_guides.{name} must be a mapping")
+                continue
+            for field in ('icon', 'action'):
+                if not isinstance(guide.get(field), str) or not guide[field].strip():
+                    problems.append(f"disaster_guides.{name}.{field} must be a non-empty string")
+            _string_list(problems, f"disaster_guides.{name}.steps", guide.get('steps'))
+    elif guides is not None:
+        problems.append("disaster_guides must be a mapping")
+
+    general = doc.get('disaster_general')
+    if isinstance(general, dict):
+        for key in ('before', 'after'):
+            _string_list(problems, f"disaster_general.{key}", general.get(key))
+    elif general is not None:
+        problems.append("disaster_general must be a mapping")
+    return problems
+
+
+def read_source(path):
+    """Raw bytes and parsed document of a JSON or YAML source"""
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read()
+        if path.endswith(('.yaml', '.yml')):
+            if not YAML_AVAILABLE:
+                raise KnowledgePackError(path, ["PyYAML is required to read YAML sources"])
+            return raw, yaml.safe_load(raw)
+        return raw, json.loads(raw)
+    except (OSError, ValueError) as e:
+        if isinstance(e, KnowledgePackError):
+            raise
+        raise KnowledgePackError(path, [f"{type(e).__name__}: {e}"])
+
+
+def load_source(path=None):
+    """Validated knowledge sections of a source, plus a 'version' section identifying it"""
+    path = path or source_path()
+    raw, doc = read_source(path)
+    problems = validate(doc)
+    if problems:
+        raise KnowledgePackError(path, problems)
+    sections = {name: doc[name] for name in SECTIONS}
+    sections['version'] = {
+        'version': doc['version'],
+        'sha256': hashlib.sha256(raw).hexdigest(),
+        'source': os.path.basename(path)
+    }
+    return sections
+
+
+def source_sha(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def loaded_version(knowledge):
+    """The 'version' section of loaded knowledge ({} for packs compiled before it existed)"""
+    return knowledge.get('version') or {}
+
+
+def compile_pack(path=None, knowledge=None):
+    """Compile a source into the startup snapshot (and the knowledge pack, when one is used)
+
+    Returns the opened, checksum-verified snapshot, ready to be swapped in.
+    """
+    knowledge = knowledge or load_source(path)
+    target = snapshot.snapshot_path()
+    sha = loaded_version(knowledge).get('sha256')
+    # Another worker on this host may have compiled this version already
+    snap, _ = snapshot._open(target) if os.path.exists(target) else (None, None)
+    if snap is None or loaded_version(snap.knowledge).get('sha256') != sha:
+        snapshot.build_snapshot(target, knowledge=knowledge)
+        snap, problem = snapshot._open(target)
+        if snap is None:
+            raise KnowledgePackError(target, [f"compiled snapshot is unusable: {problem}"])
+    if os.path.exists(datapack.pack_path()):
+        datapack.write_pack(datapack.pack_path(), datapack.mapped(knowledge))
+    return snap
+
+
+def invalidate_derived():
+    """Drop per-process caches built from the previous version"""
+    search_index.clear_index_cache()
+    fuzzy_match.clear_speller_cache()
+    datapack.open_shared.cache_clear()
+    snapshot.open_snapshot.cache_clear()
+
+
+class KnowledgeWatcher:
+    """Polls the knowledge source and hot-swaps each new valid version in the background"""
+
+    def __init__(self, path=None, interval=POLL_INTERVAL, on_swap=()):
+        self.path = path or source_path()
+        self.interval = interval
+        self.on_swap = list(on_swap)
+        self.version = loaded_version(snapshot.load_knowledge())
+        self.loaded_at = time.time()
+        self.reloads = 0
+        self.failures = 0
+        self.last_error = None
+        self._stat = None
+        self._rejected_sha = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='knowledge-watcher', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=self.interval + 1)
+
+    def _run(self):
+        while True:
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Knowledge watcher error: {type(e).__name__}: {e}", file=sys.stderr)
+            if self._stop.wait(self.interval):
+                return
+
+    def check(self):
+        """Reload if the source changed since the last check; True when a new version was swapped in"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        key = (stat.st_mtime_ns, stat.st_size)
+        if key == self._stat:
+            return False
+        self._stat = key
+        sha = source_sha(self.path)
+        if sha in (self.version.get('sha256'), self._rejected_sha):
+            return False
+        return self.reload()
+
+    def reload(self):
+        """Validate, compile and swap in the current source; the old version stays on any failure"""
+        start = time.perf_counter()
+        try:
+            knowledge = load_source(self.path)
+            snap = compile_pack(knowledge=knowledge)
+        except KnowledgePackError as e:
+            self.failures += 1
+            self.last_error = str(e)
+            self._rejected_sha = source_sha(self.path) if os.path.exists(self.path) else None
+            print(f"Keeping knowledge version {self.version.get('version')}: {e}", file=sys.stderr)
+            return False
+
+        snapshot.swap_snapshot(snap)
+        invalidate_derived()
+        for callback in self.on_swap:
+            callback()
+        self.version = loaded_version(snap.knowledge)
+        self.loaded_at = time.time()
+        self.reloads += 1
+        self.last_error = None
+        print(f"Loaded knowledge version {self.version['version']} in {time.perf_counter() - start:.2f}s",
+              file=sys.stderr)
+        return True
+
+    def status(self):
+        return {
+            'version': self.version.get('version'), 'sha256': self.version.get('sha256'),
+            'loaded_at': self.loaded_at, 'reloads': self.reloads, 'failures': self.failures,
+            'last_error': self.last_error
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate or compile the knowledge source")
+    sub = parser.add_subparsers(dest='command', required=True)
+    for name, text in (('validate', "Check a source without writing anything"),
+                       ('compile', "Validate and compile a source into the startup snapshot")):
+        command = sub.add_parser(name, help=text)
+        command.add_argument('path', nargs='?', default=source_path())
+    args = parser.parse_args()
+
+    try:
+        knowledge = load_source(args.path)
+    except KnowledgePackError as e:
+        print(f"Invalid: {args.path}", file=sys.stderr)
+        for problem in e.problems:
+            print(f"  - {problem}", file=sys.stderr)
+        sys.exit(1)
+    version = knowledge['version']
+    if args.command == 'validate':
+        print(f"OK: version {version['version']} ({version['sha256'][:12]})")
+    else:
+        start = time.perf_counter()
+        compile_pack(knowledge=knowledge)
+        print(f"Compiled version {version['version']} into {snapshot.snapshot_path()} "
+              f"in {time.perf_counter() - start:.2f}s; running workers pick it up within {POLL_INTERVAL:.0f}s")
+
+
+if __name__ == "__main__":
+    main()
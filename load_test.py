@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Load Test Harness - Concurrent simulated sessions against the Streamlit app
+Opens N browser-like sessions on a running server over Streamlit's websocket
+protocol and drives scripted flows through them: menu clicks, address entry,
+household entry and free-text questions. Reports throughput, time-to-answer
+percentiles and server CPU/memory per concurrency level, and finds the
+saturation point.
+
+Run with: python load_test.py --launch --sessions 1,2,4,8,16,32 --duration 20
+     or:  python load_test.py --url ws://127.0.0.1:8501 --server-pid <pid>
+"""
+
+import os
+import sys
+import time
+import socket
+import random
+import asyncio
+import argparse
+import subprocess
+import statistics
+
+from websockets.asyncio.client import connect
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'emergency_agent.py')
+
+WIDGET_TYPES = ('button', 'text_input', 'number_input', 'checkbox')
+
+QUESTIONS = [
+    "How do I prepare for an earthquake?",
+    "What should I do in a flood?",
+    "Help me create a family communication plan",
+    "Am I eligible for FEMA funding?",
+    "What do I do if the power is out for a week",
+    "Are there any warnings for my area?"
+]
+
+ADDRESSES = ["94086", "123 Main St, Sunnyvale, CA 94086", "San Jose, CA 95134", "94087"]
+
+
+# Websocket session
+
+class AppSession:
+    """One browser-like connection speaking Streamlit's BackMsg/ForwardMsg protocol"""
+
+    def __init__(self, url, timeout):
+        self.url = url.rstrip('/') + '/_stcore/stream'
+        self.timeout = timeout
+        self.ws = None
+        self.widgets = {}     # widget id -> (element type, label)
+        self.values = {}      # widget id -> WidgetState carrying a value
+        self.assistant_messages = 0
+
+    async def open(self):
+        self.ws = await connect(self.url, subprotocols=["streamlit"], max_size=None)
+        await self.rerun()
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+
+    def has(self, key):
+        """Whether a widget with this key is on the page"""
+        return any(widget_id.endswith(f"-{key}") for widget_id in self.widgets)
+
+    def find(self, key=None, label=None):
+        """Widget id by key (the id suffix) or by a substring of its label"""
+        for widget_id, (_, widget_label) in self.widgets.items():
+            if key is not None and widget_id.endswith(f"-{key}"):
+                return widget_id
+            if label is not None and label in widget_label:
+                return widget_id
+        raise LookupError(f"No widget with key={key!r} label={label!r} on the page")
+
+    async def rerun(self, trigger=None):
+        """Send a rerun (optionally clicking a button) and wait for the final run
+
+        Returns True when the finished page shows a new assistant message.
+        """
+        msg = BackMsg()
+        client = msg.rerun_script
+        client.query_string = ""
+        client.page_script_hash = ""
+        for state in self.values.values():
+            client.widget_states.widgets.append(state)
+        if trigger is not None:
+            client.widget_states.widgets.add(id=trigger, trigger_value=True)
+        await self.ws.send(msg.SerializeToString())
+
+        widgets, assistant = {}, 0
+        while True:
+            fwd = ForwardMsg()
+            fwd.ParseFromString(await asyncio.wait_for(self.ws.recv(), self.timeout))
+            kind = fwd.WhichOneof('type')
+            if kind == 'delta' and fwd.delta.WhichOneof('type') == 'new_element':
+                element = fwd.delta.new_element
+                element_type = element.WhichOneof('type')
+                if element_type in WIDGET_TYPES:
+                    widget = getattr(element, element_type)
+                    widgets[widget.id] = (element_type, widget.label)
+                elif element_type == 'markdown' and 'message-assistant' in element.markdown.body:
+                    assistant += 1
+            elif kind == 'script_finished':
+                if fwd.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    # st.rerun() inside the app: the page is rebuilt from scratch
+                    widgets, assistant = {}, 0
+                    continue
+                break
+
+        self.widgets = widgets
+        # Values of widgets that are no longer on the page are dropped
+        self.values = {wid: state for wid, state in self.values.items() if wid in widgets}
+        answered = assistant > self.assistant_messages
+        self.assistant_messages = assistant
+        return answered
+
+    async def click(self, key=None, label=None):
+        return await self.rerun(trigger=self.find(key=key, label=label))
+
+    def set_text(self, key, value):
+        widget_id = self.find(key=key)
+        self.values[widget_id] = WidgetState(id=widget_id, string_value=value)
+
+    def set_int(self, key, value):
+        widget_id = self.find(key=key)
+        self.values[widget_id] = WidgetState(id=widget_id, int_value=value)
+
+
+# Scripted flows: lists of (step label, coroutine function taking a session)
+
+def flow_menu(rng):
+    key = rng.choice(["menu_fema", "menu_planning", "menu_alerts", "menu_disasters"])
+    return [(key, lambda s: s.click(key=key))]
+
+
+def flow_shelter(rng):
+    address = rng.choice(ADDRESSES)
+
+    async def enter(s):
+        if s.has("address_input"):
+            s.set_text("address_input", address)
+            return await s.click(label="Find Shelters")
+        # With streamlit-searchbox installed the address box is a custom component this
+        # client cannot type into; the same lookup is asked for through the chat box
+        s.set_text("user_input_field", f"Find shelters near {address}")
+        return await s.rerun()
+
+    return [("menu_shelter", lambda s: s.click(key="menu_shelter")), ("address", enter)]
+
+
+def flow_kit(rng):
+    adults, children, pets = rng.randint(1, 4), rng.randint(0, 3), rng.randint(0, 2)
+
+    async def enter(s):
+        s.set_int("household_adults", adults)
+        s.set_int("household_children", children)
+        s.set_int("household_pets", pets)
+        return await s.click(label="Generate My Checklist")
+
+    return [("menu_kit", lambda s: s.click(key="menu_kit")), ("household", enter)]
+
+
+def flow_question(rng):
+    question = rng.choice(QUESTIONS)
+
+    async def ask(s):
+        if not s.has("user_input_field"):
+            # The chat box only appears once a conversation exists
+            await s.click(key="menu_alerts")
+        s.set_text("user_input_field", question)
+        return await s.rerun()
+
+    return [("question", ask)]
+
+
+FLOWS = {
+    'menu': flow_menu,
+    'shelter': flow_shelter,
+    'kit': flow_kit,
+    'question': flow_question
+}
+
+
+# Server metrics
+
+class ServerMonitor:
+    """Samples CPU time and RSS of the server process from /proc"""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.ticks = os.sysconf('SC_CLK_TCK')
+        self.page_size = os.sysconf('SC_PAGE_SIZE')
+
+    def cpu_seconds(self):
+        if self.pid is None:
+            return 0.0
+        with open(f'/proc/{self.pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        # utime and stime are fields 14 and 15 of /proc/<pid>/stat
+        return (int(fields[11]) + int(fields[12])) / self.ticks
+
+    def rss_mb(self):
+        if self.pid is None:
+            return 0.0
+        with open(f'/proc/{self.pid}/statm') as f:
+            return int(f.read().split()[1]) * self.page_size / 1024 / 1024
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, max(0, int(round(len(samples) * pct / 100.0)) - 1))]
+
+
+# Load generation
+
+async def session_loop(index, url, flows, stop_at, timeout, results):
+    """One simulated user running random flows until the level ends"""
+    rng = random.Random(index)
+    while time.monotonic() < stop_at:
+        session = AppSession(url, timeout)
+        try:
+            await session.open()
+            for label, step in FLOWS[rng.choice(flows)](rng):
+                if time.monotonic() >= stop_at:
+                    break
+                start = time.perf_counter()
+                answered = await step(session)
+                results.append((label, time.perf_counter() - start, answered))
+        except (OSError, asyncio.TimeoutError, LookupError) as e:
+            results.append(('error', 0.0, False))
+            print(f"[session {index}] {type(e).__name__}: {e}", file=sys.stderr)
+        finally:
+            await session.close()
+
+
+async def run_level(url, concurrency, flows, duration, timeout, monitor):
+    """Run one concurrency level and return its metrics"""
+    results = []
+    cpu_start, wall_start = monitor.cpu_seconds(), time.perf_counter()
+    stop_at = time.monotonic() + duration
+    tasks = [asyncio.create_task(session_loop(i, url, flows, stop_at, timeout, results))
+             for i in range(concurrency)]
+
+    peak_rss = monitor.rss_mb()
+    while not all(t.done() for t in tasks):
+        await asyncio.sleep(0.25)
+        peak_rss = max(peak_rss, monitor.rss_mb())
+    await asyncio.gather(*tasks)
+
+    wall = time.perf_counter() - wall_start
+    cpu = monitor.cpu_seconds() - cpu_start
+    latencies = [elapsed for _, elapsed, answered in results if answered]
+    return {
+        'sessions': concurrency,
+        'answers': len(latencies),
+        'failures': sum(1 for _, _, answered in results if not answered),
+        'throughput': len(latencies) / wall,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'mean': statistics.mean(latencies) if latencies else 0.0,
+        'cpu_percent': 100.0 * cpu / wall,
+        'peak_rss_mb': peak_rss
+    }
+
+
+def find_saturation(levels, min_gain=0.10, latency_factor=2.0):
+    """First level where throughput stops growing or p95 blows past the baseline
+
+    Returns (level, reason), or (None, None) when the ramp never saturated.
+    """
+    if not levels:
+        return None, None
+    baseline_p95 = levels[0]['p95']
+    for previous, current in zip(levels, levels[1:]):
+        if current['throughput'] < previous['throughput'] * (1 + min_gain):
+            return current, f"throughput gain under {min_gain:.0%}"
+        if baseline_p95 and current['p95'] > baseline_p95 * latency_factor:
+            return current, f"p95 above {latency_factor:g}x the single-session p95"
+    return None, None
+
+
+def print_level(level):
+    print(f"{level['sessions']:>8} {level['answers']:>8} {level['failures']:>6} "
+          f"{level['throughput']:>9.2f} {level['p50'] * 1000:>8.0f} {level['p95'] * 1000:>8.0f} "
+          f"{level['p99'] * 1000:>8.0f} {level['cpu_percent']:>6.0f}% {level['peak_rss_mb']:>8.0f}",
+          flush=True)
+
+
+def launch_server(port):
+    """Start emergency_agent.py under streamlit run and wait until it accepts connections"""
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'streamlit', 'run', APP_PATH, '--server.headless', 'true',
+         '--server.port', str(port), '--browser.gatherUsageStats', 'false'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("Streamlit server did not start within 30s")
+
+
+async def ramp(args, flows, monitor):
+    print(f"{'sessions':>8} {'answers':>8} {'fails':>6} {'answers/s':>9} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'cpu':>7} {'rss MiB':>8}")
+    levels = []
+    for concurrency in (int(n) for n in args.sessions.split(',')):
+        level = await run_level(args.url, concurrency, flows, args.duration, args.timeout, monitor)
+        levels.append(level)
+        print_level(level)
+    return levels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for emergency_agent.py")
+    parser.add_argument('--url', default=None, help="App base URL (default ws://127.0.0.1:<port>)")
+    parser.add_argument('--port', type=int, default=8501, help="Port of the app server")
+    parser.add_argument('--launch', action='store_true', help="Start the app server for the run")
+    parser.add_argument('--server-pid', type=int, help="PID of an already running server, for CPU/memory")
+    parser.add_argument('--sessions', default='1,2,4,8,16,32',
+                        help="Comma-separated concurrency levels to ramp through")
+    parser.add_argument('--duration', type=float, default=20.0, help="Seconds per level")
+    parser.add_argument('--flows', default=','.join(FLOWS),
+                        help=f"Comma-separated flows to mix ({', '.join(FLOWS)})")
+    parser.add_argument('--timeout', type=float, default=60.0, help="Seconds to wait for one answer")
+    args = parser.parse_args()
+
+    flows = [f.strip() for f in args.flows.split(',') if f.strip()]
+    unknown = [f for f in flows if f not in FLOWS]
+    if unknown:
+        parser.error(f"unknown flows: {', '.join(unknown)}")
+    args.url = args.url or f"ws://127.0.0.1:{args.port}"
+
+    server = launch_server(args.port) if args.launch else None
+    monitor = ServerMonitor(server.pid if server else args.server_pid)
+    try:
+        levels = asyncio.run(ramp(args, flows, monitor))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    saturated, reason = find_saturation(levels)
+    if saturated:
+        print(f"\nSaturation at {saturated['sessions']} concurrent sessions ({reason}); "
+              f"peak throughput {max(l['throughput'] for l in levels):.2f} answers/s")
+    else:
+        print("\nNo saturation reached; ramp to higher concurrency")
+
+
+if __name__ == "__main__":
+    main()
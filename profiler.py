@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Run Profiler - Per-rerun phase timings and on-demand profiles for operators
+A RunProfiler times named phases of one Streamlit script run. When the
+developer panel is off, every phase() call returns one shared no-op context
+manager, so the instrumentation costs a function call and nothing else.
+
+A run can also be captured whole with cProfile (a .prof file for pstats or
+snakeviz) or with a sampling profiler (collapsed stacks for flamegraph tools).
+"""
+
+import io
+import sys
+import time
+import marshal
+import pstats
+import cProfile
+import threading
+from collections import Counter
+from contextlib import nullcontext
+
+# Seconds between stack samples for the sampling profiler
+SAMPLE_INTERVAL = 0.005
+
+_NOOP = nullcontext()
+
+
+class _Phase:
+    """Context manager recording one phase's wall time"""
+
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.phases.append((self.name, self.start - self.profiler.started,
+                                     time.perf_counter() - self.start))
+        return False
+
+
+class SamplingProfiler:
+    """Samples one thread's stack at a fixed interval from a background thread"""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='run-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        """Collapsed-stack text (one 'frame;frame;frame count' line per stack)"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+class RunProfiler:
+    """Phase timings (and optionally a whole-run profile) for one script run"""
+
+    def __init__(self, enabled=False, capture=None):
+        self.enabled = enabled
+        self.phases = []
+        self.started = time.perf_counter()
+        self.capture = capture
+        self._summary = None
+        self._profile = None
+        self._sampler = None
+        if capture == 'cProfile':
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        elif capture == 'sampling':
+            self._sampler = SamplingProfiler(threading.get_ident())
+            self._sampler.start()
+
+    def phase(self, name):
+        """Time a block as a named phase; a shared no-op when profiling is off"""
+        if not self.enabled:
+            return _NOOP
+        return _Phase(self, name)
+
+    def record(self, name, seconds):
+        """Add a phase timed by the caller (for blocks that can't be wrapped)"""
+        if self.enabled:
+            self.phases.append((name, time.perf_counter() - seconds - self.started, seconds))
+
+    def finish(self):
+        """Stop any capture; returns a summary dict for the developer panel
+
+        Safe to call twice (the second call returns the first summary), so it
+        can run both at the end of a run and in a finally for interrupted ones.
+        """
+        if self._summary is not None:
+            return self._summary
+        total = time.perf_counter() - self.started
+        # (name, ms) in start order, so a phase nested in another follows its parent
+        phases = [(name, seconds * 1000) for name, _, seconds in sorted(self.phases, key=lambda p: p[1])]
+        summary = {'total_ms': total * 1000, 'phases': phases, 'capture': self.capture,
+                   'finished_at': time.time()}
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.create_stats()
+            summary['profile'] = marshal.dumps(self._profile.stats)
+            text = io.StringIO()
+            pstats.Stats(self._profile, stream=text).sort_stats('cumulative').print_stats(25)
+            summary['profile_text'] = text.getvalue()
+        elif self._sampler is not None:
+            self._sampler.stop()
+            summary['profile'] = self._sampler.collapsed().encode('utf-8')
+            leaves = Counter()
+            for stack, count in self._sampler.stacks.items():
+                leaves[stack.rsplit(';', 1)[-1]] += count
+            summary['profile_text'] = f"{sum(leaves.values())} samples every {SAMPLE_INTERVAL * 1000:.0f} ms " \
+                "(innermost frame)\n" + "\n".join(f"{count:5d}  {leaf}" for leaf, count in leaves.most_common(25))
+        self._summary = summary
+        return summary
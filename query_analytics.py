@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+Query Analytics - Fixed-memory streaming counts of intents, locations and users
+Live dashboard numbers without storing queries: a Count-Min Sketch with a
+small heavy-hitter list gives the top intents, ZIP codes and addresses, a
+HyperLogLog counts distinct users, and ring buffers of time buckets give
+sliding-window rates. Memory is fixed by the sketch sizes, not the traffic.
+Every structure merges by element-wise sum or max, so each worker process
+exports its sketches periodically and a report merges them all.
+
+Export: EMERGENCY_ANALYTICS_DIR (one file per worker, every EXPORT_INTERVAL seconds)
+Report with: python query_analytics.py report [dir]
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import socket
+import hashlib
+import argparse
+import functools
+import threading
+
+import numpy as np
+
+from zip_shelters import zip_of
+
+EXPORT_DIR_ENV = 'EMERGENCY_ANALYTICS_DIR'
+
+# Seconds between exports of this process's sketches
+EXPORT_INTERVAL = 30.0
+
+# Count-Min Sketch shape: error <= 2/width of all counts with probability 1 - 2^-depth
+CMS_WIDTH = 2048
+CMS_DEPTH = 4
+# Heavy-hitter candidates kept per sketch (the reported top-k comes from these)
+TOP_CANDIDATES = 64
+# Longest key kept in a candidate list (addresses are trimmed)
+MAX_KEY_LENGTH = 80
+
+# HyperLogLog precision: 2^12 one-byte registers, about 1.6% standard error
+HLL_PRECISION = 12
+
+# Sliding-window rate buckets: 5-second resolution over the last hour
+RATE_RESOLUTION = 5
+RATE_SPAN = 3600
+RATE_WINDOWS = (('1 min', 60), ('5 min', 300), ('1 hour', 3600))
+
+
+def hash64(key):
+    """Stable 64-bit hash of a string (the same in every process, unlike hash())"""
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def normalize_location(text):
+    """Lowercased, single-spaced address for counting"""
+    return " ".join(text.lower().replace(',', ' ').split())[:MAX_KEY_LENGTH]
+
+
+class TopK:
+    """Count-Min Sketch counts with a bounded list of the heaviest keys"""
+
+    def __init__(self, width=CMS_WIDTH, depth=CMS_DEPTH, candidates=TOP_CANDIDATES):
+        self.width = width
+        self.depth = depth
+        self.capacity = candidates
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+        self.candidates = {}
+        # Smallest candidate count, or None until it is next needed
+        self._floor = None
+
+    def _columns(self, key):
+        h = hash64(key)
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def estimate(self, key):
+        return int(min(self.table[row, col] for row, col in enumerate(self._columns(key))))
+
+    def add(self, key, count=1):
+        columns = self._columns(key)
+        estimate = None
+        for row, col in enumerate(columns):
+            self.table[row, col] += count
+            value = self.table[row, col]
+            estimate = value if estimate is None or value < estimate else estimate
+        self.total += count
+        self._offer(key, int(estimate))
+
+    def _offer(self, key, estimate):
+        if key in self.candidates:
+            if self.candidates[key] == self._floor:
+                self._floor = None
+            self.candidates[key] = estimate
+            return
+        if len(self.candidates) < self.capacity:
+            self.candidates[key] = estimate
+            self._floor = None
+            return
+        if self._floor is None:
+            self._floor = min(self.candidates.values())
+        if estimate > self._floor:
+            smallest = min(self.candidates, key=self.candidates.get)
+            del self.candidates[smallest]
+            self.candidates[key] = estimate
+            self._floor = None
+
+    def top(self, k=10):
+        """(key, estimated count) for the k heaviest keys, heaviest first"""
+        counts = [(key, self.estimate(key)) for key in self.candidates]
+        return sorted(counts, key=lambda item: (-item[1], item[0]))[:k]
+
+    def merge(self, other):
+        self.table += other.table
+        self.total += other.total
+        keys = set(self.candidates) | set(other.candidates)
+        self.candidates = {}
+        self._floor = None
+        for key in keys:
+            self._offer(key, self.estimate(key))
+
+    def nbytes(self):
+        return self.table.nbytes + sum(sys.getsizeof(key) + 8 for key in self.candidates)
+
+
+class HyperLogLog:
+    """Distinct count in 2^precision one-byte registers"""
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+        self._rest_bits = 64 - precision
+
+    def add(self, key):
+        h = hash64(key)
+        rest = h & ((1 << self._rest_bits) - 1)
+        rank = self._rest_bits - rest.bit_length() + 1
+        index = h >> self._rest_bits
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int32)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate while many registers are still empty
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+
+class RateWindow:
+    """Event counts in fixed time buckets over a trailing span"""
+
+    def __init__(self, resolution=RATE_RESOLUTION, span=RATE_SPAN):
+        self.resolution = resolution
+        slots = span // resolution
+        self.counts = np.zeros(slots, dtype=np.int64)
+        self.epochs = np.full(slots, -1, dtype=np.int64)
+
+    def add(self, now=None, count=1):
+        epoch = int((time.time() if now is None else now) // self.resolution)
+        slot = epoch % len(self.counts)
+        if self.epochs[slot] != epoch:
+            self.epochs[slot] = epoch
+            self.counts[slot] = 0
+        self.counts[slot] += count
+
+    def count(self, seconds=None, now=None):
+        """Events in the last `seconds` (the whole span by default); slots left from older laps are skipped"""
+        epoch = int((time.time() if now is None else now) // self.resolution)
+        slots = len(self.counts) if seconds is None else max(1, seconds // self.resolution)
+        live = self.epochs > epoch - slots
+        return int(self.counts[live].sum())
+
+    def rate(self, seconds, now=None):
+        """Events per second over the last `seconds`"""
+        return self.count(seconds, now) / seconds
+
+    def merge(self, other):
+        newer = other.epochs > self.epochs
+        same = other.epochs == self.epochs
+        self.counts[same] += other.counts[same]
+        self.counts[newer] = other.counts[newer]
+        self.epochs[newer] = other.epochs[newer]
+
+
+class QueryAnalytics:
+    """The app's streaming counters: intents, ZIPs, addresses, distinct users and rates (thread-safe)"""
+
+    SKETCHES = ('intents', 'zips', 'addresses')
+
+    def __init__(self):
+        self.intents = TopK()
+        self.zips = TopK()
+        self.addresses = TopK()
+        self.users = HyperLogLog()
+        self.rates = {'queries': RateWindow()}
+        self.started_at = time.time()
+        self.exporter = None
+        self._lock = threading.Lock()
+
+    def record_query(self, session_id, query, now=None):
+        """A question asked: counts the user, the rate and any ZIP code in it"""
+        zip_code = zip_of(query)
+        with self._lock:
+            self.users.add(session_id)
+            self.rates['queries'].add(now)
+            if zip_code is not None:
+                self.zips.add(f"{zip_code:05d}")
+
+    def record_intents(self, intents, now=None):
+        """The intents chosen for a question"""
+        with self._lock:
+            for intent in intents:
+                self.intents.add(intent)
+                self.rates.setdefault(f"intent:{intent}", RateWindow()).add(now)
+
+    def record_location(self, address):
+        """An address or ZIP code entered in the location form"""
+        with self._lock:
+            self.addresses.add(normalize_location(address))
+
+    def merge(self, other):
+        with self._lock:
+            for name in self.SKETCHES:
+                getattr(self, name).merge(getattr(other, name))
+            self.users.merge(other.users)
+            for name, window in other.rates.items():
+                self.rates.setdefault(name, RateWindow()).merge(window)
+            self.started_at = min(self.started_at, other.started_at)
+
+    def report(self, k=10, now=None):
+        """Dashboard numbers: totals, top-k lists, distinct users and windowed rates"""
+        with self._lock:
+            return {
+                'queries': self.rates['queries'].count(now=now),
+                'users': self.users.count(),
+                'intent_total': self.intents.total,
+                'intents': self.intents.top(k),
+                'zips': self.zips.top(k),
+                'addresses': self.addresses.top(k),
+                'rates': {name: {label: window.rate(seconds, now) for label, seconds in RATE_WINDOWS}
+                          for name, window in self.rates.items()},
+                'since': self.started_at,
+                'bytes': self.nbytes()
+            }
+
+    def nbytes(self):
+        return (sum(getattr(self, name).nbytes() for name in self.SKETCHES) + self.users.registers.nbytes +
+                sum(window.counts.nbytes + window.epochs.nbytes for window in self.rates.values()))
+
+    def to_bytes(self):
+        """Serialized sketches (an .npz archive; no pickled objects)"""
+        with self._lock:
+            arrays = {'hll': self.users.registers}
+            meta = {'started_at': self.started_at, 'sketches': {}}
+            for name in self.SKETCHES:
+                sketch = getattr(self, name)
+                arrays[f'{name}_table'] = sketch.table
+                meta['sketches'][name] = {'total': sketch.total, 'candidates': list(sketch.candidates)}
+            for i, (name, window) in enumerate(self.rates.items()):
+                arrays[f'rate{i}_counts'] = window.counts
+                arrays[f'rate{i}_epochs'] = window.epochs
+            meta['rates'] = list(self.rates)
+            arrays['meta'] = np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8)
+            buffer = io.BytesIO()
+            np.savez_compressed(buffer, **arrays)
+            return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data):
+        with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+            meta = json.loads(arrays['meta'].tobytes().decode('utf-8'))
+            analytics = cls()
+            analytics.started_at = meta['started_at']
+            analytics.users.registers[...] = arrays['hll']
+            for name in cls.SKETCHES:
+                sketch = getattr(analytics, name)
+                sketch.table[...] = arrays[f'{name}_table']
+                sketch.total = meta['sketches'][name]['total']
+                for key in meta['sketches'][name]['candidates']:
+                    sketch._offer(key, sketch.estimate(key))
+            for i, name in enumerate(meta['rates']):
+                window = analytics.rates.setdefault(name, RateWindow())
+                window.counts[...] = arrays[f'rate{i}_counts']
+                window.epochs[...] = arrays[f'rate{i}_epochs']
+        return analytics
+
+
+def export_path(directory):
+    """This process's export file in a shared directory"""
+    return os.path.join(directory, f"analytics-{socket.gethostname()}-{os.getpid()}.npz")
+
+
+def export(analytics, directory):
+    """Write this process's sketches atomically"""
+    os.makedirs(directory, exist_ok=True)
+    path = export_path(directory)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(analytics.to_bytes())
+    os.replace(tmp, path)
+    return path
+
+
+def load_merged(directory, max_age=None, skip=None):
+    """All exported sketches in a directory merged into one (files older than max_age seconds skipped)"""
+    merged = QueryAnalytics()
+    now = time.time()
+    for name in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+        path = os.path.join(directory, name)
+        if not (name.startswith('analytics-') and name.endswith('.npz')) or path == skip:
+            continue
+        if max_age is not None and now - os.path.getmtime(path) > max_age:
+            continue
+        try:
+            with open(path, 'rb') as f:
+                merged.merge(QueryAnalytics.from_bytes(f.read()))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Skipping {path}: {type(e).__name__}: {e}", file=sys.stderr)
+    return merged
+
+
+class AnalyticsExporter:
+    """Background thread exporting a process's sketches to the shared directory"""
+
+    def __init__(self, analytics, directory, interval=EXPORT_INTERVAL):
+        self.analytics = analytics
+        self.directory = directory
+        self.interval = interval
+        self.exports = 0
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='analytics-exporter', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=self.interval + 1)
+        self.export()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.export()
+
+    def export(self):
+        try:
+            export(self.analytics, self.directory)
+            self.exports += 1
+            self.last_error = None
+        except OSError as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            print(f"Analytics export failed: {self.last_error}", file=sys.stderr)
+
+
+@functools.lru_cache(maxsize=None)
+def get_analytics():
+    """Per-process analytics, with its periodic export started when EMERGENCY_ANALYTICS_DIR is set"""
+    analytics = QueryAnalytics()
+    directory = os.environ.get(EXPORT_DIR_ENV)
+    if directory:
+        analytics.exporter = AnalyticsExporter(analytics, directory).start()
+    return analytics
+
+
+def live_report(analytics, k=10):
+    """This process's live numbers merged with every other worker's latest export"""
+    exporter = analytics.exporter
+    if exporter is None:
+        return analytics.report(k)
+    merged = load_merged(exporter.directory, max_age=EXPORT_INTERVAL * 4, skip=export_path(exporter.directory))
+    merged.merge(analytics)
+    return merged.report(k)
+
+
+def print_report(report):
+    print(f"{report['queries']:,} questions in the last hour • ~{report['users']:,} distinct users • "
+          f"sketches {report['bytes'] / 1024:.0f} KB")
+    for label, seconds in RATE_WINDOWS:
+        print(f"  {label:>7}: {report['rates'].get('queries', {}).get(label, 0.0):.2f} questions/s")
+    for title, name in (("Intent mix", 'intents'), ("Top ZIP codes", 'zips'), ("Top addresses", 'addresses')):
+        print(f"\n{title}:")
+        total = report['intent_total'] if name == 'intents' else None
+        for key, count in report[name]:
+            share = f" ({count / total:.0%})" if total else ""
+            print(f"  {count:>8,}{share:<7} {key}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merged analytics from every worker's exported sketches")
+    sub = parser.add_subparsers(dest='command', required=True)
+    report = sub.add_parser('report', help="Print the merged dashboard numbers")
+    report.add_argument('directory', nargs='?', default=os.environ.get(EXPORT_DIR_ENV, 'data/analytics'))
+    report.add_argument('--top', type=int, default=10)
+    report.add_argument('--max-age', type=float, default=None,
+                        help="Skip exports older than this many seconds (workers that have stopped)")
+    args = parser.parse_args()
+    print_report(load_merged(args.directory, args.max_age).report(args.top))
+
+
+if __name__ == "__main__":
+    main()
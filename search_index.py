@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Preparedness Search Index - BM25 retrieval over preparedness content
+Indexes FEMA_DATA, the disaster guides, GO_BAG_ESSENTIALS and a corpus of guidance
+documents so questions that match no routing keyword still get an answer.
+
+The index is an inverted file with precomputed BM25 impacts per posting, stored
+in the shared data pack format so every worker maps one copy read-only.
+
+Build with: python search_index.py build [--corpus corpus/] [--output data/search.index]
+"""
+
+import os
+import re
+import sys
+import glob
+import json
+import bisect
+import hashlib
+import argparse
+import threading
+
+import numpy as np
+
+import datapack
+
+INDEX_VERSION = 1
+
+# Standard BM25 parameters
+K1 = 1.2
+B = 0.75
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_INDEX_PATH = os.path.join(ROOT, 'data', 'search.index')
+DEFAULT_CORPUS_DIR = os.path.join(ROOT, 'corpus')
+INDEX_PATH_ENV = 'EMERGENCY_SEARCH_INDEX'
+CORPUS_DIR_ENV = 'EMERGENCY_CORPUS'
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a about above after again all am an and any are as at be because been before being
+below between both but by can could did do does doing down during each for from further
+had has have having he her here hers him his how i if in into is it its itself just me
+more most my no nor not now of off on once only or other our ours out over own same she
+should so some such than that the their theirs them then there these they this those
+through to too under until up very was we were what when where which while who whom why
+will with would you your yours
+""".split())
+
+
+def stem(token):
+    """Light suffix stripping so plurals and simple verb forms share a term"""
+    if len(token) > 5 and token.endswith('ing'):
+        return token[:-3]
+    if len(token) > 4 and token.endswith('ed'):
+        return token[:-2]
+    if len(token) > 4 and token.endswith('ies'):
+        return token[:-3] + 'y'
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    """Lowercase, split, drop stopwords and stem"""
+    return [stem(t) for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+# Passage collection
+
+def knowledge_passages(knowledge):
+    """Turn the knowledge sections into (title, source, url, text) passages"""
+    passages = []
+    fema = knowledge['fema']
+    passages.append(("FEMA eligibility", "FEMA", "https://www.disasterassistance.gov",
+                     "FEMA Individual Assistance eligibility requirements: " + "; ".join(fema['eligibility'])))
+    passages.append(("How to apply for FEMA assistance", "FEMA", "https://www.disasterassistance.gov",
+                     "Steps to apply for FEMA disaster assistance: " + "; ".join(fema['process'])))
+
+    for disaster, guide in knowledge['disaster_guides'].items():
+        passages.append((f"{disaster.title()} safety", "Ready.gov", f"https://www.ready.gov/{disaster}",
+                         f"During a {disaster}: {guide['action']}. " + ". ".join(guide['steps']) + "."))
+    general = knowledge['disaster_general']
+    passages.append(("Before a disaster", "Ready.gov", "https://www.ready.gov/plan",
+                     "Before a disaster: " + ". ".join(general['before']) + "."))
+    passages.append(("After a disaster", "Ready.gov", "https://www.ready.gov/recovering-disaster",
+                     "After a disaster: " + ". ".join(general['after']) + "."))
+
+    labels = {'base': "Emergency kit essentials for everyone", 'per_adult': "Emergency kit items for each adult",
+              'per_child': "Emergency kit items for children", 'per_pet': "Emergency kit items for pets"}
+    for group, items in knowledge['go_bag'].items():
+        passages.append((labels.get(group, "Emergency kit"), "Ready.gov", "https://www.ready.gov/kit",
+                         f"{labels.get(group, 'Emergency kit')}: " + "; ".join(items) + "."))
+
+    for region, shelters in knowledge['shelters'].items():
+        for shelter in shelters:
+            passages.append((shelter['name'], "Shelter directory", "",
+                             f"{shelter['name']} emergency shelter in {region}, {shelter['address']}. "
+                             f"Capacity {shelter['capacity']}. Services: {shelter['services']}. "
+                             f"Phone {shelter['phone']}."))
+    return passages
+
+
+def corpus_passages(corpus_dir):
+    """Load guidance documents: .jsonl (title, source, url, text) or .md/.txt paragraphs"""
+    passages = []
+    for path in sorted(glob.glob(os.path.join(corpus_dir, '**', '*'), recursive=True)):
+        if path.endswith('.jsonl'):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        doc = json.loads(line)
+                        passages.append((doc.get('title', ''), doc.get('source', ''),
+                                         doc.get('url', ''), doc['text']))
+        elif path.endswith(('.md', '.txt')):
+            title = os.path.splitext(os.path.basename(path))[0].replace('_', ' ').title()
+            with open(path, encoding='utf-8') as f:
+                for paragraph in re.split(r"\n\s*\n", f.read()):
+                    paragraph = paragraph.strip()
+                    if paragraph.startswith('#'):
+                        title = paragraph.lstrip('#').strip()
+                    elif paragraph:
+                        passages.append((title, os.path.basename(path), '', paragraph))
+    return passages
+
+
+def source_fingerprint(passages):
+    """Stable hash of the indexed content, used to detect a stale index"""
+    digest = hashlib.sha256()
+    for passage in passages:
+        digest.update("\x1f".join(passage).encode('utf-8'))
+        digest.update(b"\x1e")
+    return digest.hexdigest()
+
+
+# Index build
+
+def build_sections(passages, k1=K1, b=B):
+    """Build the inverted index as pack sections"""
+    doc_terms = []
+    doc_len = np.empty(len(passages), dtype=np.float32)
+    for doc_id, (title, _, _, text) in enumerate(passages):
+        tokens = tokenize(f"{title} {text}")
+        doc_len[doc_id] = len(tokens)
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        doc_terms.append(counts)
+
+    postings = {}
+    for doc_id, counts in enumerate(doc_terms):
+        for term, tf in counts.items():
+            postings.setdefault(term, []).append((doc_id, tf))
+
+    n_docs = len(passages)
+    avg_len = float(doc_len.mean()) if n_docs else 0.0
+    vocab = sorted(postings)
+    offsets = np.zeros(len(vocab) + 1, dtype=np.uint64)
+    docs_parts, impact_parts = [], []
+    for i, term in enumerate(vocab):
+        plist = postings[term]
+        docs = np.fromiter((d for d, _ in plist), dtype=np.uint32, count=len(plist))
+        tf = np.fromiter((t for _, t in plist), dtype=np.float32, count=len(plist))
+        idf = np.log(1.0 + (n_docs - len(plist) + 0.5) / (len(plist) + 0.5))
+        norm = k1 * (1.0 - b + b * doc_len[docs] / avg_len)
+        # Query-independent BM25 contribution of this term to each document
+        impact_parts.append((idf * tf * (k1 + 1.0) / (tf + norm)).astype(np.float32))
+        docs_parts.append(docs)
+        offsets[i + 1] = offsets[i] + len(plist)
+
+    empty_u32, empty_f32 = np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.float32)
+    return {
+        'meta': {'version': INDEX_VERSION, 'k1': k1, 'b': b, 'documents': n_docs,
+                 'terms': len(vocab), 'fingerprint': source_fingerprint(passages)},
+        'vocab': datapack.StringList(vocab),
+        'term_offsets': offsets,
+        'posting_docs': np.concatenate(docs_parts) if docs_parts else empty_u32,
+        'posting_impacts': np.concatenate(impact_parts) if impact_parts else empty_f32,
+        'titles': datapack.StringList(p[0] for p in passages),
+        'sources': datapack.StringList(p[1] for p in passages),
+        'urls': datapack.StringList(p[2] for p in passages),
+        'texts': datapack.StringList(p[3] for p in passages)
+    }
+
+
+def build_index(passages, path):
+    """Build and persist an index; returns the opened index"""
+    datapack.write_pack(path, build_sections(passages))
+    return SearchIndex(datapack.DataPack(path))
+
+
+# Query
+
+class SearchIndex:
+    """Top-k BM25 search over a mapped index"""
+
+    def __init__(self, pack):
+        self.pack = pack
+        self.meta = pack['meta']
+        if self.meta.get('version') != INDEX_VERSION:
+            raise ValueError(f"Search index version {self.meta.get('version')}, expected {INDEX_VERSION}")
+        self.vocab = pack['vocab']
+        self.offsets = pack['term_offsets']
+        self.docs = pack['posting_docs']
+        self.impacts = pack['posting_impacts']
+        self.n_docs = self.meta['documents']
+
+    def __len__(self):
+        return self.n_docs
+
+    def _postings(self, term):
+        i = bisect.bisect_left(self.vocab, term)
+        if i < len(self.vocab) and self.vocab[i] == term:
+            lo, hi = int(self.offsets[i]), int(self.offsets[i + 1])
+            return self.docs[lo:hi], self.impacts[lo:hi]
+        return None
+
+    def search(self, query, k=3, min_score=0.0):
+        """Return up to k passages as dicts with score, title, source, url and text"""
+        terms = set(tokenize(query))
+        scores = None
+        for term in terms:
+            postings = self._postings(term)
+            if postings is None:
+                continue
+            docs, impacts = postings
+            if scores is None:
+                scores = np.zeros(self.n_docs, dtype=np.float32)
+            # Each document appears once per term, so fancy-index += is exact
+            scores[docs] += impacts
+        if scores is None:
+            return []
+
+        k = min(k, self.n_docs)
+        top = np.argpartition(-scores, k - 1)[:k] if k < self.n_docs else np.arange(self.n_docs)
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [{
+            'score': float(scores[d]),
+            'title': self.pack['titles'][int(d)],
+            'source': self.pack['sources'][int(d)],
+            'url': self.pack['urls'][int(d)],
+            'text': self.pack['texts'][int(d)]
+        } for d in top if scores[d] > min_score]
+
+
+_index_lock = threading.Lock()
+_index_cache = {}
+
+
+def index_path():
+    """Path of the persisted index (EMERGENCY_SEARCH_INDEX overrides the default)"""
+    return os.environ.get(INDEX_PATH_ENV, DEFAULT_INDEX_PATH)
+
+
+def corpus_dir():
+    """Guidance corpus directory (EMERGENCY_CORPUS overrides the default)"""
+    return os.environ.get(CORPUS_DIR_ENV, DEFAULT_CORPUS_DIR)
+
+
+def get_index(knowledge, corpus=None):
+    """Per-process index: map the persisted one, rebuilding it if the content changed
+
+    The content check runs once per process; later calls return the mapped index.
+    """
+    path = index_path()
+    with _index_lock:
+        if path in _index_cache:
+            return _index_cache[path]
+        passages = knowledge_passages(knowledge) + corpus_passages(corpus or corpus_dir())
+        fingerprint = source_fingerprint(passages)
+        index = None
+        if os.path.exists(path):
+            try:
+                index = SearchIndex(datapack.DataPack(path))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Rebuilding unreadable search index {path}: {e}", file=sys.stderr)
+        if index is None or index.meta['fingerprint'] != fingerprint:
+            index = build_index(passages, path)
+        _index_cache[path] = index
+        return index
+
+
+def clear_index_cache():
+    """Forget the per-process index so the next get_index() re-checks the content"""
+    with _index_lock:
+        _index_cache.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the preparedness search index")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help="Build the index from the knowledge base and corpus")
+    build.add_argument('--corpus', default=corpus_dir())
+    build.add_argument('--output', default=index_path())
+    query = sub.add_parser('query', help="Run a query against the persisted index")
+    query.add_argument('text')
+    query.add_argument('-k', type=int, default=3)
+    query.add_argument('--index', default=index_path())
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        passages = knowledge_passages(datapack.load_knowledge()) + corpus_passages(args.corpus)
+        index = build_index(passages, args.output)
+        print(f"Indexed {len(index)} passages, {index.meta['terms']} terms -> {args.output}")
+    else:
+        index = SearchIndex(datapack.DataPack(args.index))
+        for hit in index.search(args.text, k=args.k):
+            print(f"{hit['score']:.2f}  {hit['title']} ({hit['source']})\n      {hit['text']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Session Memory Budgets - Approximate per-session footprint, compaction and eviction
+A session open all day (a shelter kiosk, say) keeps every turn's full HTML,
+reasoning and tool list. Each session's footprint is estimated per category;
+over budget, the oldest turns are first compacted (text-first HTML, no
+reasoning or tool details) and then evicted, always keeping the latest turns
+intact. A process-wide ledger records every session's totals for operators.
+
+Budget: EMERGENCY_SESSION_BUDGET_KB (default 256)
+"""
+
+import os
+import sys
+import time
+import threading
+
+from compact_mode import compact_html
+
+BUDGET_ENV = 'EMERGENCY_SESSION_BUDGET_KB'
+DEFAULT_BUDGET_KB = 256
+
+# Latest messages never compacted or evicted (the current exchange and a little context)
+KEEP_RECENT = 6
+
+# Enforcement trims to this share of the budget so the next turns fit without trimming again
+TRIM_TO = 0.8
+
+# Sessions not seen for this long drop out of the ledger
+LEDGER_TTL = 3600.0
+
+
+def budget_bytes():
+    """Per-session budget from the environment, in bytes"""
+    try:
+        return int(float(os.environ.get(BUDGET_ENV, DEFAULT_BUDGET_KB)) * 1024)
+    except ValueError:
+        return DEFAULT_BUDGET_KB * 1024
+
+
+def approx_size(obj):
+    """Approximate bytes held by obj and everything it contains"""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approx_size(key) + approx_size(value) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(approx_size(item) for item in obj)
+    return size
+
+
+def session_footprint(state):
+    """Bytes per category for one session's state (a mapping such as st.session_state)"""
+    messages = state.get('messages') or []
+    maps = sum(1 for msg in messages if msg.get('show_map') and not msg.get('compacted'))
+    return {
+        'messages': approx_size(messages),
+        'household': approx_size(state.get('household_info')) + approx_size(state.get('user_address')),
+        'maps': maps * state.get('map_bytes', 0),
+        'profiles': approx_size(state.get('profile_runs')) + approx_size(state.get('last_profile'))
+    }
+
+
+def compact_turn(msg):
+    """A smaller copy of an assistant turn: compact HTML, no reasoning, tools or map"""
+    if msg['role'] != 'assistant' or msg.get('compacted'):
+        return msg
+    return {
+        'role': msg['role'],
+        'content': compact_html(msg['content']),
+        'timestamp': msg.get('timestamp'),
+        'needs_input': msg.get('needs_input'),
+        'compacted': True
+    }
+
+
+def enforce_budget(messages, budget, other_bytes=0):
+    """Compact, then evict, the oldest turns until the session fits its budget
+
+    Returns (messages, turns compacted, messages evicted); messages is a new
+    list when anything changed. other_bytes is the rest of the session's footprint.
+    """
+    size = approx_size(messages) + other_bytes
+    if size <= budget:
+        return messages, 0, 0
+    target = budget * TRIM_TO
+    messages = list(messages)
+    compacted = 0
+    for i in range(max(0, len(messages) - KEEP_RECENT)):
+        if size <= target:
+            break
+        smaller = compact_turn(messages[i])
+        if smaller is not messages[i]:
+            size -= approx_size(messages[i]) - approx_size(smaller)
+            messages[i] = smaller
+            compacted += 1
+
+    evicted = 0
+    while size > target and len(messages) > KEEP_RECENT:
+        size -= approx_size(messages.pop(0))
+        evicted += 1
+    # Never leave an answer without its question at the top
+    if evicted and messages and messages[0]['role'] == 'assistant' and len(messages) > KEEP_RECENT:
+        messages.pop(0)
+        evicted += 1
+    return messages, compacted, evicted
+
+
+class SessionLedger:
+    """Latest footprint of every live session in this process (thread-safe)"""
+
+    def __init__(self, ttl=LEDGER_TTL):
+        self.ttl = ttl
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def update(self, session_id, footprint, turns=0, compacted=0, evicted=0):
+        now = time.time()
+        with self._lock:
+            self._sessions[session_id] = {
+                'session_id': session_id, 'bytes': sum(footprint.values()), 'footprint': dict(footprint),
+                'turns': turns, 'compacted': compacted, 'evicted': evicted, 'seen_at': now
+            }
+            for stale in [sid for sid, entry in self._sessions.items() if now - entry['seen_at'] > self.ttl]:
+                del self._sessions[stale]
+
+    def heaviest(self, n=10):
+        """The n largest sessions, largest first"""
+        with self._lock:
+            return sorted(self._sessions.values(), key=lambda entry: entry['bytes'], reverse=True)[:n]
+
+    def totals(self):
+        with self._lock:
+            return {'sessions': len(self._sessions),
+                    'bytes': sum(entry['bytes'] for entry in self._sessions.values()),
+                    'compacted': sum(entry['compacted'] for entry in self._sessions.values()),
+                    'evicted': sum(entry['evicted'] for entry in self._sessions.values())}
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+External Session Store - Conversation state shared by every app process
+Keeps messages, household_info and user_address outside st.session_state so any
+process behind the load balancer can serve any user. Writes are buffered and
+flushed in batches by a background thread; a reconnect costs one fetch.
+
+Backends:
+    sqlite:///path/to/sessions.db   SQLite in WAL mode (one host)
+    redis://host:port               Any Redis-protocol server
+
+Run the local Redis-protocol stand-in with: python session_store.py serve --port 6380
+"""
+
+import os
+import json
+import zlib
+import time
+import socket
+import sqlite3
+import atexit
+import argparse
+import threading
+import functools
+import socketserver
+from datetime import datetime
+from urllib.parse import urlparse
+
+STORE_URL_ENV = 'EMERGENCY_SESSION_STORE'
+
+# Session keys that survive a process restart
+PERSISTED_KEYS = ('messages', 'household_info', 'user_address', 'compacted_turns', 'evicted_turns')
+
+# Write-behind: flush at least this often, or sooner once this many sessions are dirty
+FLUSH_INTERVAL = 0.25
+FLUSH_BATCH = 64
+
+# Payloads above this size are zlib-compressed
+COMPRESS_THRESHOLD = 512
+
+# Sessions idle for longer than this expire (Redis) or are pruned (SQLite)
+SESSION_TTL = 7 * 24 * 3600
+# Seconds between prunes of expired SQLite sessions (by each process)
+PRUNE_INTERVAL = 300
+
+
+# Serialization
+
+def _default(value):
+    if isinstance(value, datetime):
+        return {'$dt': value.isoformat()}
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _object_hook(obj):
+    if len(obj) == 1 and '$dt' in obj:
+        return datetime.fromisoformat(obj['$dt'])
+    return obj
+
+
+def encode_state(state):
+    """Serialize a session dict to compact bytes (1-byte codec tag + body)"""
+    body = json.dumps(state, default=_default, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    if len(body) > COMPRESS_THRESHOLD:
+        return b'z' + zlib.compress(body, 6)
+    return b'j' + body
+
+
+def decode_state(data):
+    """Inverse of encode_state"""
+    if data is None:
+        return None
+    tag, body = data[:1], data[1:]
+    if tag == b'z':
+        body = zlib.decompress(body)
+    elif tag != b'j':
+        raise ValueError(f"Unknown session codec {tag!r}")
+    return json.loads(body, object_hook=_object_hook)
+
+
+# Backends
+
+class SQLiteBackend:
+    """Sessions in a SQLite table; safe for several processes on one host"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("""CREATE TABLE IF NOT EXISTS sessions (
+                            id TEXT PRIMARY KEY,
+                            data BLOB NOT NULL,
+                            updated REAL NOT NULL)""")
+        # Pruning looks sessions up by age, not id
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)")
+        conn.commit()
+        self._pruned_at = 0.0
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id):
+        row = self._conn().execute("SELECT data FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return row[0] if row else None
+
+    def put_many(self, items):
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO sessions (id, data, updated) VALUES (?, ?, ?)",
+                             [(sid, data, now) for sid, data in items])
+            if now - self._pruned_at >= PRUNE_INTERVAL:
+                conn.execute("DELETE FROM sessions WHERE updated < ?", (now - SESSION_TTL,))
+                self._pruned_at = now
+
+    def delete(self, session_id):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+
+class RedisBackend:
+    """Sessions in any server speaking the Redis protocol (RESP)"""
+
+    def __init__(self, host='127.0.0.1', port=6379, prefix='ep:session:'):
+        self.address = (host, port)
+        self.prefix = prefix
+        self._local = threading.local()
+
+    def _sock(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            sock = socket.create_connection(self.address, timeout=5)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn = (sock, sock.makefile('rb'))
+            self._local.conn = conn
+        return conn
+
+    def _reset(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn[0].close()
+            self._local.conn = None
+
+    def _pipeline(self, commands):
+        """Send commands in one write and read one reply per command"""
+        payload = b''.join(encode_command(*c) for c in commands)
+        try:
+            sock, reader = self._sock()
+            sock.sendall(payload)
+            return [read_reply(reader) for _ in commands]
+        except OSError:
+            self._reset()
+            raise
+
+    def get(self, session_id):
+        return self._pipeline([(b'GET', self.prefix + session_id)])[0]
+
+    def put_many(self, items):
+        self._pipeline([(b'SET', self.prefix + sid, data, b'EX', SESSION_TTL) for sid, data in items])
+
+    def delete(self, session_id):
+        self._pipeline([(b'DEL', self.prefix + session_id)])
+
+
+class ReplyError(Exception):
+    """Error reply from a Redis-protocol server"""
+
+
+def _to_bytes(value):
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode('utf-8')
+
+
+def encode_command(*args):
+    """Encode one command as a RESP array of bulk strings"""
+    parts = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        arg = _to_bytes(arg)
+        parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+    return b''.join(parts)
+
+
+def read_reply(reader):
+    """Read one RESP reply from a buffered reader"""
+    line = reader.readline()
+    if not line:
+        raise ConnectionError("Connection closed by server")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b'+':
+        return rest
+    if kind == b'-':
+        raise ReplyError(rest.decode('utf-8', 'replace'))
+    if kind == b':':
+        return int(rest)
+    if kind == b'$':
+        length = int(rest)
+        if length < 0:
+            return None
+        data = reader.read(length + 2)
+        return data[:-2]
+    if kind == b'*':
+        count = int(rest)
+        return None if count < 0 else [read_reply(reader) for _ in range(count)]
+    raise ReplyError(f"Unexpected reply type {kind!r}")
+
+
+# Write-behind store
+
+class SessionStore:
+    """Write-behind cache in front of a backend
+
+    save() only records the latest state per session; a background thread
+    writes dirty sessions in one batch every FLUSH_INTERVAL seconds (or once
+    FLUSH_BATCH sessions are dirty). load() serves pending writes first, so a
+    process always reads its own writes.
+    """
+
+    def __init__(self, backend, flush_interval=FLUSH_INTERVAL, flush_batch=FLUSH_BATCH):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self.stats = {'saves': 0, 'writes': 0, 'batches': 0, 'loads': 0, 'errors': 0}
+        self._thread = threading.Thread(target=self._run, name='session-store-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def load(self, session_id):
+        """Fetch a session's state, or None if it is unknown"""
+        with self._lock:
+            if session_id in self._pending:
+                return decode_state(self._pending[session_id])
+        self.stats['loads'] += 1
+        try:
+            return decode_state(self.backend.get(session_id))
+        except Exception:
+            # An unreachable store degrades to a fresh in-process session
+            self.stats['errors'] += 1
+            return None
+
+    def save(self, session_id, state):
+        """Queue a session's state; returns immediately"""
+        data = encode_state(state)
+        with self._lock:
+            self._pending[session_id] = data
+            self.stats['saves'] += 1
+            dirty = len(self._pending)
+        if dirty >= self.flush_batch:
+            self._wake.set()
+
+    def delete(self, session_id):
+        with self._lock:
+            self._pending.pop(session_id, None)
+        self.backend.delete(session_id)
+
+    def flush(self):
+        """Write all pending sessions in one batch"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+        try:
+            self.backend.put_many(list(batch.items()))
+        except Exception:
+            self.stats['errors'] += 1
+            # Put the batch back unless a newer state arrived meanwhile
+            with self._lock:
+                for sid, data in batch.items():
+                    self._pending.setdefault(sid, data)
+            raise
+        self.stats['writes'] += len(batch)
+        self.stats['batches'] += 1
+        return len(batch)
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                time.sleep(self.flush_interval)
+
+    def close(self):
+        if self._stopped:
+            return
+        self._stopped = True
+        self._wake.set()
+        self._thread.join(timeout=5)
+        try:
+            self.flush()
+        except Exception:
+            pass
+
+
+def create_backend(url):
+    """Build a backend from a sqlite:/// or redis:// URL"""
+    parsed = urlparse(url)
+    if parsed.scheme == 'sqlite':
+        path = parsed.path if parsed.netloc in ('', 'localhost') else parsed.netloc + parsed.path
+        return SQLiteBackend(path)
+    if parsed.scheme == 'redis':
+        return RedisBackend(parsed.hostname or '127.0.0.1', parsed.port or 6379)
+    raise ValueError(f"Unsupported session store URL: {url}")
+
+
+@functools.lru_cache(maxsize=None)
+def get_store(url=None):
+    """Per-process store for the configured URL, or None to keep state in-process"""
+    url = url or os.environ.get(STORE_URL_ENV)
+    if not url:
+        return None
+    return SessionStore(create_backend(url))
+
+
+# Local Redis-protocol stand-in
+
+class _RespHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        server = self.server
+        while True:
+            try:
+                command = read_reply(self.rfile)
+            except (ConnectionError, ReplyError, ValueError):
+                return
+            if not command:
+                return
+            name, args = command[0].upper(), command[1:]
+            self.wfile.write(server.execute(name, args))
+            self.wfile.flush()
+
+
+class RespServer(socketserver.ThreadingTCPServer):
+    """In-memory server for the subset of Redis commands the store uses"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        super().__init__(address, _RespHandler)
+        self.data = {}
+        self.expiry = {}
+        self.lock = threading.Lock()
+
+    def _alive(self, key):
+        deadline = self.expiry.get(key)
+        if deadline is not None and deadline < time.time():
+            self.data.pop(key, None)
+            self.expiry.pop(key, None)
+        return key in self.data
+
+    def execute(self, name, args):
+        with self.lock:
+            if name == b'PING':
+                return b'+PONG\r\n'
+            if name == b'GET' and len(args) == 1:
+                if not self._alive(args[0]):
+                    return b'$-1\r\n'
+                value = self.data[args[0]]
+                return b'$%d\r\n%s\r\n' % (len(value), value)
+            if name == b'SET' and len(args) >= 2:
+                self.data[args[0]] = args[1]
+                self.expiry.pop(args[0], None)
+                if len(args) == 4 and args[2].upper() == b'EX':
+                    self.expiry[args[0]] = time.time() + int(args[3])
+                return b'+OK\r\n'
+            if name == b'DEL':
+                removed = 0
+                for key in args:
+                    if self._alive(key):
+                        del self.data[key]
+                        self.expiry.pop(key, None)
+                        removed += 1
+                return b':%d\r\n' % removed
+            if name == b'DBSIZE':
+                return b':%d\r\n' % sum(1 for key in list(self.data) if self._alive(key))
+        return b'-ERR unsupported command\r\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Session store utilities")
+    sub = parser.add_subparsers(dest='command', required=True)
+    serve = sub.add_parser('serve', help="Run the local Redis-protocol stand-in")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=6380)
+    args = parser.parse_args()
+
+    server = RespServer((args.host, args.port))
+    print(f"Session store listening on redis://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
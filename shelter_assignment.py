@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Shelter Assignment Engine - Capacity-aware batch placement of evacuees
+Assigns households to shelters by distance while respecting capacity and services
+
+Run with: python shelter_assignment.py households.csv shelters.csv -o assignment.csv
+"""
+
+import csv
+import argparse
+
+import numpy as np
+
+EARTH_RADIUS_MILES = 3958.8
+
+# Candidate shelters considered per household before falling back to a wider search
+DEFAULT_CANDIDATES = 8
+
+# Households processed per distance block (bounds memory at block * shelters floats)
+BLOCK_SIZE = 4096
+
+
+def parse_capacity(value):
+    """Parse a capacity such as '500 people' into an integer"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    digits = ''.join(ch for ch in str(value) if ch.isdigit())
+    return int(digits) if digits else 0
+
+
+def parse_services(value):
+    """Parse a services string such as 'Food, water, pet-friendly' into a set"""
+    if isinstance(value, (set, frozenset, list, tuple)):
+        return frozenset(s.strip().lower() for s in value)
+    return frozenset(s.strip().lower() for s in str(value).split(',') if s.strip())
+
+
+def shelters_from_data(shelter_data):
+    """Flatten SHELTER_DATA-style {region: [shelter, ...]} into engine shelters"""
+    shelters = []
+    for region, entries in shelter_data.items():
+        for shelter in entries:
+            shelters.append({
+                'id': shelter.get('id', shelter['name']),
+                'name': shelter['name'],
+                'region': region,
+                'lat': shelter['lat'],
+                'lon': shelter['lon'],
+                'capacity': parse_capacity(shelter['capacity']),
+                'services': parse_services(shelter['services'])
+            })
+    return shelters
+
+
+def unit_vectors(lat, lon):
+    """Convert degrees to unit vectors on the sphere, shape (n, 3)"""
+    lat, lon = np.radians(np.asarray(lat, dtype=np.float64)), np.radians(np.asarray(lon, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def dot_to_miles(dot):
+    """Great-circle distance in miles from the dot product of two unit vectors"""
+    return EARTH_RADIUS_MILES * np.arccos(np.clip(dot, -1.0, 1.0))
+
+
+class AssignmentPlan:
+    """Distance-minimizing, capacity-respecting assignment of households to shelters
+
+    Uses a greedy heuristic over each household's nearest eligible shelters:
+    candidate (household, shelter) pairs are taken shortest-first while the
+    shelter still has room. Households whose candidates are all full are
+    retried with a 4x wider candidate set until every shelter is considered.
+    This is not an exact min-cost flow, but it scales to 100k x 1k in seconds.
+    """
+
+    def __init__(self, shelters, candidates=DEFAULT_CANDIDATES):
+        self.shelters = list(shelters)
+        self.candidates = candidates
+        self.shelter_index = {s['id']: i for i, s in enumerate(self.shelters)}
+        self.shelter_xyz = unit_vectors([s['lat'] for s in self.shelters],
+                                        [s['lon'] for s in self.shelters]).reshape(-1, 3)
+        self.capacity = np.array([parse_capacity(s['capacity']) for s in self.shelters], dtype=np.int64)
+        self.load = np.zeros(len(self.shelters), dtype=np.int64)
+        self.services = [parse_services(s.get('services', ())) for s in self.shelters]
+
+        self.households = []
+        self.household_index = {}
+        self.hh_xyz = np.empty((0, 3))
+        self.hh_size = np.empty(0, dtype=np.int64)
+        self.hh_needs = []
+        # Shelter position per household, -1 when unassigned
+        self.assigned = np.empty(0, dtype=np.int64)
+        # Households released from the plan; they are never placed again
+        self.released = np.empty(0, dtype=bool)
+        self.distance = np.empty(0)
+        self._eligible_cache = {}
+
+    # Household intake
+
+    def add_households(self, households):
+        """Register households (dicts with id, lat, lon, size and optional needs)"""
+        households = list(households)
+        start = len(self.households)
+        for offset, hh in enumerate(households):
+            self.household_index[hh['id']] = start + offset
+        self.households.extend(households)
+        self.hh_xyz = np.concatenate([self.hh_xyz,
+                                      unit_vectors([h['lat'] for h in households],
+                                                   [h['lon'] for h in households]).reshape(-1, 3)])
+        self.hh_size = np.concatenate([self.hh_size,
+                                       np.array([int(h.get('size', 1)) for h in households], dtype=np.int64)])
+        self.hh_needs.extend(parse_services(h.get('needs', ())) for h in households)
+        self.assigned = np.concatenate([self.assigned, np.full(len(households), -1, dtype=np.int64)])
+        self.released = np.concatenate([self.released, np.zeros(len(households), dtype=bool)])
+        self.distance = np.concatenate([self.distance, np.full(len(households), np.inf)])
+        return np.arange(start, start + len(households))
+
+    def _eligible_mask(self, needs):
+        """Boolean mask of shelters offering every service in needs"""
+        if needs not in self._eligible_cache:
+            self._eligible_cache[needs] = np.array([needs <= s for s in self.services], dtype=bool)
+        return self._eligible_cache[needs]
+
+    # Core assignment
+
+    def _candidate_edges(self, positions, k):
+        """Nearest-k eligible (household, shelter, distance) edges for positions"""
+        hh, sh, dist = [], [], []
+        groups = {}
+        for pos in positions:
+            groups.setdefault(self.hh_needs[pos], []).append(pos)
+
+        for needs, members in groups.items():
+            mask = self._eligible_mask(needs)
+            eligible = np.flatnonzero(mask)
+            if eligible.size == 0:
+                continue
+            kk = min(k, eligible.size)
+            shelter_xyz = self.shelter_xyz[eligible]
+            members = np.asarray(members)
+            for lo in range(0, members.size, BLOCK_SIZE):
+                block = members[lo:lo + BLOCK_SIZE]
+                # Nearest on the sphere == largest dot product, so one matrix
+                # product ranks the block; trig runs only on the k winners
+                neg_dot = -(self.hh_xyz[block] @ shelter_xyz.T)
+                if kk < eligible.size:
+                    nearest = np.argpartition(neg_dot, kk - 1, axis=1)[:, :kk]
+                else:
+                    nearest = np.broadcast_to(np.arange(eligible.size), (block.size, kk))
+                hh.append(np.repeat(block, kk))
+                sh.append(eligible[nearest].ravel())
+                dist.append(dot_to_miles(-np.take_along_axis(neg_dot, nearest, axis=1)).ravel())
+
+        if not hh:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+        return np.concatenate(hh), np.concatenate(sh), np.concatenate(dist)
+
+    def _greedy(self, positions, k):
+        """Assign positions shortest-edge-first; return positions left unassigned"""
+        hh, sh, dist = self._candidate_edges(positions, k)
+        order = np.argsort(dist, kind='stable')
+        # Plain lists keep the per-edge loop free of numpy scalar overhead
+        hh_l, sh_l, dist_l = hh[order].tolist(), sh[order].tolist(), dist[order].tolist()
+        remaining = (self.capacity - self.load).tolist()
+        assigned = self.assigned.tolist()
+        sizes = self.hh_size.tolist()
+        placed_pos, placed_dist = [], []
+
+        for h, s, d in zip(hh_l, sh_l, dist_l):
+            if assigned[h] >= 0:
+                continue
+            size = sizes[h]
+            if remaining[s] >= size:
+                remaining[s] -= size
+                assigned[h] = s
+                placed_pos.append(h)
+                placed_dist.append(d)
+
+        self.assigned = np.array(assigned, dtype=np.int64)
+        self.distance[placed_pos] = placed_dist
+        self.load = self.capacity - np.array(remaining, dtype=np.int64)
+        return [p for p in positions if assigned[p] < 0]
+
+    def _place(self, positions):
+        """Assign positions, widening the candidate set for those left over"""
+        if len(positions) == 0:
+            return []
+        k = self.candidates
+        left = self._greedy(list(positions), k)
+        while left and k < len(self.shelters):
+            k *= 4
+            left = self._greedy(left, k)
+        return left
+
+    def solve(self):
+        """Assign every unassigned household; return the unplaceable household ids"""
+        pending = np.flatnonzero((self.assigned < 0) & ~self.released).tolist()
+        # Edges are placed by distance; this order only breaks ties, larger households first
+        pending.sort(key=lambda p: -int(self.hh_size[p]))
+        left = self._place(pending)
+        return [self.households[p]['id'] for p in left]
+
+    # Incremental re-planning
+
+    def _unassign(self, positions):
+        for p in positions:
+            s = self.assigned[p]
+            if s >= 0:
+                self.load[s] -= self.hh_size[p]
+                self.assigned[p] = -1
+                self.distance[p] = np.inf
+
+    def update_capacity(self, shelter_id, capacity):
+        """Change a shelter's capacity and re-plan only the affected households
+
+        Shrinking evicts the farthest occupants until the shelter fits and
+        re-places them. Growing offers the new room to unassigned households.
+        Returns the ids of households that could not be placed.
+        """
+        s = self.shelter_index[shelter_id]
+        self.capacity[s] = max(0, parse_capacity(capacity))
+
+        if self.load[s] > self.capacity[s]:
+            occupants = np.flatnonzero(self.assigned == s)
+            occupants = occupants[np.argsort(-self.distance[occupants])]
+            evicted = []
+            for p in occupants.tolist():
+                if self.load[s] <= self.capacity[s]:
+                    break
+                evicted.append(p)
+                self._unassign([p])
+            # The shrunken shelter must not take its evictees back
+            saved = self.capacity[s]
+            self.capacity[s] = self.load[s]
+            left = self._place(evicted)
+            self.capacity[s] = saved
+            return [self.households[p]['id'] for p in left]
+
+        return self.solve()
+
+    def close_shelter(self, shelter_id):
+        """Close a shelter and move its occupants elsewhere"""
+        return self.update_capacity(shelter_id, 0)
+
+    def add_shelter(self, shelter):
+        """Open a new shelter and offer it to unassigned households"""
+        self.shelter_index[shelter['id']] = len(self.shelters)
+        self.shelters.append(shelter)
+        self.shelter_xyz = np.vstack([self.shelter_xyz, unit_vectors([shelter['lat']], [shelter['lon']])])
+        self.capacity = np.append(self.capacity, parse_capacity(shelter['capacity']))
+        self.load = np.append(self.load, 0)
+        self.services.append(parse_services(shelter.get('services', ())))
+        self._eligible_cache.clear()
+        return self.solve()
+
+    def remove_households(self, household_ids):
+        """Release households (e.g. they found other lodging) and refill freed space"""
+        positions = [self.household_index[h] for h in household_ids]
+        self._unassign(positions)
+        self.released[positions] = True
+        return self.solve()
+
+    # Results
+
+    def assignment(self, household_id):
+        """Return (shelter, distance_miles) for a household, or (None, None)"""
+        p = self.household_index[household_id]
+        s = self.assigned[p]
+        if s < 0:
+            return None, None
+        return self.shelters[s], float(self.distance[p])
+
+    def summary(self):
+        """Aggregate statistics for the current plan"""
+        placed = self.assigned >= 0
+        return {
+            'households': int((~self.released).sum()),
+            'assigned': int(placed.sum()),
+            'unassigned': int((~placed & ~self.released).sum()),
+            'people_assigned': int(self.hh_size[placed].sum()),
+            'mean_distance_miles': float(self.distance[placed].mean()) if placed.any() else 0.0,
+            'max_distance_miles': float(self.distance[placed].max()) if placed.any() else 0.0,
+            'full_shelters': int((self.load >= self.capacity).sum())
+        }
+
+    def rows(self):
+        """Yield one result row per household"""
+        for p, hh in enumerate(self.households):
+            s = self.assigned[p]
+            yield {
+                'household_id': hh['id'],
+                'shelter_id': self.shelters[s]['id'] if s >= 0 else '',
+                'distance_miles': f"{self.distance[p]:.2f}" if s >= 0 else ''
+            }
+
+
+def assign_households(households, shelters, candidates=DEFAULT_CANDIDATES):
+    """Build and solve a plan in one call"""
+    plan = AssignmentPlan(shelters, candidates=candidates)
+    plan.add_households(households)
+    plan.solve()
+    return plan
+
+
+def load_households_csv(path):
+    """Read households from CSV with id, lat, lon, size and optional needs columns"""
+    with open(path, newline='') as f:
+        return [{
+            'id': row['id'],
+            'lat': float(row['lat']),
+            'lon': float(row['lon']),
+            'size': int(row.get('size') or 1),
+            'needs': (row.get('needs') or '').replace(';', ',')
+        } for row in csv.DictReader(f)]
+
+
+def load_shelters_csv(path):
+    """Read shelters from CSV with id, lat, lon, capacity and optional services columns"""
+    with open(path, newline='') as f:
+        return [{
+            'id': row['id'],
+            'name': row.get('name') or row['id'],
+            'lat': float(row['lat']),
+            'lon': float(row['lon']),
+            'capacity': parse_capacity(row['capacity']),
+            'services': (row.get('services') or '').replace(';', ',')
+        } for row in csv.DictReader(f)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Assign households to shelters")
+    parser.add_argument('households', help="Households CSV (id, lat, lon, size, needs)")
+    parser.add_argument('shelters', help="Shelters CSV (id, lat, lon, capacity, services)")
+    parser.add_argument('-o', '--output', default='assignment.csv', help="Output CSV path")
+    parser.add_argument('-k', '--candidates', type=int, default=DEFAULT_CANDIDATES,
+                        help="Nearest shelters considered per household")
+    args = parser.parse_args()
+
+    plan = assign_households(load_households_csv(args.households),
+                             load_shelters_csv(args.shelters),
+                             candidates=args.candidates)
+
+    with open(args.output, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['household_id', 'shelter_id', 'distance_miles'])
+        writer.writeheader()
+        writer.writerows(plan.rows())
+
+    for key, value in plan.summary().items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
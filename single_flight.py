@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Single-Flight - Run identical concurrent computations once and share the result
+When many sessions ask the same question at the same moment (everyone pressing
+the same menu button after an alert), the first caller for a key computes the
+answer and every caller arriving while it is in flight waits for that result
+instead of starting its own. Nothing is cached afterwards: the next caller
+after completion computes afresh, so answers never go stale.
+
+Measure with: python benchmarks/bench_single_flight.py
+"""
+
+import re
+import time
+import threading
+
+# Coalescing waits no longer than this (seconds) before computing independently
+DEFAULT_WAIT_TIMEOUT = 10.0
+
+
+class _Flight:
+    """One in-flight computation and the callers waiting on it"""
+
+    __slots__ = ('done', 'result', 'error', 'aborted', 'waiters', 'seconds')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        # The leader was interrupted (e.g. a Streamlit rerun) without a result or an error
+        self.aborted = False
+        self.waiters = 0
+        self.seconds = 0.0
+
+
+class SingleFlight:
+    """Per-key coalescing of concurrent calls (thread-safe)"""
+
+    def __init__(self, wait_timeout=DEFAULT_WAIT_TIMEOUT):
+        self.wait_timeout = wait_timeout
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.aborts = 0
+        self.wait_timeouts = 0
+        self.largest_group = 0
+        self.saved_seconds = 0.0
+
+    def do(self, key, func, *args, **kwargs):
+        """Call func(*args, **kwargs) unless a call for key is in flight; returns (result, shared)
+
+        A waiter gets the leader's result object itself (shared=True) or the
+        leader's exception re-raised. Waiters that time out, or whose leader was
+        interrupted by a BaseException (a Streamlit rerun or stop), compute on their own.
+        """
+        with self._lock:
+            self.calls += 1
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                leader = True
+            else:
+                flight.waiters += 1
+                leader = False
+
+        if not leader:
+            if flight.done.wait(self.wait_timeout) and not flight.aborted:
+                with self._lock:
+                    self.coalesced += 1
+                    self.saved_seconds += flight.seconds
+                if flight.error is not None:
+                    raise flight.error
+                return flight.result, True
+            with self._lock:
+                if flight.aborted:
+                    self.aborts += 1
+                else:
+                    self.wait_timeouts += 1
+            return func(*args, **kwargs), False
+
+        start = time.perf_counter()
+        try:
+            flight.result = func(*args, **kwargs)
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                self.errors += 1
+            raise
+        except BaseException:
+            flight.aborted = True
+            raise
+        finally:
+            flight.seconds = time.perf_counter() - start
+            with self._lock:
+                del self._flights[key]
+                self.executions += 1
+                self.largest_group = max(self.largest_group, flight.waiters + 1)
+            flight.done.set()
+        return flight.result, False
+
+    def stats(self):
+        """Coalescing counters: calls, executions, coalesced waiters and work saved"""
+        with self._lock:
+            return {
+                'calls': self.calls, 'executions': self.executions, 'coalesced': self.coalesced,
+                'errors': self.errors, 'aborts': self.aborts, 'wait_timeouts': self.wait_timeouts,
+                'in_flight': len(self._flights),
+                'largest_group': self.largest_group, 'saved_seconds': self.saved_seconds,
+                'coalesced_ratio': self.coalesced / self.calls if self.calls else 0.0
+            }
+
+
+def normalize_query(query):
+    """Coalescing form of a question: case and spacing don't change the answer"""
+    return re.sub(r'\s+', ' ', query).strip().lower()
+
+
+def flight_key(query, context):
+    """Key for a question plus the session context its answer depends on"""
+    return (normalize_query(query),) + tuple(
+        (name, tuple(sorted(value.items())) if isinstance(value, dict) else value)
+        for name, value in sorted(context.items()))
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Startup Snapshot - Every derived index in one versioned, checksummed file
+The build step serializes the knowledge sections, the BM25 search index and the
+spelling dictionary into a single data pack. Each worker maps it at startup
+instead of rebuilding anything; the file is checked against its CRC-32 and only
+rebuilt when its component versions no longer match the code.
+
+Build with: python snapshot.py build [data/snapshot.pack]
+"""
+
+import os
+import sys
+import time
+import argparse
+import functools
+from datetime import datetime
+
+import datapack
+import search_index
+import fuzzy_match
+from knowledge_base import INTENT_KEYWORDS
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_PATH_ENV = 'EMERGENCY_SNAPSHOT'
+DEFAULT_SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'snapshot.pack')
+
+
+def component_versions():
+    """Versions a snapshot must match to be used as-is"""
+    return {
+        'snapshot': SNAPSHOT_VERSION,
+        'pack_format': datapack.FORMAT_VERSION,
+        'search': search_index.INDEX_VERSION,
+        'speller': fuzzy_match.SPELLER_VERSION
+    }
+
+
+def snapshot_path():
+    """Path of the host's snapshot (EMERGENCY_SNAPSHOT overrides the default)"""
+    return os.environ.get(SNAPSHOT_PATH_ENV, DEFAULT_SNAPSHOT_PATH)
+
+
+def build_sections(knowledge=None, corpus=None):
+    """Build every component and return the snapshot's pack sections"""
+    knowledge = knowledge or datapack.load_knowledge()
+    corpus = corpus or search_index.corpus_dir()
+    timings = {}
+    sections = {}
+
+    for name, value in knowledge.items():
+        sections[f'knowledge/{name}'] = datapack.Tree(value)
+
+    start = time.perf_counter()
+    passages = search_index.knowledge_passages(knowledge) + search_index.corpus_passages(corpus)
+    for name, value in search_index.build_sections(passages).items():
+        sections[f'search/{name}'] = value
+    timings['search'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    routing_terms = fuzzy_match.routing_vocabulary(INTENT_KEYWORDS, knowledge['disaster_guides'])
+    texts = [text for title, _, _, body in passages for text in (title, body)]
+    speller = fuzzy_match.build_speller(routing_terms, texts)
+    for name, value in fuzzy_match.speller_sections(speller, routing_terms).items():
+        sections[f'speller/{name}'] = value
+    timings['speller'] = time.perf_counter() - start
+
+    sections['snapshot'] = {
+        'versions': component_versions(),
+        'built_at': datetime.now().isoformat(timespec='seconds'),
+        'knowledge': sorted(knowledge),
+        'build_seconds': {name: round(seconds, 3) for name, seconds in timings.items()}
+    }
+    return sections
+
+
+def build_snapshot(path=None, knowledge=None, corpus=None):
+    """Build and atomically write the snapshot; returns its path"""
+    path = path or snapshot_path()
+    return datapack.write_pack(path, build_sections(knowledge, corpus), checksum=True)
+
+
+class Snapshot:
+    """Mapped snapshot: knowledge dict, search index and speller, none of them rebuilt"""
+
+    def __init__(self, pack):
+        self.pack = pack
+        self.meta = pack['snapshot']
+        self.knowledge = {name: pack[f'knowledge/{name}'] for name in self.meta['knowledge']}
+        self.search = search_index.SearchIndex(pack.prefixed('search/'))
+        self.speller = fuzzy_match.MappedSymSpell(pack.prefixed('speller/'))
+
+
+def _open(path):
+    """Open and validate a snapshot; (snapshot or None, reason it cannot be used as-is)"""
+    try:
+        pack = datapack.DataPack(path)
+    except ValueError as e:
+        return None, f"version mismatch ({e})"
+    try:
+        versions = (pack.get('snapshot') or {}).get('versions')
+    except ValueError:
+        # Damaged metadata; the checksum check below reports it
+        versions = component_versions()
+    if versions != component_versions():
+        return None, f"version mismatch ({versions} != {component_versions()})"
+    if not pack.verify():
+        return None, "checksum mismatch"
+    return Snapshot(pack), None
+
+
+# Snapshot swapped in by a knowledge reload; replaces open_snapshot()'s once set
+_live = None
+
+
+@functools.lru_cache(maxsize=None)
+def open_snapshot(path=None):
+    """Per-process snapshot, or None when there is none (components then build in-process)
+
+    A snapshot written by other code versions is rebuilt in place; a corrupt
+    one is reported and ignored rather than trusted.
+    """
+    path = path or snapshot_path()
+    if not os.path.exists(path):
+        return None
+    try:
+        snap, problem = _open(path)
+        if snap is None and problem.startswith("version mismatch"):
+            print(f"Rebuilding snapshot {path}: {problem}", file=sys.stderr)
+            build_snapshot(path)
+            snap, problem = _open(path)
+    except (OSError, KeyError) as e:
+        snap, problem = None, f"{type(e).__name__}: {e}"
+    if snap is None:
+        print(f"Ignoring snapshot {path}: {problem}", file=sys.stderr)
+    return snap
+
+
+def swap_snapshot(snap):
+    """Make snap the process's snapshot; a single assignment, so runs in flight keep the old one"""
+    global _live
+    _live = snap
+
+
+def current_snapshot():
+    """The live snapshot: the last one swapped in, else the one on disk at startup"""
+    return _live if _live is not None else open_snapshot()
+
+
+# App accessors: snapshot first, per-component paths otherwise
+
+def load_knowledge():
+    """Knowledge sections from the snapshot, else from the data pack / knowledge source"""
+    snap = current_snapshot()
+    return snap.knowledge if snap is not None else datapack.load_knowledge()
+
+
+def search_index_for(knowledge):
+    """The snapshot's search index, else the persisted per-component one"""
+    snap = current_snapshot()
+    return snap.search if snap is not None else search_index.get_index(knowledge)
+
+
+def speller(routing_terms, knowledge):
+    """The snapshot's speller if it was built for these routing terms, else an in-process one"""
+    snap = current_snapshot()
+    if snap is not None and snap.speller.routing_terms == tuple(routing_terms):
+        return snap.speller
+    return fuzzy_match.get_speller(routing_terms, knowledge)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect the startup snapshot")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help="Build every derived index into one snapshot file")
+    build.add_argument('path', nargs='?', default=snapshot_path())
+    build.add_argument('--corpus', default=search_index.corpus_dir())
+    info = sub.add_parser('info', help="Show a snapshot's versions and validate its checksum")
+    info.add_argument('path', nargs='?', default=snapshot_path())
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        start = time.perf_counter()
+        build_snapshot(args.path, corpus=args.corpus)
+        print(f"Wrote {args.path} ({os.path.getsize(args.path):,} bytes) in {time.perf_counter() - start:.2f}s")
+    else:
+        pack = datapack.DataPack(args.path)
+        meta = pack['snapshot']
+        print(f"Built {meta['built_at']}; versions {meta['versions']}; build seconds {meta['build_seconds']}")
+        print(f"Current code expects {component_versions()}")
+        print(f"Checksum {'OK' if pack.verify() else 'MISMATCH'}; {len(pack.sections)} sections")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Static Shelter Map - Small server-rendered SVG alternative to the folium map
+Draws the user's location, numbered shelter markers colored by distance, a
+legend and a scale bar into a few kilobytes of SVG, with no JavaScript and no
+tile downloads, for low-end phones, old tablets and slow connections.
+
+Compare with the interactive map: python benchmarks/bench_static_map.py
+"""
+
+import math
+import functools
+from html import escape
+
+DEFAULT_WIDTH = 700
+DEFAULT_HEIGHT = 500
+
+# Same distance bands as the folium markers
+DISTANCE_COLORS = (
+    (2.0, '#16a34a', "Under 2 mi"),
+    (4.0, '#2563eb', "2–4 mi"),
+    (float('inf'), '#ea580c', "4+ mi")
+)
+USER_COLOR = '#dc2626'
+
+# Effective connection types (Network Information API / ECT client hint) treated as slow
+SLOW_CONNECTION_TYPES = ('slow-2g', '2g', '3g')
+# Downlink estimate (Mbps) below which the static map is chosen automatically
+SLOW_DOWNLINK_MBPS = 1.5
+
+
+def distance_color(distance):
+    """Marker color for a distance such as '1.2 miles'"""
+    miles = float(str(distance).split()[0])
+    for limit, color, _ in DISTANCE_COLORS:
+        if miles < limit:
+            return color
+    return DISTANCE_COLORS[-1][1]
+
+
+def is_low_bandwidth(headers):
+    """True when request headers signal Save-Data or a slow connection"""
+    headers = {k.lower(): v for k, v in (headers or {}).items()}
+    if headers.get('save-data', '').strip().lower() == 'on':
+        return True
+    if headers.get('ect', '').strip().lower() in SLOW_CONNECTION_TYPES:
+        return True
+    try:
+        return float(headers.get('downlink', '')) < SLOW_DOWNLINK_MBPS
+    except ValueError:
+        return False
+
+
+def _mercator_y(lat):
+    return math.log(math.tan(math.pi / 4 + math.radians(lat) / 2))
+
+
+def _nice_scale(max_miles):
+    """Largest 1/2/5 x 10^n mile length that fits"""
+    best = 0.1
+    for exponent in range(-1, 4):
+        for step in (1, 2, 5):
+            value = step * 10 ** exponent
+            if value <= max_miles:
+                best = value
+    return best
+
+
+@functools.lru_cache(maxsize=256)
+def _render(shelters, center, width, height):
+    """Render from hashable inputs: shelters as (name, lat, lon, distance) tuples"""
+    points = [(lat, lon) for _, lat, lon, _ in shelters]
+    if center:
+        points.append(center)
+
+    pad = 48
+    xs = [math.radians(lon) for _, lon in points]
+    ys = [_mercator_y(lat) for lat, _ in points]
+    span_x = max(max(xs) - min(xs), 1e-4)
+    span_y = max(max(ys) - min(ys), 1e-4)
+    # Uniform scale keeps the projection undistorted; leave room at the bottom for the legend
+    scale = min((width - 2 * pad) / span_x, (height - 2 * pad - 40) / span_y)
+    mid_x, mid_y = (max(xs) + min(xs)) / 2, (max(ys) + min(ys)) / 2
+
+    def project(lat, lon):
+        return (width / 2 + (math.radians(lon) - mid_x) * scale,
+                height / 2 - 20 - (_mercator_y(lat) - mid_y) * scale)
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}" width="100%" '
+        f'style="max-width:{width}px;font-family:Inter,sans-serif" role="img" aria-label="Shelter map">',
+        f'<rect width="{width}" height="{height}" rx="12" fill="#f1f5f9"/>'
+    ]
+    grid = ''.join(f'M{x} 0V{height}' for x in range(50, width, 50)) + \
+        ''.join(f'M0 {y}H{width}' for y in range(50, height, 50))
+    parts.append(f'<path d="{grid}" stroke="#e2e8f0" stroke-width="1"/>')
+
+    if center:
+        cx, cy = project(*center)
+        for _, lat, lon, _ in shelters:
+            sx, sy = project(lat, lon)
+            parts.append(f'<line x1="{cx:.1f}" y1="{cy:.1f}" x2="{sx:.1f}" y2="{sy:.1f}" '
+                         f'stroke="#94a3b8" stroke-dasharray="4 4"/>')
+        parts.append(f'<g><title>Your location</title><circle cx="{cx:.1f}" cy="{cy:.1f}" r="9" '
+                     f'fill="{USER_COLOR}" stroke="#fff" stroke-width="3"/>'
+                     f'<text x="{cx + 14:.1f}" y="{cy + 4:.1f}" font-size="13" font-weight="700" '
+                     f'fill="{USER_COLOR}">You</text></g>')
+
+    for idx, (name, lat, lon, distance) in enumerate(shelters, 1):
+        x, y = project(lat, lon)
+        label = escape(name if len(name) <= 30 else name[:29] + '…')
+        # Labels point toward the middle so they stay inside the frame
+        lx, anchor = (x + 17, 'start') if x < width / 2 else (x - 17, 'end')
+        parts.append(f'<g><title>{escape(name)} ({escape(distance)})</title>'
+                     f'<circle cx="{x:.1f}" cy="{y:.1f}" r="12" fill="{distance_color(distance)}" '
+                     f'stroke="#fff" stroke-width="2"/>'
+                     f'<text x="{x:.1f}" y="{y + 4.5:.1f}" font-size="12" font-weight="700" fill="#fff" '
+                     f'text-anchor="middle">{idx}</text>'
+                     f'<text x="{lx:.1f}" y="{y + 4.5:.1f}" font-size="12" fill="#1e293b" '
+                     f'text-anchor="{anchor}">{label} · '
+                     f'{escape(distance)}</text></g>')
+
+    # Legend
+    lx, ly = 16, height - 20
+    for i, (_, color, text) in enumerate(DISTANCE_COLORS):
+        parts.append(f'<circle cx="{lx + i * 96 + 6}" cy="{ly - 4}" r="6" fill="{color}"/>'
+                     f'<text x="{lx + i * 96 + 16}" y="{ly}" font-size="11" fill="#475569">{text}</text>')
+
+    # Scale bar at the map's mid latitude
+    mid_lat = math.degrees(2 * math.atan(math.exp(mid_y)) - math.pi / 2)
+    miles_per_px = 3958.8 * math.cos(math.radians(mid_lat)) / scale
+    miles = _nice_scale(120 * miles_per_px)
+    bar = miles / miles_per_px
+    sx, sy = width - 24 - bar, height - 24
+    parts.append(f'<path d="M{sx:.1f} {sy - 5}V{sy}H{sx + bar:.1f}V{sy - 5}" fill="none" stroke="#475569" '
+                 f'stroke-width="2"/><text x="{sx + bar / 2:.1f}" y="{sy - 9}" font-size="11" fill="#475569" '
+                 f'text-anchor="middle">{miles:g} mi</text>')
+    parts.append('</svg>')
+    return ''.join(parts)
+
+
+def render_shelter_map(shelters, center_lat=None, center_lon=None, width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT):
+    """SVG markup for a shelter map, cached per (shelter set, center, size)"""
+    key = tuple((s['name'], float(s['lat']), float(s['lon']), str(s['distance'])) for s in shelters)
+    center = (float(center_lat), float(center_lon)) if center_lat and center_lon else None
+    return _render(key, center, int(width), int(height))
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Surge Controller - Overload detection, admission control and degraded serving
+Tracks how many answers are being computed or waiting and how long script runs
+take. Past the trip thresholds the app switches to surge mode: answers come
+from the static answer cache when possible, maps are static and images are
+dropped, and new computations pass through a bounded FIFO admission queue.
+Surge mode ends by itself once load stays under the recovery thresholds.
+
+Thresholds come from EMERGENCY_SURGE_* environment variables (see SurgeConfig).
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict, deque
+
+# Environment variable prefix for the thresholds, e.g. EMERGENCY_SURGE_TRIP_QUEUE=40
+ENV_PREFIX = 'EMERGENCY_SURGE_'
+
+# 'auto' (default), or 'on' / 'off' to force the mode for drills and incidents
+SURGE_MODE_ENV = 'EMERGENCY_SURGE'
+
+# Script runs considered for the latency percentile
+LATENCY_WINDOW = 256
+LATENCY_MAX_AGE = 60.0
+
+
+class SurgeConfig:
+    """Trip and recovery thresholds; every field can be overridden from the environment"""
+
+    FIELDS = {
+        # Answers computing or waiting at or above which surge mode starts
+        'trip_queue': 24,
+        # p95 script-run latency (ms) at or above which surge mode starts
+        'trip_latency_ms': 2500.0,
+        # Load must stay at or below these for recover_seconds to end surge mode
+        'recover_queue': 6,
+        'recover_latency_ms': 800.0,
+        'recover_seconds': 30.0,
+        # Answers computed at once while in surge mode
+        'max_answering': 8,
+        # Sessions allowed to wait for a slot; later ones get the busy answer
+        'max_queue': 64,
+        # Static answers kept, and how old one may be before it is recomputed
+        'cache_size': 256,
+        'cache_ttl': 600.0
+    }
+
+    def __init__(self, **overrides):
+        for name, default in self.FIELDS.items():
+            setattr(self, name, type(default)(overrides.get(name, default)))
+
+    @classmethod
+    def from_env(cls, environ=None):
+        environ = os.environ if environ is None else environ
+        return cls(**{name: environ[ENV_PREFIX + name.upper()]
+                      for name in cls.FIELDS if ENV_PREFIX + name.upper() in environ})
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+
+class Ticket:
+    """A session's place in the admission queue"""
+
+    __slots__ = ('admitted', 'enqueued_at')
+
+    def __init__(self, admitted=False):
+        self.admitted = admitted
+        self.enqueued_at = time.monotonic()
+
+
+class SurgeController:
+    """Process-wide load tracking, surge state with hysteresis and admission (thread-safe)"""
+
+    def __init__(self, config=None, mode=None):
+        self.config = config or SurgeConfig.from_env()
+        self.mode = (mode or os.environ.get(SURGE_MODE_ENV, 'auto')).lower()
+        self._cond = threading.Condition()
+        self._waiting = deque()
+        self._answering = 0
+        self._runs = deque(maxlen=LATENCY_WINDOW)
+        self._answers = OrderedDict()
+        self._surge = False
+        self._calm_since = None
+        self.trips = 0
+        self.recoveries = 0
+        self.tripped_at = None
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.cache_hits = 0
+
+    # Load signals
+
+    def record_run(self, seconds):
+        """Record one finished script run's wall time"""
+        with self._cond:
+            self._runs.append((time.monotonic(), seconds * 1000))
+            self._update()
+
+    def _latency_p95(self):
+        cutoff = time.monotonic() - LATENCY_MAX_AGE
+        latencies = sorted(ms for at, ms in self._runs if at >= cutoff)
+        return latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] if latencies else 0.0
+
+    def _update(self):
+        """Re-evaluate the surge state and admit whoever now fits (caller holds the lock)"""
+        self._evaluate()
+        if self._waiting:
+            self._admit_waiting()
+            self._cond.notify_all()
+
+    def _evaluate(self):
+        if self.mode in ('on', 'off'):
+            self._surge = self.mode == 'on'
+            return
+        config = self.config
+        depth = self._answering + len(self._waiting)
+        latency = self._latency_p95()
+        now = time.monotonic()
+        if not self._surge:
+            if depth >= config.trip_queue or latency >= config.trip_latency_ms:
+                self._surge = True
+                self._calm_since = None
+                self.trips += 1
+                self.tripped_at = time.time()
+        elif depth <= config.recover_queue and latency <= config.recover_latency_ms:
+            if self._calm_since is None:
+                self._calm_since = now
+            elif now - self._calm_since >= config.recover_seconds:
+                self._surge = False
+                self.recoveries += 1
+        else:
+            self._calm_since = None
+
+    def active(self):
+        """True while in surge mode"""
+        with self._cond:
+            self._update()
+            return self._surge
+
+    # Admission
+
+    def enter(self):
+        """Ticket for computing an answer, or None when the admission queue is full
+
+        Outside surge mode every caller is admitted at once. In surge mode up
+        to max_answering compute together and the rest wait in FIFO order.
+        """
+        with self._cond:
+            self._update()
+            if not self._surge or (self._answering < self.config.max_answering and not self._waiting):
+                self._answering += 1
+                self.admitted += 1
+                return Ticket(admitted=True)
+            if len(self._waiting) >= self.config.max_queue:
+                self.rejected += 1
+                return None
+            ticket = Ticket()
+            self._waiting.append(ticket)
+            self.queued += 1
+            self._update()
+            return ticket
+
+    def wait(self, ticket, timeout):
+        """Wait up to timeout seconds for admission; True once admitted"""
+        end = time.monotonic() + timeout
+        with self._cond:
+            while not ticket.admitted:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def position(self, ticket):
+        """1-based place in line (0 once admitted)"""
+        with self._cond:
+            if ticket.admitted:
+                return 0
+            try:
+                return self._waiting.index(ticket) + 1
+            except ValueError:
+                return 0
+
+    def leave(self, ticket):
+        """Release an admitted ticket's slot, or give up a place in line"""
+        with self._cond:
+            if ticket.admitted:
+                self._answering -= 1
+            elif ticket in self._waiting:
+                self._waiting.remove(ticket)
+            self._update()
+            self._cond.notify_all()
+
+    def _admit_waiting(self):
+        limit = self.config.max_answering if self._surge else float('inf')
+        while self._waiting and self._answering < limit:
+            ticket = self._waiting.popleft()
+            ticket.admitted = True
+            self._answering += 1
+            self.admitted += 1
+
+    # Static answers
+
+    def remember(self, key, answer):
+        """Keep a fully computed answer to serve during surge mode"""
+        with self._cond:
+            self._answers[key] = (time.time(), answer)
+            self._answers.move_to_end(key)
+            while len(self._answers) > self.config.cache_size:
+                self._answers.popitem(last=False)
+
+    def cached(self, key):
+        """(computed_at, answer) for a recent enough answer, else None"""
+        with self._cond:
+            entry = self._answers.get(key)
+            if entry is None or time.time() - entry[0] > self.config.cache_ttl:
+                return None
+            self.cache_hits += 1
+            return entry
+
+    def clear_answers(self):
+        """Forget the saved answers (after the data behind them changed)"""
+        with self._cond:
+            self._answers.clear()
+
+    def stats(self):
+        """Current load, surge state and admission counters"""
+        with self._cond:
+            self._update()
+            return {
+                'surge': self._surge, 'mode': self.mode, 'answering': self._answering,
+                'waiting': len(self._waiting), 'latency_p95_ms': self._latency_p95(),
+                'trips': self.trips, 'recoveries': self.recoveries, 'tripped_at': self.tripped_at,
+                'admitted': self.admitted, 'queued': self.queued, 'rejected': self.rejected,
+                'cache_hits': self.cache_hits, 'cached_answers': len(self._answers)
+            }
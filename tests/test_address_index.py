@@ -0,0 +1,128 @@
+"""Address index: normalization, ranked prefix suggestions, CSV input and file handling"""
+
+import random
+
+import pytest
+
+import address_index
+from address_index import (RANK_ADDRESS, RANK_STREET, AddressIndex, display, load_index, normalize, read_addresses,
+                           write_index)
+
+SHELTERS = {'Sunnyvale, CA': [{'address': "550 E Remington Dr, Sunnyvale, CA 94087"}]}
+
+
+def test_normalize():
+    assert normalize("123 Main Street, Sunnyvale") == "123 main st sunnyvale"
+    assert normalize("North  Mathilda Avenue") == "n mathilda ave"
+    # The word being typed is left alone until it is finished
+    assert normalize("123 main str", partial=True) == "123 main str"
+    assert normalize("123 main street ", partial=True) == "123 main st"
+    assert normalize(" ,", partial=True) == ''
+
+
+def test_display():
+    assert display("123 n mathilda ave sunnyvale ca 94086") == "123 N Mathilda Ave Sunnyvale CA 94086"
+    assert display("n mathilda ave") == "N Mathilda Ave"
+
+
+@pytest.fixture
+def index(tmp_path):
+    path = str(tmp_path / 'addresses.index')
+    centroids = tmp_path / 'zip_centroids.csv'
+    centroids.write_text("zip,lat,lon,city,state\n94086,37.37,-122.02,Sunnyvale,CA\n"
+                         "94087,37.35,-122.03,Sunnyvale,CA\n95014,37.32,-122.03,Cupertino,CA\n")
+    entries = address_index.local_entries(SHELTERS, centroids=str(centroids))
+    entries += address_index.address_entries("123", "Main Street", "Sunnyvale", "CA", "94086")
+    entries += address_index.address_entries("125", "Main Street", "Sunnyvale", "CA", "94086")
+    entries += address_index.address_entries("9", "Sunny Lane", "Cupertino", "CA", "95014", weight=5000)
+    write_index(path, entries)
+    index = AddressIndex(path)
+    yield index
+    index.close()
+
+
+def test_ranked_suggestions(index):
+    assert [key for _, key in index.suggest("9")] == [
+        "94086 sunnyvale ca", "94087 sunnyvale ca", "95014 cupertino ca", "9 sunny ln cupertino ca 95014"]
+    assert [key for _, key in index.suggest("sunny")] == ["sunnyvale ca", "sunny ln cupertino ca"]
+    assert index.suggest("main") == [("Main St Sunnyvale CA", "main st sunnyvale ca")]
+    assert index.suggest("123 Main Str")[0][1] == "123 main st sunnyvale ca 94086"
+    assert index.suggest("sunny lan")[0][1] == "sunny ln cupertino ca"
+    assert index.suggest("550 east rem")[0][1] == "550 e remington dr sunnyvale ca"
+    assert index.suggest("zzz") == [] and index.suggest("") == []
+
+
+def test_streets_rank_by_address_count(index):
+    lo, _ = index.prefix_range("main st sunnyvale ca")
+    assert index.ranks[lo] == RANK_STREET + 1
+
+
+def test_contains(index):
+    assert index.contains("123 Main Street Sunnyvale CA 94086")
+    assert index.contains("94086")
+    assert not index.contains("124 Main Street Sunnyvale CA 94086")
+
+
+def test_top_k_matches_brute_force(tmp_path):
+    rng = random.Random(7)
+    words = ["oak", "elm", "pine", "palm", "olive", "orchard", "ocean", "otter"]
+    entries = [(f"{rng.choice(words)} {rng.randrange(100000)}", rng.randrange(1, 60000)) for _ in range(20000)]
+    path = str(tmp_path / 'big.index')
+    write_index(path, entries)
+    ranks = {}
+    for key, rank in entries:
+        ranks[key] = max(rank, ranks.get(key, 0))
+    index = AddressIndex(path)
+    try:
+        assert len(index) == len(ranks)
+        for prefix in ("o", "oak", "orchard 1", "p"):
+            expected = sorted((key for key in ranks if key.startswith(prefix)), key=lambda key: (-ranks[key], key))
+            assert [key for _, key in index.suggest(prefix, k=10)] == expected[:10]
+    finally:
+        index.close()
+
+
+def test_read_addresses_openaddresses(tmp_path):
+    path = tmp_path / 'oa.csv'
+    path.write_text("LON,LAT,NUMBER,STREET,UNIT,CITY,DISTRICT,REGION,POSTCODE\n"
+                    "-122.0,37.3,10,Evelyn Avenue,,Sunnyvale,,CA,94086\n")
+    assert list(read_addresses(str(path))) == [("10 evelyn ave sunnyvale ca 94086", RANK_ADDRESS),
+                                               ("evelyn ave sunnyvale ca", RANK_STREET)]
+    path.write_text("number,street\n1,Main\n")
+    with pytest.raises(ValueError, match="street and city"):
+        list(read_addresses(str(path)))
+
+
+def test_load_index_builds_and_rejects(tmp_path, monkeypatch):
+    centroids = tmp_path / 'zip_centroids.csv'
+    centroids.write_text("zip,lat,lon,city,state\n94086,37.37,-122.02,Sunnyvale,CA\n")
+    monkeypatch.setenv('EMERGENCY_ZIP_CENTROIDS', str(centroids))
+    path = str(tmp_path / 'built.index')
+    index = load_index(SHELTERS, path=path)
+    assert index.contains("94086") and len(index) == 3
+    index.close()
+
+    bad = tmp_path / 'bad.index'
+    bad.write_bytes(b'\0' * 64)
+    assert load_index(path=str(bad)) is None
+
+
+def test_load_index_refreshes_changed_shelters(tmp_path, monkeypatch):
+    monkeypatch.setenv('EMERGENCY_ZIP_CENTROIDS', str(tmp_path / 'missing.csv'))
+    addresses = tmp_path / 'addresses.csv'
+    addresses.write_text("number,street,city,state,zip\n123,Main Street,Sunnyvale,CA,94086\n")
+    path = str(tmp_path / 'addresses.index')
+    address_index.build_index(path, sources=[str(addresses)], shelter_data=SHELTERS)
+    index = load_index(SHELTERS, path=path)
+    assert index.contains("550 E Remington Dr Sunnyvale CA")
+    assert index.shelters == ["550 e remington dr sunnyvale ca"]
+    index.close()
+
+    moved = {'Sunnyvale, CA': [{'address': "725 Old San Francisco Rd, Sunnyvale, CA 94086"}]}
+    index = load_index(moved, path=path)
+    assert index.contains("725 Old San Francisco Rd Sunnyvale CA")
+    assert not index.contains("550 E Remington Dr Sunnyvale CA")
+    # Entries from the address CSV survive without re-reading it
+    assert index.contains("123 Main St Sunnyvale CA 94086")
+    assert dict(index.entries())["main st sunnyvale ca"] == RANK_STREET
+    index.close()
@@ -0,0 +1,101 @@
+"""Static assets: content-hashed build, responsive image markup, pruning, immutable cache headers"""
+
+import os
+import json
+import asyncio
+
+import pytest
+
+import assets
+from assets import IMMUTABLE, STATIC_URL, Assets, ImmutableAssets, build, sources_sha
+
+IMAGE_URL = "https://images.example/go-bag.jpg"
+
+
+@pytest.fixture
+def source_dir(tmp_path):
+    source = tmp_path / 'assets'
+    (source / 'fonts').mkdir(parents=True)
+    (source / 'images').mkdir()
+    (source / 'fonts' / 'inter-1234abcd.woff2').write_bytes(b'wOF2 font bytes')
+    (source / 'fonts' / 'inter.css').write_text(
+        "@font-face { font-family: 'Inter'; src: url(inter-1234abcd.woff2) format('woff2'); }\n")
+    image_path = source / 'images' / 'go-bag.jpg'
+    if assets.PIL_AVAILABLE:
+        from PIL import Image
+        Image.new('RGB', (700, 350), (200, 40, 40)).save(image_path, 'JPEG')
+    else:
+        image_path.write_bytes(b'\xff\xd8 jpeg bytes')
+    (source / 'vendor.json').write_text(json.dumps({
+        'font_css': 'fonts/inter.css', 'images': {'go-bag': {'url': IMAGE_URL, 'file': 'images/go-bag.jpg'}}}))
+    return str(source)
+
+
+def test_nothing_vendored(tmp_path):
+    assert build(str(tmp_path / 'missing'), str(tmp_path / 'static')) is None
+
+
+def test_build_hashes_every_file(source_dir, tmp_path):
+    static = str(tmp_path / 'static')
+    manifest = build(source_dir, static)
+    assert manifest['sha'] == sources_sha(source_dir)
+    assert f"url({STATIC_URL}inter-1234abcd." in manifest['font_css']
+    files = Assets(manifest).files()
+    assert files and all(os.path.exists(os.path.join(static, name)) for name in files)
+    assert all(assets.HASHED_RE.search('/app/static/' + name) for name in files)
+    with open(os.path.join(static, 'assets.json')) as f:
+        assert json.load(f) == manifest
+
+
+@pytest.mark.skipif(not assets.PIL_AVAILABLE, reason="Pillow not installed")
+def test_widths_never_exceed_source(source_dir, tmp_path):
+    image = build(source_dir, str(tmp_path / 'static'))['images']['go-bag']
+    assert (image['width'], image['height']) == (700, 350)
+    assert [width for width, _ in image['variants']['jpg']] == [320, 480, 640, 700]
+    assert 'webp' in image['variants']
+
+
+@pytest.mark.skipif(not assets.PIL_AVAILABLE, reason="Pillow not installed")
+def test_picture_markup(source_dir, tmp_path):
+    site = Assets(build(source_dir, str(tmp_path / 'static')))
+    html = site.picture('go-bag', IMAGE_URL, 'Go "bag"', style="width: 100%;")
+    assert html.startswith('<picture><source type="image/')
+    assert 'type="image/webp"' in html and 'width="700" height="350"' in html
+    assert 'alt="Go &quot;bag&quot;"' in html and " 700w" in html
+    assert site.picture('go-bag', "https://images.example/other.jpg", "Go bag") is None
+    assert site.picture('unknown', IMAGE_URL, "Go bag") is None
+
+
+def test_source_change_changes_sha_and_prune(source_dir, tmp_path):
+    static = str(tmp_path / 'static')
+    before = Assets(build(source_dir, static)).files()
+    sha = sources_sha(source_dir)
+    with open(os.path.join(source_dir, 'fonts', 'inter-1234abcd.woff2'), 'wb') as f:
+        f.write(b'wOF2 new font bytes')
+    assert sources_sha(source_dir) != sha
+    after = Assets(build(source_dir, static, prune=True)).files()
+    old_font = next(name for name in before if name.startswith('inter-'))
+    assert old_font not in after and not os.path.exists(os.path.join(static, old_font))
+    assert sorted(name for name in os.listdir(static) if name != 'assets.json') == after
+
+
+def call(app, path, status=200):
+    messages = []
+
+    async def inner(scope, receive, send):
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'font/woff2'), (b'cache-control', b'no-cache')]})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(inner)({'type': 'http', 'path': path}, None, send))
+    return dict(messages[0]['headers'])
+
+
+def test_immutable_headers_for_hashed_files_only():
+    assert call(ImmutableAssets, '/app/static/inter-1234abcd.0123456789.woff2')[b'cache-control'] == \
+        IMMUTABLE.encode()
+    assert call(ImmutableAssets, '/app/static/assets.json')[b'cache-control'] == b'no-cache'
+    assert call(ImmutableAssets, '/app/static/inter.0123456789.woff2', status=404)[b'cache-control'] == b'no-cache'
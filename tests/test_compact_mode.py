@@ -0,0 +1,43 @@
+"""Compact answers: semantic markup kept, decoration and images dropped"""
+
+from compact_mode import compact_html
+
+ANSWER = """<div class="info-card info-card-success">
+<h3>🏠 Emergency Shelters Found</h3>
+<p style="color: red"><strong>Your Location:</strong> 94086<br>
+<strong>Radius:</strong> 50 miles</p>
+</div>
+
+<div class="image-container"><img src="bag.jpg"><p>Caption</p></div>
+
+<div class="checklist-item">
+<strong>1. Community Center</strong><br>
+📍 550 E Remington Dr &amp; more
+</div>
+
+<div class="highlight-box-warning">
+<strong>What to Bring</strong><br><br>
+Photo ID • Medications
+</div>
+
+<a href="https://www.redcross.org/shelter" target="_blank" style="color: #3b82f6;">redcross.org</a>"""
+
+
+def test_compact_answer():
+    assert compact_html(ANSWER) == (
+        '<h3>🏠 Emergency Shelters Found</h3>'
+        '<p><strong>Your Location:</strong> 94086<br><strong>Radius:</strong> 50 miles</p>'
+        '<p><strong>1. Community Center</strong><br>📍 550 E Remington Dr &amp; more</p>'
+        '<p class="w"><strong>What to Bring</strong><br>Photo ID • Medications</p>'
+        '<a href="https://www.redcross.org/shelter">redcross.org</a>'
+    )
+
+
+def test_no_styles_or_images_survive():
+    compact = compact_html(ANSWER)
+    assert 'style=' not in compact and '<img' not in compact and 'Caption' not in compact
+    assert len(compact) < len(ANSWER) * 0.7
+
+
+def test_plain_text_passes_through():
+    assert compact_html("Call 211 for help") == "Call 211 for help"
@@ -0,0 +1,105 @@
+"""Compute pool: task results, shared-memory handles, pooled and inline runs"""
+
+import zlib
+import pickle
+
+import numpy as np
+import pytest
+
+import compute_pool
+from compute_pool import ComputePool, SharedArray, kit_totals, nearest_shelters
+
+SHELTERS = [
+    {'name': "Community Center", 'address': "550 E Remington Dr", 'distance': "1.5 miles",
+     'capacity': "200 people", 'services': "Food, Water", 'phone': "(408) 555-0100",
+     'lat': 37.3541, 'lon': -122.0322},
+    {'name': "High School Gym", 'address': "1080 Mathilda Ave", 'distance': "4.2 miles",
+     'capacity': "350 people", 'services': "Medical", 'phone': "(408) 555-0101",
+     'lat': 37.3894, 'lon': -122.0430}
+]
+
+
+def brute_force_miles(points, shelter_points):
+    lat1, lon1 = np.radians(points[:, :1]), np.radians(points[:, 1:])
+    lat2, lon2 = np.radians(shelter_points[:, 0]), np.radians(shelter_points[:, 1])
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 3958.8 * np.arcsin(np.sqrt(a))
+
+
+def test_kit_totals():
+    households = np.array([[1, 0, 0], [2, 3, 1]])
+    assert kit_totals((10, 2, 3, 1), households).tolist() == [12, 24]
+
+
+def test_nearest_shelters_matches_brute_force():
+    rng = np.random.default_rng(5)
+    points = np.column_stack([rng.uniform(37.2, 37.5, 50), rng.uniform(-122.2, -121.9, 50)])
+    shelter_points = np.column_stack([rng.uniform(37.2, 37.5, 20), rng.uniform(-122.2, -121.9, 20)])
+    index, miles = nearest_shelters(points, shelter_points, k=3)
+    expected = brute_force_miles(points, shelter_points)
+    assert index.shape == (50, 3) and np.all(np.diff(miles, axis=1) >= 0)
+    assert (index == np.argsort(expected, axis=1)[:, :3]).all()
+    assert np.allclose(miles, np.sort(expected, axis=1)[:, :3], atol=1e-3)
+
+
+def test_nearest_shelters_k_beyond_count():
+    index, miles = nearest_shelters(np.array([[37.39, -122.04]]), np.array([[37.35, -122.03], [37.39, -122.04]]), k=5)
+    assert index.tolist() == [[1, 0]] and miles[0, 0] < 0.01
+
+
+def test_shared_array_pickles_as_handle():
+    data = np.arange(100_000, dtype=np.int64).reshape(-1, 2)
+    with SharedArray.copy_of(data) as shared:
+        payload = pickle.dumps(shared)
+        assert len(payload) < 1000
+        attached = pickle.loads(payload)
+        assert not attached.owner and (attached.array == data).all()
+        attached.array[0, 0] = -1
+        assert shared.array[0, 0] == -1
+        attached.close()
+
+
+@pytest.mark.skipif(not compute_pool.FOLIUM_AVAILABLE, reason="folium not installed")
+def test_shelter_map_html():
+    html = zlib.decompress(compute_pool.shelter_map_html(SHELTERS, 37.37, -122.04)).decode('utf-8')
+    assert "Community Center" in html and "You are here" in html
+    assert '"green"' in html and '"orange"' in html
+
+
+def test_default_workers(monkeypatch):
+    monkeypatch.delenv(compute_pool.WORKERS_ENV, raising=False)
+    monkeypatch.setattr(compute_pool.os, 'cpu_count', lambda: 64)
+    assert compute_pool.default_workers() == compute_pool.DEFAULT_WORKERS
+    monkeypatch.setattr(compute_pool.os, 'cpu_count', lambda: 1)
+    assert compute_pool.default_workers() == 1
+    monkeypatch.setenv(compute_pool.WORKERS_ENV, "0")
+    assert compute_pool.default_workers() == 0
+
+
+def test_inline_pool():
+    pool = ComputePool(workers=0)
+    assert pool.run('kit_totals', (1, 1, 1, 1), np.array([[1, 1, 1]])).tolist() == [4]
+    assert pool.stats()['inline'] == 1 and pool.stats()['pooled'] == 0
+    pool.close()
+
+
+def test_worker_pool_with_shared_input():
+    pool = ComputePool(workers=1, timeout=60)
+    try:
+        households = np.array([[2, 1, 0]] * 1000)
+        with SharedArray.copy_of(households) as shared:
+            totals = pool.run('kit_totals', (5, 2, 3, 1), shared)
+        assert totals.tolist() == [12] * 1000
+        assert pool.stats()['pooled'] == 1 and pool.stats()['failures'] == 0
+    finally:
+        pool.close()
+
+
+def test_timeout_falls_back_inline():
+    pool = ComputePool(workers=1, timeout=0.0)
+    try:
+        assert pool.run('kit_totals', (0, 1, 0, 0), np.array([[3, 0, 0]])).tolist() == [3]
+        stats = pool.stats()
+        assert stats['failures'] == 1 and stats['inline'] == 1
+    finally:
+        pool.close()
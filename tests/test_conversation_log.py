@@ -0,0 +1,43 @@
+"""Conversation log: queued writes, queries by session and time, and failed batches"""
+
+import sqlite3
+import time
+from datetime import datetime
+
+from conversation_log import ConversationLog
+
+
+def test_turns_round_trip(tmp_path):
+    log = ConversationLog(str(tmp_path / 'log.db'), batch_interval=0.01)
+    try:
+        log.append('s1', 'user', "Find shelters", timestamp=datetime(2026, 10, 19, 9, 0))
+        log.append('s1', 'assistant', "<p>Shelters</p>", timestamp=datetime(2026, 10, 19, 9, 1),
+                   meta={'show_map': True, 'needs_input': None})
+        log.append('s2', 'user', "Kit", timestamp=datetime(2026, 10, 19, 10, 0))
+        log.flush()
+        assert log.stats['written'] == 3
+        turns = list(log.turns(session_id='s1'))
+        assert [turn['role'] for turn in turns] == ['user', 'assistant']
+        assert turns[1]['meta'] == {'show_map': True, 'needs_input': None}
+        assert [turn['session_id'] for turn in log.turns(start=datetime(2026, 10, 19, 9, 30))] == ['s2']
+        assert [(s['session_id'], s['turns']) for s in log.sessions()] == [('s1', 2), ('s2', 1)]
+    finally:
+        log.close()
+
+
+def test_failed_rows_let_flush_return(tmp_path):
+    path = str(tmp_path / 'log.db')
+    log = ConversationLog(path, batch_size=2, batch_interval=0.01)
+    try:
+        conn = sqlite3.connect(path)
+        conn.execute("DROP TABLE turns")
+        conn.commit()
+        conn.close()
+        for i in range(5):
+            log.append('s1', 'user', f"question {i}")
+        start = time.monotonic()
+        log.flush(timeout=5)
+        assert time.monotonic() - start < 2
+        assert log.stats['errors'] == 5 and log.stats['written'] == 0
+    finally:
+        log.close()
@@ -0,0 +1,143 @@
+"""Data pack: section round trips, zero-copy arrays, mapped trees, CRC and format version checks"""
+
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+import datapack
+from datapack import DataPack, MappedDict, MappedList, StringList, Tree, plain, write_pack, PREAMBLE, MAGIC
+
+SECTIONS = {
+    'meta': {'version': "1", 'regions': ["Sunnyvale, CA"]},
+    'points': np.arange(12, dtype=np.float32).reshape(4, 3),
+    'names': StringList(["Community Center", "Gymnasium", "Café ☕", ""]),
+}
+
+
+def write(path, checksum=True):
+    return write_pack(str(path), SECTIONS, checksum=checksum)
+
+
+def corrupt(path, offset):
+    os.chmod(path, 0o644)
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        byte = f.read(1)
+        f.seek(offset)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+
+def test_sections_round_trip(tmp_path):
+    pack = DataPack(write(tmp_path / 'p.pack'))
+    assert pack['meta'] == SECTIONS['meta']
+    assert np.array_equal(pack['points'], SECTIONS['points'])
+    assert list(pack['names']) == SECTIONS['names'].items
+    assert pack['names'][-2] == "Café ☕" and pack['names'][1:3] == ["Gymnasium", "Café ☕"]
+    assert pack.get('missing') is None and 'points' in pack
+    assert all(meta['offset'] % datapack.ALIGNMENT == 0 for meta in pack.sections.values())
+
+
+def test_arrays_are_read_only_views_of_the_mapping(tmp_path):
+    points = DataPack(write(tmp_path / 'p.pack'))['points']
+    assert not points.flags.writeable and not points.flags.owndata
+    with pytest.raises(ValueError):
+        points[0, 0] = 1
+
+
+def test_checksum(tmp_path):
+    path = write(tmp_path / 'p.pack')
+    assert DataPack(path).verify() is True
+    assert DataPack(write(tmp_path / 'plain.pack', checksum=False)).verify() is None
+    corrupt(path, DataPack(path).sections['points']['offset'])
+    assert DataPack(path).verify() is False
+
+
+def test_rejects_other_files_and_format_versions(tmp_path):
+    path = write(tmp_path / 'p.pack')
+    header_len = PREAMBLE.unpack_from(open(path, 'rb').read(PREAMBLE.size))[2]
+    os.chmod(path, 0o644)
+    with open(path, 'r+b') as f:
+        f.write(PREAMBLE.pack(MAGIC, datapack.FORMAT_VERSION + 1, header_len))
+    with pytest.raises(ValueError, match="pack format"):
+        DataPack(path)
+    other = tmp_path / 'other.bin'
+    other.write_bytes(b'\0' * 64)
+    with pytest.raises(ValueError, match="not a data pack"):
+        DataPack(str(other))
+
+
+TREE = {
+    'shelters': {"Sunnyvale, CA": [{'name': "Café ☕", 'lat': 37.37, 'beds': 120, 'open': True, 'note': None},
+                                   {'name': "Gym", 'lat': -1.5, 'beds': 0, 'open': False, 'note': ""}]},
+    'steps': ["Drop", "Cover", "Hold on"],
+    'empty': {'list': [], 'dict': {}}
+}
+
+
+@pytest.fixture
+def tree(tmp_path):
+    path = write_pack(str(tmp_path / 't.pack'), {'tree': Tree(TREE), 'image': Tree("https://example.org/a.jpg")})
+    pack = DataPack(path)
+    yield pack
+    pack.close()
+
+
+def test_tree_reads_in_place(tree):
+    value = tree['tree']
+    assert isinstance(value, MappedDict) and isinstance(value['steps'], MappedList)
+    assert value == TREE and plain(value) == TREE and tree['image'] == "https://example.org/a.jpg"
+    shelters = value['shelters']["Sunnyvale, CA"]
+    assert shelters[0]['name'] == "Café ☕" and shelters[-1]['lat'] == -1.5
+    assert shelters[0]['open'] is True and shelters[1]['note'] == "" and shelters[0]['note'] is None
+    assert list(value) == ['shelters', 'steps', 'empty'] and 'steps' in value and 'missing' not in value
+    assert value.get('missing') is None and value['steps'][1:] == ["Cover", "Hold on"]
+    assert value['steps'] + ["Call"] == ["Drop", "Cover", "Hold on", "Call"]
+    assert len(value['empty']['list']) == 0 and dict(value['empty']['dict']) == {}
+    with pytest.raises(KeyError):
+        value[1]
+    with pytest.raises(IndexError):
+        value['steps'][3]
+
+
+def test_tree_pickles_and_copies_as_plain_values(tree):
+    shelter = tree['tree']['shelters']["Sunnyvale, CA"][0]
+    assert pickle.loads(pickle.dumps(tree['tree'])) == TREE
+    assert type(pickle.loads(pickle.dumps(tree['tree']['steps']))) is list
+    assert dict(shelter, beds=5) == dict(TREE['shelters']["Sunnyvale, CA"][0], beds=5)
+
+
+def test_tree_from_mapped_tree(tree, tmp_path):
+    path = write_pack(str(tmp_path / 'copy.pack'), {'tree': Tree(tree['tree'])})
+    assert DataPack(path)['tree'] == TREE
+
+
+def test_format_1_packs_still_read(tmp_path):
+    path = write(tmp_path / 'p.pack')
+    header_len = PREAMBLE.unpack_from(open(path, 'rb').read(PREAMBLE.size))[2]
+    os.chmod(path, 0o644)
+    with open(path, 'r+b') as f:
+        f.write(PREAMBLE.pack(MAGIC, 1, header_len))
+    assert DataPack(path)['meta'] == SECTIONS['meta']
+
+
+def test_load_knowledge_maps_the_pack_without_the_source(tmp_path, monkeypatch):
+    source = datapack.knowledge_sections()
+    path = str(tmp_path / 'knowledge.pack')
+    write_pack(path, datapack.mapped(source))
+    monkeypatch.setenv(datapack.PACK_PATH_ENV, path)
+    monkeypatch.setattr(datapack, 'knowledge_sections', lambda: pytest.fail("read the knowledge source"))
+    knowledge = datapack.load_knowledge()
+    assert isinstance(knowledge['shelters'], MappedDict) and knowledge == source
+    datapack.open_shared.cache_clear()
+
+
+def test_load_knowledge_fills_sections_an_old_pack_lacks(tmp_path, monkeypatch):
+    source = datapack.knowledge_sections()
+    path = str(tmp_path / 'old.pack')
+    write_pack(path, {'shelters': source['shelters']})
+    monkeypatch.setenv(datapack.PACK_PATH_ENV, path)
+    knowledge = datapack.load_knowledge()
+    assert knowledge['go_bag'] == source['go_bag'] and 'version' not in knowledge
+    datapack.open_shared.cache_clear()
@@ -0,0 +1,56 @@
+"""FEMA rules: validation, batch screening and the single-applicant check"""
+
+import pytest
+
+import snapshot
+from fema_screening import RuleSet, rule_problems, screen, PASS, FAIL, REVIEW
+
+
+@pytest.fixture(scope='module')
+def fema():
+    return snapshot.load_knowledge()['fema']
+
+
+@pytest.fixture(scope='module')
+def ruleset(fema):
+    return RuleSet(fema['rules'])
+
+
+def test_shipped_rules_are_valid(fema):
+    assert rule_problems(fema['rules'], fema['eligibility']) == []
+
+
+def test_rule_problems_are_reported(fema):
+    rules = [dict(rule) for rule in fema['rules']]
+    rules[1]['op'] = 'bogus'
+    rules[2]['id'] = rules[0]['id']
+    problems = rule_problems(rules, fema['eligibility'])
+    assert any('.op must be one of' in problem for problem in problems)
+    assert any('is used twice' in problem for problem in problems)
+
+
+@pytest.mark.parametrize('address, declared', [
+    ("94086", True),
+    ("10050 N Wolfe Rd, Cupertino, CA 95014", True),
+    ("10050 N Wolfe Rd, New York, NY 10001", False),
+    ("10001", False),
+    ("10050 N Wolfe Rd", None),
+])
+def test_declared_area_from_an_address(ruleset, address, declared):
+    assert ruleset.check({'zip': address})['declared_area'] is declared
+
+
+def test_screen_streams_reasons(ruleset, tmp_path):
+    intake = tmp_path / 'intake.csv'
+    intake.write_text(
+        "applicant_id,zip,primary_residence,damage_amount,insurance_payout,residency_status\n"
+        "1,94086-1234,yes,\"$12,000\",0,citizen\n"
+        "2,10001,yes,5000,0,citizen\n"
+        "3,95014,no,5000,6000,visitor\n"
+        "4,,yes,5000,,citizen\n")
+    rows = [row for block in screen(str(intake), ruleset, id_column='applicant_id') for row in zip(*block)]
+    results = {applicant: (result, failed) for applicant, result, failed, _ in rows}
+    assert results['1'] == (PASS, '')
+    assert results['2'] == (FAIL, 'declared_area')
+    assert results['3'] == (FAIL, 'primary_residence|uninsured_loss|residency')
+    assert results['4'] == (REVIEW, 'declared_area|uninsured_loss')
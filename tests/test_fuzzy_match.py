@@ -0,0 +1,54 @@
+"""Spelling correction: typos reach routing terms, real words stay as typed"""
+
+import pytest
+
+import datapack
+import snapshot
+import fuzzy_match
+from knowledge_base import INTENT_KEYWORDS
+
+
+@pytest.fixture(scope='module')
+def speller():
+    knowledge = snapshot.load_knowledge()
+    vocabulary = fuzzy_match.routing_vocabulary(INTENT_KEYWORDS, knowledge['disaster_guides'])
+    return fuzzy_match.build_speller(vocabulary, fuzzy_match.speller_texts(knowledge))
+
+
+@pytest.mark.parametrize('typed, expected', [
+    ("earthqake", "earthquake"),
+    ("shleter", "shelter"),
+    ("femma", "fema"),
+    ("evacuaton", "evacuation"),
+    ("i need a kitt", "i need a kit"),
+    ("shelterr", "shelter"),
+    ("flod", "flood"),
+    ("emergncy", "emergency"),
+])
+def test_typos_are_corrected(speller, typed, expected):
+    assert speller.correct_text(typed)[0] == expected
+
+
+@pytest.mark.parametrize('text', [
+    "i lack water", "jack", "plano", "main", "fair", "create", "sick", "mold", "tree", "renter",
+])
+def test_real_words_are_not_rewritten(speller, text):
+    assert speller.correct_text(text) == (text, [])
+
+
+def test_corrections_only_target_routing_terms(speller):
+    _, corrections = speller.correct_text("the maid said the hause is fine")
+    assert all(fixed in speller.targets for _, fixed in corrections)
+
+
+def test_mapped_speller_matches_built_one(speller, tmp_path):
+    path = str(tmp_path / 'speller.pack')
+    datapack.write_pack(path, fuzzy_match.speller_sections(speller, ['kit', 'shelter']))
+    mapped = fuzzy_match.MappedSymSpell(datapack.DataPack(path))
+    assert mapped.targets == {'kit', 'shelter'}
+    assert mapped.correct_text("shleter kitt lack") == ("shelter kit lack", [("shleter", "shelter"), ("kitt", "kit")])
+
+
+def test_osa_distance_counts_transpositions_once():
+    assert fuzzy_match.osa_distance("shelter", "shleter", 2) == 1
+    assert fuzzy_match.osa_distance("kit", "pack", 1) == 2
@@ -0,0 +1,123 @@
+"""Knowledge pack: validation problems, source versions, hot reload that keeps the old version on failure"""
+
+import os
+import json
+import copy
+
+import pytest
+
+import snapshot
+import knowledge_pack
+from knowledge_pack import KnowledgePackError, KnowledgeWatcher, validate, load_source
+
+
+@pytest.fixture(scope='module')
+def source_doc():
+    with open(knowledge_pack.DEFAULT_SOURCE_PATH) as f:
+        return json.load(f)
+
+
+def write(path, doc):
+    with open(path, 'w') as f:
+        json.dump(doc, f)
+
+
+def test_bundled_source_is_valid(source_doc):
+    assert validate(source_doc) == []
+
+
+def test_problems_name_the_field(source_doc):
+    doc = copy.deepcopy(source_doc)
+    shelter = doc['shelters']['Sunnyvale, CA'][0]
+    shelter['phone'] = "call us"
+    shelter['status'] = "maybe"
+    shelter['occupancy'] = -1
+    shelter['lat'] = 123.0
+    del doc['go_bag']
+    doc['extra'] = {}
+    problems = validate(doc)
+    where = "shelters['Sunnyvale, CA'][0]"
+    assert f"{where}.phone 'call us' is not a phone number" in problems
+    assert f"{where}.status must be one of open, full, closed" in problems
+    assert f"{where}.occupancy must be a whole number of people" in problems
+    assert f"{where}.lat must be a number within ±90" in problems
+    assert "missing section 'go_bag'" in problems
+    assert "unknown section 'extra'" in problems
+
+
+def test_required_region_and_guide(source_doc):
+    doc = copy.deepcopy(source_doc)
+    del doc['shelters']['Sunnyvale, CA']
+    del doc['disaster_guides']['earthquake']
+    problems = validate(doc)
+    assert "shelters must include 'Sunnyvale, CA'" in problems
+    assert "disaster_guides must include 'earthquake'" in problems
+
+
+def test_load_source_versions(source_doc, tmp_path):
+    path = str(tmp_path / 'knowledge.json')
+    write(path, source_doc)
+    knowledge = load_source(path)
+    assert knowledge['version']['version'] == source_doc['version']
+    assert knowledge['version']['sha256'] == knowledge_pack.source_sha(path)
+    assert knowledge['version']['source'] == 'knowledge.json'
+
+
+def test_load_source_errors(tmp_path):
+    path = str(tmp_path / 'knowledge.json')
+    with open(path, 'w') as f:
+        f.write("{not json")
+    with pytest.raises(KnowledgePackError, match="JSONDecodeError"):
+        load_source(path)
+    write(path, {'version': "1"})
+    with pytest.raises(KnowledgePackError) as error:
+        load_source(path)
+    assert "missing section 'fema'" in error.value.problems
+
+
+@pytest.fixture
+def watched(source_doc, tmp_path, monkeypatch):
+    monkeypatch.setenv(snapshot.SNAPSHOT_PATH_ENV, str(tmp_path / 'snapshot.pack'))
+    monkeypatch.setenv('EMERGENCY_DATAPACK', str(tmp_path / 'knowledge.pack'))
+    monkeypatch.setattr(snapshot, '_live', None)
+    snapshot.open_snapshot.cache_clear()
+    path = str(tmp_path / 'knowledge.json')
+    write(path, source_doc)
+    knowledge_pack.compile_pack(path)
+    yield path
+    knowledge_pack.invalidate_derived()
+
+
+def test_watcher_swaps_new_version(source_doc, watched):
+    swapped = []
+    watcher = KnowledgeWatcher(path=watched, interval=60, on_swap=[lambda: swapped.append(True)])
+    assert watcher.version['version'] == source_doc['version']
+    assert not watcher.check()
+
+    doc = copy.deepcopy(source_doc)
+    doc['version'] = "next"
+    doc['fema']['process'].append("Keep every receipt")
+    write(watched, doc)
+    assert watcher.check()
+    assert swapped == [True]
+    knowledge = snapshot.load_knowledge()
+    assert knowledge['version']['version'] == "next"
+    assert knowledge['fema']['process'][-1] == "Keep every receipt"
+    assert watcher.status()['reloads'] == 1 and os.path.exists(snapshot.snapshot_path())
+
+
+def test_watcher_keeps_old_version_on_invalid_source(source_doc, watched):
+    watcher = KnowledgeWatcher(path=watched, interval=60)
+    doc = copy.deepcopy(source_doc)
+    doc['version'] = "broken"
+    del doc['fema']
+    write(watched, doc)
+    assert not watcher.check()
+    status = watcher.status()
+    assert status['failures'] == 1 and "missing section 'fema'" in status['last_error']
+    assert snapshot.load_knowledge()['version']['version'] == source_doc['version']
+
+    # The same rejected content is not re-validated on every poll
+    os.utime(watched, ns=(0, 0))
+    assert not watcher.check()
+    assert watcher.status()['failures'] == 1
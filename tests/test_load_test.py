@@ -0,0 +1,32 @@
+"""Load test reporting: percentiles and the saturation point"""
+
+from load_test import percentile, find_saturation
+
+
+def level(sessions, throughput, p95):
+    return {'sessions': sessions, 'throughput': throughput, 'p95': p95}
+
+
+def test_percentile():
+    samples = list(range(1, 101))
+    assert percentile(samples, 50) == 50
+    assert percentile(samples, 99) == 99
+    assert percentile([3.0], 95) == 3.0
+    assert percentile([], 95) == 0.0
+
+
+def test_saturation_when_throughput_stops_growing():
+    levels = [level(1, 2.0, 0.5), level(2, 3.9, 0.6), level(4, 4.1, 0.9)]
+    found, reason = find_saturation(levels)
+    assert found['sessions'] == 4 and "throughput" in reason
+
+
+def test_saturation_when_latency_blows_up():
+    levels = [level(1, 2.0, 0.5), level(2, 4.0, 0.6), level(4, 8.0, 1.2)]
+    found, reason = find_saturation(levels)
+    assert found['sessions'] == 4 and "p95" in reason
+
+
+def test_no_saturation():
+    assert find_saturation([level(1, 2.0, 0.5), level(2, 4.0, 0.5)]) == (None, None)
+    assert find_saturation([]) == (None, None)
@@ -0,0 +1,53 @@
+"""Run profiler: no-op when off, phase timings, cProfile and sampling captures"""
+
+import time
+import marshal
+
+from profiler import RunProfiler
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_disabled_profiler_records_nothing():
+    profiler = RunProfiler()
+    assert profiler.phase("a") is profiler.phase("b")
+    with profiler.phase("a"):
+        pass
+    profiler.record("b", 0.1)
+    assert profiler.finish()['phases'] == []
+
+
+def test_phases_in_start_order():
+    profiler = RunProfiler(enabled=True)
+    with profiler.phase("outer"):
+        with profiler.phase("inner"):
+            time.sleep(0.01)
+    profiler.record("late", 0.002)
+    summary = profiler.finish()
+    assert [name for name, _ in summary['phases']] == ["outer", "inner", "late"]
+    outer, inner = summary['phases'][0][1], summary['phases'][1][1]
+    assert outer >= inner >= 10
+    assert summary['total_ms'] >= outer
+    assert profiler.finish() is summary
+
+
+def test_cprofile_capture():
+    profiler = RunProfiler(enabled=True, capture='cProfile')
+    busy(0.02)
+    summary = profiler.finish()
+    assert 'busy' in summary['profile_text']
+    stats = marshal.loads(summary['profile'])
+    assert any(func == 'busy' for _, _, func in stats)
+
+
+def test_sampling_capture():
+    profiler = RunProfiler(enabled=True, capture='sampling')
+    busy(0.1)
+    summary = profiler.finish()
+    collapsed = summary['profile'].decode('utf-8')
+    assert 'busy (test_profiler.py' in collapsed
+    assert summary['profile_text'].split()[0].isdigit()
@@ -0,0 +1,76 @@
+"""Streaming analytics: rate windows, heavy hitters, distinct users, merge and export"""
+
+from query_analytics import TopK, HyperLogLog, RateWindow, QueryAnalytics, RATE_SPAN
+
+NOW = 1_800_000_000.0
+
+
+def test_rate_windows_cover_only_their_span():
+    window = RateWindow()
+    window.add(NOW - 30, count=6)
+    window.add(NOW - 240, count=30)
+    window.add(NOW - 1800, count=360)
+    assert window.count(60, NOW) == 6
+    assert window.count(300, NOW) == 36
+    assert window.count(now=NOW) == 396
+    assert window.rate(60, NOW) == 0.1
+
+
+def test_stale_slots_are_not_counted():
+    analytics = QueryAnalytics()
+    analytics.record_query('a', "shelter near 94086", now=NOW - 2 * RATE_SPAN)
+    analytics.record_query('b', "kit", now=NOW - 10)
+    report = analytics.report(now=NOW)
+    assert report['queries'] == 1
+    # An hour later both questions have left the window
+    assert analytics.report(now=NOW + RATE_SPAN)['queries'] == 0
+
+
+def test_record_query_counts_the_zip_not_the_house_number():
+    analytics = QueryAnalytics()
+    analytics.record_query('a', "10050 N Wolfe Rd, Cupertino, CA 95014", now=NOW)
+    assert analytics.report(now=NOW)['zips'] == [('95014', 1)]
+
+
+def test_newcomer_does_not_evict_a_heavier_key():
+    sketch = TopK(candidates=3)
+    for key, count in (('a', 5), ('b', 10), ('c', 10)):
+        sketch.add(key, count)
+    # 'a' grows past the others, so the floor is now 10, not 5
+    sketch.add('a', 20)
+    sketch.add('d', 6)
+    assert set(sketch.candidates) == {'a', 'b', 'c'}
+    sketch.add('e', 15)
+    assert 'e' in sketch.candidates and len(sketch.candidates) == 3
+
+
+def test_top_is_heaviest_first():
+    sketch = TopK()
+    for key, count in (('fire', 3), ('flood', 7), ('kit', 1)):
+        sketch.add(key, count)
+    assert sketch.top(2) == [('flood', 7), ('fire', 3)]
+
+
+def test_distinct_users_estimate():
+    hll = HyperLogLog()
+    for i in range(5000):
+        hll.add(f"user-{i}")
+        hll.add(f"user-{i}")
+    assert abs(hll.count() - 5000) < 5000 * 0.05
+
+
+def test_merge_and_export_round_trip():
+    first, second = QueryAnalytics(), QueryAnalytics()
+    first.record_query('a', "94086", now=NOW)
+    first.record_intents(['shelter'], now=NOW)
+    second.record_query('b', "94086", now=NOW)
+    second.record_intents(['shelter', 'kit'], now=NOW)
+    second.record_location("550 E Remington Dr,  Sunnyvale")
+    first.merge(QueryAnalytics.from_bytes(second.to_bytes()))
+    report = first.report(now=NOW)
+    assert report['queries'] == 2
+    assert report['users'] == 2
+    assert report['zips'] == [('94086', 2)]
+    assert report['intents'] == [('shelter', 2), ('kit', 1)]
+    assert report['addresses'] == [('550 e remington dr sunnyvale', 1)]
+    assert report['rates']['intent:kit']['1 min'] == 1 / 60
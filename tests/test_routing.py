@@ -0,0 +1,39 @@
+"""Intent routing: every keyword, its inflections and compounds, and several intents at once"""
+
+import pytest
+
+from knowledge_base import INTENT_KEYWORDS, detect_intents
+
+
+@pytest.mark.parametrize('intent, word', [(intent, word) for intent, words in INTENT_KEYWORDS.items()
+                                          for word in words])
+def test_every_keyword_routes(intent, word):
+    assert intent in detect_intents(f"tell me about {word} please")
+
+
+@pytest.mark.parametrize('text, intent', [
+    ("how do i survive a wildfire", 'disaster'),
+    ("wildfires near san jose", 'disaster'),
+    ("flooding in my street", 'disaster'),
+    ("are you prepared", 'kit'),
+    ("preparing for an earthquake", 'kit'),
+    ("what should i be packing", 'kit'),
+    ("my backpack list", 'kit'),
+    ("emergency kits for kids", 'kit'),
+    ("we planned a meeting spot", 'plan'),
+    ("planning with my family", 'plan'),
+    ("who applies for fema aid", 'fema'),
+    ("evacuations tonight", 'shelter'),
+    ("i got warnings on my phone", 'alert'),
+])
+def test_inflections_route(text, intent):
+    assert intent in detect_intents(text)
+
+
+@pytest.mark.parametrize('text', ["preparedness month", "a kitten", "airplane safety", "packet loss", "the planet"])
+def test_longer_words_do_not_route(text):
+    assert detect_intents(text) == []
+
+
+def test_several_intents_in_keyword_order():
+    assert detect_intents("pack a kit and find a shelter") == ['shelter', 'kit']
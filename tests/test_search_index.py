@@ -0,0 +1,61 @@
+"""BM25 search index: tokenizing, ranking, the persisted index and its rebuild on content changes"""
+
+import pytest
+
+import datapack
+import search_index
+import snapshot
+from search_index import tokenize, stem, build_index, SearchIndex
+
+PASSAGES = [
+    ("Earthquake safety", "Ready.gov", "https://www.ready.gov/earthquakes",
+     "Drop, cover and hold on. Stay away from windows during shaking."),
+    ("Flood safety", "Ready.gov", "https://www.ready.gov/floods",
+     "Turn around, don't drown. Never drive through flooded roads."),
+    ("Water storage", "Red Cross", "", "Store one gallon of water per person per day for drinking and sanitation."),
+]
+
+
+def test_tokenize_and_stem():
+    assert tokenize("The floods are flooding the roads!") == ['flood', 'flood', 'road']
+    assert stem("batteries") == 'battery' and stem("glass") == 'glass'
+
+
+def test_ranking(tmp_path):
+    index = build_index(PASSAGES, str(tmp_path / 'search.index'))
+    assert len(index) == 3
+    results = index.search("what to do when the ground is shaking", k=2)
+    assert results[0]['title'] == "Earthquake safety"
+    assert results[0]['url'] == "https://www.ready.gov/earthquakes"
+    assert index.search("flooded road")[0]['title'] == "Flood safety"
+    assert index.search("xylophone") == []
+    assert all(r['score'] > 0 for r in index.search("water", k=5))
+
+
+def test_version_mismatch_is_rejected(tmp_path):
+    path = str(tmp_path / 'search.index')
+    sections = search_index.build_sections(PASSAGES)
+    sections['meta']['version'] = search_index.INDEX_VERSION + 1
+    datapack.write_pack(path, sections)
+    with pytest.raises(ValueError):
+        SearchIndex(datapack.DataPack(path))
+
+
+def test_get_index_rebuilds_when_content_changes(tmp_path, monkeypatch):
+    monkeypatch.setenv('EMERGENCY_SEARCH_INDEX', str(tmp_path / 'search.index'))
+    corpus = tmp_path / 'corpus'
+    corpus.mkdir()
+    (corpus / 'heat.md').write_text("# Extreme heat\n\nDrink water and find a cooling center.\n")
+    knowledge = snapshot.load_knowledge()
+    search_index.clear_index_cache()
+    try:
+        first = search_index.get_index(knowledge, str(corpus))
+        assert first.search("cooling center")[0]['title'] == "Extreme heat"
+        assert search_index.get_index(knowledge, str(corpus)) is first
+        (corpus / 'heat.md').write_text("# Extreme heat\n\nDrink water and visit a splash pad.\n")
+        search_index.clear_index_cache()
+        second = search_index.get_index(knowledge, str(corpus))
+        assert second.meta['fingerprint'] != first.meta['fingerprint']
+        assert second.search("splash pad")[0]['title'] == "Extreme heat"
+    finally:
+        search_index.clear_index_cache()
@@ -0,0 +1,89 @@
+"""Session budgets: footprint estimates, compaction before eviction, the operator ledger"""
+
+import time
+
+import session_budget
+from session_budget import (KEEP_RECENT, SessionLedger, approx_size, budget_bytes, compact_turn,
+                            enforce_budget, session_footprint)
+
+
+def conversation(turns, padding=2000):
+    messages = []
+    for i in range(turns):
+        messages.append({'role': 'user', 'content': f"question {i}", 'timestamp': "10:00"})
+        messages.append({'role': 'assistant', 'timestamp': "10:00", 'show_map': True,
+                         'content': f"<div class='answer'><p>Answer {i}</p>{'<span>x</span>' * padding}</div>",
+                         'reasoning': ["step"] * 50, 'tools_used': ["shelter_finder"]})
+    return messages
+
+
+def test_budget_from_env(monkeypatch):
+    monkeypatch.setenv(session_budget.BUDGET_ENV, "64")
+    assert budget_bytes() == 64 * 1024
+    monkeypatch.setenv(session_budget.BUDGET_ENV, "lots")
+    assert budget_bytes() == session_budget.DEFAULT_BUDGET_KB * 1024
+
+
+def test_approx_size_counts_contents():
+    assert approx_size({'a': "x" * 1000}) > 1000
+    assert approx_size([["x" * 500] * 2]) > 1000
+
+
+def test_footprint_categories():
+    messages = conversation(2)
+    messages[1] = compact_turn(messages[1])
+    footprint = session_footprint({'messages': messages, 'household_info': {'adults': 2}, 'map_bytes': 1000})
+    assert footprint['maps'] == 1000
+    assert footprint['messages'] == approx_size(messages)
+    assert footprint['household'] > 0 and footprint['profiles'] == approx_size(None) * 2
+
+
+def test_compact_turn():
+    user, answer = conversation(1)
+    assert compact_turn(user) is user
+    compact = compact_turn(answer)
+    assert compact['compacted'] and "Answer 0" in compact['content']
+    assert 'reasoning' not in compact and 'show_map' not in compact
+    assert compact_turn(compact) is compact
+    assert approx_size(compact) < approx_size(answer)
+
+
+def test_under_budget_unchanged():
+    messages = conversation(3)
+    assert enforce_budget(messages, approx_size(messages)) == (messages, 0, 0)
+
+
+def test_compacts_oldest_before_evicting():
+    messages = conversation(6)
+    budget = int(approx_size(messages) * 0.9)
+    trimmed, compacted, evicted = enforce_budget(messages, budget)
+    assert compacted and not evicted
+    assert approx_size(trimmed) <= budget * session_budget.TRIM_TO
+    assert trimmed[1].get('compacted') and trimmed[-KEEP_RECENT:] == messages[-KEEP_RECENT:]
+    assert messages[1].get('reasoning')
+
+
+def test_evicts_but_keeps_recent_turns():
+    messages = conversation(10)
+    trimmed, compacted, evicted = enforce_budget(messages, approx_size(messages[-KEEP_RECENT:]) + 1000)
+    assert evicted and len(trimmed) == len(messages) - evicted
+    assert trimmed[-KEEP_RECENT:] == messages[-KEEP_RECENT:]
+    assert trimmed[0]['role'] == 'user'
+
+
+def test_other_bytes_count_against_budget():
+    messages = conversation(6)
+    budget = approx_size(messages) + 100
+    assert enforce_budget(messages, budget)[1:] == (0, 0)
+    assert enforce_budget(messages, budget, other_bytes=budget // 2)[1]
+
+
+def test_ledger_heaviest_and_ttl():
+    ledger = SessionLedger(ttl=0.1)
+    ledger.update('a', {'messages': 100}, turns=2)
+    ledger.update('b', {'messages': 300, 'maps': 200}, compacted=3, evicted=1)
+    assert [entry['session_id'] for entry in ledger.heaviest()] == ['b', 'a']
+    assert ledger.totals() == {'sessions': 2, 'bytes': 600, 'compacted': 3, 'evicted': 1}
+    time.sleep(0.15)
+    ledger.update('c', {'messages': 10})
+    assert ledger.totals()['sessions'] == 1
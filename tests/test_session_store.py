@@ -0,0 +1,109 @@
+"""Session store: codec, SQLite and Redis-protocol round trips, write-behind flushing and pruning"""
+
+import threading
+from datetime import datetime
+
+import pytest
+
+import session_store
+from session_store import (SessionStore, SQLiteBackend, RedisBackend, RespServer, encode_state, decode_state,
+                           create_backend)
+
+STATE = {
+    'messages': [{'role': 'user', 'content': "Find shelters near 94086 ☂", 'timestamp': datetime(2026, 10, 19, 9, 30)},
+                 {'role': 'assistant', 'content': "<p>" + "shelter " * 200 + "</p>", 'needs_input': ['address']}],
+    'household_info': {'adults': 2, 'children': 1, 'pets': 0},
+    'user_address': "94086",
+}
+
+
+@pytest.mark.parametrize('state, codec', [(STATE, b'z'), ({'user_address': None}, b'j')])
+def test_codec_round_trip(state, codec):
+    data = encode_state(state)
+    assert data[:1] == codec
+    assert decode_state(data) == state
+
+
+def test_unknown_codec_is_rejected():
+    with pytest.raises(ValueError):
+        decode_state(b'x{}')
+
+
+@pytest.fixture
+def sqlite_backend(tmp_path):
+    return SQLiteBackend(str(tmp_path / 'sessions.db'))
+
+
+@pytest.fixture
+def redis_backend():
+    server = RespServer(('127.0.0.1', 0))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield RedisBackend(*server.server_address)
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize('backend_name', ['sqlite_backend', 'redis_backend'])
+def test_store_round_trip(request, backend_name):
+    backend = request.getfixturevalue(backend_name)
+    store = SessionStore(backend, flush_interval=60)
+    try:
+        store.save('s1', STATE)
+        # Pending writes are read back before they are flushed
+        assert backend.get('s1') is None
+        assert store.load('s1') == STATE
+        assert store.flush() == 1
+        assert decode_state(backend.get('s1')) == STATE
+        # Another process sees the flushed state
+        assert SessionStore(backend, flush_interval=60).load('s1') == STATE
+        store.delete('s1')
+        assert store.load('s1') is None
+        assert store.load('unknown') is None
+    finally:
+        store.close()
+
+
+def test_failed_flush_keeps_newer_state():
+    class Failing:
+        down = True
+
+        def put_many(self, items):
+            if self.down:
+                store.save('s1', {'user_address': "newer"})
+                raise OSError("store down")
+
+    backend = Failing()
+    store = SessionStore(backend, flush_interval=60)
+    try:
+        store.save('s1', {'user_address': "older"})
+        with pytest.raises(OSError):
+            store.flush()
+        assert store.load('s1') == {'user_address': "newer"}
+        assert store.stats['errors'] == 1
+    finally:
+        backend.down = False
+        store.close()
+
+
+def test_sqlite_prunes_expired_sessions_on_a_timer(sqlite_backend, monkeypatch):
+    sqlite_backend.put_many([('old', b'j{}')])
+    conn = sqlite_backend._conn()
+    conn.execute("UPDATE sessions SET updated = updated - ?", (session_store.SESSION_TTL + 1,))
+    conn.commit()
+    # Pruned at most once per interval, not on every flush
+    sqlite_backend.put_many([('new', b'j{}')])
+    assert sqlite_backend.get('old') is not None
+    monkeypatch.setattr(session_store, 'PRUNE_INTERVAL', 0)
+    sqlite_backend.put_many([('new', b'j{}')])
+    assert sqlite_backend.get('old') is None
+    assert sqlite_backend.get('new') == b'j{}'
+    plan = conn.execute("EXPLAIN QUERY PLAN DELETE FROM sessions WHERE updated < 0").fetchall()
+    assert 'sessions_updated' in str(plan)
+
+
+def test_create_backend_urls(tmp_path):
+    assert isinstance(create_backend(f"sqlite:///{tmp_path}/s.db"), SQLiteBackend)
+    assert create_backend("redis://example:6390").address == ('example', 6390)
+    with pytest.raises(ValueError):
+        create_backend("memcached://x")
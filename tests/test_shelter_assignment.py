@@ -0,0 +1,82 @@
+"""Shelter assignment: nearest placement, capacity, services and incremental re-planning"""
+
+import numpy as np
+import pytest
+
+from shelter_assignment import (assign_households, parse_capacity, parse_services, shelters_from_data,
+                                unit_vectors, dot_to_miles)
+
+SHELTERS = [
+    {'id': 'north', 'lat': 37.50, 'lon': -122.0, 'capacity': 4, 'services': 'food, water'},
+    {'id': 'south', 'lat': 37.00, 'lon': -122.0, 'capacity': "10 people", 'services': 'Food, pet-friendly'},
+]
+
+
+def households(*specs):
+    return [{'id': hh_id, 'lat': lat, 'lon': -122.0, 'size': size, 'needs': needs}
+            for hh_id, lat, size, needs in specs]
+
+
+def shelter_of(plan, hh_id):
+    shelter, _ = plan.assignment(hh_id)
+    return shelter['id'] if shelter else None
+
+
+def test_parsers():
+    assert parse_capacity("1,200 people") == 1200 and parse_capacity(7) == 7 and parse_capacity("none") == 0
+    assert parse_services("Food, water ,pet-friendly") == {'food', 'water', 'pet-friendly'}
+
+
+def test_miles_between_points():
+    a, b = unit_vectors([37.0, 38.0], [-122.0, -122.0])
+    assert dot_to_miles(a @ b) == pytest.approx(69.1, abs=0.1)
+
+
+def test_nearest_shelter_with_room():
+    plan = assign_households(households(('a', 37.49, 2, ''), ('b', 37.48, 2, ''), ('c', 37.47, 2, '')), SHELTERS)
+    # North holds 4 people; the third household overflows to the south
+    assert [shelter_of(plan, hh) for hh in 'abc'].count('north') == 2
+    assert plan.summary()['assigned'] == 3 and plan.summary()['full_shelters'] == 1
+
+
+def test_services_are_required():
+    plan = assign_households(households(('dog', 37.49, 1, 'pet-friendly'), ('gym', 37.49, 1, 'gym')), SHELTERS)
+    assert shelter_of(plan, 'dog') == 'south'
+    assert shelter_of(plan, 'gym') is None
+    assert plan.summary()['unassigned'] == 1
+
+
+def test_shrinking_capacity_moves_the_farthest_occupants():
+    plan = assign_households(households(('near', 37.50, 2, ''), ('far', 37.40, 2, '')), SHELTERS)
+    assert plan.update_capacity('north', 2) == []
+    assert shelter_of(plan, 'near') == 'north' and shelter_of(plan, 'far') == 'south'
+
+
+def test_closing_opening_and_releasing():
+    plan = assign_households(households(('a', 37.5, 3, ''), ('b', 37.0, 10, '')), SHELTERS)
+    assert plan.close_shelter('north') == ['a']
+    plan.add_shelter({'id': 'east', 'lat': 37.5, 'lon': -121.9, 'capacity': 5, 'services': ''})
+    assert shelter_of(plan, 'a') == 'east'
+    # Released households free their room and are not placed again
+    assert plan.remove_households(['b']) == []
+    assert shelter_of(plan, 'b') is None
+    assert plan.load.tolist() == [0, 0, 3]
+    assert plan.summary()['households'] == 1 and plan.summary()['unassigned'] == 0
+
+
+def test_matches_brute_force_when_capacity_is_ample():
+    rng = np.random.default_rng(1)
+    shelters = [{'id': i, 'lat': lat, 'lon': lon, 'capacity': 10_000, 'services': ''}
+                for i, (lat, lon) in enumerate(zip(rng.uniform(37, 38, 30), rng.uniform(-122.5, -121.5, 30)))]
+    people = [{'id': i, 'lat': lat, 'lon': lon} for i, (lat, lon) in
+              enumerate(zip(rng.uniform(37, 38, 500), rng.uniform(-122.5, -121.5, 500)))]
+    plan = assign_households(people, shelters, candidates=2)
+    nearest = np.argmax(plan.hh_xyz @ plan.shelter_xyz.T, axis=1)
+    assert np.array_equal(plan.assigned, nearest)
+
+
+def test_shelters_from_data():
+    flat = shelters_from_data({'Sunnyvale, CA': [{'name': "Center", 'lat': 37.3, 'lon': -122.0,
+                                                  'capacity': "500 people", 'services': "Food, water"}]})
+    assert flat == [{'id': "Center", 'name': "Center", 'region': 'Sunnyvale, CA', 'lat': 37.3, 'lon': -122.0,
+                     'capacity': 500, 'services': frozenset({'food', 'water'})}]
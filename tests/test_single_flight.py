@@ -0,0 +1,165 @@
+"""Single-flight coalescing: shared results, shared errors, interrupted leaders"""
+
+import threading
+
+from surge import SurgeConfig, SurgeController
+from single_flight import SingleFlight, flight_key
+
+
+class Rerun(BaseException):
+    """Stands in for Streamlit's RerunException / StopException"""
+
+
+def start_waiters(flight, key, func, count):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do(key, func))) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def wait_for_waiters(flight, key, count):
+    while True:
+        with flight._lock:
+            current = flight._flights.get(key)
+            if current is not None and current.waiters == count:
+                return
+
+
+def test_waiters_share_the_leaders_result():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def leader():
+        release.wait()
+        return ['answer']
+
+    result = []
+    lead = threading.Thread(target=lambda: result.append(flight.do('q', leader)))
+    lead.start()
+    wait_for_waiters(flight, 'q', 0)
+    threads, results = start_waiters(flight, 'q', lambda: ['other'], 3)
+    wait_for_waiters(flight, 'q', 3)
+    release.set()
+    for thread in [lead] + threads:
+        thread.join()
+    assert result == [(['answer'], False)]
+    assert all(value is result[0][0] and shared for value, shared in results)
+    assert flight.stats()['coalesced'] == 3
+
+
+def test_leader_error_is_raised_in_waiters():
+    flight = SingleFlight()
+    release = threading.Event()
+    errors = []
+
+    def failing():
+        release.wait()
+        raise ValueError("boom")
+
+    def call():
+        try:
+            flight.do('q', failing)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    threads[0].start()
+    wait_for_waiters(flight, 'q', 0)
+    for thread in threads[1:]:
+        thread.start()
+    wait_for_waiters(flight, 'q', 2)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 3 and flight.stats()['errors'] == 1
+
+
+def test_interrupted_leader_makes_waiters_compute_their_own():
+    flight = SingleFlight()
+    release = threading.Event()
+    interrupted = []
+
+    def interrupted_leader():
+        release.wait()
+        raise Rerun()
+
+    def lead():
+        try:
+            flight.do('q', interrupted_leader)
+        except Rerun:
+            interrupted.append(True)
+
+    leader = threading.Thread(target=lead)
+    leader.start()
+    wait_for_waiters(flight, 'q', 0)
+    threads, results = start_waiters(flight, 'q', lambda: ('computed',), 2)
+    wait_for_waiters(flight, 'q', 2)
+    release.set()
+    for thread in [leader] + threads:
+        thread.join()
+    assert interrupted == [True]
+    assert results == [(('computed',), False)] * 2
+    assert flight.stats()['aborts'] == 2 and flight.stats()['in_flight'] == 0
+
+
+def test_flight_key_depends_on_context_not_spacing():
+    context = {'user_address': '94086', 'household_info': {'adults': 2}}
+    assert flight_key("  Find  SHELTER ", context) == flight_key("find shelter", dict(context))
+    assert flight_key("find shelter", context) != flight_key("find shelter", dict(context, user_address='95014'))
+
+
+def test_waiter_times_out_and_computes():
+    flight = SingleFlight(wait_timeout=0.01)
+    release = threading.Event()
+    lead = threading.Thread(target=lambda: flight.do('q', release.wait))
+    lead.start()
+    wait_for_waiters(flight, 'q', 0)
+    assert flight.do('q', lambda: 'mine') == ('mine', False)
+    release.set()
+    lead.join()
+    assert flight.stats()['wait_timeouts'] == 1
+
+
+QUEUE_MAX_WAIT = 1.0
+
+
+def queued_leader_run(wait_timeout):
+    """A leader queued behind a busy slot for longer than 0.1 s, plus one duplicate question"""
+    surge = SurgeController(SurgeConfig(max_answering=1), mode='on')
+    flight = SingleFlight(wait_timeout=wait_timeout)
+    blocker = surge.enter()
+
+    def admitted():
+        # The app's admitted_thinking: wait in line, then compute
+        ticket = surge.enter()
+        try:
+            if not surge.wait(ticket, QUEUE_MAX_WAIT):
+                return 'busy'
+            return 'answer'
+        finally:
+            surge.leave(ticket)
+
+    result = []
+    lead = threading.Thread(target=lambda: result.append(flight.do('q', admitted)))
+    lead.start()
+    wait_for_waiters(flight, 'q', 0)
+    threads, results = start_waiters(flight, 'q', admitted, 1)
+    wait_for_waiters(flight, 'q', 1)
+    threading.Timer(0.3, surge.leave, (blocker,)).start()
+    for thread in [lead] + threads:
+        thread.join()
+    return result + results, surge.stats()
+
+
+def test_short_waiter_timeout_takes_its_own_ticket():
+    results, stats = queued_leader_run(wait_timeout=0.1)
+    assert results[1] == ('answer', False)
+    assert stats['queued'] == 2
+
+
+def test_waiter_outwaits_a_queued_leader():
+    # The app waits longer than a leader can spend in line (FLIGHT_WAIT > QUEUE_MAX_WAIT + QUERY_DEADLINE)
+    results, stats = queued_leader_run(wait_timeout=QUEUE_MAX_WAIT + 0.5)
+    assert results == [('answer', False), ('answer', True)]
+    assert stats['queued'] == 1 and stats['admitted'] == 2
@@ -0,0 +1,58 @@
+"""Startup snapshot: every component mapped, rebuilt on a version change, ignored when corrupt"""
+
+import os
+import shutil
+
+import pytest
+
+import datapack
+import snapshot
+
+
+def corrupt(path, offset):
+    os.chmod(path, 0o644)
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        byte = f.read(1)
+        f.seek(offset)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+
+@pytest.fixture(scope='module')
+def built(tmp_path_factory):
+    return snapshot.build_snapshot(str(tmp_path_factory.mktemp('snap') / 'snapshot.pack'))
+
+
+@pytest.fixture
+def snapshot_file(built, tmp_path):
+    path = str(tmp_path / 'snapshot.pack')
+    shutil.copyfile(built, path)
+    snapshot.open_snapshot.cache_clear()
+    yield path
+    snapshot.open_snapshot.cache_clear()
+
+
+def test_opens_with_every_component(snapshot_file):
+    snap, problem = snapshot._open(snapshot_file)
+    assert problem is None
+    assert snap.knowledge['shelters'] == datapack.load_knowledge()['shelters']
+    assert snap.meta['versions'] == snapshot.component_versions()
+    assert snap.search.search("earthquake")
+
+
+def test_version_mismatch_is_rebuilt(snapshot_file, monkeypatch):
+    monkeypatch.setattr(snapshot, 'SNAPSHOT_VERSION', snapshot.SNAPSHOT_VERSION + 1)
+    snap, problem = snapshot._open(snapshot_file)
+    assert snap is None and problem.startswith("version mismatch")
+    rebuilt = snapshot.open_snapshot(snapshot_file)
+    assert rebuilt is not None and rebuilt.meta['versions']['snapshot'] == snapshot.SNAPSHOT_VERSION
+
+
+@pytest.mark.parametrize('section', ['snapshot', 'search/'])
+def test_corrupt_snapshot_is_ignored(snapshot_file, section):
+    sections = datapack.DataPack(snapshot_file).sections
+    name = next(name for name in sections if name.startswith(section))
+    corrupt(snapshot_file, sections[name]['offset'] + sections[name]['length'] // 2)
+    snap, problem = snapshot._open(snapshot_file)
+    assert snap is None and problem == "checksum mismatch"
+    assert snapshot.open_snapshot(snapshot_file) is None
@@ -0,0 +1,45 @@
+"""Static SVG shelter map and low-bandwidth detection"""
+
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from static_map import render_shelter_map, distance_color, is_low_bandwidth, DISTANCE_COLORS
+
+SHELTERS = [
+    {'name': "Sunnyvale Community Center", 'lat': 37.3688, 'lon': -122.0363, 'distance': "1.2 miles"},
+    {'name': "Parents & Kids <Gym>", 'lat': 37.3541, 'lon': -122.0443, 'distance': "2.1 miles"},
+    {'name': "Red Cross Emergency Shelter", 'lat': 37.3894, 'lon': -121.9439, 'distance': "5.3 miles"},
+]
+
+
+def test_map_is_valid_svg_with_every_shelter():
+    svg = render_shelter_map(SHELTERS)
+    root = ET.fromstring(svg)
+    titles = [title.text for title in root.iter('{http://www.w3.org/2000/svg}title')]
+    assert titles == [f"{s['name']} ({s['distance']})" for s in SHELTERS]
+    assert "You" not in svg
+
+
+def test_user_location_and_cache():
+    svg = render_shelter_map(SHELTERS, 37.37, -122.03)
+    assert "Your location" in svg
+    assert render_shelter_map(SHELTERS, 37.37, -122.03) is svg
+    assert render_shelter_map(SHELTERS[:1]) != render_shelter_map(SHELTERS)
+
+
+@pytest.mark.parametrize('distance, band', [("0.4 miles", 0), ("2.0 miles", 1), ("3.9 miles", 1), ("12 miles", 2)])
+def test_distance_colors(distance, band):
+    assert distance_color(distance) == DISTANCE_COLORS[band][1]
+
+
+@pytest.mark.parametrize('headers, slow', [
+    ({'Save-Data': 'on'}, True),
+    ({'ECT': '3g'}, True),
+    ({'ect': '4g', 'downlink': '10'}, False),
+    ({'Downlink': '0.4'}, True),
+    ({'downlink': 'unknown'}, False),
+    (None, False),
+])
+def test_low_bandwidth_headers(headers, slow):
+    assert is_low_bandwidth(headers) is slow
@@ -0,0 +1,114 @@
+"""Surge controller: trip and recovery hysteresis, FIFO admission, static answers"""
+
+import time
+import threading
+
+from surge import SurgeConfig, SurgeController
+
+
+def controller(mode='auto', **overrides):
+    settings = dict(trip_queue=3, recover_queue=1, recover_seconds=0.1, max_answering=1, max_queue=2)
+    settings.update(overrides)
+    return SurgeController(SurgeConfig(**settings), mode=mode)
+
+
+def test_config_from_env():
+    config = SurgeConfig.from_env({'EMERGENCY_SURGE_TRIP_QUEUE': '40', 'EMERGENCY_SURGE_CACHE_TTL': '5'})
+    assert config.trip_queue == 40 and config.cache_ttl == 5.0
+    assert config.max_queue == SurgeConfig.FIELDS['max_queue']
+
+
+def test_everyone_admitted_outside_surge():
+    surge = controller(trip_queue=100)
+    tickets = [surge.enter() for _ in range(10)]
+    assert all(ticket.admitted for ticket in tickets)
+    assert not surge.active()
+
+
+def test_trip_queue_and_reject():
+    surge = controller(mode='on')
+    first = surge.enter()
+    second, third = surge.enter(), surge.enter()
+    assert first.admitted and not second.admitted and not third.admitted
+    assert surge.position(second) == 1 and surge.position(third) == 2
+    assert surge.enter() is None
+    assert surge.stats()['rejected'] == 1
+
+
+def test_fifo_admission_on_leave():
+    surge = controller(mode='on')
+    first = surge.enter()
+    second, third = surge.enter(), surge.enter()
+    surge.leave(first)
+    assert second.admitted and not third.admitted
+    assert surge.position(third) == 1
+    surge.leave(third)
+    assert surge.position(third) == 0 and surge.stats()['waiting'] == 0
+
+
+def test_wait_returns_once_admitted():
+    surge = controller(mode='on')
+    first = surge.enter()
+    second = surge.enter()
+    assert not surge.wait(second, 0.05)
+    threading.Timer(0.05, surge.leave, (first,)).start()
+    assert surge.wait(second, 2.0)
+
+
+def test_trips_on_depth_and_recovers_after_calm():
+    surge = controller(max_answering=10)
+    tickets = [surge.enter() for _ in range(3)]
+    assert surge.active() and surge.trips == 1
+    for ticket in tickets:
+        surge.leave(ticket)
+    # Calm must last recover_seconds before surge mode ends
+    assert surge.active()
+    time.sleep(0.15)
+    assert not surge.active() and surge.recoveries == 1
+
+
+def test_calm_resets_when_load_returns():
+    surge = controller(max_answering=10, recover_seconds=0.2)
+    tickets = [surge.enter() for _ in range(3)]
+    assert surge.active()
+    for ticket in tickets:
+        surge.leave(ticket)
+    assert surge.active()
+    time.sleep(0.1)
+    tickets = [surge.enter() for _ in range(2)]
+    time.sleep(0.15)
+    assert surge.active()
+    for ticket in tickets:
+        surge.leave(ticket)
+
+
+def test_trips_on_latency():
+    surge = controller(trip_queue=100, trip_latency_ms=500.0)
+    for _ in range(20):
+        surge.record_run(0.01)
+    assert not surge.active()
+    for _ in range(5):
+        surge.record_run(1.0)
+    assert surge.active()
+    assert surge.stats()['latency_p95_ms'] >= 500.0
+
+
+def test_forced_off_admits_everyone():
+    surge = controller(mode='off')
+    tickets = [surge.enter() for _ in range(10)]
+    assert all(ticket.admitted for ticket in tickets) and not surge.active()
+
+
+def test_static_answers_ttl_and_size():
+    surge = controller(cache_size=2, cache_ttl=0.1)
+    surge.remember('a', {'response': "A"})
+    surge.remember('b', {'response': "B"})
+    surge.remember('c', {'response': "C"})
+    assert surge.cached('a') is None
+    assert surge.cached('c')[1] == {'response': "C"}
+    time.sleep(0.15)
+    assert surge.cached('b') is None
+    surge.remember('d', {'response': "D"})
+    surge.clear_answers()
+    assert surge.cached('d') is None
+    assert surge.stats()['cache_hits'] == 1
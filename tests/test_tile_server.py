@@ -0,0 +1,46 @@
+"""Tile store: lookups, ETags and the byte bound on its LRU (misses included)"""
+
+import pytest
+
+from tile_server import TileStore, create_mbtiles, put_tile, tile_for, ENTRY_OVERHEAD
+
+
+@pytest.fixture
+def mbtiles(tmp_path):
+    path = str(tmp_path / 'tiles.mbtiles')
+    conn = create_mbtiles(path, 'test', (-122.5, 37.0, -121.5, 37.6), 10, 10)
+    for x in range(4):
+        put_tile(conn, 10, x, 0, bytes([x]) * 1000)
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_get_returns_data_and_stable_etag(mbtiles):
+    store = TileStore(mbtiles)
+    data, etag = store.get(10, 2, 0)
+    assert data == bytes([2]) * 1000
+    assert store.get(10, 2, 0) == (data, etag)
+    assert store.get(10, 9, 9) is None
+    assert store.stats['hits'] == 1 and store.stats['misses'] == 2
+
+
+def test_cache_stays_within_its_byte_bound(mbtiles):
+    store = TileStore(mbtiles, cache_bytes=2 * (1000 + ENTRY_OVERHEAD))
+    for x in range(4):
+        store.get(10, x, 0)
+    assert len(store._cache) == 2 and store._cached_bytes <= store.cache_bytes
+    assert list(store._cache) == [(10, 2, 0), (10, 3, 0)]
+
+
+def test_missing_tiles_count_toward_the_bound(mbtiles):
+    store = TileStore(mbtiles, cache_bytes=100 * ENTRY_OVERHEAD)
+    for y in range(1, 10_000):
+        assert store.get(10, 0, y) is None
+    assert len(store._cache) <= 100
+    assert store._cached_bytes <= store.cache_bytes
+
+
+def test_tile_for_known_point():
+    # Sunnyvale at zoom 10
+    assert tile_for(37.3688, -122.0363, 10) == (164, 397)
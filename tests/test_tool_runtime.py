@@ -0,0 +1,112 @@
+"""Tool runtime: concurrent tools, deadlines, cached and degraded fallbacks, late results"""
+
+import time
+import asyncio
+import threading
+
+import pytest
+
+from tool_runtime import ToolRuntime
+
+
+@pytest.fixture
+def runtime():
+    runtime = ToolRuntime(workers=4)
+    yield runtime
+    runtime.close()
+
+
+def test_results_in_order_and_concurrent(runtime):
+    def slow(name):
+        def tool(context):
+            time.sleep(0.2)
+            return {'response': f"{name} {context['q']}"}
+        return tool
+
+    for name in ('a', 'b', 'c'):
+        runtime.register(name, slow(name))
+    start = time.perf_counter()
+    results = runtime.run(['c', 'a', 'b'], {'q': "?"}, deadline=2.0)
+    assert time.perf_counter() - start < 0.5
+    assert [r['response'] for r in results] == ["c ?", "a ?", "b ?"]
+    assert all(r['status'] == 'ok' for r in results)
+
+
+def test_timeout_falls_back_to_cached_then_degraded(runtime):
+    release = threading.Event()
+    calls = []
+
+    def lookup(context):
+        calls.append(context['zip'])
+        if len(calls) > 1:
+            release.wait(2)
+        return {'response': f"shelters near {context['zip']}"}
+
+    runtime.register('shelter', lookup, deadline=0.1, cache_key=lambda context: context['zip'],
+                     fallback=lambda context: {'response': "call 211"})
+    assert runtime.run(['shelter'], {'zip': '94086'})[0]['status'] == 'ok'
+
+    cached = runtime.run(['shelter'], {'zip': '94086'})[0]
+    assert (cached['status'], cached['fallback'], cached['response']) == ('timeout', 'cached', "shelters near 94086")
+    degraded = runtime.run(['shelter'], {'zip': '95014'})[0]
+    assert (degraded['fallback'], degraded['response']) == ('degraded', "call 211")
+
+    # The abandoned call still finishes and refreshes the cache
+    release.set()
+    deadline = time.monotonic() + 2
+    while runtime.stats()['shelter']['late_results'] < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert runtime.stats()['shelter']['late_results'] == 2
+    runtime.clear_cache()
+    release.clear()
+    assert runtime.run(['shelter'], {'zip': '94086'})[0]['fallback'] == 'degraded'
+    release.set()
+
+
+def test_async_tool_is_cancelled_at_its_deadline(runtime):
+    cancelled = threading.Event()
+
+    async def forever(context):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    runtime.register('slow', forever, deadline=0.05)
+    assert runtime.run(['slow'], {})[0]['status'] == 'timeout'
+    assert cancelled.wait(1)
+
+
+def test_errors_are_counted_and_answered(runtime):
+    def broken(context):
+        raise RuntimeError("backend down")
+
+    runtime.register('fema', broken, fallback=lambda context: {'response': "see disasterassistance.gov"})
+    result = runtime.run(['fema'], {})[0]
+    assert (result['status'], result['response']) == ('error', "see disasterassistance.gov")
+    stats = runtime.stats()['fema']
+    assert stats['calls'] == 1 and stats['errors'] == 1 and stats['degraded_fallbacks'] == 1
+
+
+def test_hung_tool_is_capped_and_fails_fast(runtime):
+    release = threading.Event()
+    runtime.register('hung', lambda context: release.wait(5) and {'response': "late"}, deadline=0.05,
+                     fallback=lambda context: {'response': "call 211"})
+    runtime.register('quick', lambda context: {'response': "ok"})
+
+    # A pool of 4 lets one tool hold 2 threads; the third call is answered at once
+    for _ in range(2):
+        assert runtime.run(['hung'], {})[0]['status'] == 'timeout'
+    start = time.perf_counter()
+    busy = runtime.run(['hung'], {})[0]
+    assert time.perf_counter() - start < 0.05
+    assert (busy['status'], busy['response']) == ('busy', "call 211")
+    assert runtime.stats()['hung']['rejected'] == 1 and runtime.stats()['hung']['in_flight'] == 2
+    assert runtime.run(['quick'], {})[0]['status'] == 'ok'
+
+    release.set()
+    deadline = time.monotonic() + 2
+    while runtime.stats()['hung']['in_flight'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert runtime.stats()['hung']['in_flight'] == 0
@@ -0,0 +1,87 @@
+"""Trace replay: capture round trip, torn lines, fingerprint and follow-up comparison"""
+
+import json
+
+import pytest
+
+from trace_replay import TraceRecorder, fingerprint, follow_ups, read_traces, replay, replay_step
+
+TOOLS = [{'tool': "shelter_finder", 'time_ms': 3.2}, {'tool': "fema_checker", 'status': 'cached'}]
+
+
+def fake_answer(query, context):
+    needs = ['household'] if "kit" in query else None
+    return f"Answer to {query} for {context.get('zip')}", ["step"], TOOLS[:1], "shelter" in query, needs
+
+
+@pytest.fixture
+def recorder(tmp_path):
+    recorder = TraceRecorder(str(tmp_path / 'traces' / 'trace.jsonl'), batch_interval=0.01)
+    yield recorder
+    recorder.close()
+
+
+def record_session(recorder, sid, queries, offset=0.0):
+    for query in queries:
+        recorder.input(sid, 'question', query)
+        result = fake_answer(query, {'zip': "94086"})
+        recorder.answer(sid, query, {'zip': "94086"}, result, 12.34 + offset, knowledge_version="1")
+
+
+def test_round_trip(recorder, tmp_path):
+    record_session(recorder, 's1', ["find a shelter", "build my kit"])
+    record_session(recorder, 's2', ["am I eligible"])
+    recorder.flush()
+    assert recorder.stats == {'recorded': 6, 'written': 6, 'dropped': 0, 'errors': 0}
+    sessions = read_traces([str(tmp_path / 'traces')])
+    assert sorted(sessions) == ['s1', 's2']
+    events = sessions['s1']
+    assert [event['e'] for event in events] == ['question', 'answer', 'question', 'answer']
+    answer = events[1]
+    assert answer['fp'] == fingerprint("Answer to find a shelter for 94086")
+    assert answer['map'] is True and answer['ms'] == 12.3 and answer['kv'] == "1"
+    assert answer['tools'] == [["shelter_finder", 3.2, 'ok']]
+    assert events[3]['ni'] == ['household']
+
+
+def test_partial_last_line_skipped(tmp_path, capsys):
+    path = tmp_path / 'trace.jsonl'
+    event = {'f': 1, 'sid': 's', 't': 1.0, 'e': 'question', 'v': "hi"}
+    path.write_text(json.dumps(event) + "\n" + '{"f":1,"sid":"s","t":2')
+    assert read_traces([str(path)]) == {'s': [event]}
+    assert "skipping unreadable event" in capsys.readouterr().err
+
+
+def test_follow_ups_accepts_old_single_names():
+    assert follow_ups('household') == ['household']
+    assert follow_ups(None) == []
+    assert follow_ups(('household', 'address')) == ['household', 'address']
+
+
+def answer_event(query, **changes):
+    response, _, _, show_map, needs = fake_answer(query, {'zip': "94086"})
+    event = {'sid': 's', 't': 1.0, 'e': 'answer', 'q': query, 'ctx': {'zip': "94086"}, 'fp': fingerprint(response),
+             'map': bool(show_map), 'ni': needs, 'ms': 50.0, 'kv': "1"}
+    event.update(changes)
+    return event
+
+
+def test_replay_step_outcomes():
+    step = replay_step(fake_answer, answer_event("build my kit"))
+    assert step['outcome'] == 'match' and step['delta_ms'] < 0 and step['fallbacks'] == 0
+    assert replay_step(fake_answer, answer_event("build my kit", ni='household'))['outcome'] == 'match'
+    assert replay_step(fake_answer, answer_event("build my kit", ni=None))['outcome'] == 'follow-up differs'
+    assert replay_step(fake_answer, answer_event("find a shelter", map=False))['outcome'] == 'follow-up differs'
+    assert replay_step(fake_answer, answer_event("hello", fp="0" * 16), "1")['outcome'] == 'answer differs'
+    assert replay_step(fake_answer, answer_event("hello", fp="0" * 16), "2")['outcome'] == \
+        'answer differs (recorded on knowledge v1)'
+
+
+def test_replay_sessions_concurrently():
+    sessions = {
+        'a': [{'sid': 'a', 't': 1.0, 'e': 'question', 'v': "hello"}, answer_event("hello", sid='a', t=1.0)],
+        'b': [answer_event("find a shelter", sid='b', t=1.05)]
+    }
+    steps = replay(sessions, fake_answer, concurrent=True)
+    assert sorted(step['sid'] for step in steps) == ['a', 'b']
+    assert all(step['outcome'] == 'match' for step in steps)
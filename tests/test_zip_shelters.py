@@ -0,0 +1,97 @@
+"""ZIP parsing and the per-ZIP nearest-shelter table"""
+
+import numpy as np
+import pytest
+
+from zip_shelters import ZipShelterTable, zip_of, open_shelters, load_table
+
+
+def shelter(name, lat, lon, **extra):
+    return dict(name=name, address=f"{name} St", capacity="100 people", lat=lat, lon=lon, **extra)
+
+
+def regions(*shelters):
+    return {'Test': list(shelters)}
+
+
+ZIPS = np.array([10001, 10002, 10003], dtype=np.int32)
+POINTS = np.array([(37.0, -122.0), (37.5, -122.0), (38.0, -122.0)])
+NORTH, MIDDLE, SOUTH = shelter("North", 38.0, -122.0), shelter("Middle", 37.5, -122.0), shelter("South", 37.0, -122.0)
+
+
+def table(*shelters, k=2):
+    keys, points = open_shelters(regions(*shelters))
+    return ZipShelterTable.build(ZIPS, POINTS, keys, points, k=k)
+
+
+def names(result):
+    return [key.split('|')[0] for key, _ in result]
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("94086", 94086),
+    ("94086-1234", 94086),
+    ("shelters near 94086", 94086),
+    ("94086 shelters", 94086),
+    ("10050 N Wolfe Rd, Cupertino, CA 95014", 95014),
+    ("10050 Wolfe Road Cupertino 95014", 95014),
+    ("12345 Main St, Springfield, IL 62701-1234", 62701),
+    ("550 E Remington Dr, Sunnyvale, CA 94087", 94087),
+    ("10050 N Wolfe Rd", None),
+    ("Sunnyvale", None),
+    ("", None),
+    (None, None),
+])
+def test_zip_of(text, expected):
+    assert zip_of(text) == expected
+
+
+def test_lookup_nearest_first():
+    zip_table = table(NORTH, MIDDLE, SOUTH)
+    assert names(zip_table.lookup(10001)) == ['South', 'Middle']
+    assert zip_table.lookup(10003)[0][1] == pytest.approx(0.0)
+    assert zip_table.lookup(99999) is None
+
+
+def test_fewer_shelters_than_k():
+    zip_table = table(MIDDLE, k=3)
+    assert names(zip_table.lookup(10001)) == ['Middle']
+
+
+def test_refresh_recomputes_only_affected_rows():
+    zip_table = table(NORTH, MIDDLE, SOUTH)
+    # Closing North only matters to the ZIPs that listed it
+    assert zip_table.refresh_from(regions(NORTH | {'status': 'closed'}, MIDDLE, SOUTH)) == 2
+    assert names(zip_table.lookup(10003)) == ['Middle', 'South']
+    assert names(zip_table.lookup(10001)) == ['South', 'Middle']
+    # Nothing changed: nothing recomputed
+    assert zip_table.refresh_from(regions(NORTH | {'status': 'closed'}, MIDDLE, SOUTH)) == 0
+
+
+def test_refresh_when_a_shelter_opens_nearby():
+    zip_table = table(NORTH, SOUTH)
+    assert zip_table.refresh_from(regions(NORTH, SOUTH, MIDDLE)) > 0
+    assert names(zip_table.lookup(10002))[0] == 'Middle'
+
+
+def test_filling_up_counts_as_closing():
+    zip_table = table(NORTH, MIDDLE, SOUTH)
+    assert zip_table.refresh_from(regions(NORTH, MIDDLE, SOUTH | {'occupancy': 60})) == 0
+    assert zip_table.refresh_from(regions(NORTH, MIDDLE, SOUTH | {'occupancy': 100})) > 0
+    assert 'South' not in names(zip_table.lookup(10001))
+    # A capacity raised past the occupancy reopens it
+    assert zip_table.refresh_from(regions(NORTH, MIDDLE, SOUTH | {'occupancy': 100, 'capacity': "150 people"})) > 0
+    assert names(zip_table.lookup(10001))[0] == 'South'
+
+
+def test_load_table_saves_and_refreshes(tmp_path, monkeypatch):
+    centroids = tmp_path / 'centroids.csv'
+    centroids.write_text("zip,lat,lon\n" + "".join(f"{z},{lat},{lon}\n" for z, (lat, lon) in zip(ZIPS, POINTS)))
+    monkeypatch.setenv('EMERGENCY_ZIP_CENTROIDS', str(centroids))
+    path = str(tmp_path / 'table.npz')
+    built = load_table(regions(NORTH, MIDDLE, SOUTH), path=path, k=2)
+    loaded = load_table(regions(NORTH, MIDDLE, SOUTH), path=path, k=2)
+    assert loaded.lookup(10002) == built.lookup(10002)
+    assert loaded.rows_recomputed == 0
+    changed = load_table(regions(NORTH, SOUTH), path=path, k=2)
+    assert 'Middle' not in names(changed.lookup(10002))
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Local Tile Server - Serves map tiles for our regions from an MBTiles file
+Keeps shelter maps working on congested or offline networks and off the public
+OpenStreetMap tile servers. Hot tiles are held in an in-memory LRU and every
+response carries ETag / Cache-Control headers so browsers revalidate cheaply.
+
+Serve with: python tile_server.py serve data/tiles.mbtiles --port 8600
+Then run the app with EMERGENCY_TILE_URL=http://<host>:8600/tiles/{z}/{x}/{y}.png
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+import urllib.request
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TILE_URL_ENV = 'EMERGENCY_TILE_URL'
+
+DEFAULT_PORT = 8600
+
+# Bytes of tile data kept in memory
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+# Bytes charged per cached entry on top of the tile data (key, ETag, LRU links), so
+# remembered misses, which hold no data, still count toward the bound
+ENTRY_OVERHEAD = 256
+
+# Browsers may reuse a tile for a day, then revalidate with If-None-Match
+TILE_MAX_AGE = 86400
+# Missing tiles are retried sooner in case the file is re-seeded
+MISSING_MAX_AGE = 300
+
+TILE_PATH_RE = re.compile(r"^/tiles/(\d+)/(\d+)/(\d+)\.(png|jpg|jpeg|webp|pbf)$")
+
+CONTENT_TYPES = {
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'webp': 'image/webp',
+    'pbf': 'application/x-protobuf'
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (name TEXT, value TEXT);
+CREATE TABLE IF NOT EXISTS tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB);
+CREATE UNIQUE INDEX IF NOT EXISTS tile_index ON tiles (zoom_level, tile_column, tile_row);
+"""
+
+
+def tile_for(lat, lon, zoom):
+    """Slippy-map (XYZ) tile containing a point"""
+    n = 2 ** zoom
+    x = int((lon + 180.0) / 360.0 * n)
+    lat_rad = math.radians(lat)
+    y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tiles_in_bounds(bounds, min_zoom, max_zoom):
+    """All (z, x, y) tiles covering (west, south, east, north)"""
+    west, south, east, north = bounds
+    for z in range(min_zoom, max_zoom + 1):
+        x0, y0 = tile_for(north, west, z)
+        x1, y1 = tile_for(south, east, z)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                yield z, x, y
+
+
+def region_bounds(shelter_data, padding=0.75):
+    """Bounding box around every shelter, padded by about 50 miles"""
+    lats = [s['lat'] for shelters in shelter_data.values() for s in shelters]
+    lons = [s['lon'] for shelters in shelter_data.values() for s in shelters]
+    return min(lons) - padding, min(lats) - padding, max(lons) + padding, max(lats) + padding
+
+
+def entry_bytes(entry):
+    """Memory charged for one cache entry: a (data, etag) pair or None for a missing tile"""
+    return ENTRY_OVERHEAD + (len(entry[0]) if entry else 0)
+
+
+class TileStore:
+    """Read-only MBTiles access with a byte-bounded LRU of hot tiles"""
+
+    def __init__(self, path, cache_bytes=DEFAULT_CACHE_BYTES):
+        self.path = path
+        self.cache_bytes = cache_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+        self.stats = {'requests': 0, 'hits': 0, 'misses': 0, 'not_found': 0, 'not_modified': 0,
+                      'bytes_served': 0}
+        self.metadata = dict(self._conn().execute("SELECT name, value FROM metadata"))
+        self.format = self.metadata.get('format', 'png')
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def count(self, counter, amount=1):
+        with self._lock:
+            self.stats[counter] += amount
+
+    def get(self, z, x, y):
+        """(data, etag) for an XYZ tile, or None when the file has no such tile"""
+        key = (z, x, y)
+        with self._lock:
+            self.stats['requests'] += 1
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.stats['hits'] += 1
+                return self._cache[key]
+            self.stats['misses'] += 1
+
+        # MBTiles rows are TMS: y counts up from the south
+        row = self._conn().execute(
+            "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (z, x, (1 << z) - 1 - y)).fetchone()
+        entry = None
+        if row is not None:
+            data = bytes(row[0])
+            entry = (data, '"' + hashlib.blake2b(data, digest_size=12).hexdigest() + '"')
+
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = entry
+                self._cached_bytes += entry_bytes(entry)
+                while self._cached_bytes > self.cache_bytes and self._cache:
+                    _, evicted = self._cache.popitem(last=False)
+                    self._cached_bytes -= entry_bytes(evicted)
+        return entry
+
+
+class TileHandler(BaseHTTPRequestHandler):
+    """GET /tiles/{z}/{x}/{y}.{ext}, /stats and /health"""
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; don't let Nagle hold the body back
+    disable_nagle_algorithm = True
+    store = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b'', content_type='text/plain', headers=()):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        if body and self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/health':
+            return self._send(200, b'ok')
+        if path == '/stats':
+            with self.store._lock:
+                stats = dict(self.store.stats, cached_tiles=len(self.store._cache),
+                             cached_bytes=self.store._cached_bytes)
+            return self._send(200, json.dumps(stats).encode('utf-8'), 'application/json')
+
+        match = TILE_PATH_RE.match(path)
+        if not match:
+            return self._send(404, b'not found')
+        z, x, y = (int(v) for v in match.groups()[:3])
+        entry = self.store.get(z, x, y)
+        if entry is None:
+            self.store.count('not_found')
+            # Transparent/empty responses would hide gaps; 404 lets the map show its background
+            return self._send(404, b'no tile', headers=[('Cache-Control', f'public, max-age={MISSING_MAX_AGE}')])
+
+        data, etag = entry
+        cache_headers = [('ETag', etag), ('Cache-Control', f'public, max-age={TILE_MAX_AGE}')]
+        if self.headers.get('If-None-Match') == etag:
+            self.store.count('not_modified')
+            return self._send(304, headers=cache_headers)
+
+        headers = list(cache_headers)
+        if data[:2] == b'\x1f\x8b':
+            headers.append(('Content-Encoding', 'gzip'))
+        self.store.count('bytes_served', len(data))
+        self._send(200, data, CONTENT_TYPES.get(self.store.format, 'application/octet-stream'), headers)
+
+    do_HEAD = do_GET
+
+
+def make_server(path, host='127.0.0.1', port=DEFAULT_PORT, cache_bytes=DEFAULT_CACHE_BYTES):
+    """HTTP server bound to an MBTiles file (call serve_forever on it)"""
+    handler = type('BoundTileHandler', (TileHandler,), {'store': TileStore(path, cache_bytes)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def tile_url():
+    """Tile URL template for maps, or None to use the public OpenStreetMap tiles"""
+    return os.environ.get(TILE_URL_ENV) or None
+
+
+# Building tile files
+
+def create_mbtiles(path, name, bounds, min_zoom, max_zoom, tile_format='png'):
+    """Create (or open) an MBTiles file and write its metadata"""
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.execute("DELETE FROM metadata")
+    conn.executemany("INSERT INTO metadata (name, value) VALUES (?, ?)", [
+        ('name', name), ('format', tile_format), ('type', 'baselayer'), ('version', '1'),
+        ('bounds', ','.join(f"{v:.5f}" for v in bounds)),
+        ('minzoom', str(min_zoom)), ('maxzoom', str(max_zoom)),
+        ('attribution', '© OpenStreetMap contributors')
+    ])
+    conn.commit()
+    return conn
+
+
+def put_tile(conn, z, x, y, data):
+    conn.execute("INSERT OR REPLACE INTO tiles (zoom_level, tile_column, tile_row, tile_data) VALUES (?, ?, ?, ?)",
+                 (z, x, (1 << z) - 1 - y, sqlite3.Binary(data)))
+
+
+def import_directory(conn, directory):
+    """Load a {z}/{x}/{y}.ext tile tree (e.g. a renderer's output) into the file"""
+    count = 0
+    for root, _, files in os.walk(directory):
+        for filename in files:
+            parts = os.path.relpath(os.path.join(root, filename), directory).split(os.sep)
+            if len(parts) != 3 or not parts[0].isdigit() or not parts[1].isdigit():
+                continue
+            y = os.path.splitext(parts[2])[0]
+            if not y.isdigit():
+                continue
+            with open(os.path.join(root, filename), 'rb') as f:
+                put_tile(conn, int(parts[0]), int(parts[1]), int(y), f.read())
+            count += 1
+    conn.commit()
+    return count
+
+
+def seed(conn, source, bounds, min_zoom, max_zoom, delay=0.1):
+    """Download tiles once from a source you are licensed to bulk-fetch from
+
+    source is a URL template with {z}/{x}/{y}. Requests are sequential and
+    throttled; tiles already in the file are skipped so seeding can resume.
+    """
+    fetched = skipped = failed = 0
+    for z, x, y in tiles_in_bounds(bounds, min_zoom, max_zoom):
+        exists = conn.execute("SELECT 1 FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                              (z, x, (1 << z) - 1 - y)).fetchone()
+        if exists:
+            skipped += 1
+            continue
+        request = urllib.request.Request(source.format(z=z, x=x, y=y),
+                                         headers={'User-Agent': 'emergency-preparedness-agent tile seeder'})
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                put_tile(conn, z, x, y, response.read())
+            fetched += 1
+        except OSError as e:
+            failed += 1
+            print(f"Tile {z}/{x}/{y} failed: {e}", file=sys.stderr)
+        if fetched % 100 == 0:
+            conn.commit()
+        time.sleep(delay)
+    conn.commit()
+    return fetched, skipped, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve or build local map tiles")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    serve = sub.add_parser('serve', help="Serve tiles from an MBTiles file")
+    serve.add_argument('path')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve.add_argument('--cache-mb', type=int, default=DEFAULT_CACHE_BYTES // (1024 * 1024))
+
+    for name, help_text in (('import', "Import a {z}/{x}/{y} tile directory"),
+                            ('seed', "Download tiles for the shelter regions from a tile source")):
+        build = sub.add_parser(name, help=help_text)
+        build.add_argument('path', help="MBTiles file to create or extend")
+        build.add_argument('--min-zoom', type=int, default=8)
+        build.add_argument('--max-zoom', type=int, default=15)
+        build.add_argument('--format', default='png')
+        if name == 'import':
+            build.add_argument('directory')
+        else:
+            build.add_argument('--source', required=True, help="Tile URL template with {z}/{x}/{y}")
+            build.add_argument('--delay', type=float, default=0.1, help="Seconds between requests")
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        server = make_server(args.path, args.host, args.port, args.cache_mb * 1024 * 1024)
+        print(f"Serving {args.path} on http://{args.host}:{args.port}/tiles/{{z}}/{{x}}/{{y}}."
+              f"{server.RequestHandlerClass.store.format}")
+        server.serve_forever()
+        return
+
+    from datapack import load_knowledge
+
+    bounds = region_bounds(load_knowledge()['shelters'])
+    conn = create_mbtiles(args.path, 'Emergency shelter regions', bounds, args.min_zoom, args.max_zoom, args.format)
+    if args.command == 'import':
+        print(f"Imported {import_directory(conn, args.directory)} tiles into {args.path}")
+    else:
+        fetched, skipped, failed = seed(conn, args.source, bounds, args.min_zoom, args.max_zoom, args.delay)
+        print(f"Seeded {args.path}: {fetched} fetched, {skipped} already present, {failed} failed")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Tool Runtime - Deadline-bound execution of the agent's tool lookups
+Tools are registered by name with a deadline and a fallback. A query runs its
+tools on an asyncio loop in a background thread; anything that misses its
+deadline is cancelled (async tools) or abandoned (blocking tools) and answered
+from the last good result or a degraded fallback, so one slow backend never
+stalls the whole answer. Blocking calls still running per tool are capped, so a
+hung backend cannot take over the shared thread pool; past the cap the call is
+answered from the fallback at once.
+
+Used by emergency_agent.py; see ToolRuntime.stats() for per-tool counters.
+"""
+
+import sys
+import time
+import asyncio
+import threading
+import concurrent.futures
+from collections import OrderedDict, deque
+
+# Seconds a single tool may take, unless registered with its own deadline
+DEFAULT_TOOL_DEADLINE = 2.0
+
+# Seconds a whole query may wait for its tools
+DEFAULT_QUERY_DEADLINE = 3.0
+
+# Extra time the caller allows for loop scheduling before giving up on the loop itself
+DEADLINE_GRACE = 0.25
+
+# Last good results kept for cached fallbacks
+CACHE_SIZE = 512
+
+# Recent latencies kept per tool for percentiles
+LATENCY_WINDOW = 1024
+
+# Share of the pool's threads one blocking tool may hold, unless registered with its own cap
+IN_FLIGHT_SHARE = 0.5
+
+
+class Tool:
+    """A registered tool: callable(context) -> result dict, sync or async"""
+
+    def __init__(self, name, func, label=None, deadline=DEFAULT_TOOL_DEADLINE, fallback=None, cache_key=None,
+                 max_in_flight=None):
+        self.name = name
+        self.func = func
+        self.label = label or name
+        self.deadline = deadline
+        self.fallback = fallback
+        self.cache_key = cache_key
+        self.max_in_flight = max_in_flight
+        self.is_async = asyncio.iscoroutinefunction(func)
+
+    def key(self, context):
+        return (self.name, self.cache_key(context) if self.cache_key else None)
+
+
+class ToolStats:
+    """Counters and recent latencies for one tool"""
+
+    def __init__(self):
+        self.calls = 0
+        self.ok = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.cached_fallbacks = 0
+        self.degraded_fallbacks = 0
+        self.late_results = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.max_ms = 0.0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def snapshot(self):
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+
+        return {
+            'calls': self.calls, 'ok': self.ok, 'timeouts': self.timeouts, 'errors': self.errors,
+            'cancelled': self.cancelled, 'cached_fallbacks': self.cached_fallbacks,
+            'degraded_fallbacks': self.degraded_fallbacks, 'late_results': self.late_results,
+            'rejected': self.rejected, 'in_flight': self.in_flight,
+            'p50_ms': percentile(0.50), 'p95_ms': percentile(0.95), 'max_ms': self.max_ms
+        }
+
+
+class ToolRuntime:
+    """Tool registry plus an asyncio executor running on its own thread"""
+
+    def __init__(self, workers=8):
+        self.workers = workers
+        self.tools = {}
+        self._stats = {}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='agent-tool')
+        self._loop = asyncio.new_event_loop()
+        self._loop.set_default_executor(self._pool)
+        self._thread = threading.Thread(target=self._loop.run_forever, name='tool-runtime', daemon=True)
+        self._thread.start()
+
+    # Registry
+
+    def register(self, name, func, label=None, deadline=DEFAULT_TOOL_DEADLINE, fallback=None, cache_key=None,
+                 max_in_flight=None):
+        """Register (or replace) a tool; counters survive re-registration"""
+        if max_in_flight is None:
+            max_in_flight = max(1, int(self.workers * IN_FLIGHT_SHARE))
+        tool = Tool(name, func, label, deadline, fallback, cache_key, max_in_flight)
+        with self._lock:
+            self.tools[name] = tool
+            self._stats.setdefault(name, ToolStats())
+        return tool
+
+    def stats(self):
+        """Per-tool counters and latency percentiles, keyed by tool name"""
+        with self._lock:
+            return {name: stats.snapshot() for name, stats in self._stats.items()}
+
+    def _count(self, name, counter, elapsed_ms=None):
+        with self._lock:
+            stats = self._stats[name]
+            setattr(stats, counter, getattr(stats, counter) + 1)
+            if elapsed_ms is not None:
+                stats.latencies.append(elapsed_ms)
+                stats.max_ms = max(stats.max_ms, elapsed_ms)
+
+    # Cached and degraded answers
+
+    def _remember(self, key, result):
+        with self._lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+    def clear_cache(self):
+        """Forget every last good result (after the data behind them changed)"""
+        with self._lock:
+            self._cache.clear()
+
+    def _fallback(self, tool, context, status, elapsed_ms):
+        with self._lock:
+            cached = self._cache.get(tool.key(context))
+        if cached is not None:
+            result = dict(cached, fallback='cached')
+            self._count(tool.name, 'cached_fallbacks')
+        else:
+            result = dict(tool.fallback(context) if tool.fallback else {'response': ''}, fallback='degraded')
+            self._count(tool.name, 'degraded_fallbacks')
+        result.update(status=status, elapsed_ms=elapsed_ms)
+        return result
+
+    # Execution
+
+    def _admit(self, tool):
+        """Take an in-flight slot for a blocking call; False at the tool's cap"""
+        with self._lock:
+            stats = self._stats[tool.name]
+            if stats.in_flight >= tool.max_in_flight:
+                stats.rejected += 1
+                return False
+            stats.in_flight += 1
+            return True
+
+    def _release(self, name):
+        with self._lock:
+            self._stats[name].in_flight -= 1
+
+    async def _call(self, tool, context, timeout):
+        start = time.perf_counter()
+        self._count(tool.name, 'calls')
+        if tool.is_async:
+            inner = asyncio.ensure_future(tool.func(context))
+        elif self._admit(tool):
+            inner = self._loop.run_in_executor(None, tool.func, context)
+            # The slot is held until the thread finishes, even after the caller has moved on
+            inner.add_done_callback(lambda f, name=tool.name: self._release(name))
+        else:
+            return self._fallback(tool, context, 'busy', (time.perf_counter() - start) * 1000)
+
+        try:
+            result = await asyncio.wait_for(asyncio.shield(inner), timeout)
+        except asyncio.TimeoutError:
+            status = 'timeout'
+        except asyncio.CancelledError:
+            inner.cancel()
+            raise
+        except Exception as e:
+            print(f"Tool {tool.name} failed: {type(e).__name__}: {e}", file=sys.stderr)
+            status = 'error'
+        else:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self._count(tool.name, 'ok', elapsed_ms)
+            self._remember(tool.key(context), result)
+            return dict(result, status='ok', elapsed_ms=elapsed_ms)
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self._count(tool.name, 'timeouts' if status == 'timeout' else 'errors', elapsed_ms)
+        if status == 'timeout':
+            if tool.is_async:
+                inner.cancel()
+            else:
+                # A blocking call cannot be interrupted; let it finish and refresh the cache
+                inner.add_done_callback(lambda f, tool=tool, key=tool.key(context): self._late(tool, key, f))
+        return self._fallback(tool, context, status, elapsed_ms)
+
+    def _late(self, tool, key, future):
+        if not future.cancelled() and future.exception() is None:
+            self._count(tool.name, 'late_results')
+            self._remember(key, future.result())
+
+    async def _run_all(self, names, context, deadline):
+        end = time.monotonic() + deadline
+        tasks = [asyncio.ensure_future(self._call(self.tools[name], context,
+                                                  max(0.0, min(self.tools[name].deadline, end - time.monotonic()))))
+                 for name in names]
+        return await asyncio.gather(*tasks)
+
+    def run(self, names, context, deadline=DEFAULT_QUERY_DEADLINE):
+        """Run the named tools concurrently; results come back in the same order
+
+        Every result dict gets status ('ok', 'timeout', 'error', 'busy' or 'cancelled')
+        and elapsed_ms; fallback answers also get fallback ('cached' or 'degraded').
+        """
+        start = time.perf_counter()
+        future = asyncio.run_coroutine_threadsafe(self._run_all(names, context, deadline), self._loop)
+        try:
+            return future.result(timeout=deadline + DEADLINE_GRACE)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            results = []
+            for name in names:
+                self._count(name, 'cancelled')
+                results.append(self._fallback(self.tools[name], context, 'cancelled', elapsed_ms))
+            return results
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Trace Replay - Capture real conversation flows and replay them headlessly
+Each session's inputs (questions, household and address forms) and, for
+every answer, the context it was computed with, a fingerprint of the answer
+and its timings are appended to a compact JSON Lines trace by a background
+writer. The replay tool feeds traces back through the agent's answer path
+without a browser, checks each answer against its recorded fingerprint and
+reports the latency change per step, so a slow or wrong answer seen in
+production becomes a repeatable performance test.
+
+Capture: EMERGENCY_TRACE_DIR (one trace file per worker)
+Replay with: python trace_replay.py replay <trace file or dir> [--session <id>] [--concurrent]
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import atexit
+import hashlib
+import argparse
+import threading
+import functools
+from datetime import datetime
+
+TRACE_DIR_ENV = 'EMERGENCY_TRACE_DIR'
+
+# Trace format version, written into every event
+FORMAT = 1
+
+# Writer flushes after this many events or this many seconds
+BATCH_SIZE = 256
+BATCH_INTERVAL = 0.5
+
+# Events queued beyond this are dropped (and counted) rather than blocking the app
+QUEUE_LIMIT = 100_000
+
+
+def fingerprint(response):
+    """Short digest of an answer; traces keep this instead of the answer text"""
+    return hashlib.sha256(response.encode('utf-8')).hexdigest()[:16]
+
+
+class TraceRecorder:
+    """Appends trace events to a JSON Lines file from a background writer"""
+
+    def __init__(self, path, batch_size=BATCH_SIZE, batch_interval=BATCH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.stats = {'recorded': 0, 'written': 0, 'dropped': 0, 'errors': 0}
+        self._stats_lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=QUEUE_LIMIT)
+        self._thread = threading.Thread(target=self._run, name='trace-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # Request path
+
+    def input(self, session_id, kind, value):
+        """A user input: 'question' text, 'household' counts or an 'address'"""
+        self._emit({'f': FORMAT, 'sid': session_id, 't': time.time(), 'e': kind, 'v': value})
+
+    def answer(self, session_id, query, context, result, elapsed_ms, knowledge_version=None, shared=False):
+        """An answer: the context it used, its fingerprint and where its time went"""
+        response, reasoning, tools, show_map, needs_input = result
+        self._emit({
+            'f': FORMAT, 'sid': session_id, 't': time.time(), 'e': 'answer', 'q': query,
+            'ctx': context, 'fp': fingerprint(response), 'len': len(response), 'map': bool(show_map),
+            'ni': needs_input, 'ms': round(elapsed_ms, 1), 'kv': knowledge_version, 'shared': shared,
+            'tools': [[tool['tool'], tool.get('time_ms'), tool.get('status', 'ok')] for tool in tools]
+        })
+
+    def _emit(self, event):
+        try:
+            self._queue.put_nowait(json.dumps(event, default=str, separators=(',', ':')))
+            counter = 'recorded'
+        except queue.Full:
+            counter = 'dropped'
+        with self._stats_lock:
+            self.stats[counter] += 1
+
+    # Writer thread
+
+    def _run(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            stop = False
+            while not stop:
+                line = self._queue.get()
+                if line is None:
+                    break
+                batch = [line]
+                deadline = time.monotonic() + self.batch_interval
+                while len(batch) < self.batch_size:
+                    try:
+                        line = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if line is None:
+                        stop = True
+                        break
+                    batch.append(line)
+                try:
+                    f.write("\n".join(batch) + "\n")
+                    f.flush()
+                    self.stats['written'] += len(batch)
+                except OSError as e:
+                    self.stats['errors'] += len(batch)
+                    print(f"Trace write failed ({len(batch)} events lost): {e}", file=sys.stderr)
+
+    def flush(self, timeout=10):
+        """Block until everything recorded so far is written (for tools and tests)"""
+        deadline = time.monotonic() + timeout
+        while self.stats['written'] + self.stats['errors'] < self.stats['recorded'] and \
+                time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=10)
+
+
+@functools.lru_cache(maxsize=None)
+def get_recorder(directory=None):
+    """Per-process recorder writing to the configured directory, or None when capture is off"""
+    directory = directory or os.environ.get(TRACE_DIR_ENV)
+    if not directory:
+        return None
+    return TraceRecorder(os.path.join(directory, f"trace-{socket.gethostname()}-{os.getpid()}.jsonl"))
+
+
+# Replay
+
+def read_traces(paths):
+    """Events of every trace file (or directory of them), grouped by session in time order"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.jsonl'))
+        else:
+            files.append(path)
+    sessions = {}
+    for path in files:
+        with open(path, encoding='utf-8') as f:
+            for number, line in enumerate(f, 1):
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    # A worker killed mid-write leaves a partial last line
+                    print(f"{path}:{number}: skipping unreadable event", file=sys.stderr)
+                    continue
+                sessions.setdefault(event['sid'], []).append(event)
+    for events in sessions.values():
+        events.sort(key=lambda event: event['t'])
+    return sessions
+
+
+def follow_ups(needs_input):
+    """The follow-up forms of an answer as a list; older traces record a single name"""
+    return [needs_input] if isinstance(needs_input, str) else list(needs_input or [])
+
+
+def replay_step(answer, event, knowledge_version=None):
+    """Recompute one recorded answer; returns the step's comparison"""
+    start = time.perf_counter()
+    response, _, tools, show_map, needs_input = answer(event['q'], dict(event['ctx']))
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if fingerprint(response) != event['fp']:
+        outcome = 'answer differs'
+    elif bool(show_map) != event['map'] or follow_ups(needs_input) != follow_ups(event['ni']):
+        outcome = 'follow-up differs'
+    else:
+        outcome = 'match'
+    if outcome != 'match' and event.get('kv') and knowledge_version and event['kv'] != knowledge_version:
+        outcome += f" (recorded on knowledge v{event['kv']})"
+    return {
+        'sid': event['sid'], 'q': event['q'], 'outcome': outcome, 'recorded_ms': event['ms'],
+        'replay_ms': elapsed_ms, 'delta_ms': elapsed_ms - event['ms'],
+        'fallbacks': sum(1 for tool in tools if tool.get('status'))
+    }
+
+
+def replay(sessions, answer, knowledge_version=None, concurrent=False, speed=1.0):
+    """Replay every session's answers: one after another, or on one thread per
+    session at the recorded pace (divided by speed) to reproduce the load"""
+    steps = []
+    lock = threading.Lock()
+    first = min((events[0]['t'] for events in sessions.values() if events), default=0.0)
+    start = time.monotonic()
+
+    def run(events):
+        for event in events:
+            if event['e'] != 'answer':
+                continue
+            if concurrent:
+                time.sleep(max(0.0, start + (event['t'] - first) / speed - time.monotonic()))
+            step = replay_step(answer, event, knowledge_version)
+            with lock:
+                steps.append(step)
+
+    if concurrent:
+        threads = [threading.Thread(target=run, args=(events,)) for events in sessions.values()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    else:
+        for events in sessions.values():
+            run(events)
+    return steps
+
+
+def _percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(share * len(values)))] if values else 0.0
+
+
+def print_steps(steps):
+    print(f"{'session':<10}{'question':<44}{'recorded':>10}{'replay':>10}{'delta':>10}  result")
+    for step in steps:
+        question = step['q'] if len(step['q']) <= 42 else step['q'][:41] + "…"
+        print(f"{step['sid'][:8]:<10}{question:<44}{step['recorded_ms']:>8.0f}ms{step['replay_ms']:>8.0f}ms"
+              f"{step['delta_ms']:>+8.0f}ms  {'✓' if step['outcome'] == 'match' else '✗ ' + step['outcome']}")
+    matches = sum(1 for step in steps if step['outcome'] == 'match')
+    recorded = [step['recorded_ms'] for step in steps]
+    replayed = [step['replay_ms'] for step in steps]
+    print(f"\n{len(steps)} answers • {matches} match • {len(steps) - matches} differ • "
+          f"p50 {_percentile(recorded, 0.5):.0f} → {_percentile(replayed, 0.5):.0f} ms • "
+          f"p95 {_percentile(recorded, 0.95):.0f} → {_percentile(replayed, 0.95):.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List or replay captured conversation traces")
+    sub = parser.add_subparsers(dest='command', required=True)
+    listing = sub.add_parser('sessions', help="Sessions in the traces with their step counts")
+    listing.add_argument('paths', nargs='+')
+    run = sub.add_parser('replay', help="Feed traces back through the agent and compare")
+    run.add_argument('paths', nargs='+', help="Trace files or directories")
+    run.add_argument('--session', action='append', help="Only this session id (or prefix); repeatable")
+    run.add_argument('--concurrent', action='store_true',
+                     help="One thread per session at the recorded pace, to reproduce the load")
+    run.add_argument('--speed', type=float, default=1.0, help="Pace multiplier for --concurrent")
+    run.add_argument('--max-slowdown', type=float, default=None,
+                     help="Fail when replay p95 exceeds recorded p95 by more than this factor")
+    args = parser.parse_args()
+
+    sessions = read_traces(args.paths)
+    if args.command == 'sessions':
+        for sid, events in sessions.items():
+            answers = [event for event in events if event['e'] == 'answer']
+            print(f"{sid}  {datetime.fromtimestamp(events[0]['t']):%Y-%m-%d %H:%M:%S}  "
+                  f"{len(events)} events • {len(answers)} answers • "
+                  f"{sum(event['ms'] for event in answers):.0f} ms answering")
+        return
+
+    if args.session:
+        sessions = {sid: events for sid, events in sessions.items()
+                    if any(sid.startswith(prefix) for prefix in args.session)}
+    if not sessions:
+        sys.exit("No matching sessions in the traces")
+
+    import logging
+    logging.disable(logging.WARNING)
+    import emergency_agent as app
+    import snapshot
+    from knowledge_pack import loaded_version
+
+    version = loaded_version(snapshot.load_knowledge()).get('version')
+    steps = replay(sessions, app.simulate_thinking, version, args.concurrent, args.speed)
+    print_steps(steps)
+    failed = any(step['outcome'] != 'match' for step in steps)
+    if args.max_slowdown is not None:
+        recorded = _percentile([step['recorded_ms'] for step in steps], 0.95)
+        replayed = _percentile([step['replay_ms'] for step in steps], 0.95)
+        if replayed > recorded * args.max_slowdown:
+            print(f"p95 slowed down {replayed / max(recorded, 1e-9):.2f}x (limit {args.max_slowdown}x)")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
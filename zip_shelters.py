@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+ZIP Shelter Table - Precomputed nearest open shelters for every ZIP code
+Most users type a ZIP code, and the answer for a ZIP only changes when
+shelters open, close or fill up. This table maps each ZIP centroid to its k
+nearest open shelters with distances, kept in a compact array file, so the
+shelter answer is one binary search. When the shelter data changes only the
+ZIPs whose top-k could be affected are recomputed: rows that listed a
+shelter which closed, filled up or moved, and rows whose k-th distance is
+beaten by a shelter that opened.
+
+Centroids: data/zip_centroids.csv (zip,lat,lon) or a Census ZCTA gazetteer file
+Build with: python zip_shelters.py build [--k 5]
+"""
+
+import os
+import re
+import sys
+import csv
+import time
+import argparse
+import threading
+
+import numpy as np
+
+from shelter_assignment import unit_vectors, dot_to_miles
+from compute_pool import nearest_shelters
+from address_index import ABBREVIATIONS, STATES
+
+TABLE_PATH_ENV = 'EMERGENCY_ZIP_TABLE'
+CENTROIDS_PATH_ENV = 'EMERGENCY_ZIP_CENTROIDS'
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+DEFAULT_TABLE_PATH = os.path.join(DATA_DIR, 'zip_shelters.npz')
+DEFAULT_CENTROIDS_PATH = os.path.join(DATA_DIR, 'zip_centroids.csv')
+
+# Shelters kept per ZIP
+DEFAULT_K = 5
+
+ZIP_RE = re.compile(r'\b(\d{5})(?:-\d{4})?\b')
+# A ZIP right after a state ("CA 95014") is certainly the ZIP
+STATE_ZIP_RE = re.compile(r'\b(?:' + '|'.join(sorted(STATES)) + r'),?\s+(\d{5})(?:-\d{4})?\b', re.IGNORECASE)
+# Street types: a leading number followed by one of these is a house number
+STREET_WORDS = {word for pair in ABBREVIATIONS.items() for word in pair} - \
+    {'north', 'south', 'east', 'west', 'n', 's', 'e', 'w'}
+# The head count in a shelter's capacity text ("1,200 people")
+CAPACITY_RE = re.compile(r'\d[\d,]*')
+
+
+def table_path():
+    return os.environ.get(TABLE_PATH_ENV, DEFAULT_TABLE_PATH)
+
+
+def centroids_path():
+    return os.environ.get(CENTROIDS_PATH_ENV, DEFAULT_CENTROIDS_PATH)
+
+
+def read_centroids(path):
+    """Sorted ZIP codes (int32) and their (lat, lon) centroids from a CSV or gazetteer file"""
+    with open(path, newline='', encoding='utf-8') as f:
+        sample = f.read(4096)
+        f.seek(0)
+        rows = csv.DictReader(f, delimiter='\t' if '\t' in sample.splitlines()[0] else ',')
+        # Census ZCTA gazetteer columns, else zip,lat,lon
+        fields = {name.strip().upper(): name for name in rows.fieldnames}
+        zip_col = fields.get('GEOID') or fields['ZIP']
+        lat_col = fields.get('INTPTLAT') or fields['LAT']
+        lon_col = fields.get('INTPTLONG') or fields['LON']
+        entries = sorted((int(row[zip_col]), float(row[lat_col]), float(row[lon_col])) for row in rows)
+    zips = np.array([zip_code for zip_code, _, _ in entries], dtype=np.int32)
+    points = np.array([(lat, lon) for _, lat, lon in entries], dtype=np.float64).reshape(-1, 2)
+    return zips, points
+
+
+def zip_of(text):
+    """The ZIP code in an address, as an int, or None
+
+    A ZIP after the state wins; otherwise the last five-digit number, since
+    addresses end with the ZIP. A five-digit number that starts a street
+    address ("10050 N Wolfe Rd") is the house number, not a ZIP.
+    """
+    text = text or ''
+    matches = list(STATE_ZIP_RE.finditer(text))
+    if not matches:
+        matches = [match for match in ZIP_RE.finditer(text) if not _house_number(text, match)]
+    return int(matches[-1].group(1)) if matches else None
+
+
+def _house_number(text, match):
+    if text[:match.start()].strip():
+        return False
+    words = re.findall(r'[a-z]+', text[match.end():].split(',')[0].lower())
+    return any(word in STREET_WORDS for word in words)
+
+
+def shelter_key(shelter):
+    return f"{shelter['name']}|{shelter['address']}"
+
+
+def capacity_of(shelter):
+    """People a shelter holds, read from its capacity text, or None when it gives no number"""
+    match = CAPACITY_RE.search(shelter.get('capacity', ''))
+    return int(match.group().replace(',', '')) if match else None
+
+
+def is_open(shelter):
+    """Open status and, when its occupancy is reported, room left"""
+    if shelter.get('status', 'open') != 'open':
+        return False
+    occupancy, capacity = shelter.get('occupancy'), capacity_of(shelter)
+    return occupancy is None or capacity is None or occupancy < capacity
+
+
+def open_shelters(shelter_data):
+    """Keys and (lat, lon) points of every open shelter in SHELTER_DATA-style {region: [shelter, ...]}"""
+    shelters = [shelter for entries in shelter_data.values() for shelter in entries if is_open(shelter)]
+    return ([shelter_key(shelter) for shelter in shelters],
+            np.array([(shelter['lat'], shelter['lon']) for shelter in shelters], dtype=np.float64).reshape(-1, 2))
+
+
+class ZipShelterTable:
+    """ZIP -> k nearest open shelters, with incremental refresh (lookups are thread-safe)"""
+
+    def __init__(self, zips, points, keys, shelter_points, index, miles):
+        # Readers take one reference to this tuple, so a refresh never shows them a half-updated table
+        self._data = (zips, points, list(keys), shelter_points, index, miles)
+        self._lock = threading.Lock()
+        self.refreshes = 0
+        self.rows_recomputed = 0
+
+    @classmethod
+    def build(cls, zips, points, keys, shelter_points, k=DEFAULT_K, nearest=nearest_shelters):
+        index, miles = cls._nearest(points, shelter_points, k, nearest)
+        return cls(zips, points, keys, shelter_points, index, miles)
+
+    @staticmethod
+    def _nearest(points, shelter_points, k, nearest):
+        """(rows, k) shelter indices and miles, padded with -1 / inf when there are fewer than k shelters"""
+        index = np.full((len(points), k), -1, dtype=np.int32)
+        miles = np.full((len(points), k), np.inf, dtype=np.float32)
+        if len(points) and len(shelter_points):
+            found, found_miles = nearest(points, shelter_points, k)
+            index[:, :found.shape[1]] = found
+            miles[:, :found.shape[1]] = found_miles
+        return index, miles
+
+    @property
+    def k(self):
+        return self._data[4].shape[1]
+
+    def __len__(self):
+        return len(self._data[0])
+
+    def lookup(self, zip_code):
+        """[(shelter key, miles), ...] nearest first for a ZIP, or None when the ZIP is unknown"""
+        zips, _, keys, _, index, miles = self._data
+        row = int(np.searchsorted(zips, zip_code))
+        if row == len(zips) or zips[row] != zip_code:
+            return None
+        return [(keys[i], float(d)) for i, d in zip(index[row].tolist(), miles[row].tolist()) if i >= 0]
+
+    def refresh(self, keys, shelter_points, nearest=nearest_shelters):
+        """Bring the table up to date with a new set of open shelters; returns the rows recomputed"""
+        shelter_points = np.asarray(shelter_points, dtype=np.float64).reshape(-1, 2)
+        with self._lock:
+            zips, points, old_keys, old_points, index, miles = self._data
+            old_position = {key: i for i, key in enumerate(old_keys)}
+            # Old index -> new index; -1 for shelters gone, closed, full or moved
+            remap = np.full(len(old_keys) + 1, -1, dtype=np.int32)
+            kept = np.zeros(len(keys), dtype=bool)
+            for new, key in enumerate(keys):
+                old = old_position.get(key)
+                if old is not None and np.array_equal(old_points[old], shelter_points[new]):
+                    remap[old] = new
+                    kept[new] = True
+            # Padding (-1) maps through the extra last slot to -1
+            new_index = remap[index]
+            lost = np.any((index >= 0) & (new_index < 0), axis=1)
+
+            gained = np.flatnonzero(~kept)
+            beaten = np.zeros(len(zips), dtype=bool)
+            if gained.size and len(points):
+                dots = unit_vectors(points[:, 0], points[:, 1]).reshape(-1, 3) @ \
+                    unit_vectors(shelter_points[gained, 0], shelter_points[gained, 1]).reshape(-1, 3).T
+                beaten = np.any(dot_to_miles(dots) < miles[:, -1:], axis=1)
+
+            rows = np.flatnonzero(lost | beaten)
+            if rows.size:
+                # new_index is already a fresh array; miles may be shared with readers
+                miles = miles.copy()
+                fresh_index, fresh_miles = self._nearest(points[rows], shelter_points, self.k, nearest)
+                new_index[rows] = fresh_index
+                miles[rows] = fresh_miles
+            self._data = (zips, points, list(keys), shelter_points, new_index, miles)
+            self.refreshes += 1
+            self.rows_recomputed += int(rows.size)
+            return int(rows.size)
+
+    def refresh_from(self, shelter_data, nearest=nearest_shelters):
+        keys, shelter_points = open_shelters(shelter_data)
+        return self.refresh(keys, shelter_points, nearest)
+
+    def save(self, path):
+        zips, points, keys, shelter_points, index, miles = self._data
+        tmp = f"{path}.tmp{os.getpid()}.npz"
+        np.savez(tmp, zips=zips, points=points, keys=np.array(keys, dtype=str),
+                 shelter_points=shelter_points, index=index, miles=miles)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls(arrays['zips'], arrays['points'], arrays['keys'].tolist(), arrays['shelter_points'],
+                       arrays['index'], arrays['miles'])
+
+    def stats(self):
+        zips, _, keys, _, index, _ = self._data
+        return {'zips': len(zips), 'shelters': len(keys), 'k': index.shape[1], 'refreshes': self.refreshes,
+                'rows_recomputed': self.rows_recomputed,
+                'bytes': sum(array.nbytes for array in (self._data[0], self._data[1], index, self._data[5]))}
+
+
+def load_table(shelter_data, path=None, k=DEFAULT_K, nearest=nearest_shelters):
+    """The saved table brought up to date with shelter_data, or a new one built from the centroids
+
+    Returns None when neither a table nor a centroids file exists. Saves the
+    table whenever anything had to be (re)computed.
+    """
+    path = path or table_path()
+    keys, shelter_points = open_shelters(shelter_data)
+    table = None
+    if os.path.exists(path):
+        try:
+            table = ZipShelterTable.load(path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Rebuilding ZIP shelter table {path}: {type(e).__name__}: {e}", file=sys.stderr)
+    if table is not None and table.k == k:
+        if not table.refresh(keys, shelter_points, nearest):
+            return table
+    else:
+        if not os.path.exists(centroids_path()):
+            return None
+        zips, points = read_centroids(centroids_path())
+        table = ZipShelterTable.build(zips, points, keys, shelter_points, k, nearest)
+    try:
+        table.save(path)
+    except OSError as e:
+        print(f"Could not save ZIP shelter table {path}: {e}", file=sys.stderr)
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or refresh the per-ZIP nearest-shelter table")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help="Build from the centroids file (or refresh an existing table)")
+    build.add_argument('--k', type=int, default=DEFAULT_K)
+    build.add_argument('--rebuild', action='store_true', help="Ignore the existing table")
+    lookup = sub.add_parser('lookup', help="Print the nearest shelters for a ZIP code")
+    lookup.add_argument('zip')
+    args = parser.parse_args()
+
+    import snapshot
+    shelters = snapshot.load_knowledge()['shelters']
+    if args.command == 'build':
+        if args.rebuild and os.path.exists(table_path()):
+            os.remove(table_path())
+        start = time.perf_counter()
+        table = load_table(shelters, k=args.k)
+        if table is None:
+            sys.exit(f"No centroids file at {centroids_path()}")
+        stats = table.stats()
+        print(f"{stats['zips']:,} ZIPs x {stats['k']} of {stats['shelters']} open shelters "
+              f"({stats['bytes'] / 1024:.0f} KB) in {time.perf_counter() - start:.2f}s -> {table_path()}")
+    else:
+        table = load_table(shelters)
+        rows = table.lookup(int(args.zip)) if table is not None else None
+        if rows is None:
+            sys.exit(f"ZIP {args.zip} is not in the table")
+        for key, miles in rows:
+            print(f"{miles:6.1f} mi  {key.split('|')[0]}")
+
+
+if __name__ == "__main__":
+    main()